@@ -1,4 +1,10 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit import config,data,evaluate,loss,model,module,trainer,utils,hyper_search,quick_start
\ No newline at end of file
+
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['config', 'data', 'evaluate', 'loss', 'model', 'module', 'trainer', 'utils', 'hyper_search', 'inference_server', 'quick_start']
+)
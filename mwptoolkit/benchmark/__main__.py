@@ -0,0 +1,13 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/27 10:36:12
+# @File: __main__.py
+"""Benchmark models on a bundled dataset, see mwptoolkit.benchmark.model_throughput.
+
+usage:
+    python -m mwptoolkit.benchmark --model GTS Graph2Tree --dataset mawps-single --steps 20 --output bench.json
+"""
+
+from mwptoolkit.benchmark.model_throughput import main
+
+main()
@@ -0,0 +1,266 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/28 16:20:41
+# @File: equation_solving.py
+"""Compare multi-equation evaluation with the linear solver fast path against sympy.solve on the
+equation systems of the bundled multi-equation datasets, and check both give the same verdicts.
+
+usage:
+    python -m mwptoolkit.benchmark.equation_solving --dataset_dir dataset --max_systems 500
+
+    # assert identical verdicts on every system of the datasets, skipped if sympy is not installed.
+    python -m mwptoolkit.benchmark.equation_solving --dataset_dir dataset --check
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import re
+import time
+
+from mwptoolkit.evaluate import evaluator as evaluator_module
+from mwptoolkit.evaluate.evaluator import InfixEvaluator, PostfixEvaluator, PrefixEvaluator
+from mwptoolkit.utils.enum_type import TaskType, MaskSymbol
+from mwptoolkit.utils.preprocess_tools import from_infix_to_postfix, from_infix_to_prefix
+
+MULTI_EQUATION_DATASETS = ['alg514', 'draw', 'dolphin1878', 'hmwp']
+
+_TOKEN = re.compile(r"\d+\(\d+/\d+\)|\(\d+/\d+\)|\d+(?:\.\d+)?%?|[a-zA-Z]+|[+\-*/^()=]")
+
+
+def _tokenize(equation):
+    equation = equation.replace(" ", "")
+    tokens = _TOKEN.findall(equation)
+    if "".join(tokens) != equation:
+        return None
+    result = []
+    for token in tokens:
+        if token == "-" and (not result or result[-1] in ["(", "="]):
+            # unary minus.
+            result.append("0")
+        elif token == "-" and result[-1] in ["+", "-", "*", "/", "^"]:
+            return None
+        result.append(token)
+    return result
+
+
+def _problem_equations(problem):
+    if "equations" in problem:
+        return [equation[len("equ:"):] for equation in problem["equations"] if equation.startswith("equ:")]
+    equation = problem.get("equation")
+    if not isinstance(equation, str):
+        return []
+    return equation.split(";")
+
+
+def load_systems(dataset_dir, datasets=None, max_systems=None):
+    r"""collect the equation systems of the multi-equation datasets under `dataset_dir`.
+
+    Returns:
+        list(list(list)): for each system, the tokens of its equations.
+    """
+    systems = []
+    for dataset in datasets or MULTI_EQUATION_DATASETS:
+        count = 0
+        for file_name in ["trainset.json", "validset.json", "testset.json"]:
+            path = os.path.join(dataset_dir, dataset, file_name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for problem in data:
+                if max_systems is not None and count >= max_systems:
+                    break
+                equations = [_tokenize(equation) for equation in _problem_equations(problem)]
+                if not equations or any(equation is None or equation.count("=") != 1 for equation in equations):
+                    continue
+                systems.append(equations)
+                count += 1
+    return systems
+
+
+def _join(equations):
+    tokens = []
+    for equation in equations:
+        if tokens:
+            tokens.append("<BRG>")
+        tokens.extend(equation)
+    return tokens
+
+
+def _swap_sides(equations):
+    swapped = []
+    for equation in equations:
+        idx = equation.index("=")
+        swapped.append(equation[idx + 1:] + ["="] + equation[:idx])
+    return swapped
+
+
+def _notations():
+    return [
+        ("infix", InfixEvaluator, lambda tokens: tokens),
+        ("postfix", PostfixEvaluator, from_infix_to_postfix),
+        ("prefix", PrefixEvaluator, from_infix_to_prefix),
+    ]
+
+
+def _pairs(systems, fix):
+    expressions = []
+    swapped = []
+    for equations in systems:
+        try:
+            expressions.append(fix(_join(equations)))
+            swapped.append(fix(_join(_swap_sides(equations))))
+        except IndexError:
+            continue
+    # every system is compared to itself with swapped sides and to its neighbour, as a prediction would be to a target.
+    pairs = list(zip(expressions, swapped)) + \
+        [(expressions[i], expressions[(i + 1) % len(expressions)]) for i in range(len(expressions))]
+    return expressions, pairs
+
+
+def _evaluator(evaluator_class, fast_linear_solve, solve_timeout):
+    config = {
+        "share_vocab": False,
+        "mask_symbol": MaskSymbol.NUM,
+        "task_type": TaskType.MultiEquation,
+        "single": False,
+        "linear": True,
+        "solve_timeout": solve_timeout,
+        "eval_workers": 0,
+        "verdict_cache_size": 0,
+        "fast_linear_solve": fast_linear_solve
+    }
+    return evaluator_class(config)
+
+
+def _verdicts(evaluator, pairs):
+    return [evaluator.result_multi(list(test_exp), list(tar_exp))[:2] for test_exp, tar_exp in pairs]
+
+
+class _SharedSympySolve(object):
+    r"""solve each sympy equation system once for all the evaluators it is bound to.
+
+    The evaluators with and without the fast path fall back to the same sympy code, so sharing the
+    solves leaves their verdicts as they are, but a solve hitting solve_timeout under load can not
+    give the two evaluators different answers.
+    """
+    def __init__(self):
+        self.results = {}
+
+    def bind(self, evaluator):
+        solve = evaluator._solve_equations
+
+        def shared_solve(equations, unk_symbol):
+            try:
+                key = (tuple(equations), tuple(unk_symbol))
+                known = key in self.results
+            except TypeError:
+                return solve(equations, unk_symbol)
+            if not known:
+                self.results[key] = solve(equations, unk_symbol)
+            return self.results[key]
+
+        evaluator._solve_equations = shared_solve
+        return evaluator
+
+
+class _CountedSolver(object):
+    def __init__(self, func):
+        self.func = func
+        self.calls = 0
+        self.solved = 0
+
+    def __call__(self, expression, prefix=False):
+        self.calls += 1
+        result = self.func(expression, prefix=prefix)
+        if result is not None:
+            self.solved += 1
+        return result
+
+
+def run(dataset_dir, datasets=None, max_systems=None, solve_timeout=10):
+    """Run the benchmark and return one result dict per expression notation.
+    """
+    systems = load_systems(dataset_dir, datasets, max_systems)
+    results = []
+    for name, evaluator_class, fix in _notations():
+        expressions, pairs = _pairs(systems, fix)
+
+        start = time.perf_counter()
+        legacy = _verdicts(_evaluator(evaluator_class, False, solve_timeout), pairs)
+        legacy_seconds = time.perf_counter() - start
+
+        counter = _CountedSolver(evaluator_module.solve_linear_equations)
+        evaluator_module.solve_linear_equations = counter
+        try:
+            start = time.perf_counter()
+            fast = _verdicts(_evaluator(evaluator_class, True, solve_timeout), pairs)
+            fast_seconds = time.perf_counter() - start
+        finally:
+            evaluator_module.solve_linear_equations = counter.func
+
+        results.append({
+            'notation': name,
+            'systems': len(expressions),
+            'pairs': len(pairs),
+            'sympy_ms': legacy_seconds / max(len(pairs), 1) * 1e3,
+            'fast_ms': fast_seconds / max(len(pairs), 1) * 1e3,
+            'fast_path_rate': counter.solved / counter.calls if counter.calls else 0.,
+            'value_accuracy': sum(1 for verdict in legacy if verdict[0]) / max(len(pairs), 1),
+            'verdict_mismatch': sum(1 for a, b in zip(legacy, fast) if a != b)
+        })
+    return results
+
+
+def check_parity(dataset_dir, datasets=None, solve_timeout=10):
+    """assert that evaluation with and without the fast path gives the same verdict for every pair of
+    every system of the multi-equation datasets, in every notation.
+
+    Returns:
+        dict|None: number of pairs checked per notation, None if the check is skipped as sympy is not installed.
+    """
+    if importlib.util.find_spec('sympy') is None:
+        return None
+    systems = load_systems(dataset_dir, datasets)
+    checked = {}
+    for name, evaluator_class, fix in _notations():
+        _, pairs = _pairs(systems, fix)
+        shared_solve = _SharedSympySolve()
+        legacy = _verdicts(shared_solve.bind(_evaluator(evaluator_class, False, solve_timeout)), pairs)
+        fast = _verdicts(shared_solve.bind(_evaluator(evaluator_class, True, solve_timeout)), pairs)
+        mismatch = [(pair, a, b) for pair, a, b in zip(pairs, legacy, fast) if a != b]
+        assert not mismatch, "{} {} of {} verdicts differ with the fast path, e.g. {} vs {}: sympy {} | fast path {}".format(
+            name, len(mismatch), len(pairs), " ".join(mismatch[0][0][0]), " ".join(mismatch[0][0][1]),
+            mismatch[0][1], mismatch[0][2])
+        checked[name] = len(pairs)
+    return checked
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset_dir', type=str, default='dataset')
+    parser.add_argument('--dataset', type=str, nargs='+', default=None)
+    parser.add_argument('--max_systems', type=int, default=None, help='systems read from each dataset, all if not set.')
+    parser.add_argument('--solve_timeout', type=float, default=10)
+    parser.add_argument('--check', action='store_true', help='only check the verdicts on every system of the datasets.')
+    args, _ = parser.parse_known_args()
+
+    if args.check:
+        checked = check_parity(args.dataset_dir, args.dataset, args.solve_timeout)
+        if checked is None:
+            print("skipped, sympy is not installed.")
+        else:
+            print(" | ".join("{} {:d} pairs".format(name, pairs) for name, pairs in checked.items()) + " | verdicts identical")
+        raise SystemExit(0)
+
+    mismatch = 0
+    for result in run(args.dataset_dir, args.dataset, args.max_systems, args.solve_timeout):
+        print("{:<8s} {:d} systems | {:d} pairs | sympy {:.3f} ms | fast path {:.3f} ms | solved by fast path {:.3f} | "
+              "value acc {:.3f} | verdict mismatch {:d}".format(
+            result['notation'], result['systems'], result['pairs'], result['sympy_ms'], result['fast_ms'],
+            result['fast_path_rate'], result['value_accuracy'], result['verdict_mismatch']))
+        mismatch += result['verdict_mismatch']
+    if mismatch:
+        raise SystemExit(1)
@@ -0,0 +1,246 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/20 10:12:45
+# @File: expression_evaluation.py
+"""Compare single-equation evaluation of the compiled expression programs with the former
+regex/eval evaluator on the equations of the bundled datasets, and check both give the same values.
+
+usage:
+    python -m mwptoolkit.benchmark.expression_evaluation --dataset_dir dataset
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+
+from mwptoolkit.evaluate import expression_program
+from mwptoolkit.evaluate.expression_program import compile_infix, compile_postfix, compile_prefix, run_program, run_programs
+from mwptoolkit.utils.preprocess_tools import from_infix_to_postfix, from_infix_to_prefix
+
+_TOKEN = re.compile(r"\d+\(\d+/\d+\)|\(\d+/\d+\)|\d+(?:\.\d+)?%?|[+\-*/^()\[\]]")
+
+
+def _legacy_compute_postfix_expression(post_fix):
+    st = list()
+    operators = ["+", "-", "^", "*", "/"]
+    for p in post_fix:
+        if p not in operators:
+            pos = re.search(r"\d+\(", p)
+            if pos:
+                st.append(eval(p[pos.start():pos.end() - 1] + "+" + p[pos.end() - 1:]))
+            elif p[-1] == "%":
+                st.append(float(p[:-1]) / 100)
+            else:
+                st.append(eval(p))
+        elif p == "+" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            st.append(b + a)
+        elif p == "*" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            st.append(b * a)
+        elif p == "/" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            if a == 0:
+                return None
+            st.append(b / a)
+        elif p == "-" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            st.append(b - a)
+        elif p == "^" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            if float(a) != 2.0 and float(a) != 3.0:
+                return None
+            st.append(b**a)
+        else:
+            return None
+    if len(st) == 1:
+        return st.pop()
+    return None
+
+
+def _legacy_compute_prefix_expression(pre_fix):
+    st = list()
+    operators = ["+", "-", "^", "*", "/"]
+    pre_fix_ = list(pre_fix)
+    pre_fix_.reverse()
+    for p in pre_fix_:
+        if p not in operators:
+            pos = re.search(r"\d+\(", p)
+            if pos:
+                st.append(eval(p[pos.start():pos.end() - 1] + "+" + p[pos.end() - 1:]))
+            elif p[-1] == "%":
+                st.append(float(p[:-1]) / 100)
+            else:
+                st.append(eval(p))
+        elif p == "+" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            st.append(a + b)
+        elif p == "*" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            st.append(a * b)
+        elif p == "/" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            if b == 0:
+                return None
+            st.append(a / b)
+        elif p == "-" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            st.append(a - b)
+        elif p == "^" and len(st) > 1:
+            a = st.pop()
+            b = st.pop()
+            if float(b) != 2.0 and float(b) != 3.0:
+                return None
+            st.append(a**b)
+        else:
+            return None
+    if len(st) == 1:
+        return st.pop()
+    return None
+
+
+def _legacy_compute_infix_expression(expression):
+    try:
+        post_exp = from_infix_to_postfix(expression)
+    except:
+        return None
+    return _legacy_compute_postfix_expression(post_exp)
+
+
+def _try(func, expression):
+    # the former evaluator let exceptions reach the try block of `result`, which counts them as wrong.
+    try:
+        return func(expression)
+    except:
+        return None
+
+
+def _verdict(test_value, tar_value):
+    try:
+        return abs(test_value - tar_value) < 1e-4
+    except:
+        return False
+
+
+def _same_value(a, b):
+    if a is None or b is None:
+        return a is b
+    return a == b or (a != a and b != b)
+
+
+def load_expressions(dataset_dir):
+    r"""collect the arithmetic sides of the single-equation problems in every dataset under `dataset_dir`.
+    """
+    expressions = []
+    for dataset in sorted(os.listdir(dataset_dir)):
+        for file_name in ["trainset.json", "validset.json", "testset.json"]:
+            path = os.path.join(dataset_dir, dataset, file_name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for problem in data:
+                equations = problem.get("equation", problem.get("lEquations", problem.get("Equation", problem.get("Formula"))))
+                if isinstance(equations, str):
+                    equations = [equations]
+                if not isinstance(equations, list) or len(equations) != 1 or not isinstance(equations[0], str):
+                    continue
+                for side in equations[0].split("="):
+                    side = side.replace(" ", "")
+                    if side == "" or re.search("[a-zA-Z]", side):
+                        continue
+                    tokens = _TOKEN.findall(side)
+                    if "".join(tokens) == side:
+                        expressions.append(tokens)
+    return expressions
+
+
+def _per_sample_us(func, expressions, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat / max(len(expressions), 1) * 1e6
+
+
+def _clear_program_caches():
+    for cached in [expression_program.parse_operand, expression_program._compile_infix,
+                   expression_program._compile_postfix, expression_program._compile_prefix]:
+        cached.cache_clear()
+
+
+def _cold(func):
+    def run():
+        _clear_program_caches()
+        return func()
+    return run
+
+
+def run(dataset_dir, repeat=3):
+    """Run the benchmark and return one result dict per expression notation.
+    """
+    infix = load_expressions(dataset_dir)
+    postfix = []
+    prefix = []
+    for exp in infix:
+        try:
+            postfix.append(from_infix_to_postfix(exp))
+            prefix.append(from_infix_to_prefix(exp))
+        except IndexError:
+            # unbalanced brackets, only kept as infix.
+            continue
+    notations = [
+        ("infix", infix, _legacy_compute_infix_expression, compile_infix),
+        ("postfix", postfix, _legacy_compute_postfix_expression, compile_postfix),
+        ("prefix", prefix, _legacy_compute_prefix_expression, compile_prefix),
+    ]
+    results = []
+    for name, expressions, legacy, compile_expression in notations:
+        legacy_values = [_try(legacy, exp) for exp in expressions]
+        scalar_values = [run_program(compile_expression(exp)) for exp in expressions]
+        batch_values = run_programs([compile_expression(exp) for exp in expressions])
+        # every expression is compared to itself and to its neighbour, as a prediction would be to a target.
+        pairs = [(i, i) for i in range(len(expressions))] + [(i, (i + 1) % len(expressions)) for i in range(len(expressions))]
+        verdict_mismatch = 0
+        for i, j in pairs:
+            legacy_verdict = _verdict(legacy_values[i], legacy_values[j])
+            if legacy_verdict != _verdict(scalar_values[i], scalar_values[j]) or \
+                    legacy_verdict != _verdict(batch_values[i], batch_values[j]):
+                verdict_mismatch += 1
+        value_mismatch = sum(1 for a, b, c in zip(legacy_values, scalar_values, batch_values)
+                             if not _same_value(a, b) or not _same_value(a, c))
+
+        results.append({
+            'notation': name,
+            'expressions': len(expressions),
+            'legacy_us': _per_sample_us(lambda: [_try(legacy, exp) for exp in expressions], expressions, repeat),
+            'compiled_cold_us': _per_sample_us(_cold(lambda: [run_program(compile_expression(exp)) for exp in expressions]), expressions, repeat),
+            'compiled_cached_us': _per_sample_us(lambda: [run_program(compile_expression(exp)) for exp in expressions], expressions, repeat),
+            'batch_us': _per_sample_us(lambda: run_programs([compile_expression(exp) for exp in expressions]), expressions, repeat),
+            'value_mismatch': value_mismatch,
+            'verdict_mismatch': verdict_mismatch
+        })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset_dir', type=str, default='dataset')
+    parser.add_argument('--repeat', type=int, default=3)
+    args, _ = parser.parse_known_args()
+
+    for result in run(args.dataset_dir, repeat=args.repeat):
+        print("{:<8s} {:d} expressions | legacy {:.2f} us | compiled {:.2f} us (cached {:.2f} us) | batch {:.2f} us | "
+              "value mismatch {:d} | verdict mismatch {:d}".format(
+            result['notation'], result['expressions'], result['legacy_us'], result['compiled_cold_us'],
+            result['compiled_cached_us'], result['batch_us'], result['value_mismatch'], result['verdict_mismatch']))
@@ -0,0 +1,117 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/20 10:12:45
+# @File: import_time.py
+"""Measure the import time of the toolkit entry points, each in a fresh interpreter, and list
+the heavy optional dependencies they load. With --check, exit with status 1 when an entry point
+loads a dependency it should only load on first use, or takes longer than --max_seconds.
+
+usage:
+    python -m mwptoolkit.benchmark.import_time --repeat 5 --check
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+# dependencies which cost seconds to import and are only needed by some models or datasets.
+HEAVY_MODULES = ['stanza', 'nltk', 'sympy', 'transformers', 'ray']
+
+# (name, statement, modules the statement may load)
+TARGETS = [
+    ('package', 'import mwptoolkit', []),
+    ('quick_start', 'from mwptoolkit.quick_start import run_toolkit', []),
+    ('evaluator', 'from mwptoolkit.evaluate.evaluator import InfixEvaluator', []),
+    ('get_model_gts', "from mwptoolkit.utils.utils import get_model; get_model('GTS')", []),
+    ('dataset_gts', "from mwptoolkit.data.dataset.single_equation_dataset import SingleEquationDataset", []),
+]
+
+_CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+exec({statement!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'num_modules': len(sys.modules),
+                   'heavy': sorted(m for m in {heavy!r} if m in sys.modules)}}))
+"""
+
+
+def _parse_importtime(stderr):
+    # lines look like "import time:       123 |        456 |   package.module"
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3:
+            continue
+        try:
+            modules.append((int(fields[0]), int(fields[1]), fields[2].strip()))
+        except ValueError:
+            continue
+    return modules
+
+
+def measure(statement, repeat=3, top=5):
+    r"""import `statement` in `repeat` fresh interpreters.
+
+    Returns:
+        dict: fastest wall time in seconds, number of loaded modules, heavy modules loaded and the
+        `top` modules with the largest self import time.
+    """
+    best = None
+    for _ in range(repeat):
+        code = _CHILD.format(statement=statement, heavy=HEAVY_MODULES)
+        proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE, universal_newlines=True)
+        if proc.returncode != 0:
+            raise RuntimeError("{} failed:\n{}".format(statement, proc.stderr[-2000:]))
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        modules = _parse_importtime(proc.stderr)
+        result['slowest'] = [(name, self_us / 1e6) for self_us, _, name in sorted(modules, reverse=True)[:top]]
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+
+def run(repeat=3, top=5, max_seconds=None):
+    r"""measure every target.
+
+    Returns:
+        tuple(list, list): one result dict per target and the list of failed checks.
+    """
+    results = []
+    failures = []
+    for name, statement, allowed in TARGETS:
+        result = measure(statement, repeat=repeat, top=top)
+        result['name'] = name
+        result['statement'] = statement
+        results.append(result)
+        unexpected = [m for m in result['heavy'] if m not in allowed]
+        if unexpected:
+            failures.append("{} loads {}".format(name, ', '.join(unexpected)))
+        if max_seconds is not None and result['seconds'] > max_seconds:
+            failures.append("{} takes {:.3f}s > {:.3f}s".format(name, result['seconds'], max_seconds))
+    return results, failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5, help='number of slowest modules reported per target')
+    parser.add_argument('--max_seconds', type=float, default=None, help='time budget of every target, checked with --check')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    args, _ = parser.parse_known_args()
+
+    results, failures = run(repeat=args.repeat, top=args.top, max_seconds=args.max_seconds)
+    for result in results:
+        print("{:<14s} {:.3f}s | {:d} modules | heavy: {} | {}".format(
+            result['name'], result['seconds'], result['num_modules'], ', '.join(result['heavy']) or '-',
+            result['statement']))
+        for module_name, seconds in result['slowest']:
+            print("    {:.3f}s  {}".format(seconds, module_name))
+    for failure in failures:
+        print("FAILED: {}".format(failure))
+    if args.check and failures:
+        sys.exit(1)
@@ -0,0 +1,251 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/27 10:36:12
+# @File: model_throughput.py
+"""Measure preprocessing time, training throughput, per-problem decoding latency, evaluator time
+and peak memory of models on a bundled dataset, on cpu, and write the results as json so they can
+be compared across versions.
+
+usage:
+    python -m mwptoolkit.benchmark --model GTS Graph2Tree --dataset mawps-single --steps 20 --output bench.json
+    python -m mwptoolkit.benchmark.model_throughput --model Transformer --dataset math23k --eval_problems 50
+
+extra parameters of the toolkit are given as in run_mwptoolkit.py, e.g. --embedding_size=128.
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+import torch
+
+from mwptoolkit.config.configuration import Config
+from mwptoolkit.data.utils import get_dataset_module, get_dataloader_module
+from mwptoolkit.evaluate.evaluator import get_evaluator_module
+from mwptoolkit.utils.enum_type import DatasetType
+from mwptoolkit.utils.utils import get_model, get_trainer, init_seed
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# task type of the bundled datasets which are not single equation.
+MULTI_EQUATION_DATASETS = ['draw', 'hmwp', 'alg514', 'dolphin1878']
+
+
+def _peak_rss_mb():
+    # peak resident memory of the process so far, None where resource is not available.
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos.
+    return peak / (1024 * 1024) if platform.system() == 'Darwin' else peak / 1024
+
+
+class _Phase(object):
+    r"""wall time and peak resident memory of a phase, and peak python memory if `trace` is True.
+
+    tracing slows python code down, so it is left off for the phases measuring throughput.
+    """
+    def __init__(self, results, name, trace=False):
+        self.results = results
+        self.name = name
+        self.trace = trace
+
+    def __enter__(self):
+        if self.trace:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        self.results[self.name] = {'seconds': seconds, 'peak_rss_mb': _peak_rss_mb()}
+        if self.trace:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.results[self.name]['peak_python_mb'] = peak / (1024 * 1024)
+        return False
+
+
+class _TimedEvaluator(object):
+    r"""wrap `result_batch` of an evaluator to sum the time spent in it.
+    """
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self.result_batch = evaluator.result_batch
+        self.seconds = 0.
+        self.problems = 0
+        evaluator.result_batch = self
+
+    def __call__(self, test_exps, tar_exps, *args, **kwargs):
+        start = time.perf_counter()
+        result = self.result_batch(test_exps, tar_exps, *args, **kwargs)
+        self.seconds += time.perf_counter() - start
+        self.problems += len(test_exps)
+        return result
+
+    def reset(self):
+        self.seconds = 0.
+        self.problems = 0
+
+
+def _train_epoch(trainer):
+    # TSN trains a teacher net before its student net, the teacher stage is measured.
+    if trainer.config["model"].lower() == 'tsn':
+        return trainer._train_epoch('teacher_net')
+    return trainer._train_epoch()
+
+
+def _eval_batch(trainer, batch):
+    if trainer.config["model"].lower() == 'tsn':
+        return trainer._eval_teacher_net_batch(batch)
+    return trainer._eval_batch(batch)
+
+
+def _decode(trainer, timed_evaluator, beam_size):
+    r"""decode every test problem one by one.
+
+    Returns:
+        dict: decoding latency per problem, evaluator time excluded, and evaluator time per problem.
+    """
+    trainer.model.eval()
+    timed_evaluator.reset()
+    latencies = []
+    with torch.no_grad():
+        for batch in trainer.dataloader.load_data(DatasetType.Test):
+            evaluator_seconds = timed_evaluator.seconds
+            start = time.perf_counter()
+            _eval_batch(trainer, batch)
+            seconds = time.perf_counter() - start - (timed_evaluator.seconds - evaluator_seconds)
+            latencies.append(seconds)
+    latencies = sorted(latencies)
+    if not latencies:
+        return {'beam_size': beam_size, 'problems': 0}
+    return {
+        'beam_size': beam_size,
+        'problems': len(latencies),
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p90_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))] * 1000,
+        'evaluator_ms': timed_evaluator.seconds / max(1, timed_evaluator.problems) * 1000
+    }
+
+
+def run(model_name, dataset_name, task_type=None, steps=20, eval_problems=50, beam_size=None, num_threads=None,
+        config_dict=None):
+    r"""benchmark a model on cpu.
+
+    The whole dataset is preprocessed, as in training, then `steps` training batches and
+    `eval_problems` test problems are taken to build the dataloader, train one pass and decode
+    the problems one by one, greedily and with beam search.
+
+    Args:
+        model_name (str): a registered model, e.g. GTS.
+
+        dataset_name (str): a bundled dataset, e.g. math23k.
+
+        task_type (str|None): task type, multi_equation for the multi equation datasets and single_equation else if None.
+
+        steps (int): number of training batches.
+
+        eval_problems (int): number of decoded test problems.
+
+        beam_size (int|None): beam size of beam decoding, the one of the model config if None.
+
+        num_threads (int|None): torch threads, torch default if None.
+
+        config_dict (dict|None): other parameters of the config.
+
+    Returns:
+        dict: results of every phase.
+    """
+    if task_type is None:
+        task_type = 'multi_equation' if dataset_name.lower() in MULTI_EQUATION_DATASETS else 'single_equation'
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    bench_config = {'use_gpu': False, 'dataset_cache': False, 'test_batch_size': 1, 'epoch_nums': 1,
+                    'gradient_accumulation_steps': 1}
+    bench_config.update(config_dict or {})
+    config = Config(model_name, dataset_name, task_type, bench_config)
+    init_seed(config['random_seed'], True)
+
+    results = {'model': model_name, 'dataset': dataset_name, 'task_type': task_type, 'torch': torch.__version__,
+               'num_threads': torch.get_num_threads(), 'phases': {}}
+    phases = results['phases']
+
+    with _Phase(phases, 'preprocess', trace=True):
+        dataset = get_dataset_module(config)(config)
+        dataset.dataset_load()
+    phases['preprocess']['problems'] = len(dataset.trainset) + len(dataset.validset) + len(dataset.testset)
+
+    dataset.trainset = dataset.trainset[:steps * config['train_batch_size']]
+    dataset.validset = dataset.validset[:eval_problems]
+    dataset.testset = dataset.testset[:eval_problems]
+    with _Phase(phases, 'build_batches', trace=True):
+        dataloader = get_dataloader_module(config)(config, dataset)
+    phases['build_batches']['problems'] = len(dataset.trainset) + len(dataset.validset) + len(dataset.testset)
+
+    model = get_model(config["model"])(config, dataset).to(config["device"])
+    evaluator = get_evaluator_module(config)(config)
+    trainer = get_trainer(config)(config, model, dataloader, evaluator)
+    timed_evaluator = _TimedEvaluator(evaluator)
+
+    with _Phase(phases, 'train'):
+        _train_epoch(trainer)
+    phases['train']['steps'] = dataloader.trainset_batch_nums
+    phases['train']['samples'] = len(dataset.trainset)
+    phases['train']['samples_per_second'] = len(dataset.trainset) / phases['train']['seconds']
+
+    has_beam = hasattr(model, 'beam_size')
+    default_beam_size = model.beam_size if has_beam else None
+    if has_beam:
+        model.beam_size = 1
+    with _Phase(phases, 'greedy_decode'):
+        phases['greedy_decode'].update(_decode(trainer, timed_evaluator, 1 if has_beam else None))
+    if has_beam:
+        model.beam_size = beam_size if beam_size else max(1, default_beam_size)
+        with _Phase(phases, 'beam_decode'):
+            phases['beam_decode'].update(_decode(trainer, timed_evaluator, model.beam_size))
+        model.beam_size = default_beam_size
+    else:
+        # the model decodes greedily only.
+        phases['beam_decode'] = None
+    evaluator.close()
+
+    results['peak_rss_mb'] = _peak_rss_mb()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, nargs='+', default=['GTS'])
+    parser.add_argument('--dataset', type=str, default='mawps-single')
+    parser.add_argument('--task_type', type=str, default=None)
+    parser.add_argument('--steps', type=int, default=20, help='number of training batches')
+    parser.add_argument('--eval_problems', type=int, default=50, help='number of decoded test problems')
+    parser.add_argument('--beam_size', type=int, default=None)
+    parser.add_argument('--num_threads', type=int, default=None)
+    parser.add_argument('--output', type=str, default=None, help='json file the results are written to')
+    args, _ = parser.parse_known_args(argv)
+
+    results = []
+    for model_name in args.model:
+        results.append(run(model_name, args.dataset, args.task_type, steps=args.steps,
+                           eval_problems=args.eval_problems, beam_size=args.beam_size, num_threads=args.num_threads))
+    output = json.dumps(results, indent=4)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
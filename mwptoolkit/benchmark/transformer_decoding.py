@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/20 10:12:45
+# @File: transformer_decoding.py
+"""Compare greedy decoding of TransformerDecoder with and without key/value cache.
+
+usage:
+    python -m mwptoolkit.benchmark.transformer_decoding --max_output_len 30 60
+"""
+
+import argparse
+import time
+
+import torch
+from torch import nn
+
+from mwptoolkit.module.Decoder.transformer_decoder import TransformerDecoder
+from mwptoolkit.module.Embedder.position_embedder import PositionEmbedder
+from mwptoolkit.module.Attention.self_attention import SelfAttentionMask
+
+
+class _GreedyDecoder(nn.Module):
+    def __init__(self, symbol_size, embedding_size, ffn_size, num_layers, num_heads):
+        super(_GreedyDecoder, self).__init__()
+        self.out_embedder = nn.Embedding(symbol_size, embedding_size)
+        self.pos_embedder = PositionEmbedder(embedding_size)
+        self.self_attentioner = SelfAttentionMask()
+        self.decoder = TransformerDecoder(embedding_size, ffn_size, num_layers, num_heads)
+        self.out = nn.Linear(embedding_size, symbol_size)
+
+    def full_prefix(self, encoder_outputs, seq_mask, max_output_len):
+        batch_size = encoder_outputs.size(0)
+        input_seq = torch.zeros((batch_size, 1), dtype=torch.long)
+        pre_tokens = [input_seq]
+        outputs = []
+        for idx in range(max_output_len):
+            self_attn_mask = self.self_attentioner(input_seq.size(-1)).bool()
+            decoder_input = self.out_embedder(input_seq) + self.pos_embedder(input_seq)
+            decoder_outputs = self.decoder(decoder_input, self_attn_mask=self_attn_mask,
+                                           external_states=encoder_outputs, external_padding_mask=seq_mask)
+            token_logit = self.out(decoder_outputs[:, -1, :])
+            output = token_logit.topk(1, dim=-1)[1]
+            outputs.append(output)
+            pre_tokens.append(output)
+            input_seq = torch.cat(pre_tokens, dim=1)
+        return torch.cat(outputs, dim=1)
+
+    def cached(self, encoder_outputs, seq_mask, max_output_len):
+        batch_size = encoder_outputs.size(0)
+        input_seq = torch.zeros((batch_size, 1), dtype=torch.long)
+        cache = self.decoder.init_cache()
+        outputs = []
+        for idx in range(max_output_len):
+            decoder_input = self.out_embedder(input_seq) + self.pos_embedder(input_seq, offset=idx)
+            decoder_outputs = self.decoder(decoder_input, external_states=encoder_outputs,
+                                           external_padding_mask=seq_mask, cache=cache)
+            token_logit = self.out(decoder_outputs[:, -1, :])
+            output = token_logit.topk(1, dim=-1)[1]
+            outputs.append(output)
+            input_seq = output
+        return torch.cat(outputs, dim=1)
+
+
+def _timeit(func, repeat):
+    func()
+    start = time.time()
+    for _ in range(repeat):
+        result = func()
+    return (time.time() - start) / repeat, result
+
+
+def run(max_output_lens, batch_size=64, seq_len=120, symbol_size=30, embedding_size=512, ffn_size=1024,
+        num_layers=4, num_heads=8, repeat=5, seed=2020):
+    """Run the benchmark and return one result dict per max output length.
+    """
+    torch.manual_seed(seed)
+    model = _GreedyDecoder(symbol_size, embedding_size, ffn_size, num_layers, num_heads)
+    model.eval()
+    encoder_outputs = torch.randn(batch_size, seq_len, embedding_size)
+    seq_mask = torch.zeros(batch_size, seq_len, dtype=torch.bool)
+    results = []
+    with torch.no_grad():
+        for max_output_len in max_output_lens:
+            full_time, full_outputs = _timeit(lambda: model.full_prefix(encoder_outputs, seq_mask, max_output_len),
+                                              repeat)
+            cached_time, cached_outputs = _timeit(lambda: model.cached(encoder_outputs, seq_mask, max_output_len),
+                                                  repeat)
+            results.append({
+                'max_output_len': max_output_len,
+                'full_prefix_ms': full_time * 1000,
+                'cached_ms': cached_time * 1000,
+                'speedup': full_time / cached_time,
+                'same_outputs': bool(torch.equal(full_outputs, cached_outputs))
+            })
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max_output_len', type=int, nargs='+', default=[30, 60])
+    parser.add_argument('--batch_size', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=5)
+    args, _ = parser.parse_known_args()
+
+    for result in run(args.max_output_len, batch_size=args.batch_size, repeat=args.repeat):
+        print("max_output_len {:d} | full prefix {:.2f} ms | cached {:.2f} ms | speedup {:.2f}x | same outputs {}".format(
+            result['max_output_len'], result['full_prefix_ms'], result['cached_ms'], result['speedup'],
+            result['same_outputs']))
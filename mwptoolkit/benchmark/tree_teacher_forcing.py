@@ -0,0 +1,225 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/28 18:05:27
+# @File: tree_teacher_forcing.py
+"""Check that goal-driven tree decoders give the same token logits, resolved targets, losses and
+gradients when the target trees are decoded along the tree schedule of the dataloader as when they
+are decoded step by step, and measure the training time of both on a bundled dataset, on cpu.
+
+usage:
+    python -m mwptoolkit.benchmark.tree_teacher_forcing --model GTS TSN --dataset mawps_asdiv-a_svamp --steps 50
+
+    # only check the models on the first training batches.
+    python -m mwptoolkit.benchmark.tree_teacher_forcing --model GTS Graph2Tree SAUSolver TSN --dataset mawps_asdiv-a_svamp --steps 50 --check
+"""
+
+import argparse
+import json
+import time
+
+import torch
+
+from mwptoolkit.benchmark.model_throughput import MULTI_EQUATION_DATASETS, _train_epoch
+from mwptoolkit.config.configuration import Config
+from mwptoolkit.data.utils import get_dataset_module, get_dataloader_module
+from mwptoolkit.evaluate.evaluator import get_evaluator_module
+from mwptoolkit.utils.enum_type import DatasetType
+from mwptoolkit.utils.utils import get_model, get_trainer, init_seed, copy_num_stack
+
+# per model, the methods computing the loss of a batch with its tree schedule and running backward, and the
+# decoder forwards taking a tree schedule. SAUSolver decodes the targets inside its loss.
+TREE_DECODERS = {
+    'gts': (['calculate_loss'], ['decoder_forward']),
+    'graph2tree': (['calculate_loss'], ['decoder_forward']),
+    'mwpbert': (['calculate_loss'], ['decoder_forward']),
+    'sausolver': (['calculate_loss'], []),
+    'tsn': (['teacher_calculate_loss', 'student_calculate_loss'],
+            ['teacher_net_decoder_forward', 'student_net_decoder_forward'])
+}
+
+
+class _ScheduleParity(object):
+    r"""wrap a decoder forward of a model to decode every scheduled batch step by step as well, and
+    assert that both give the same token logits and resolved targets.
+    """
+    def __init__(self, model, name, atol):
+        self.name = name
+        self.atol = atol
+        self.decoder_forward = getattr(model, name)
+        self.batches = 0
+        self.scheduled_batches = 0
+        self.max_logit_diff = 0.
+        setattr(model, name, self)
+
+    def __call__(self, encoder_outputs, problem_output, all_nums_encoder_outputs, nums_stack, seq_mask, num_mask,
+                 target=None, output_all_layers=False, tree_schedule=None):
+        self.batches += 1
+        if target is None or tree_schedule is None:
+            return self.decoder_forward(encoder_outputs, problem_output, all_nums_encoder_outputs, nums_stack, seq_mask,
+                                        num_mask, target, output_all_layers, tree_schedule)
+        self.scheduled_batches += 1
+        step_logits, _, step_layer_outputs = self.decoder_forward(encoder_outputs, problem_output,
+                                                                  all_nums_encoder_outputs, copy_num_stack(nums_stack),
+                                                                  seq_mask, num_mask, target.clone(), True, None)
+        token_logits, outputs, all_layer_outputs = self.decoder_forward(encoder_outputs, problem_output,
+                                                                        all_nums_encoder_outputs, nums_stack, seq_mask,
+                                                                        num_mask, target, True, tree_schedule)
+        step_logits = step_logits if isinstance(step_logits, tuple) else (step_logits,)
+        for step_logit, token_logit in zip(step_logits, token_logits if isinstance(token_logits, tuple) else (token_logits,)):
+            assert step_logit.shape == token_logit.shape, "{} token logits of shape {} with the schedule, {} without".format(
+                self.name, tuple(token_logit.shape), tuple(step_logit.shape))
+            diff = (step_logit - token_logit).abs().max().item() if step_logit.numel() else 0.
+            self.max_logit_diff = max(self.max_logit_diff, diff)
+            assert diff <= self.atol, "{} token logits differ by {} with the schedule".format(self.name, diff)
+        for key, step_target in step_layer_outputs.items():
+            if key.endswith('target') and isinstance(step_target, torch.Tensor):
+                assert torch.equal(step_target, all_layer_outputs[key]), \
+                    "{} resolves {} differently with the schedule".format(self.name, key)
+        return token_logits, outputs, all_layer_outputs if output_all_layers else {}
+
+
+class _LossRecorder(object):
+    r"""wrap a loss term of a model to keep the values it returns.
+    """
+    def __init__(self, model, name):
+        self.name = name
+        self.loss = getattr(model, name)
+        self.values = []
+        setattr(model, name, self)
+
+    def __call__(self, *args, **kwargs):
+        value = self.loss(*args, **kwargs)
+        self.values.append(value.item())
+        return value
+
+
+def _gradients(model):
+    return {name: param.grad.clone() for name, param in model.named_parameters() if param.grad is not None}
+
+
+def _build(model_name, dataset_name, task_type, steps, config_dict):
+    if task_type is None:
+        task_type = 'multi_equation' if dataset_name.lower() in MULTI_EQUATION_DATASETS else 'single_equation'
+    bench_config = {'use_gpu': False, 'dataset_cache': False, 'epoch_nums': 1, 'gradient_accumulation_steps': 1}
+    bench_config.update(config_dict or {})
+    config = Config(model_name, dataset_name, task_type, bench_config)
+    init_seed(config['random_seed'], True)
+    dataset = get_dataset_module(config)(config)
+    dataset.dataset_load()
+    dataset.trainset = dataset.trainset[:steps * config['train_batch_size']]
+    dataloader = get_dataloader_module(config)(config, dataset)
+    return config, dataset, dataloader
+
+
+def _without_schedule(load_data):
+    def load(type):
+        for batch in load_data(type):
+            batch = dict(batch)
+            batch['tree schedule'] = None
+            yield batch
+    return load
+
+
+def check_parity(model_name, dataset_name, task_type=None, steps=20, atol=1e-5, config_dict=None):
+    r"""compute the loss of `steps` training batches without and with their tree schedule, in eval mode, and
+    assert that both give the same loss and gradients, and that every tree decoder of the model gives the
+    same token logits and resolved targets.
+
+    The semantic alignment loss of SAUSolver, averaged over the aligned sub trees, is compared as well.
+
+    Returns:
+        dict: per loss method, the batches and the max difference of losses and gradients, per decoder forward,
+        the batches decoded with a schedule and the max difference of token logits.
+    """
+    config, dataset, dataloader = _build(model_name, dataset_name, task_type, steps, config_dict)
+    model = get_model(config["model"])(config, dataset).to(config["device"])
+    model.eval()
+    if config["model"].lower() == 'tsn':
+        model.init_encoder_mask(config['train_batch_size'])
+    loss_names, decoder_names = TREE_DECODERS[config["model"].lower()]
+    parities = [_ScheduleParity(model, decoder_name, atol) for decoder_name in decoder_names]
+    sa_loss = _LossRecorder(model, 'semantic_alignment_loss') if hasattr(model, 'semantic_alignment_loss') else None
+    results = {name: {'batches': 0, 'max_loss_diff': 0., 'max_grad_diff': 0.} for name in loss_names}
+    for batch in dataloader.load_data(DatasetType.Train):
+        if config["model"].lower() == 'tsn':
+            model.init_soft_target(batch)
+        for name in loss_names:
+            losses = []
+            gradients = []
+            sa_values = len(sa_loss.values) if sa_loss else 0
+            for tree_schedule in [None, batch.get("tree schedule")]:
+                model.zero_grad()
+                losses.append(getattr(model, name)(dict(batch, **{"tree schedule": tree_schedule})))
+                gradients.append(_gradients(model))
+            result = results[name]
+            result['batches'] += 1
+            diff = abs(losses[0] - losses[1])
+            result['max_loss_diff'] = max(result['max_loss_diff'], diff)
+            assert diff <= atol, "{} differs by {} with the schedule".format(name, diff)
+            assert gradients[0].keys() == gradients[1].keys(), "{} updates other parameters with the schedule".format(name)
+            for param_name, grad in gradients[0].items():
+                diff = (grad - gradients[1][param_name]).abs().max().item() if grad.numel() else 0.
+                result['max_grad_diff'] = max(result['max_grad_diff'], diff)
+                assert diff <= atol, "{} gradient of {} differs by {} with the schedule".format(name, param_name, diff)
+            if sa_loss and len(sa_loss.values) > sa_values:
+                step_value, scheduled_value = sa_loss.values[sa_values:]
+                diff = abs(step_value - scheduled_value)
+                result['max_sa_loss_diff'] = max(result.get('max_sa_loss_diff', 0.), diff)
+                assert diff <= atol, "semantic alignment loss differs by {} with the schedule".format(diff)
+    model.zero_grad()
+    for parity in parities:
+        results[parity.name] = {'batches': parity.batches, 'scheduled_batches': parity.scheduled_batches,
+                                'max_logit_diff': parity.max_logit_diff}
+    return results
+
+
+def run(model_name, dataset_name, task_type=None, steps=20, num_threads=None, config_dict=None):
+    r"""train one pass over `steps` training batches decoding the targets step by step, then one pass
+    decoding them along their tree schedule, from the same initial model.
+
+    TSN trains its teacher net, as in `mwptoolkit.benchmark.model_throughput`.
+
+    Returns:
+        dict: training time of both passes.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    config, dataset, dataloader = _build(model_name, dataset_name, task_type, steps, config_dict)
+    results = {'model': model_name, 'dataset': dataset_name, 'torch': torch.__version__,
+               'num_threads': torch.get_num_threads(), 'steps': dataloader.trainset_batch_nums}
+    for name, scheduled in [('sequential_seconds', False), ('scheduled_seconds', True)]:
+        init_seed(config['random_seed'], True)
+        model = get_model(config["model"])(config, dataset).to(config["device"])
+        evaluator = get_evaluator_module(config)(config)
+        trainer = get_trainer(config)(config, model, dataloader, evaluator)
+        if not scheduled:
+            dataloader.load_data = _without_schedule(type(dataloader).load_data.__get__(dataloader))
+        start = time.perf_counter()
+        try:
+            _train_epoch(trainer)
+        finally:
+            if not scheduled:
+                del dataloader.load_data
+        results[name] = time.perf_counter() - start
+        evaluator.close()
+    results['speedup'] = results['sequential_seconds'] / results['scheduled_seconds']
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, nargs='+', default=['GTS', 'TSN'])
+    parser.add_argument('--dataset', type=str, default='mawps-single')
+    parser.add_argument('--task_type', type=str, default=None)
+    parser.add_argument('--steps', type=int, default=20, help='number of training batches')
+    parser.add_argument('--num_threads', type=int, default=None)
+    parser.add_argument('--check', action='store_true', help='only check the decoders.')
+    args, _ = parser.parse_known_args()
+
+    results = []
+    for model_name in args.model:
+        result = {'model': model_name, 'parity': check_parity(model_name, args.dataset, args.task_type, args.steps)}
+        if not args.check:
+            result.update(run(model_name, args.dataset, args.task_type, args.steps, args.num_threads))
+        results.append(result)
+    print(json.dumps(results, indent=4))
@@ -236,6 +236,7 @@ class Config(object):
         path_config_dict["dataset_config_file"] = os.path.relpath(dataset_config_file,os.getcwd())
 
         path_config_dict["dataset_dir"] = "dataset/{}".format(dataset_name)
+        path_config_dict["dataset_cache_dir"] = "cache/{}".format(dataset_name)
 
         path_config_dict["checkpoint_file"] = 'checkpoint/' + '{}-{}.pth'.format(model_name, dataset_name)
         path_config_dict["trained_model_dir"] = 'trained_model/' + '{}-{}'.format(model_name, dataset_name)
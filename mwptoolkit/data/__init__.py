@@ -1,2 +1,10 @@
-from mwptoolkit.data import dataloader,dataset,utils
+from __future__ import absolute_import
+from __future__ import print_function
+from __future__ import division
 
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['dataloader', 'dataset', 'utils']
+)
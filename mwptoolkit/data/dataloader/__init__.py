@@ -1,14 +1,21 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.data.dataloader import abstract_dataloader,dataloader_ept,dataloader_multiencdec,pretrain_dataloader,single_equation_dataloader,multi_equation_dataloader,template_dataloader,\
-    dataloader_hms
 
-from mwptoolkit.data.dataloader.abstract_dataloader import AbstractDataLoader
-from mwptoolkit.data.dataloader.single_equation_dataloader import SingleEquationDataLoader
-from mwptoolkit.data.dataloader.multi_equation_dataloader import MultiEquationDataLoader
-from mwptoolkit.data.dataloader.template_dataloader import TemplateDataLoader
-from mwptoolkit.data.dataloader.dataloader_ept import DataLoaderEPT
-from mwptoolkit.data.dataloader.dataloader_multiencdec import DataLoaderMultiEncDec
-from mwptoolkit.data.dataloader.pretrain_dataloader import PretrainDataLoader
-from mwptoolkit.data.dataloader.dataloader_hms import DataLoaderHMS
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['abstract_dataloader', 'dataloader_ept', 'dataloader_multiencdec', 'pretrain_dataloader', 'single_equation_dataloader', 'multi_equation_dataloader', 'template_dataloader', 'dataloader_hms', 'dataloader_gpt2'],
+    attributes={
+        'abstract_dataloader': ['AbstractDataLoader'],
+        'single_equation_dataloader': ['SingleEquationDataLoader'],
+        'multi_equation_dataloader': ['MultiEquationDataLoader'],
+        'template_dataloader': ['TemplateDataLoader'],
+        'dataloader_ept': ['DataLoaderEPT'],
+        'dataloader_multiencdec': ['DataLoaderMultiEncDec'],
+        'pretrain_dataloader': ['PretrainDataLoader'],
+        'dataloader_hms': ['DataLoaderHMS'],
+        'dataloader_gpt2': ['DataLoaderGPT2'],
+    }
+)
@@ -2,9 +2,42 @@
 # @Author: Yihuai Lan
 # @Time: 2021/08/18 11:34:06
 # @File: abstract_dataloader.py
+import random
 from typing import List
 
+import torch
+
 from mwptoolkit.utils.enum_type import FixType, SpecialTokens
+from mwptoolkit.utils.preprocess_tool.graph_operator import quantity_graph_edges, quantity_graph_index
+from mwptoolkit.utils.preprocess_tool.tree_operator import prefix_tree_schedule, postfix_tree
+from mwptoolkit.utils.utils import map_tensors
+from mwptoolkit.data.dataset.indexed_store import IndexedDataStore
+
+# goal-driven tree decoders trained along a schedule of their target trees, see prefix_tree_schedule.
+TREE_SCHEDULE_MODELS = ['gts', 'graph2tree', 'tsn', 'sausolver', 'mwpbert']
+
+
+class LazyBatches(object):
+    """batches of a split kept in an IndexedDataStore, a batch is built from the problems at its offsets when read.
+    """
+    def __init__(self, datas, batch_indices, build_batch):
+        super().__init__()
+        self.datas = datas
+        self.batch_indices = batch_indices
+        self.build_batch = build_batch
+
+    def shuffle(self, rng):
+        rng.shuffle(self.batch_indices)
+
+    def __len__(self):
+        return len(self.batch_indices)
+
+    def __getitem__(self, idx):
+        return self.build_batch([self.datas[data_idx] for data_idx in self.batch_indices[idx]])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
 
 
 class AbstractDataLoader(object):
@@ -39,6 +72,14 @@ class AbstractDataLoader(object):
 
         add_eos (bool): add eos token at the tail of input sequence.
 
+        bucket_batching (bool): group problems of similar question and equation length into batches, whose order is
+        reshuffled every epoch.
+
+        max_batch_tokens (int|None): with bucket_batching, the max number of padded question and equation tokens of
+        a batch, batches are not larger than train_batch_size and test_batch_size if None.
+
+        random_seed (int): seed of the batch order of every epoch.
+
         device (torch.device):
         """
         super().__init__()
@@ -54,6 +95,9 @@ class AbstractDataLoader(object):
         self.add_sos = config["add_sos"]
         self.add_eos = config["add_eos"]
         self.filt_dirty = config["filt_dirty"]
+        self.bucket_batching = config["bucket_batching"]
+        self.max_batch_tokens = config["max_batch_tokens"]
+        self.shuffle_seed = config["random_seed"] if config["random_seed"] is not None else 0
 
         self.device = config["device"]
 
@@ -75,6 +119,10 @@ class AbstractDataLoader(object):
         self.trainset_batch_nums = 0
         self.validset_batch_nums = 0
         self.testset_batch_nums = 0
+        self._batches_on_device = True
+        self._train_epochs = 0
+        # set by trainers which keep per sample state in the order of the trainset batches.
+        self.fixed_train_order = False
 
     def _pad_input_batch(self, batch_seq, batch_seq_len):
         max_length = max(batch_seq_len)
@@ -103,15 +151,189 @@ class AbstractDataLoader(object):
                 batch_target[idx] = batch_target[idx][:max_length]
         return batch_target
 
+    def _truncate_input(self, seq, max_length):
+        if self.add_sos and self.add_eos:
+            return [seq[0]] + seq[1:max_length - 1] + [seq[-1]]
+        else:
+            return seq[:max_length]
+
+    def _pad_to_tensor(self, batch_seq, max_length, pad_token):
+        """pad sequences into one LongTensor, sequences longer than max_length are cut off.
+
+        the whole batch is filled with a single masked assignment instead of padding every sequence in python.
+        """
+        seq_len = torch.LongTensor([min(len(seq), max_length) for seq in batch_seq])
+        padded = torch.full((len(batch_seq), max_length), pad_token, dtype=torch.long)
+        mask = torch.arange(max_length).unsqueeze(0) < seq_len.unsqueeze(1)
+        padded[mask] = torch.LongTensor([idx for seq in batch_seq for idx in seq[:max_length]])
+        return padded
+
+    def _pad_input_tensor(self, batch_seq, batch_seq_len):
+        """same as _pad_input_batch, but return a LongTensor, shape [batch_size, max_length].
+        """
+        max_length = max(batch_seq_len)
+        if self.max_len is not None:
+            if self.max_len < max_length:
+                max_length = self.max_len
+        batch_seq = [self._truncate_input(seq, max_length) if len(seq) > max_length else seq for seq in batch_seq]
+        return self._pad_to_tensor(batch_seq, max_length, self.in_pad_token)
+
+    def _pad_output_tensor(self, batch_target, batch_target_len):
+        """same as _pad_output_batch, but return a LongTensor, shape [batch_size, max_length].
+        """
+        max_length = max(batch_target_len)
+        if self.max_equ_len is not None:
+            if self.max_equ_len < max_length:
+                max_length = self.max_equ_len
+        return self._pad_to_tensor(batch_target, max_length, self.out_pad_token)
+
+    def _get_mask_tensor(self, batch_seq_len, max_length=None):
+        """same as _get_mask, but return a BoolTensor, shape [batch_size, max_length], True for valid positions.
+        """
+        if max_length is None:
+            max_length = max(batch_seq_len)
+        return torch.arange(max_length).unsqueeze(0) < torch.LongTensor(batch_seq_len).unsqueeze(1)
+
+    def _split_batches(self, datas, batch_size):
+        """split datas into the data of each batch.
+
+        without bucket_batching, datas are sliced into batches of batch_size in order. with it, datas are sorted by
+        question and equation length and batches are filled in that order until one more problem would exceed
+        max_batch_tokens, or batch_size if max_batch_tokens is None.
+        """
+        if not self.bucket_batching:
+            return [datas[start_idx:start_idx + batch_size] for start_idx in range(0, len(datas), batch_size)]
+        return [[datas[idx] for idx in batch] for batch in self._split_batch_indices(datas, batch_size)]
+
+    def _split_batch_indices(self, datas, batch_size):
+        """same as _split_batches, but return the indices of the data of each batch.
+        """
+        if not self.bucket_batching:
+            return [list(range(start_idx, min(start_idx + batch_size, len(datas))))
+                    for start_idx in range(0, len(datas), batch_size)]
+        lengths = [(len(data.get("question", [])), len(data.get("equation", []))) for data in datas]
+        order = sorted(range(len(datas)), key=lambda idx: lengths[idx])
+        batches = []
+        batch = []
+        max_ques_len = 0
+        max_equ_len = 0
+        for idx in order:
+            ques_len = max(max_ques_len, lengths[idx][0])
+            equ_len = max(max_equ_len, lengths[idx][1])
+            if self.max_batch_tokens:
+                full = (len(batch) + 1) * (ques_len + equ_len) > self.max_batch_tokens
+            else:
+                full = len(batch) + 1 > batch_size
+            if batch and full:
+                batches.append(batch)
+                batch = []
+                ques_len, equ_len = lengths[idx]
+            batch.append(idx)
+            max_ques_len, max_equ_len = ques_len, equ_len
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _build_set_batches(self, datas, batch_size, build_batch):
+        """batches of one split.
+
+        datas in an IndexedDataStore are not built here but by the LazyBatches returned, when a batch is read,
+        so that no more than one batch of the split is in memory.
+        """
+        if isinstance(datas, IndexedDataStore):
+            return LazyBatches(datas, self._split_batch_indices(datas, batch_size), build_batch)
+        return [build_batch(batch_data) for batch_data in self._split_batches(datas, batch_size)]
+
+    def _reshuffle_train_batches(self):
+        """shuffle the order of trainset batches at the start of an epoch, when bucket_batching is on.
+
+        the order depends on random_seed and the epoch only, so runs with the same seed see the same batches. the
+        order is kept if fixed_train_order is set.
+        """
+        if not self.bucket_batching or self.fixed_train_order:
+            return
+        rng = random.Random(self.shuffle_seed + self._train_epochs)
+        if isinstance(self.trainset_batches, LazyBatches):
+            self.trainset_batches.shuffle(rng)
+        else:
+            rng.shuffle(self.trainset_batches)
+        self._train_epochs += 1
+
+    def resume_train_order(self, train_epochs):
+        """continue the trainset batch order of bucket_batching from the epoch a resumed run starts at.
+
+        Args:
+            train_epochs (int): number of epochs trained before the run was resumed.
+        """
+        self._train_epochs = train_epochs
+
+    def _quantity_graph_index(self, batch_data):
+        """COO index of the quantity graphs of a batch, shape [4, edge_num], see `quantity_graph_index`.
+
+        graphs are read from the preprocessed data, or built here for data preprocessed without them.
+        """
+        graphs = []
+        for data in batch_data:
+            if "quantity graph" in data:
+                graphs.append(data["quantity graph"])
+            else:
+                graphs.append(quantity_graph_edges(data["number position"], data["number list"], data.get("group nums", [])))
+        return quantity_graph_index(graphs, shift=1 if self.add_sos else 0)
+
+    def _tree_schedule(self, equ_batch, equ_len_batch, num_stack_batch):
+        """schedule of teacher forced decoding of the target trees of a batch, see `prefix_tree_schedule`.
+
+        None if the targets are not built for trees or one of them is not a complete prefix tree, the model decodes
+        such batches step by step.
+        """
+        if not self.symbol_for_tree or self.equation_fix == FixType.MultiWayTree:
+            return None
+        equations = [equation[:length] for equation, length in zip(equ_batch.tolist(), equ_len_batch)]
+        return prefix_tree_schedule(equations, equ_batch.size(1), num_stack_batch, self.dataset.num_start,
+                                    self.out_unk_token)
+
+    def _template_trees(self, equ_source_batch):
+        """postorder arrays of the template trees of a batch, see `postfix_tree`, None for a template which is not a
+        complete tree. Trees are cached per template.
+        """
+        return [postfix_tree(tuple(equ_source.split(" "))) for equ_source in equ_source_batch]
+
+    def _place_batches(self):
+        """put tensor fields of all batches where the model reads them.
+
+        if the batches of the whole dataset take no more than a tenth of gpu memory, they are moved to gpu once for
+        the whole run, otherwise they are kept in pinned memory and copied batch by batch in each epoch. batches
+        built when read are copied batch by batch.
+        """
+        self._batches_on_device = True
+        if self.device is None or self.device.type != 'cuda':
+            return
+        if any(isinstance(batches, LazyBatches) for batches in [self.trainset_batches, self.validset_batches, self.testset_batches]):
+            self._batches_on_device = False
+            return
+        all_batches = self.trainset_batches + self.validset_batches + self.testset_batches
+        tensor_bytes = []
+        for batch in all_batches:
+            map_tensors(batch, lambda value: tensor_bytes.append(value.element_size() * value.nelement()))
+        device_index = self.device.index if self.device.index is not None else torch.cuda.current_device()
+        self._batches_on_device = sum(tensor_bytes) <= torch.cuda.get_device_properties(device_index).total_memory * 0.1
+        # nested tensors, e.g. the index tensors of a tree schedule, are placed with the batch, so the decoders
+        # never copy them.
+        for batch in all_batches:
+            for key, value in batch.items():
+                batch[key] = map_tensors(value, lambda value: value.to(self.device) if self._batches_on_device
+                                         else value.pin_memory())
+
+    def _batch_to_device(self, batch):
+        """return the batch with its tensor fields on device.
+        """
+        if self._batches_on_device:
+            return batch
+        return map_tensors(batch, lambda value: value.to(self.device, non_blocking=True))
+
     def _word2idx(self, sentence):
-        sentence_idx = []
-        for word in sentence:
-            try:
-                idx = self.dataset.in_word2idx[word]
-            except:
-                idx = self.in_unk_token
-            sentence_idx.append(idx)
-        return sentence_idx
+        word2idx = self.dataset.in_word2idx
+        return [word2idx.get(word, self.in_unk_token) for word in sentence]
 
     def _idx2word(self, sentence_idx):
         sentence = []
@@ -143,18 +365,10 @@ class AbstractDataLoader(object):
                             idx = self.out_unk_token
                     equ_idx.append(idx)
         else:
-            for word in equation:
-                if self.share_vocab:
-                    try:
-                        idx = self.dataset.in_word2idx[word]
-                    except:
-                        idx = self.in_unk_token
-                else:
-                    try:
-                        idx = self.dataset.out_symbol2idx[word]
-                    except:
-                        idx = self.out_unk_token
-                equ_idx.append(idx)
+            if self.share_vocab:
+                equ_idx = [self.dataset.in_word2idx.get(word, self.in_unk_token) for word in equation]
+            else:
+                equ_idx = [self.dataset.out_symbol2idx.get(word, self.out_unk_token) for word in equation]
         return equ_idx
 
     def _equ_idx2symbol(self, equation_idx):
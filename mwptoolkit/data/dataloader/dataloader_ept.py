@@ -4,7 +4,6 @@
 # @File: dataloader_ept.py
 
 
-import math
 import torch
 from typing import List
 
@@ -13,9 +12,9 @@ from mwptoolkit.data.dataset.dataset_ept import DatasetEPT
 from mwptoolkit.utils.enum_type import EPT
 from mwptoolkit.data.dataloader.template_dataloader import TemplateDataLoader
 from mwptoolkit.utils.preprocess_tools import find_ept_numbers_in_text, pad_token_ept_inp, ept_equ_preprocess
+from mwptoolkit.utils.lazy_import import LazyModule
 
-
-from transformers import AutoTokenizer,BertTokenizer
+transformers = LazyModule('transformers')
 
 
 class DataLoaderEPT(TemplateDataLoader):
@@ -61,9 +60,9 @@ class DataLoaderEPT(TemplateDataLoader):
         self.testset_nums = len(dataset.testset)
 
         if config["dataset"] in ['math23k','hmwp']:
-            self.pretrained_tokenzier = BertTokenizer.from_pretrained(config["pretrained_model_path"])
+            self.pretrained_tokenzier = transformers.BertTokenizer.from_pretrained(config["pretrained_model_path"])
         else:
-            self.pretrained_tokenzier = AutoTokenizer.from_pretrained(config["pretrained_model_path"])
+            self.pretrained_tokenzier = transformers.AutoTokenizer.from_pretrained(config["pretrained_model_path"])
             
         self.pretrained_tokenzier.add_special_tokens({'additional_special_tokens': ['[N]']})
         
@@ -227,15 +226,7 @@ class DataLoaderEPT(TemplateDataLoader):
                 batch_size = self.test_batch_size
             else:
                 raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
-            num_total = len(datas)
-            batch_num = math.ceil(num_total / batch_size)
-            for batch_i in range(batch_num):
-                start_idx = batch_i * batch_size
-                end_idx = (batch_i + 1) * batch_size
-                if end_idx <= num_total:
-                    batch_data = datas[start_idx:end_idx]
-                else:
-                    batch_data = datas[start_idx:num_total]
+            for batch_data in self._split_batches(datas, batch_size):
                 built_batch = self.__build_batch(batch_data)
                 if set_type == 'train':
                     self.trainset_batches.append(built_batch)
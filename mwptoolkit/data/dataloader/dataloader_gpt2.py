@@ -3,7 +3,6 @@
 # @Time: 2022/3/25 13:46
 # @File: dataloader_gpt2.py
 # @Update Time: 2022/3/25 13:46
-import math
 
 import torch
 from typing import List
@@ -273,15 +272,7 @@ class DataLoaderGPT2(TemplateDataLoader):
                 batch_size = self.test_batch_size
             else:
                 raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
-            num_total = len(datas)
-            batch_num = math.ceil(num_total / batch_size)
-            for batch_i in range(batch_num):
-                start_idx = batch_i * batch_size
-                end_idx = (batch_i + 1) * batch_size
-                if end_idx <= num_total:
-                    batch_data = datas[start_idx:end_idx]
-                else:
-                    batch_data = datas[start_idx:num_total]
+            for batch_data in self._split_batches(datas, batch_size):
                 built_batch = self.__build_batch(batch_data)
                 if set_type == 'train':
                     self.trainset_batches.append(built_batch)
@@ -6,7 +6,6 @@
 
 import numpy as np
 import torch
-import math
 
 from typing import List
 
@@ -164,8 +163,8 @@ class DataLoaderMultiEncDec(TemplateDataLoader):
         output1_batch = self._pad_output1_batch(output1_batch, output1_length_batch)
         output2_batch = self._pad_output2_batch(output2_batch, output2_length_batch)
         parse_graph_batch = self.get_parse_graph_batch(input1_length_batch, parse_tree_batch)
-        equ_mask1 = self._get_mask(output1_length_batch)
-        equ_mask2 = self._get_mask(output2_length_batch)
+        equ_mask1 = self._get_mask_tensor(output1_length_batch)
+        equ_mask2 = self._get_mask_tensor(output2_length_batch)
 
         return {
             "input1": input1_batch,
@@ -203,15 +202,7 @@ class DataLoaderMultiEncDec(TemplateDataLoader):
                 batch_size = self.test_batch_size
             else:
                 raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
-            num_total = len(datas)
-            batch_num = math.ceil(num_total / batch_size)
-            for batch_i in range(batch_num):
-                start_idx = batch_i * batch_size
-                end_idx = (batch_i + 1) * batch_size
-                if end_idx <= num_total:
-                    batch_data = datas[start_idx:end_idx]
-                else:
-                    batch_data = datas[start_idx:num_total]
+            for batch_data in self._split_batches(datas, batch_size):
                 built_batch = self.__build_batch(batch_data)
                 if set_type == 'train':
                     self.trainset_batches.append(built_batch)
@@ -227,97 +218,52 @@ class DataLoaderMultiEncDec(TemplateDataLoader):
         self.trainset_batch_nums = len(self.trainset_batches)
         self.validset_batch_nums = len(self.validset_batches)
         self.testset_batch_nums = len(self.testset_batches)
+        self._place_batches()
 
     def _word2idx_1(self, sentence):
-        sentence_idx = []
-        for word in sentence:
-            try:
-                idx = self.dataset.in_word2idx_1[word]
-            except:
-                idx = self.in_unk_token1
-            sentence_idx.append(idx)
-        return sentence_idx
+        word2idx = self.dataset.in_word2idx_1
+        return [word2idx.get(word, self.in_unk_token1) for word in sentence]
 
     def _word2idx_2(self, pos):
-        pos_idx = []
-        for word in pos:
-            try:
-                idx = self.dataset.in_word2idx_2[word]
-            except:
-                idx = self.in_unk_token2
-            pos_idx.append(idx)
-        return pos_idx
+        word2idx = self.dataset.in_word2idx_2
+        return [word2idx.get(word, self.in_unk_token2) for word in pos]
 
     def _equ_symbol2idx_1(self, equation):
-        equ_idx = []
-        for word in equation:
-            try:
-                idx = self.dataset.out_symbol2idx_1[word]
-            except:
-                idx = self.out_unk_token1
-            equ_idx.append(idx)
-        return equ_idx
+        symbol2idx = self.dataset.out_symbol2idx_1
+        return [symbol2idx.get(word, self.out_unk_token1) for word in equation]
     
     def _equ_symbol2idx_2(self, equation):
-        equ_idx = []
-        for word in equation:
-            try:
-                idx = self.dataset.out_symbol2idx_2[word]
-            except:
-                idx = self.out_unk_token2
-            equ_idx.append(idx)
-        return equ_idx
+        symbol2idx = self.dataset.out_symbol2idx_2
+        return [symbol2idx.get(word, self.out_unk_token2) for word in equation]
     
     def _pad_output1_batch(self, batch_target, batch_target_len):
         if self.max_equ_len != None:
             max_length = self.max_equ_len
         else:
             max_length = max(batch_target_len)
-        for idx, length in enumerate(batch_target_len):
-            if length < max_length:
-                batch_target[idx] += [self.out_pad_token1 for i in range(max_length - length)]
-            else:
-                batch_target[idx] = batch_target[idx][:max_length]
-        return batch_target
+        return self._pad_to_tensor(batch_target, max_length, self.out_pad_token1)
     
     def _pad_output2_batch(self, batch_target, batch_target_len):
         if self.max_equ_len != None:
             max_length = self.max_equ_len
         else:
             max_length = max(batch_target_len)
-        for idx, length in enumerate(batch_target_len):
-            if length < max_length:
-                batch_target[idx] += [self.out_pad_token2 for i in range(max_length - length)]
-            else:
-                batch_target[idx] = batch_target[idx][:max_length]
-        return batch_target
+        return self._pad_to_tensor(batch_target, max_length, self.out_pad_token2)
 
     def _pad_input1_batch(self, batch_seq, batch_seq_len):
         if self.max_len != None:
             max_length = self.max_len
         else:
             max_length = max(batch_seq_len)
-        for idx, length in enumerate(batch_seq_len):
-            if length < max_length:
-                batch_seq[idx] += [self.in_pad_token1 for i in range(max_length - length)]
-            else:
-                if self.add_sos and self.add_eos:
-                    batch_seq[idx] = [batch_seq[idx][0]] + batch_seq[idx][1:max_length-1] + [batch_seq[idx][-1]]
-                else:
-                    batch_seq[idx] = batch_seq[idx][:max_length]
-        return batch_seq
+        batch_seq = [self._truncate_input(seq, max_length) if len(seq) > max_length else seq for seq in batch_seq]
+        return self._pad_to_tensor(batch_seq, max_length, self.in_pad_token1)
 
     def _pad_input2_batch(self, batch_seq, batch_seq_len):
         if self.max_len != None:
             max_length = self.max_len
         else:
             max_length = max(batch_seq_len)
-        for idx, length in enumerate(batch_seq_len):
-            if length < max_length:
-                batch_seq[idx] += [self.in_pad_token2 for i in range(max_length - length)]
-            else:
-                batch_seq[idx] = batch_seq[idx][:max_length]
-        return batch_seq
+        return self._pad_to_tensor(batch_seq, max_length, self.in_pad_token2)
 
     def _build_num_stack(self, equation, num_list):
         num_stack = []
@@ -363,9 +309,8 @@ class DataLoaderMultiEncDec(TemplateDataLoader):
                     graph2[parse_tree[j], j] = 1
                     graph3[j, parse_tree[j]] = 1
                     graph3[parse_tree[j], j] = 1
-            graph = [graph1.tolist(), graph2.tolist(), graph3.tolist()]
-            batch_graph.append(graph)
-        # batch_graph = torch.tensor(batch_graph)
+            batch_graph.append(torch.stack([graph1, graph2, graph3]))
+        batch_graph = torch.stack(batch_graph)
         return batch_graph
 
     def build_batch_for_predict(self, batch_data: List[dict]):
@@ -4,22 +4,20 @@
 # @File: multi_equation_dataloader.py
 
 
-import math
+import torch
 
 from typing import List
 
 from mwptoolkit.config.configuration import Config
 from mwptoolkit.data.dataset.multi_equation_dataset import MultiEquationDataset
 from mwptoolkit.utils.enum_type import FixType,SpecialTokens
-from mwptoolkit.data.dataloader.abstract_dataloader import AbstractDataLoader
+from mwptoolkit.data.dataloader.abstract_dataloader import AbstractDataLoader, TREE_SCHEDULE_MODELS
 
 
 def get_num_mask(num_size_batch, generate_nums):
-    num_mask = []
+    num_size = torch.LongTensor(num_size_batch) + len(generate_nums)
     max_num_size = max(num_size_batch) + len(generate_nums)
-    for i in num_size_batch:
-        d = i + len(generate_nums)
-        num_mask.append([0] * d + [1] * (max_num_size - d))
+    num_mask = torch.arange(max_num_size).unsqueeze(0) >= num_size.unsqueeze(1)
     return num_mask
 
 
@@ -92,20 +90,21 @@ class MultiEquationDataLoader(AbstractDataLoader):
         """
 
         if type == "train":
+            self._reshuffle_train_batches()
             self.__trainset_batch_idx = -1
             for batch in self.trainset_batches:
                 self.__trainset_batch_idx = (self.__trainset_batch_idx + 1) % self.trainset_batch_nums
-                yield batch
+                yield self._batch_to_device(batch)
         elif type == "valid":
             self.__validset_batch_idx = -1
             for batch in self.validset_batches:
                 self.__validset_batch_idx = (self.__validset_batch_idx + 1) % self.validset_batch_nums
-                yield batch
+                yield self._batch_to_device(batch)
         elif type == "test":
             self.__testset_batch_idx = -1
             for batch in self.testset_batches:
                 self.__testset_batch_idx = (self.__testset_batch_idx + 1) % self.testset_batch_nums
-                yield batch
+                yield self._batch_to_device(batch)
         else:
             raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
 
@@ -117,13 +116,15 @@ class MultiEquationDataLoader(AbstractDataLoader):
         """
         if type == "train":
             self.__trainset_batch_idx = (self.__trainset_batch_idx + 1) % self.trainset_batch_nums
-            return self.trainset_batches[self.__trainset_batch_idx]
+            if self.__trainset_batch_idx == 0:
+                self._reshuffle_train_batches()
+            return self._batch_to_device(self.trainset_batches[self.__trainset_batch_idx])
         elif type == "valid":
             self.__validset_batch_idx = (self.__validset_batch_idx + 1) % self.trainset_batch_nums
-            return self.validset_batches[self.__validset_batch_idx]
+            return self._batch_to_device(self.validset_batches[self.__validset_batch_idx])
         elif type == "test":
             self.__testset_batch_idx = (self.__testset_batch_idx + 1) % self.trainset_batch_nums
-            return self.testset_batches[self.__testset_batch_idx]
+            return self._batch_to_device(self.testset_batches[self.__testset_batch_idx])
         else:
             raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
 
@@ -232,20 +233,20 @@ class MultiEquationDataLoader(AbstractDataLoader):
                 group_nums_batch.append([])
             num_stack_batch.append(self._build_num_stack(equation, data["number list"]))
         # padding batch question
-        ques_batch = self._pad_input_batch(ques_batch, ques_len_batch)
+        ques_batch = self._pad_input_tensor(ques_batch, ques_len_batch)
         # padding batch equation
         if self.equation_fix == FixType.MultiWayTree:
             pass
         else:
-            equ_batch = self._pad_output_batch(equ_batch, equ_len_batch)
-            temp_batch = self._pad_output_batch(temp_batch, equ_len_batch)
+            equ_batch = self._pad_output_tensor(equ_batch, equ_len_batch)
+            temp_batch = self._pad_output_tensor(temp_batch, equ_len_batch)
 
         if self.max_len is not None:
             ques_len_batch = [self.max_len if l > self.max_len else l for l in ques_len_batch]
         # question mask
-        ques_mask_batch = self._get_mask(ques_len_batch)
+        ques_mask_batch = self._get_mask_tensor(ques_len_batch)
         # equation mask
-        equ_mask_batch = self._get_mask(equ_len_batch)
+        equ_mask_batch = self._get_mask_tensor(equ_len_batch)
         # quantity count
         num_size_batch = [len(num_pos) for num_pos in num_pos_batch]
         # quantity mask
@@ -264,7 +265,7 @@ class MultiEquationDataLoader(AbstractDataLoader):
                 new_group_nums.append(new_group_num)
             new_group_nums_batch.append(new_group_nums)
 
-        return {
+        batch = {
             "question": ques_batch,
             "equation": equ_batch,
             "template": temp_batch,
@@ -286,6 +287,11 @@ class MultiEquationDataLoader(AbstractDataLoader):
             "group nums": new_group_nums_batch,
             "infix equation": infix_equ_batch,
         }
+        if self.model.lower() in ['graph2tree']:
+            batch["graph index"] = self._quantity_graph_index(batch_data)
+        if self.model.lower() in TREE_SCHEDULE_MODELS:
+            batch["tree schedule"] = self._tree_schedule(equ_batch, equ_len_batch, num_stack_batch)
+        return batch
 
     def __init_batches(self):
         self.trainset_batches=[]
@@ -303,30 +309,22 @@ class MultiEquationDataLoader(AbstractDataLoader):
                 batch_size = self.test_batch_size
             else:
                 raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
-            num_total = len(datas)
-            batch_num = math.ceil(num_total / batch_size)
-            for batch_i in range(batch_num):
-                start_idx = batch_i * batch_size
-                end_idx = (batch_i + 1) * batch_size
-                if end_idx <= num_total:
-                    batch_data = datas[start_idx:end_idx]
-                else:
-                    batch_data = datas[start_idx:num_total]
-                built_batch = self.__build_batch(batch_data)
-                if set_type == 'train':
-                    self.trainset_batches.append(built_batch)
-                elif set_type == 'valid':
-                    self.validset_batches.append(built_batch)
-                elif set_type == 'test':
-                    self.testset_batches.append(built_batch)
-                else:
-                    raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
+            built_batches = self._build_set_batches(datas, batch_size, self.__build_batch)
+            if set_type == 'train':
+                self.trainset_batches = built_batches
+            elif set_type == 'valid':
+                self.validset_batches = built_batches
+            elif set_type == 'test':
+                self.testset_batches = built_batches
+            else:
+                raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
         self.__trainset_batch_idx=-1
         self.__validset_batch_idx=-1
         self.__testset_batch_idx=-1
         self.trainset_batch_nums=len(self.trainset_batches)
         self.validset_batch_nums=len(self.validset_batches)
         self.testset_batch_nums=len(self.testset_batches)
+        self._place_batches()
 
     def build_batch_for_predict(self, batch_data: List[dict]):
         for idx, data in enumerate(batch_data):
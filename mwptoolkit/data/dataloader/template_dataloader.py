@@ -31,20 +31,21 @@ class TemplateDataLoader(AbstractDataLoader):
         :return: Generator[dict], batches
         """
         if type == "train":
+            self._reshuffle_train_batches()
             self.__trainset_batch_idx=-1
             for batch in self.trainset_batches:
                 self.__trainset_batch_idx = (self.__trainset_batch_idx + 1) % self.trainset_batch_nums
-                yield batch
+                yield self._batch_to_device(batch)
         elif type == "valid":
             self.__validset_batch_idx=-1
             for batch in self.validset_batches:
                 self.__validset_batch_idx = (self.__validset_batch_idx + 1) % self.validset_batch_nums
-                yield batch
+                yield self._batch_to_device(batch)
         elif type == "test":
             self.__testset_batch_idx=-1
             for batch in self.testset_batches:
                 self.__testset_batch_idx = (self.__testset_batch_idx + 1) % self.testset_batch_nums
-                yield batch
+                yield self._batch_to_device(batch)
         else:
             raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
 
@@ -56,13 +57,15 @@ class TemplateDataLoader(AbstractDataLoader):
         """
         if type == "train":
             self.__trainset_batch_idx=(self.__trainset_batch_idx+1)%self.trainset_batch_nums
-            return self.trainset_batches[self.__trainset_batch_idx]
+            if self.__trainset_batch_idx == 0:
+                self._reshuffle_train_batches()
+            return self._batch_to_device(self.trainset_batches[self.__trainset_batch_idx])
         elif type == "valid":
             self.__validset_batch_idx = (self.__validset_batch_idx + 1) % self.trainset_batch_nums
-            return self.validset_batches[self.__validset_batch_idx]
+            return self._batch_to_device(self.validset_batches[self.__validset_batch_idx])
         elif type == "test":
             self.__testset_batch_idx = (self.__testset_batch_idx + 1) % self.trainset_batch_nums
-            return self.testset_batches[self.__testset_batch_idx]
+            return self._batch_to_device(self.testset_batches[self.__testset_batch_idx])
         else:
             raise ValueError("{} type not in ['train', 'valid', 'test'].".format(type))
 
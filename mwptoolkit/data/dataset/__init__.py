@@ -1,14 +1,22 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.data.dataset import abstract_dataset,dataset_ept,dataset_multiencdec,pretrain_dataset,single_equation_dataset,multi_equation_dataset,template_dataset,\
-    dataset_hms
 
-from mwptoolkit.data.dataset.abstract_dataset import AbstractDataset
-from mwptoolkit.data.dataset.single_equation_dataset import SingleEquationDataset
-from mwptoolkit.data.dataset.multi_equation_dataset import MultiEquationDataset
-from mwptoolkit.data.dataset.template_dataset import TemplateDataset
-from mwptoolkit.data.dataset.dataset_ept import DatasetEPT
-from mwptoolkit.data.dataset.dataset_multiencdec import DatasetMultiEncDec
-from mwptoolkit.data.dataset.pretrain_dataset import PretrainDataset
-from mwptoolkit.data.dataset.dataset_hms import DatasetHMS
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['abstract_dataset', 'dataset_ept', 'dataset_multiencdec', 'pretrain_dataset', 'single_equation_dataset', 'multi_equation_dataset', 'template_dataset', 'dataset_hms', 'dataset_gpt2', 'indexed_store'],
+    attributes={
+        'abstract_dataset': ['AbstractDataset'],
+        'single_equation_dataset': ['SingleEquationDataset'],
+        'multi_equation_dataset': ['MultiEquationDataset'],
+        'template_dataset': ['TemplateDataset'],
+        'dataset_ept': ['DatasetEPT'],
+        'dataset_multiencdec': ['DatasetMultiEncDec'],
+        'pretrain_dataset': ['PretrainDataset'],
+        'dataset_hms': ['DatasetHMS'],
+        'dataset_gpt2': ['DatasetGPT2'],
+        'indexed_store': ['IndexedDataStore'],
+    }
+)
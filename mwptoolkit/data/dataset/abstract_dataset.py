@@ -8,14 +8,32 @@ import random
 import os
 import copy
 import re
+import hashlib
+import json
+import glob
+import itertools
+from logging import getLogger
+
 import torch
 
 from mwptoolkit.config.configuration import Config
-from mwptoolkit.utils.utils import read_json_data, write_json_data
+from mwptoolkit.utils.utils import read_json_data, write_json_data, read_pickle_data, write_pickle_data, file_digest, iter_json_data
 from mwptoolkit.utils.preprocess_tools import get_group_nums, get_deprel_tree, get_span_level_deprel_tree
+from mwptoolkit.utils.preprocess_tool.dependency_parser import DependencyParser
 from mwptoolkit.utils.preprocess_tools import id_reedit
 from mwptoolkit.utils.preprocess_tool.equation_operator import from_postfix_to_infix, from_prefix_to_infix, operator_mask,EN_rule1_stat,EN_rule2
+from mwptoolkit.utils.preprocess_tool.number_transfer import iter_number_transfer, keep_generate_number
 from mwptoolkit.utils.enum_type import DatasetName,FixType
+from mwptoolkit.data.dataset.indexed_store import IndexedDataStore
+
+# bump it when a change of preprocessing makes cached datasets stale.
+DATASET_CACHE_VERSION = 2
+# dataset attributes which change the result of preprocessing or vocabulary building.
+CACHE_PARAMETER_NAMES = ['model', 'dataset', 'task_type', 'language', 'single', 'linear', 'source_equation_fix',
+                         'equation_fix', 'validset_divide', 'mask_symbol', 'rule1', 'rule2', 'min_word_keep',
+                         'min_generate_keep', 'symbol_for_tree', 'share_vocab', 'vocab_level', 'add_num_symbol',
+                         'embedding', 'decoder', 'parse_tree_path', 'pretrained_model', 'pretrained_model_path',
+                         'ltp_model_path', 'stream_dataset']
 
 
 class AbstractDataset(object):
@@ -23,6 +41,12 @@ class AbstractDataset(object):
 
     the base class of dataset class
     """
+    # whether the result of _build_vocab can be stored in dataset cache. datasets whose vocabulary
+    # comes with a tokenizer or changes global state have to build it every time.
+    _cache_vocab = True
+    # whether _preprocess can run on splits read from an IndexedDataStore, see stream_dataset.
+    _stream_supported = False
+
     def __init__(self, config):
         """
         Args:
@@ -69,6 +93,15 @@ class AbstractDataset(object):
         device (torch.device):
 
         resume_training or resume (bool):
+
+        dataset_cache (bool): store preprocessed dataset and vocabulary in dataset_cache_dir and reuse them when data files and preprocessing parameters are unchanged.
+
+        dataset_cache_dir (str): the road path of dataset cache folder.
+
+        stream_dataset (bool): read trainset, validset and testset (.json, .jsonl or shards like trainset-00000.jsonl)
+        one problem at a time into on-disk stores under dataset_cache_dir, preprocess them as generator stages and
+        let dataloaders read problems by offset, so the splits are never held in memory. only supported by datasets
+        without a whole-dataset preprocessing step, it falls back to loading in memory otherwise.
         """
         super().__init__()
         self.model = config["model"]
@@ -83,6 +116,8 @@ class AbstractDataset(object):
 
         self.rebuild = config['rebuild']
         self.validset_divide = config["validset_divide"]
+        self.dataset_cache = config['dataset_cache']
+        self.dataset_cache_dir = config['dataset_cache_dir']
         
         self.mask_symbol = config["mask_symbol"]
         self.min_word_keep = config["min_word_keep"]
@@ -97,6 +132,7 @@ class AbstractDataset(object):
         self.device = config["device"]
 
         self.resume_training = config['resume_training'] if config['resume_training'] else config['resume']
+        self.stream_dataset = config['stream_dataset'] and self._stream_available(config)
 
         self.max_span_size = 1
         self.fold_t = 0
@@ -117,23 +153,70 @@ class AbstractDataset(object):
         else:
             self._load_dataset()
 
-    def _load_all_data(self):
-        trainset_file = os.path.join(self.dataset_path, 'trainset.json')
-        validset_file = os.path.join(self.dataset_path, 'validset.json')
-        testset_file = os.path.join(self.dataset_path, 'testset.json')
+    def _stream_available(self, config):
+        reasons = []
+        if not self._stream_supported:
+            reasons.append('{} preprocesses the whole dataset at once'.format(self.__class__.__name__))
+        if config['k_fold']:
+            reasons.append('k-fold cross validation splits the whole dataset')
+        if config['rule1'] or config['rule2']:
+            reasons.append('en rules are applied to the whole dataset')
+        if config['model'] and config['model'].lower() in ['graph2tree', 'graph2treeibm', 'ept']:
+            reasons.append('{} preprocessing reads the whole dataset'.format(config['model']))
+        if config['dataset'] in [DatasetName.hmwp, DatasetName.draw]:
+            reasons.append('{} ids are rewritten across splits'.format(config['dataset']))
+        if reasons:
+            getLogger().warning("stream_dataset is not supported ({}), load the dataset in memory.".format('; '.join(reasons)))
+        return not reasons
+
+    def _split_files(self, split_name):
+        """data files of a split: <split_name>.jsonl, shards <split_name>-*.jsonl in order, or <split_name>.json.
+        """
+        dataset_dir = self.dataset_path
+        if not os.path.isabs(dataset_dir):
+            dataset_dir = os.path.join(os.getcwd(), dataset_dir)
+        jsonl_file = os.path.join(dataset_dir, split_name + '.jsonl')
+        if os.path.exists(jsonl_file):
+            return [jsonl_file]
+        shard_files = sorted(glob.glob(os.path.join(glob.escape(dataset_dir), split_name + '-*.jsonl')))
+        if shard_files:
+            return shard_files
+        return [os.path.join(dataset_dir, split_name + '.json')]
+
+    def _iter_split(self, split_name):
+        for split_file in self._split_files(split_name):
+            for data in iter_json_data(split_file):
+                yield data
+
+    def _stream_dir(self):
+        cache_dir = self.dataset_cache_dir
+        if not os.path.isabs(cache_dir):
+            cache_dir = os.path.join(os.getcwd(), cache_dir)
+        return os.path.join(cache_dir, 'stream')
+
+    def _ingest_split(self, split_names):
+        """read the data files of splits one problem at a time into a store.
+
+        the store is named after the path, size and modification time of the files, so it is read again
+        instead of being written by the next run with the same files.
+        """
+        files = [split_file for split_name in split_names for split_file in self._split_files(split_name)]
+        signature = [[split_file, os.path.getsize(split_file), os.path.getmtime(split_file)] for split_file in files]
+        signature = hashlib.sha256(json.dumps(signature).encode('utf-8')).hexdigest()
+        path = os.path.join(self._stream_dir(), 'raw', '{}-{}'.format('+'.join(split_names), signature))
+        if not self.rebuild:
+            try:
+                return IndexedDataStore(path)
+            except (OSError, ValueError):
+                pass
+        getLogger().info("read {} into {} ...".format(', '.join(files), path))
+        datas = itertools.chain.from_iterable(self._iter_split(split_name) for split_name in split_names)
+        return IndexedDataStore.write(datas, path)
 
-        if os.path.isabs(trainset_file):
-            trainset = read_json_data(trainset_file)
-        else:
-            trainset = read_json_data(os.path.join(os.getcwd(), trainset_file))
-        if os.path.isabs(validset_file):
-            validset = read_json_data(validset_file)
-        else:
-            validset = read_json_data(os.path.join(os.getcwd(), validset_file))
-        if os.path.isabs(testset_file):
-            testset = read_json_data(testset_file)
-        else:
-            testset = read_json_data(os.path.join(os.getcwd(), testset_file))
+    def _load_all_data(self):
+        trainset = list(self._iter_split('trainset'))
+        validset = list(self._iter_split('validset'))
+        testset = list(self._iter_split('testset'))
 
         return trainset + validset + testset
 
@@ -143,23 +226,19 @@ class AbstractDataset(object):
         '''
         if self.trainset_id and self.testset_id:
             self._init_split_from_id()
-        else:
-            trainset_file = os.path.join(self.dataset_path,'trainset.json')
-            validset_file = os.path.join(self.dataset_path, 'validset.json')
-            testset_file = os.path.join(self.dataset_path, 'testset.json')
-        
-            if os.path.isabs(trainset_file):
-                self.trainset = read_json_data(trainset_file)
-            else:
-                self.trainset = read_json_data(os.path.join(os.getcwd(),trainset_file))
-            if os.path.isabs(validset_file):
-                self.validset = read_json_data(validset_file)
-            else:
-                self.validset = read_json_data(os.path.join(os.getcwd(),validset_file))
-            if os.path.isabs(testset_file):
-                self.testset = read_json_data(testset_file)
+        elif self.stream_dataset:
+            self.trainset = self._ingest_split(['trainset'])
+            if self.validset_divide is not True:
+                self.testset = self._ingest_split(['validset', 'testset'])
+                self.validset = []
             else:
-                self.testset = read_json_data(os.path.join(os.getcwd(),testset_file))
+                self.validset = self._ingest_split(['validset'])
+                self.testset = self._ingest_split(['testset'])
+            self._init_id_from_split()
+        else:
+            self.trainset = list(self._iter_split('trainset'))
+            self.validset = list(self._iter_split('validset'))
+            self.testset = list(self._iter_split('testset'))
 
             if self.validset_divide is not True:
                 self.testset = self.validset + self.testset
@@ -311,54 +390,35 @@ class AbstractDataset(object):
         Args:
             fix (function): a function to make infix, postfix, prefix or None  
         """
+        for datas in [self.trainset, self.validset, self.testset]:
+            for data in datas:
+                self._fix_data(data, fix)
+
+    def iter_fix_process(self, datas, fix):
+        r"""equation infix/postfix/prefix process as a generator stage.
+
+        Args:
+            datas (Iterable[dict]): problems.
+
+            fix (function): a function to make infix, postfix, prefix or None
+
+        Returns:
+            Generator[dict]: processed problems.
+        """
+        for data in datas:
+            yield self._fix_data(data, fix)
+
+    def _fix_data(self, data, fix):
         source_equation_fix=self.source_equation_fix if self.source_equation_fix else FixType.Infix
-        if fix != None:
-            for idx, data in enumerate(self.trainset):
-                if source_equation_fix==FixType.Prefix:
-                    self.trainset[idx]["infix equation"] = from_prefix_to_infix(data["equation"])
-                elif source_equation_fix==FixType.Postfix:
-                    self.trainset[idx]["infix equation"] = from_postfix_to_infix(data["equation"])
-                else:
-                    self.trainset[idx]["infix equation"] = copy.deepcopy(data["equation"])
-                self.trainset[idx]["equation"] = fix(data["equation"])
-            for idx, data in enumerate(self.validset):
-                if source_equation_fix==FixType.Prefix:
-                    self.validset[idx]["infix equation"] = from_prefix_to_infix(data["equation"])
-                elif source_equation_fix==FixType.Postfix:
-                    self.validset[idx]["infix equation"] = from_postfix_to_infix(data["equation"])
-                else:
-                    self.validset[idx]["infix equation"] = copy.deepcopy(data["equation"])
-                self.validset[idx]["equation"] = fix(data["equation"])
-            for idx, data in enumerate(self.testset):
-                if source_equation_fix==FixType.Prefix:
-                    self.testset[idx]["infix equation"] = from_prefix_to_infix(data["equation"])
-                elif source_equation_fix==FixType.Postfix:
-                    self.testset[idx]["infix equation"] = from_postfix_to_infix(data["equation"])
-                else:
-                    self.testset[idx]["infix equation"] = copy.deepcopy(data["equation"])
-                self.testset[idx]["equation"] = fix(data["equation"])
+        if source_equation_fix==FixType.Prefix:
+            data["infix equation"] = from_prefix_to_infix(data["equation"])
+        elif source_equation_fix==FixType.Postfix:
+            data["infix equation"] = from_postfix_to_infix(data["equation"])
         else:
-            for idx, data in enumerate(self.trainset):
-                if source_equation_fix==FixType.Prefix:
-                    self.trainset[idx]["infix equation"] = from_prefix_to_infix(data["equation"])
-                elif source_equation_fix==FixType.Postfix:
-                    self.trainset[idx]["infix equation"] = from_postfix_to_infix(data["equation"])
-                else:
-                    self.trainset[idx]["infix equation"] = copy.deepcopy(data["equation"])
-            for idx, data in enumerate(self.validset):
-                if source_equation_fix==FixType.Prefix:
-                    self.validset[idx]["infix equation"] = from_prefix_to_infix(data["equation"])
-                elif source_equation_fix==FixType.Postfix:
-                    self.validset[idx]["infix equation"] = from_postfix_to_infix(data["equation"])
-                else:
-                    self.validset[idx]["infix equation"] = copy.deepcopy(data["equation"])
-            for idx, data in enumerate(self.testset):
-                if source_equation_fix==FixType.Prefix:
-                    self.testset[idx]["infix equation"] = from_prefix_to_infix(data["equation"])
-                elif source_equation_fix==FixType.Postfix:
-                    self.testset[idx]["infix equation"] = from_postfix_to_infix(data["equation"])
-                else:
-                    self.testset[idx]["infix equation"] = copy.deepcopy(data["equation"])
+            data["infix equation"] = copy.deepcopy(data["equation"])
+        if fix != None:
+            data["equation"] = fix(data["equation"])
+        return data
 
     def operator_mask_process(self):
         """operator mask process of equation.
@@ -370,6 +430,46 @@ class AbstractDataset(object):
         for idx, data in enumerate(self.testset):
             self.testset[idx]["template"] = operator_mask(data["equation"])
 
+    def iter_operator_mask_process(self, datas):
+        """operator mask process of equation as a generator stage.
+        """
+        for data in datas:
+            data["template"] = operator_mask(data["equation"])
+            yield data
+
+    def _stream_preprocess(self, task_type, fix):
+        r"""number transfer, equation fix and operator mask of stream_dataset.
+
+        every split is read from its store, passed through the stages one problem at a time and written
+        to a new store named after the cache fingerprint.
+
+        Args:
+            task_type (str): [single_equation | multi_equation], task type.
+
+            fix (function): a function to make infix, postfix, prefix or None
+
+        Returns:
+            tuple(list,list,list): generate number list of trainset, copy number of trainset, validset and testset,
+            unk symbol list of trainset.
+        """
+        store_dir = os.path.join(self._stream_dir(), self._cache_fingerprint())
+        generate_list = []
+        unk_symbols = []
+        copy_nums = []
+        for split_name in ['trainset', 'validset', 'testset']:
+            statistics = {}
+            datas = iter_number_transfer(getattr(self, split_name), self.dataset, task_type, self.mask_symbol,
+                                         self.linear, statistics)
+            datas = self.iter_fix_process(datas, fix)
+            datas = self.iter_operator_mask_process(datas)
+            getLogger().info("preprocess {} into {} ...".format(split_name, store_dir))
+            setattr(self, split_name, IndexedDataStore.write(datas, os.path.join(store_dir, split_name)))
+            copy_nums.append(statistics['copy_nums'])
+            if split_name == 'trainset':
+                generate_list = keep_generate_number(statistics, self.min_generate_keep)
+                unk_symbols = statistics['unk_symbol']
+        return generate_list, copy_nums, unk_symbols
+
     def en_rule1_process(self, k):
         rule1_list = EN_rule1_stat(self.trainset, k)
         for idx, data in enumerate(self.trainset):
@@ -453,14 +553,7 @@ class AbstractDataset(object):
                     else:
                         self.trainset += copy.deepcopy(folds[fold_t])
             self._init_id_from_split()
-            parameters = self._preprocess()
-            if not self.resume_training and not self.from_pretrained:
-                for key, value in parameters.items():
-                    setattr(self, key, value)
-            parameters = self._build_vocab()
-            if not self.resume_training and not self.from_pretrained:
-                for key, value in parameters.items():
-                    setattr(self, key, value)
+            self._preprocess_and_build_vocab()
             if self.shuffle:
                 random.shuffle(self.trainset)
             yield k
@@ -473,41 +566,132 @@ class AbstractDataset(object):
         if self.k_fold:
             self.the_fold_t +=1
             self.fold_t = self.the_fold_t
-            self.testset = []
-            self.trainset = []
-            self.validset = []
-            for fold_t in range(self.k_fold):
-                if fold_t == self.the_fold_t:
-                    self.testset += copy.deepcopy(self.folds[fold_t])
-                else:
-                    self.trainset += copy.deepcopy(self.folds[fold_t])
+            self._split_folds(self.the_fold_t, copy_data=True)
             self._init_id_from_split()
 
-            parameters = self._preprocess()
-            if not self.resume_training and not self.from_pretrained:
-                for key,value in parameters.items():
-                    setattr(self,key,value)
-            parameters = self._build_vocab()
-            if not self.resume_training and not self.from_pretrained:
-                for key, value in parameters.items():
-                    setattr(self, key, value)
+            self._preprocess_and_build_vocab()
             if self.resume_training:
                 self.resume_training=False
 
         else:
-            parameters = self._preprocess()
-            if not self.resume_training and not self.from_pretrained:
-                for key, value in parameters.items():
-                    setattr(self, key, value)
-            parameters = self._build_vocab()
-            if not self.resume_training and not self.from_pretrained:
-                for key, value in parameters.items():
-                    setattr(self, key, value)
+            self._preprocess_and_build_vocab()
             if self.resume_training:
                 self.resume_training=False
+        if self.shuffle:
+            if isinstance(self.trainset, IndexedDataStore):
+                self.trainset.shuffle(random)
+            else:
+                random.shuffle(self.trainset)
+
+    def fold_load(self, fold_t):
+        r"""dataset process and build vocab of the fold `fold_t` only.
+
+        Unlike dataset_load, the data of the folds is not copied but processed in place, so the dataset
+        can not load another fold afterwards. It is used by cross validation workers, each of which
+        reads its own copy of the dataset.
+        """
+        self.fold_t = fold_t
+        self.the_fold_t = fold_t
+        self._split_folds(fold_t, copy_data=False)
+        self._init_id_from_split()
+        self._preprocess_and_build_vocab()
         if self.shuffle:
             random.shuffle(self.trainset)
 
+    def _split_folds(self, test_fold_t, copy_data=True):
+        self.testset = []
+        self.trainset = []
+        self.validset = []
+        for fold_t in range(self.k_fold):
+            fold = copy.deepcopy(self.folds[fold_t]) if copy_data else list(self.folds[fold_t])
+            if fold_t == test_fold_t:
+                self.testset += fold
+            else:
+                self.trainset += fold
+
+    def _preprocess_and_build_vocab(self):
+        r"""preprocess dataset and build vocab.
+
+        When dataset_cache is set, the preprocessed splits and vocab are stored in dataset_cache_dir under
+        a fingerprint of the data files, the current split and the preprocessing parameters, and read back
+        instead of being built again by the next run with the same fingerprint.
+        """
+        apply_parameters = not self.resume_training and not self.from_pretrained
+        # vocab built on top of pretrained parameters is not the one a fresh run would build.
+        cache_vocab = self._cache_vocab and apply_parameters
+        cache_file = None
+        cached = {}
+        if self.dataset_cache:
+            cache_dir = self.dataset_cache_dir
+            if not os.path.isabs(cache_dir):
+                cache_dir = os.path.join(os.getcwd(), cache_dir)
+            cache_file = os.path.join(cache_dir, '{}.pkl'.format(self._cache_fingerprint()))
+            if os.path.exists(cache_file) and not self.rebuild:
+                try:
+                    cached = read_pickle_data(cache_file)
+                except Exception:
+                    getLogger().warning("can not read dataset cache {}, building it anew ...".format(cache_file))
+                    cached = {}
+
+        if 'preprocess' in cached:
+            getLogger().info("read preprocessed dataset from {} ...".format(cache_file))
+            for key, value in cached['splits'].items():
+                setattr(self, key, value)
+            parameters = cached['preprocess']
+        else:
+            parameters = self._preprocess()
+        if apply_parameters:
+            for key, value in parameters.items():
+                setattr(self, key, value)
+
+        if cache_vocab and 'vocab' in cached:
+            vocab_parameters = cached['vocab']
+        else:
+            vocab_parameters = self._build_vocab()
+        if apply_parameters:
+            for key, value in vocab_parameters.items():
+                setattr(self, key, value)
+
+        if cache_file is not None and ('preprocess' not in cached or (cache_vocab and 'vocab' not in cached)):
+            cached = {
+                'splits': {'trainset': self.trainset, 'validset': self.validset, 'testset': self.testset,
+                           'max_span_size': self.max_span_size},
+                'preprocess': parameters
+            }
+            if cache_vocab:
+                cached['vocab'] = vocab_parameters
+            if not os.path.exists(os.path.dirname(cache_file)):
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            write_pickle_data(cached, cache_file)
+
+    def _build_dependency_parser(self, use_gpu):
+        r"""dependency parser of graph preprocessing.
+
+        Questions parsed by earlier runs are read from a json-lines cache next to parse_tree_path,
+        so only new or changed questions are parsed.
+        """
+        cache_path = os.path.splitext(self.parse_tree_path)[0] + '.jsonl'
+        return DependencyParser(self.language, use_gpu, cache_path=cache_path, num_workers=self.parse_workers,
+                                rebuild=self.rebuild)
+
+    def _cache_fingerprint(self):
+        dataset_dir = self.dataset_path
+        if not os.path.isabs(dataset_dir):
+            dataset_dir = os.path.join(os.getcwd(), dataset_dir)
+        files = {}
+        for file_name in sorted(os.listdir(dataset_dir)):
+            if file_name.endswith('.json') or file_name.endswith('.jsonl'):
+                files[file_name] = file_digest(os.path.join(dataset_dir, file_name))
+        fingerprint = {
+            'version': DATASET_CACHE_VERSION,
+            'dataset_class': self.__class__.__name__,
+            'parameters': {name: getattr(self, name, None) for name in CACHE_PARAMETER_NAMES},
+            'files': files,
+            'split': [self.trainset_id, self.validset_id, self.testset_id]
+        }
+        fingerprint = json.dumps(fingerprint, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+
     def parameters_to_dict(self):
         """
         return the parameters of dataset as format of dict.
@@ -10,8 +10,6 @@ from logging import getLogger
 from collections import Counter
 
 import torch
-import stanza
-from transformers import AutoTokenizer, AlbertTokenizer, BertTokenizer
 
 from mwptoolkit.config.configuration import Config
 from mwptoolkit.data.dataset.template_dataset import TemplateDataset
@@ -24,11 +22,16 @@ from mwptoolkit.utils.preprocess_tools import id_reedit, read_aux_jsonl_data
 from mwptoolkit.utils.enum_type import MaskSymbol, Operators, SPECIAL_TOKENS, NumMask, SpecialTokens, FixType, \
     DatasetName, EPT
 from mwptoolkit.utils.utils import read_json_data, write_json_data
+from mwptoolkit.utils.lazy_import import LazyModule
+
+transformers = LazyModule('transformers')
 
 
 class DatasetEPT(TemplateDataset):
     """dataset class for deep-learning model EPT.
     """
+    # the vocabulary is read from a pretrained tokenizer.
+    _cache_vocab = False
 
     def __init__(self, config):
         """
@@ -240,9 +243,9 @@ class DatasetEPT(TemplateDataset):
 
         if self.pretrained_model:
             if self.dataset in ['math23k', 'hmwp']:
-                pretrained_tokenizer = BertTokenizer.from_pretrained(self.pretrained_model)
+                pretrained_tokenizer = transformers.BertTokenizer.from_pretrained(self.pretrained_model)
             else:
-                pretrained_tokenizer = AutoTokenizer.from_pretrained(self.pretrained_model)
+                pretrained_tokenizer = transformers.AutoTokenizer.from_pretrained(self.pretrained_model)
             in_idx2word = list(pretrained_tokenizer.get_vocab().keys())
             in_idx2word.append('[N]')
             for key, value in words_count.items():
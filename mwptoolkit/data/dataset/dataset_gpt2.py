@@ -8,7 +8,6 @@ import json
 import os
 import copy
 import warnings
-from transformers import GPT2Tokenizer, BertTokenizer
 
 from mwptoolkit.config.configuration import Config
 from mwptoolkit.data.dataset.template_dataset import TemplateDataset
@@ -20,11 +19,16 @@ from mwptoolkit.utils.preprocess_tool.equation_operator import from_infix_to_pos
 
 from mwptoolkit.utils.preprocess_tool.number_transfer import number_transfer
 from mwptoolkit.utils.utils import read_json_data, write_json_data
+from mwptoolkit.utils.lazy_import import LazyModule
+
+transformers = LazyModule('transformers')
 
 
 class DatasetGPT2(TemplateDataset):
     """dataset class for pre-train model.
     """
+    # the vocabulary is read from a pretrained tokenizer.
+    _cache_vocab = False
 
     def __init__(self, config):
         """
@@ -198,7 +202,7 @@ class DatasetGPT2(TemplateDataset):
                 'out_symbol2idx': out_symbol2idx, 'tokenizer': tokenizer}
 
     def _init_tokenizer(self):
-        tokenizer = GPT2Tokenizer.from_pretrained(self.pretrained_model_path)
+        tokenizer = transformers.GPT2Tokenizer.from_pretrained(self.pretrained_model_path)
 
         if self.add_num_symbol:
             _ = tokenizer.add_tokens(self.operator_list)
@@ -20,8 +20,6 @@ from mwptoolkit.utils.preprocess_tool.sentence_operator import span_level_deprel
 from mwptoolkit.utils.preprocess_tool.number_transfer import number_transfer
 from mwptoolkit.utils.enum_type import MaskSymbol, NumMask, SpecialTokens, FixType, Operators, TaskType
 
-from transformers import AutoTokenizer
-
 from mwptoolkit.utils.utils import read_json_data, write_json_data
 
 
@@ -6,7 +6,6 @@ import json
 import os
 import copy
 from logging import getLogger
-import stanza
 
 from mwptoolkit.config.configuration import Config
 from mwptoolkit.data.dataset.template_dataset import TemplateDataset
@@ -17,6 +16,9 @@ from mwptoolkit.utils.preprocess_tool.equation_operator import from_infix_to_pos
 from mwptoolkit.utils.preprocess_tools import id_reedit, dataset_drop_duplication
 from mwptoolkit.utils.preprocess_tool.number_transfer import number_transfer
 from mwptoolkit.utils.utils import read_json_data, write_json_data
+from mwptoolkit.utils.lazy_import import LazyModule
+
+stanza = LazyModule('stanza')
 
 
 class DatasetMultiEncDec(TemplateDataset):
@@ -0,0 +1,138 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/26 15:02:47
+# @File: indexed_store.py
+
+
+import os
+import pickle
+import random
+
+import numpy as np
+
+
+class IndexedDataStore(object):
+    r"""read-only sequence of problems kept on disk, each problem is read by its byte offset.
+
+    Problems are pickled one after another into `<path>.data` and their offsets are written to
+    `<path>.index` as int64, with the end of the last problem as the final entry. The index is
+    memory mapped, so a store of any size holds no problem in memory until it is read.
+
+    A store is pickled as its path and order, every process opens its own file handle.
+    """
+    # offsets buffered before they are appended to the index file.
+    index_chunk_size = 1 << 16
+
+    def __init__(self, path, order=None):
+        """
+        Args:
+            path (str): path of the store without extension.
+
+            order (numpy.ndarray|None): positions of the problems in the order the store is read, stored order if None.
+        """
+        super().__init__()
+        self.path = path
+        self.order = order
+        self.offsets = np.memmap(self.index_file, dtype=np.int64, mode='r')
+        self._file = None
+        self._file_pid = None
+
+    @property
+    def data_file(self):
+        return self.path + '.data'
+
+    @property
+    def index_file(self):
+        return self.path + '.index'
+
+    @classmethod
+    def write(cls, datas, path):
+        r"""write problems to a new store, consuming `datas` one problem at a time.
+
+        Args:
+            datas (Iterable[dict]): problems, e.g. a generator of preprocessing stages.
+
+            path (str): path of the store without extension, an existing store is replaced.
+
+        Returns:
+            IndexedDataStore: the store.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        temp_data_file = '{}.data.{}.tmp'.format(path, os.getpid())
+        temp_index_file = '{}.index.{}.tmp'.format(path, os.getpid())
+        with open(temp_data_file, 'wb') as data_file, open(temp_index_file, 'wb') as index_file:
+            offsets = []
+            for data in datas:
+                offsets.append(data_file.tell())
+                pickle.dump(data, data_file, protocol=pickle.HIGHEST_PROTOCOL)
+                if len(offsets) >= cls.index_chunk_size:
+                    np.asarray(offsets, dtype=np.int64).tofile(index_file)
+                    offsets = []
+            offsets.append(data_file.tell())
+            np.asarray(offsets, dtype=np.int64).tofile(index_file)
+        os.replace(temp_data_file, path + '.data')
+        os.replace(temp_index_file, path + '.index')
+        return cls(path)
+
+    def exists(self):
+        return os.path.exists(self.data_file) and os.path.exists(self.index_file)
+
+    def shuffle(self, rng=random):
+        r"""shuffle the order the problems are read in, the files are not changed.
+        """
+        order = list(range(len(self)))
+        rng.shuffle(order)
+        if self.order is not None:
+            order = self.order[order]
+        self.order = np.asarray(order, dtype=np.int64)
+
+    def _reader(self):
+        # a handle opened before fork is shared with the parent, so a forked worker opens its own.
+        if self._file is None or self._file_pid != os.getpid():
+            self._file = open(self.data_file, 'rb')
+            self._file_pid = os.getpid()
+        return self._file
+
+    def _read(self, position):
+        reader = self._reader()
+        reader.seek(int(self.offsets[position]))
+        return pickle.load(reader)
+
+    def __len__(self):
+        if self.order is not None:
+            return len(self.order)
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("store index out of range")
+        position = int(self.order[idx]) if self.order is not None else idx
+        return self._read(position)
+
+    def __iter__(self):
+        if self.order is not None:
+            for idx in range(len(self)):
+                yield self[idx]
+            return
+        # in stored order, read sequentially with a handle of its own.
+        with open(self.data_file, 'rb') as reader:
+            for _ in range(len(self)):
+                yield pickle.load(reader)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._file_pid = None
+
+    def __getstate__(self):
+        return {'path': self.path, 'order': self.order}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['order'])
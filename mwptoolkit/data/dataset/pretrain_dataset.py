@@ -9,7 +9,6 @@ import warnings
 from logging import getLogger
 
 import torch
-from transformers import RobertaTokenizer, BertTokenizer
 
 from mwptoolkit.config.configuration import Config
 from mwptoolkit.data.dataset.abstract_dataset import AbstractDataset
@@ -18,15 +17,20 @@ from mwptoolkit.utils.preprocess_tools import id_reedit
 from mwptoolkit.utils.preprocess_tool.equation_operator import from_infix_to_multi_way_tree
 from mwptoolkit.utils.preprocess_tool.equation_operator import from_infix_to_postfix, from_infix_to_prefix, \
     from_postfix_to_infix, from_postfix_to_prefix, from_prefix_to_infix, from_prefix_to_postfix
-from mwptoolkit.utils.preprocess_tool.sentence_operator import deprel_tree_to_file, get_group_nums_, \
-    span_level_deprel_tree_to_file, get_span_level_deprel_tree_, get_deprel_tree_
+from mwptoolkit.utils.preprocess_tool.sentence_operator import span_level_deprel_tree_to_file, \
+    get_span_level_deprel_tree_, get_group_nums_by_parser, get_deprel_tree_by_parser
 from mwptoolkit.utils.preprocess_tool.number_transfer import number_transfer
 from mwptoolkit.utils.utils import read_json_data, write_json_data
+from mwptoolkit.utils.lazy_import import LazyModule
+
+transformers = LazyModule('transformers')
 
 
 class PretrainDataset(AbstractDataset):
     """dataset class for pre-train model.
     """
+    # the vocabulary is read from a pretrained tokenizer.
+    _cache_vocab = False
 
     def __init__(self, config):
         """
@@ -45,6 +49,8 @@ class PretrainDataset(AbstractDataset):
 
         parse_tree_file_name (str|None): the name of the file to save parse tree information.
 
+        parse_workers (int): number of processes parsing questions on CPU for graph preprocessing.
+
         pretrained_model or transformers_pretrained_model (str|None): road path or name of pretrained model.
 
         model (str): model name.
@@ -98,6 +104,7 @@ class PretrainDataset(AbstractDataset):
             "transformers_pretrained_model"] else config["pretrained_model"]
 
         self.parse_tree_path = config['parse_tree_file_name']
+        self.parse_workers = config['parse_workers']
         self.add_num_symbol = config['add_num_symbol']
         if self.parse_tree_path is not None:
             self.parse_tree_path = os.path.join(self.dataset_path,self.parse_tree_path + '.json')
@@ -183,18 +190,11 @@ class PretrainDataset(AbstractDataset):
         # graph preprocess
         use_gpu = True if self.device == torch.device('cuda') else False
         if self.model.lower() in ['graph2treeibm']:
-            if os.path.exists(self.parse_tree_path) and not self.rebuild:
-                logger = getLogger()
-                logger.info("read deprel tree infomation from {} ...".format(self.parse_tree_path))
-                self.trainset, self.validset, self.testset, token_list = \
-                    get_deprel_tree_(self.trainset, self.validset, self.testset, self.parse_tree_path)
-            else:
-                logger = getLogger()
-                logger.info("build deprel tree infomation to {} ...".format(self.parse_tree_path))
-                deprel_tree_to_file(self.trainset, self.validset, self.testset, \
-                                    self.parse_tree_path, self.language, use_gpu)
-                self.trainset, self.validset, self.testset, token_list = \
-                    get_deprel_tree_(self.trainset, self.validset, self.testset, self.parse_tree_path)
+            logger = getLogger()
+            parser = self._build_dependency_parser(use_gpu)
+            logger.info("parse deprel tree infomation, cached in {} ...".format(parser.cache.path))
+            self.trainset, self.validset, self.testset, token_list =\
+                get_deprel_tree_by_parser(self.trainset, self.validset, self.testset, parser)
         if self.model.lower() in ['hms']:
             if os.path.exists(self.parse_tree_path) and not self.rebuild:
                 logger = getLogger()
@@ -209,26 +209,19 @@ class PretrainDataset(AbstractDataset):
                 self.trainset, self.validset, self.testset, self.max_span_size = \
                     get_span_level_deprel_tree_(self.trainset, self.validset, self.testset, self.parse_tree_path)
         if self.model.lower() in ['graph2tree']:
-            if os.path.exists(self.parse_tree_path) and not self.rebuild:
-                logger = getLogger()
-                logger.info("read deprel tree infomation from {} ...".format(self.parse_tree_path))
-                self.trainset, self.validset, self.testset = \
-                    get_group_nums_(self.trainset, self.validset, self.testset, self.parse_tree_path)
-            else:
-                logger = getLogger()
-                logger.info("build deprel tree infomation to {} ...".format(self.parse_tree_path))
-                deprel_tree_to_file(self.trainset, self.validset, self.testset, \
-                                    self.parse_tree_path, self.language, use_gpu)
-                self.trainset, self.validset, self.testset = \
-                    get_group_nums_(self.trainset, self.validset, self.testset, self.parse_tree_path)
+            logger = getLogger()
+            parser = self._build_dependency_parser(use_gpu)
+            logger.info("parse deprel tree infomation, cached in {} ...".format(parser.cache.path))
+            self.trainset, self.validset, self.testset =\
+                get_group_nums_by_parser(self.trainset, self.validset, self.testset, parser)
         return {'generate_list': generate_list, 'copy_nums': copy_nums, 'operator_list': operator_list,
                 'operator_nums': operator_nums}
 
     def _build_vocab(self):
         if self.embedding == 'bert':
-            tokenizer = BertTokenizer.from_pretrained(self.pretrained_model_path)
+            tokenizer = transformers.BertTokenizer.from_pretrained(self.pretrained_model_path)
         elif self.embedding == 'roberta':
-            tokenizer = RobertaTokenizer.from_pretrained(self.pretrained_model_path)
+            tokenizer = transformers.RobertaTokenizer.from_pretrained(self.pretrained_model_path)
         else:
             raise NotImplementedError
         if self.add_num_symbol:
@@ -635,9 +628,9 @@ class PretrainDataset(AbstractDataset):
             setattr(dataset, 'from_pretrained', True)
             setattr(dataset, 'pretrained_dir', pretrained_dir)
         if dataset.embedding == 'bert':
-            tokenizer = BertTokenizer.from_pretrained(dataset.pretrained_model_path)
+            tokenizer = transformers.BertTokenizer.from_pretrained(dataset.pretrained_model_path)
         elif dataset.embedding == 'roberta':
-            tokenizer = RobertaTokenizer.from_pretrained(dataset.pretrained_model_path)
+            tokenizer = transformers.RobertaTokenizer.from_pretrained(dataset.pretrained_model_path)
         else:
             raise NotImplementedError
         if dataset.add_num_symbol:
@@ -19,11 +19,10 @@ from mwptoolkit.data.dataset.abstract_dataset import AbstractDataset
 from mwptoolkit.utils.preprocess_tools import preprocess_ept_dataset_
 from mwptoolkit.utils.preprocess_tool.equation_operator import from_infix_to_multi_way_tree, postfix_parser
 from mwptoolkit.utils.preprocess_tool.equation_operator import from_infix_to_postfix, from_infix_to_prefix, from_postfix_to_infix, from_postfix_to_prefix, from_prefix_to_infix, from_prefix_to_postfix
-from mwptoolkit.utils.preprocess_tool.sentence_operator import deprel_tree_to_file, get_group_nums_, span_level_deprel_tree_to_file, get_span_level_deprel_tree_, get_deprel_tree_
+from mwptoolkit.utils.preprocess_tool.sentence_operator import get_group_nums_by_parser, get_deprel_tree_by_parser, span_level_deprel_tree_to_file, get_span_level_deprel_tree_
 from mwptoolkit.utils.preprocess_tool.number_transfer import number_transfer
 from mwptoolkit.utils.enum_type import MaskSymbol, NumMask, SpecialTokens, FixType, Operators, DatasetName, EPT
 from mwptoolkit.utils.enum_type import OPERATORS, SPECIAL_TOKENS
-from transformers import AutoTokenizer
 
 from mwptoolkit.utils.utils import write_json_data, read_json_data
 
@@ -33,6 +32,8 @@ class SingleEquationDataset(AbstractDataset):
 
     preprocess dataset when running single-equation task.
     """
+    _stream_supported = True
+
     def __init__(self, config):
         """
         Args:
@@ -46,6 +47,8 @@ class SingleEquationDataset(AbstractDataset):
 
         parse_tree_file_name (str|None): the name of the file to save parse tree information.
 
+        parse_workers (int): number of processes parsing questions on CPU for graph preprocessing.
+
         model (str): model name.
 
         dataset (str): dataset name.
@@ -92,6 +95,7 @@ class SingleEquationDataset(AbstractDataset):
         self.rule1 = config["rule1"]
         self.rule2 = config["rule2"]
         self.parse_tree_path = config['parse_tree_file_name']
+        self.parse_workers = config['parse_workers']
         if self.parse_tree_path is not None:
             self.parse_tree_path = os.path.join(self.dataset_path,self.parse_tree_path + '.json')
             if not os.path.isabs(self.parse_tree_path):
@@ -110,32 +114,8 @@ class SingleEquationDataset(AbstractDataset):
         self.operator_nums = len(self.operator_list)
     
     def _preprocess(self):
-        transfer = number_transfer
-        
-        self.trainset, generate_list, train_copy_nums,unk_symbols = transfer(self.trainset, self.dataset, 'single_equation', self.mask_symbol, self.min_generate_keep,self.linear)
-        self.validset, _g, valid_copy_nums,_ = transfer(self.validset, self.dataset, 'single_equation', self.mask_symbol, self.min_generate_keep,self.linear)
-        self.testset, _g, test_copy_nums,_ = transfer(self.testset, self.dataset, 'single_equation', self.mask_symbol, self.min_generate_keep,self.linear)
-        
         target_equation_fix=self.equation_fix if self.equation_fix else FixType.Infix
         source_equation_fix=self.source_equation_fix if self.source_equation_fix else FixType.Infix
-        if self.rule1:
-            if source_equation_fix != FixType.Infix:
-                warnings.warn("non-infix-equation datasets may not surport en rule1 process, already ignored it. ")
-            elif self.linear and self.single:
-                self.en_rule1_process(k=max([train_copy_nums, valid_copy_nums, test_copy_nums]))
-            else:
-                warnings.warn("non-linear or non-single datasets may not surport en rule1 process, already ignored it. ")
-                #raise Warning("non-linear or non-single datasets may not surport en rule1 process, already ignored it. ")
-
-        if self.rule2:
-            if source_equation_fix != FixType.Infix:
-                warnings.warn("non-infix-equation datasets may not surport en rule2 process, already ignored it. ")
-            elif self.linear and self.single:
-                self.en_rule2_process()
-            else:
-                warnings.warn("non-linear or non-single datasets may not surport en rule2 process, already ignored it. ")
-                #raise Warning("non-linear or non-single datasets may not surport en rule2 process, already ignored it. ")
-            
         if source_equation_fix == target_equation_fix:
             fix = None
         elif source_equation_fix == FixType.Infix and target_equation_fix == FixType.Prefix:
@@ -155,8 +135,36 @@ class SingleEquationDataset(AbstractDataset):
         else:
             raise NotImplementedError("the type of equation fix ({}) is not implemented.".format(self.equation_fix))
 
-        self.fix_process(fix)
-        self.operator_mask_process()
+        if self.stream_dataset:
+            generate_list, (train_copy_nums, valid_copy_nums, test_copy_nums), unk_symbols = \
+                self._stream_preprocess('single_equation', fix)
+        else:
+            transfer = number_transfer
+
+            self.trainset, generate_list, train_copy_nums,unk_symbols = transfer(self.trainset, self.dataset, 'single_equation', self.mask_symbol, self.min_generate_keep,self.linear)
+            self.validset, _g, valid_copy_nums,_ = transfer(self.validset, self.dataset, 'single_equation', self.mask_symbol, self.min_generate_keep,self.linear)
+            self.testset, _g, test_copy_nums,_ = transfer(self.testset, self.dataset, 'single_equation', self.mask_symbol, self.min_generate_keep,self.linear)
+
+            if self.rule1:
+                if source_equation_fix != FixType.Infix:
+                    warnings.warn("non-infix-equation datasets may not surport en rule1 process, already ignored it. ")
+                elif self.linear and self.single:
+                    self.en_rule1_process(k=max([train_copy_nums, valid_copy_nums, test_copy_nums]))
+                else:
+                    warnings.warn("non-linear or non-single datasets may not surport en rule1 process, already ignored it. ")
+                    #raise Warning("non-linear or non-single datasets may not surport en rule1 process, already ignored it. ")
+
+            if self.rule2:
+                if source_equation_fix != FixType.Infix:
+                    warnings.warn("non-infix-equation datasets may not surport en rule2 process, already ignored it. ")
+                elif self.linear and self.single:
+                    self.en_rule2_process()
+                else:
+                    warnings.warn("non-linear or non-single datasets may not surport en rule2 process, already ignored it. ")
+                    #raise Warning("non-linear or non-single datasets may not surport en rule2 process, already ignored it. ")
+
+            self.fix_process(fix)
+            self.operator_mask_process()
 
         generate_list = unk_symbols + generate_list
         if self.symbol_for_tree:
@@ -173,32 +181,18 @@ class SingleEquationDataset(AbstractDataset):
         # graph preprocess
         use_gpu = True if self.device == torch.device('cuda') else False
         if self.model.lower() in ['graph2treeibm']:
-            if os.path.exists(self.parse_tree_path) and not self.rebuild:
-                logger = getLogger()
-                logger.info("read deprel tree infomation from {} ...".format(self.parse_tree_path))
-                self.trainset, self.validset, self.testset, token_list =\
-                    get_deprel_tree_(self.trainset, self.validset, self.testset, self.parse_tree_path)
-            else:
-                logger = getLogger()
-                logger.info("build deprel tree infomation to {} ...".format(self.parse_tree_path))
-                deprel_tree_to_file(self.trainset, self.validset, self.testset, \
-                                        self.parse_tree_path, self.language, use_gpu)
-                self.trainset, self.validset, self.testset, token_list =\
-                    get_deprel_tree_(self.trainset, self.validset, self.testset, self.parse_tree_path)
+            logger = getLogger()
+            parser = self._build_dependency_parser(use_gpu)
+            logger.info("parse deprel tree infomation, cached in {} ...".format(parser.cache.path))
+            self.trainset, self.validset, self.testset, token_list =\
+                get_deprel_tree_by_parser(self.trainset, self.validset, self.testset, parser)
 
         if self.model.lower() in ['graph2tree']:
-            if os.path.exists(self.parse_tree_path) and not self.rebuild:
-                logger = getLogger()
-                logger.info("read deprel tree infomation from {} ...".format(self.parse_tree_path))
-                self.trainset, self.validset, self.testset =\
-                    get_group_nums_(self.trainset, self.validset, self.testset, self.parse_tree_path)
-            else:
-                logger = getLogger()
-                logger.info("build deprel tree infomation to {} ...".format(self.parse_tree_path))
-                deprel_tree_to_file(self.trainset, self.validset, self.testset, \
-                                        self.parse_tree_path, self.language, use_gpu)
-                self.trainset, self.validset, self.testset =\
-                    get_group_nums_(self.trainset, self.validset, self.testset, self.parse_tree_path)
+            logger = getLogger()
+            parser = self._build_dependency_parser(use_gpu)
+            logger.info("parse deprel tree infomation, cached in {} ...".format(parser.cache.path))
+            self.trainset, self.validset, self.testset =\
+                get_group_nums_by_parser(self.trainset, self.validset, self.testset, parser)
 
         return {'generate_list': generate_list, 'copy_nums': copy_nums, 'operator_list': operator_list,
                 'operator_nums': operator_nums}
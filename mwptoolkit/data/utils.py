@@ -2,30 +2,20 @@
 # @Author: Yihuai Lan
 # @Time: 2021/08/29 21:39:08
 # @File: utils.py
-from typing import Union, Type
+from typing import Union, Type, TYPE_CHECKING
 
 from mwptoolkit.config.configuration import Config
-
-from mwptoolkit.data.dataset.abstract_dataset import AbstractDataset
-from mwptoolkit.data.dataset.single_equation_dataset import SingleEquationDataset
-from mwptoolkit.data.dataset.multi_equation_dataset import MultiEquationDataset
-from mwptoolkit.data.dataset.dataset_multiencdec import DatasetMultiEncDec
-from mwptoolkit.data.dataset.dataset_ept import DatasetEPT
-from mwptoolkit.data.dataset.pretrain_dataset import PretrainDataset
-from mwptoolkit.data.dataset.dataset_hms import DatasetHMS
-from mwptoolkit.data.dataset.dataset_gpt2 import DatasetGPT2
-
-from mwptoolkit.data.dataloader.abstract_dataloader import AbstractDataLoader
-from mwptoolkit.data.dataloader.single_equation_dataloader import SingleEquationDataLoader
-from mwptoolkit.data.dataloader.multi_equation_dataloader import MultiEquationDataLoader
-from mwptoolkit.data.dataloader.dataloader_multiencdec import DataLoaderMultiEncDec
-from mwptoolkit.data.dataloader.dataloader_ept import DataLoaderEPT
-from mwptoolkit.data.dataloader.pretrain_dataloader import PretrainDataLoader
-from mwptoolkit.data.dataloader.dataloader_hms import DataLoaderHMS
-from mwptoolkit.data.dataloader.dataloader_gpt2 import DataLoaderGPT2
-
+# dataset and dataloader modules are imported on demand, a model only pays for its own.
+from mwptoolkit.data import dataset as dataset_package
+from mwptoolkit.data import dataloader as dataloader_package
 from mwptoolkit.utils.enum_type import TaskType
 
+if TYPE_CHECKING:
+    from mwptoolkit.data.dataset import AbstractDataset, SingleEquationDataset, MultiEquationDataset, \
+        DatasetMultiEncDec, DatasetEPT, PretrainDataset, DatasetHMS, DatasetGPT2
+    from mwptoolkit.data.dataloader import AbstractDataLoader, SingleEquationDataLoader, MultiEquationDataLoader, \
+        DataLoaderMultiEncDec, DataLoaderEPT, PretrainDataLoader, DataLoaderHMS, DataLoaderGPT2
+
 
 def create_dataset(config):
     """Create dataset according to config
@@ -36,19 +26,7 @@ def create_dataset(config):
     Returns:
         Dataset: Constructed dataset.
     """
-    try:
-        return eval('Dataset{}'.format(config['model']))(config)
-    except:
-        pass
-    if config['transformers_pretrained_model'] is not None or config['pretrained_model'] is not None:
-        return PretrainDataset(config)
-    task_type = config['task_type'].lower()
-    if task_type == TaskType.SingleEquation:
-        return SingleEquationDataset(config)
-    elif task_type == TaskType.MultiEquation:
-        return MultiEquationDataset(config)
-    else:
-        return AbstractDataset(config)
+    return get_dataset_module(config)(config)
 
 
 def create_dataloader(config):
@@ -60,48 +38,33 @@ def create_dataloader(config):
     Returns:
         Dataloader module
     """
-    try:
-        return eval('DataLoader{}'.format(config['model']))
-    except:
-        pass
-    if config['transformers_pretrained_model'] is not None or config['pretrained_model'] is not None:
-        return PretrainDataLoader
-    task_type = config['task_type'].lower()
-    if task_type == TaskType.SingleEquation:
-        return SingleEquationDataLoader
-    elif task_type == TaskType.MultiEquation:
-        return MultiEquationDataLoader
-    else:
-        return AbstractDataLoader
+    return get_dataloader_module(config)
 
 
 def get_dataset_module(config: Config) \
-        -> Type[Union[
-            DatasetMultiEncDec, DatasetEPT, DatasetHMS, DatasetGPT2, PretrainDataset, SingleEquationDataset, MultiEquationDataset, AbstractDataset]]:
+        -> "Type[Union[DatasetMultiEncDec, DatasetEPT, DatasetHMS, DatasetGPT2, PretrainDataset, SingleEquationDataset, MultiEquationDataset, AbstractDataset]]":
     """
     return a dataset module according to config
 
     :param config: An instance object of Config, used to record parameter information.
     :return: dataset module
     """
-    try:
-        return eval('Dataset{}'.format(config['model']))
-    except:
-        pass
+    dataset_name = 'Dataset{}'.format(config['model'])
+    if dataset_name in dataset_package.__all__:
+        return getattr(dataset_package, dataset_name)
     if config['transformers_pretrained_model'] is not None or config['pretrained_model'] is not None:
-        return PretrainDataset
+        return dataset_package.PretrainDataset
     task_type = config['task_type'].lower()
     if task_type == TaskType.SingleEquation:
-        return SingleEquationDataset
+        return dataset_package.SingleEquationDataset
     elif task_type == TaskType.MultiEquation:
-        return MultiEquationDataset
+        return dataset_package.MultiEquationDataset
     else:
-        return AbstractDataset
+        return dataset_package.AbstractDataset
 
 
 def get_dataloader_module(config: Config) \
-        -> Type[Union[
-            DataLoaderMultiEncDec, DataLoaderEPT, DataLoaderHMS, DataLoaderGPT2, PretrainDataLoader, SingleEquationDataLoader, MultiEquationDataLoader, AbstractDataLoader]]:
+        -> "Type[Union[DataLoaderMultiEncDec, DataLoaderEPT, DataLoaderHMS, DataLoaderGPT2, PretrainDataLoader, SingleEquationDataLoader, MultiEquationDataLoader, AbstractDataLoader]]":
     """Create dataloader according to config
 
         Args:
@@ -110,16 +73,15 @@ def get_dataloader_module(config: Config) \
         Returns:
             Dataloader module
         """
-    try:
-        return eval('DataLoader{}'.format(config['model']))
-    except:
-        pass
+    dataloader_name = 'DataLoader{}'.format(config['model'])
+    if dataloader_name in dataloader_package.__all__:
+        return getattr(dataloader_package, dataloader_name)
     if config['transformers_pretrained_model'] is not None or config['pretrained_model'] is not None:
-        return PretrainDataLoader
+        return dataloader_package.PretrainDataLoader
     task_type = config['task_type'].lower()
     if task_type == TaskType.SingleEquation:
-        return SingleEquationDataLoader
+        return dataloader_package.SingleEquationDataLoader
     elif task_type == TaskType.MultiEquation:
-        return MultiEquationDataLoader
+        return dataloader_package.MultiEquationDataLoader
     else:
-        return AbstractDataLoader
+        return dataloader_package.AbstractDataLoader
@@ -1,6 +1,13 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.evaluate import evaluator
 
-from mwptoolkit.evaluate.evaluator import PrefixEvaluator,PostfixEvaluator,InfixEvaluator,MultiWayTreeEvaluator,MultiEncDecEvaluator
\ No newline at end of file
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['evaluator'],
+    attributes={
+        'evaluator': ['PrefixEvaluator', 'PostfixEvaluator', 'InfixEvaluator', 'MultiWayTreeEvaluator', 'MultiEncDecEvaluator'],
+    }
+)
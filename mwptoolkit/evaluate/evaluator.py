@@ -5,15 +5,21 @@
 
 
 import copy
+import itertools
 import re
 import threading
+from collections import OrderedDict
 from typing import Type, Union
 
-import sympy as sym
-
 from mwptoolkit.config.configuration import Config
-from mwptoolkit.utils.enum_type import SpecialTokens, OPERATORS, NumMask, MaskSymbol, FixType
+from mwptoolkit.evaluate.expression_program import compile_infix, compile_postfix, compile_prefix, run_program
+from mwptoolkit.evaluate.linear_solver import solve_linear_equations
+from mwptoolkit.evaluate.verification_pool import VerificationPool, solve_with_time_limit
+from mwptoolkit.utils.enum_type import SpecialTokens, OPERATORS, NumMask, MaskSymbol, FixType, TaskType
 from mwptoolkit.utils.preprocess_tools import from_infix_to_postfix
+from mwptoolkit.utils.lazy_import import LazyModule
+
+sym = LazyModule('sympy')
 
 
 class Solver(threading.Thread):
@@ -50,9 +56,18 @@ class Solver(threading.Thread):
             return None
 
 
+class _TargetFailed(object):
+    r"""marks a target of the target table whose answer can not be computed.
+    """
+    pass
+
+
 class AbstractEvaluator(object):
     """abstract evaluator
     """
+    # names of the methods computing the answer of a target, (single equation, multiple equations).
+    target_computes = None
+
     def __init__(self, config):
         super().__init__()
         self.share_vocab = config["share_vocab"]
@@ -60,6 +75,15 @@ class AbstractEvaluator(object):
         self.task_type = config["task_type"]
         self.single = config["single"]
         self.linear = config["linear"]
+        self.solve_timeout = config["solve_timeout"] if config["solve_timeout"] is not None else 10
+        self.eval_workers = config["eval_workers"] if config["eval_workers"] is not None else 0
+        self.verdict_cache_size = config["verdict_cache_size"] if config["verdict_cache_size"] is not None else 0
+        self.fast_linear_solve = config["fast_linear_solve"] if config["fast_linear_solve"] is not None else True
+        self.in_verification_worker = False
+        self._verification_pool = None
+        self._verdict_cache = OrderedDict()
+        self._target_table = {}
+        self.reset_cache_info()
 
     def result(self):
         raise NotImplementedError
@@ -67,10 +91,217 @@ class AbstractEvaluator(object):
     def result_multi(self):
         raise NotImplementedError
 
+    def result_batch(self, test_exps, tar_exps, method="result"):
+        """evaluate a batch of equations.
+
+        Samples which may need sympy to be solved are verified by a persistent pool of
+        `eval_workers` processes, the others are evaluated in place. Verdicts are kept in a LRU cache
+        of `verdict_cache_size` entries, so only the samples whose prediction changed are evaluated again.
+
+        Args:
+            test_exps (list): list of test expressions.
+
+            tar_exps (list): list of target expressions.
+
+            method (str): name of the evaluating method applied to each sample, e.g. 'result' or 'result_multi'.
+
+        Returns:
+            (list(tuple(bool,bool,list,list)))
+
+            one (val_ac, equ_ac, test_exp, tar_exp) tuple per sample, in input order.
+        """
+        if len(test_exps) != len(tar_exps):
+            raise ValueError("got {} test expressions but {} target expressions".format(len(test_exps), len(tar_exps)))
+        if self.verdict_cache_size <= 0:
+            return self._evaluate_batch(test_exps, tar_exps, method)[0]
+        results = [None] * len(test_exps)
+        miss_idx = []
+        miss_keys = []
+        for idx, (test_exp, tar_exp) in enumerate(zip(test_exps, tar_exps)):
+            try:
+                key = (method, tuple(test_exp), tuple(tar_exp))
+                verdict = self._verdict_cache.get(key)
+            except TypeError:
+                key = verdict = None
+            if verdict is None:
+                miss_idx.append(idx)
+                miss_keys.append(key)
+                continue
+            self._verdict_cache.move_to_end(key)
+            self._verdict_hits += 1
+            results[idx] = self._from_verdict(verdict, test_exp, tar_exp)
+        self._verdict_misses += len(miss_idx)
+        if not miss_idx:
+            return results
+        miss_results, unverified = self._evaluate_batch([test_exps[idx] for idx in miss_idx],
+                                                        [tar_exps[idx] for idx in miss_idx], method)
+        for i, (idx, key, result) in enumerate(zip(miss_idx, miss_keys, miss_results)):
+            results[idx] = result
+            # samples judged wrong as their worker timed out or died are verified again next time.
+            if key is None or i in unverified:
+                continue
+            self._verdict_cache[key] = self._to_verdict(result, test_exps[idx], tar_exps[idx])
+            if len(self._verdict_cache) > self.verdict_cache_size:
+                self._verdict_cache.popitem(last=False)
+        return results
+
+    def _evaluate_batch(self, test_exps, tar_exps, method):
+        r"""evaluate the samples, returns the results and the set of indexes of the samples which were
+        judged wrong without being verified.
+        """
+        evaluate = getattr(self, method)
+        need_solver = method.endswith("_multi") or (self.single and self.linear) != True
+        if not need_solver or self.eval_workers <= 0 or self.in_verification_worker:
+            return [evaluate(test_exp, tar_exp) for test_exp, tar_exp in zip(test_exps, tar_exps)], set()
+        if self._verification_pool is None:
+            # a sample solves at most a test and a target equation system.
+            self._verification_pool = VerificationPool(self, self.eval_workers, 2 * self.solve_timeout + 5)
+        return self._verification_pool.map(method, test_exps, tar_exps)
+
+    @staticmethod
+    def _to_verdict(result, test_exp, tar_exp):
+        # the expressions of a result are kept as 0 for test_exp and 1 for tar_exp, results from the
+        # verification workers are copies so they are compared by value.
+        exps = []
+        for exp in result[2:]:
+            if exp == test_exp:
+                exps.append(0)
+            elif exp == tar_exp:
+                exps.append(1)
+            else:
+                exps.append(copy.copy(exp))
+        return (result[0], result[1], *exps)
+
+    @staticmethod
+    def _from_verdict(verdict, test_exp, tar_exp):
+        exps = [test_exp if exp == 0 else tar_exp if exp == 1 else exp for exp in verdict[2:]]
+        return (verdict[0], verdict[1], *exps)
+
+    def _target_answer(self, compute, tar_exp):
+        r"""answer of a target expression, computed once and kept in the target table.
+
+        Targets which failed to be computed raise ValueError every time they are asked for again.
+        """
+        try:
+            key = (compute.__name__, tuple(tar_exp))
+            known = key in self._target_table
+        except TypeError:
+            return compute(tar_exp)
+        if not known:
+            self._target_misses += 1
+            try:
+                answer = compute(tar_exp)
+            except Exception:
+                self._target_table[key] = _TargetFailed
+                raise
+            # a system of equations whose solving timed out is solved again next time.
+            if not (isinstance(answer, tuple) and answer[0] is None):
+                self._target_table[key] = answer
+            return answer
+        self._target_hits += 1
+        answer = self._target_table[key]
+        if answer is _TargetFailed:
+            raise ValueError("the answer of target {} can not be computed".format(' '.join(tar_exp)))
+        return answer
+
+    def _target_table_state(self):
+        return self._target_hits, self._target_misses, len(self._target_table)
+
+    def _target_table_update(self, state):
+        r"""counters and new entries of the target table since `state` was taken, sent back by the verification workers.
+        """
+        hits, misses, size = state
+        entries = list(itertools.islice(self._target_table.items(), size, None)) if len(self._target_table) > size else []
+        return self._target_hits - hits, self._target_misses - misses, entries
+
+    def _merge_target_table_update(self, update):
+        r"""add the counters and the new entries of the target table of a verification worker.
+        """
+        hits, misses, entries = update
+        self._target_hits += hits
+        self._target_misses += misses
+        for key, answer in entries:
+            self._target_table.setdefault(key, answer)
+
+    def build_target_table(self, dataset):
+        """compute the answer of every target of the valid and test set once, at dataset load.
+
+        Args:
+            dataset (Dataset): dataset whose validset and testset are evaluated.
+        """
+        if self.target_computes is None:
+            return
+        if self.task_type == TaskType.MultiEquation or (self.single and self.linear) != True:
+            compute = getattr(self, self.target_computes[1])
+        else:
+            compute = getattr(self, self.target_computes[0])
+        for datas in [dataset.validset, dataset.testset]:
+            for data in datas:
+                num_list = data["number list"]
+                tar_exp = []
+                for symbol in data["equation"]:
+                    if symbol in NumMask.number and NumMask.number.index(symbol) < len(num_list):
+                        tar_exp.append(num_list[NumMask.number.index(symbol)])
+                    else:
+                        tar_exp.append(symbol)
+                try:
+                    self._target_answer(compute, tar_exp)
+                except Exception:
+                    pass
+        self._target_misses = 0
+
+    def cache_info(self):
+        """hits and misses of the verdict cache and the target table since the last reset.
+
+        Returns:
+            dict: verdict_hits, verdict_misses, target_hits, target_misses and the size of both.
+        """
+        return {
+            "verdict_hits": self._verdict_hits,
+            "verdict_misses": self._verdict_misses,
+            "verdict_size": len(self._verdict_cache),
+            "target_hits": self._target_hits,
+            "target_misses": self._target_misses,
+            "target_size": len(self._target_table)
+        }
+
+    def reset_cache_info(self):
+        """reset the counters of cache_info.
+        """
+        self._verdict_hits = 0
+        self._verdict_misses = 0
+        self._target_hits = 0
+        self._target_misses = 0
+
+    def close(self):
+        """stop the verification workers.
+        """
+        if self._verification_pool is not None:
+            self._verification_pool.close()
+            self._verification_pool = None
+
+    def _solve_equations(self, equations, unk_symbol):
+        if self.in_verification_worker:
+            return solve_with_time_limit(sym.solve, equations, unk_symbol, self.solve_timeout)
+        t = Solver(sym.solve, equations, unk_symbol)
+        t.setDaemon(True)
+        t.start()
+        t.join(self.solve_timeout)
+        return t.get_result()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_verification_pool"] = None
+        # verdicts are looked up in the main process only.
+        state["_verdict_cache"] = OrderedDict()
+        return state
+
 
 class InfixEvaluator(AbstractEvaluator):
     r"""evaluator for infix equation sequnence.
     """
+    target_computes = ('_compute_expression_by_postfix', '_compute_expression_by_postfix_multi')
+
     def __init__(self, config):
         super().__init__(config)
 
@@ -102,7 +333,7 @@ class InfixEvaluator(AbstractEvaluator):
         if test_exp == tar_exp:
             return True, True, test_exp, tar_exp
         try:
-            if abs(self._compute_expression_by_postfix(test_exp) - self._compute_expression_by_postfix(tar_exp)) < 1e-4:
+            if abs(self._compute_expression_by_postfix(test_exp) - self._target_answer(self._compute_expression_by_postfix, tar_exp)) < 1e-4:
                 return True, False, tar_exp, tar_exp
             else:
                 return False, False, tar_exp, tar_exp
@@ -134,7 +365,7 @@ class InfixEvaluator(AbstractEvaluator):
             return True, True, test_exp, tar_exp
         try:
             test_solves, test_unk = self._compute_expression_by_postfix_multi(test_exp)
-            tar_solves, tar_unk = self._compute_expression_by_postfix_multi(tar_exp)
+            tar_solves, tar_unk = self._target_answer(self._compute_expression_by_postfix_multi, tar_exp)
             if len(test_unk) != len(tar_unk):
                 return False, False, test_exp, tar_exp
             flag = False
@@ -194,48 +425,14 @@ class InfixEvaluator(AbstractEvaluator):
             return False, False, tar_exp, tar_exp
 
     def _compute_postfix_expression(self, post_fix):
-        st = list()
-        operators = ["+", "-", "^", "*", "/"]
-        for p in post_fix:
-            if p not in operators:
-                pos = re.search("\d+\(", p)
-                if pos:
-                    st.append(eval(p[pos.start():pos.end() - 1] + "+" + p[pos.end() - 1:]))
-                elif p[-1] == "%":
-                    st.append(float(p[:-1]) / 100)
-                else:
-                    st.append(eval(p))
-            elif p == "+" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b + a)
-            elif p == "*" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b * a)
-            elif p == "/" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if a == 0:
-                    return None
-                st.append(b / a)
-            elif p == "-" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b - a)
-            elif p == "^" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if float(a) != 2.0 and float(a) != 3.0:
-                    return None
-                st.append(b**a)
-            else:
-                return None
-        if len(st) == 1:
-            return st.pop()
-        return None
+        return run_program(compile_postfix(post_fix))
 
     def _compute_postfix_expression_multi(self, post_fix):
+        # linear systems are solved without building sympy expressions.
+        if self.fast_linear_solve:
+            result = solve_linear_equations(post_fix)
+            if result is not None:
+                return result
         st = list()
         operators = ["+", "-", "^", "*", "/", "=", "<BRG>"]
         unk_symbols = {}
@@ -292,20 +489,12 @@ class InfixEvaluator(AbstractEvaluator):
         if len(st) == 1:
             equations = st.pop()
             unk_list = list(unk_symbols.values())
-            t = Solver(sym.solve, equations, unk_list)
-            t.setDaemon(True)
-            t.start()
-            t.join(10)
-            result = t.get_result()
+            result = self._solve_equations(equations, unk_list)
             return result, unk_symbols
         return None, unk_symbols
 
     def _compute_expression_by_postfix(self, expression):
-        try:
-            post_exp = from_infix_to_postfix(expression)
-        except:
-            return None
-        return self._compute_postfix_expression(post_exp)
+        return run_program(compile_infix(expression))
 
     def _compute_expression_by_postfix_multi(self, expression):
         r"""return solves and unknown number list
@@ -320,6 +509,8 @@ class InfixEvaluator(AbstractEvaluator):
 class PrefixEvaluator(AbstractEvaluator):
     r"""evaluator for prefix equation.
     """
+    target_computes = ('_compute_prefix_expression', '_compute_prefix_expression_multi')
+
     def __init__(self, config):
         super().__init__(config)
 
@@ -349,7 +540,7 @@ class PrefixEvaluator(AbstractEvaluator):
         if test_exp == tar_exp:
             return True, True, test_exp, tar_exp
         try:
-            if abs(self._compute_prefix_expression(test_exp) - self._compute_prefix_expression(tar_exp)) < 1e-4:
+            if abs(self._compute_prefix_expression(test_exp) - self._target_answer(self._compute_prefix_expression, tar_exp)) < 1e-4:
                 return True, False, test_exp, tar_exp
             else:
                 return False, False, test_exp, tar_exp
@@ -381,7 +572,7 @@ class PrefixEvaluator(AbstractEvaluator):
             return True, True, test_exp, tar_exp
         try:
             test_solves, test_unk = self._compute_prefix_expression_multi(test_exp)
-            tar_solves, tar_unk = self._compute_prefix_expression_multi(tar_exp)
+            tar_solves, tar_unk = self._target_answer(self._compute_prefix_expression_multi, tar_exp)
             if len(test_unk) != len(tar_unk):
                 return False, False, test_exp, tar_exp
             flag = False
@@ -441,54 +632,14 @@ class PrefixEvaluator(AbstractEvaluator):
         return False, False, test_exp, tar_exp
 
     def _compute_prefix_expression(self, pre_fix):
-        st = list()
-        operators = ["+", "-", "^", "*", "/"]
-        pre_fix_ = copy.deepcopy(pre_fix)
-        pre_fix_.reverse()
-        for p in pre_fix_:
-            if p not in operators:
-                pos = re.search("\d+\(", p)
-                if pos:
-                    st.append(eval(p[pos.start():pos.end() - 1] + "+" + p[pos.end() - 1:]))
-                elif p[-1] == "%":
-                    st.append(float(p[:-1]) / 100)
-                else:
-                    st.append(eval(p))
-            elif p == "+" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(a + b)
-            elif p == "*" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(a * b)
-            elif p == "*" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(a * b)
-            elif p == "/" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if b == 0:
-                    return None
-                st.append(a / b)
-            elif p == "-" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(a - b)
-            elif p == "^" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if float(b) != 2.0 and float(b) != 3.0:
-                    return None
-                st.append(a**b)
-            else:
-                return None
-        if len(st) == 1:
-            return st.pop()
-        return None
+        return run_program(compile_prefix(pre_fix))
 
     def _compute_prefix_expression_multi(self, pre_fix):
+        # linear systems are solved without building sympy expressions.
+        if self.fast_linear_solve:
+            result = solve_linear_equations(pre_fix, prefix=True)
+            if result is not None:
+                return result
         st = list()
         operators = ["+", "-", "^", "*", "/", "=", "<BRG>"]
         unk_symbols = {}
@@ -547,11 +698,7 @@ class PrefixEvaluator(AbstractEvaluator):
         if len(st) == 1:
             equations = st.pop()
             unk_list = list(unk_symbols.values())
-            t = Solver(sym.solve, equations, unk_list)
-            t.setDaemon(True)
-            t.start()
-            t.join(10)
-            result = t.get_result()
+            result = self._solve_equations(equations, unk_list)
             return result, unk_symbols
         return None
 
@@ -562,6 +709,8 @@ class PrefixEvaluator(AbstractEvaluator):
 class PostfixEvaluator(AbstractEvaluator):
     r"""evaluator for postfix equation.
     """
+    target_computes = ('_compute_postfix_expression', '_compute_postfix_expression_multi')
+
     def __init__(self, config):
         super().__init__(config)
 
@@ -591,7 +740,7 @@ class PostfixEvaluator(AbstractEvaluator):
         if test_exp == tar_exp:
             return True, True, test_exp, tar_exp
         try:
-            if abs(self._compute_postfix_expression(test_exp) - self._compute_postfix_expression(tar_exp)) < 1e-4:
+            if abs(self._compute_postfix_expression(test_exp) - self._target_answer(self._compute_postfix_expression, tar_exp)) < 1e-4:
                 return True, False, test_exp, tar_exp
             else:
                 return False, False, test_exp, tar_exp
@@ -623,7 +772,7 @@ class PostfixEvaluator(AbstractEvaluator):
             return True, True, test_exp, tar_exp
         try:
             test_solves, test_unk = self._compute_postfix_expression_multi(test_exp)
-            tar_solves, tar_unk = self._compute_postfix_expression_multi(tar_exp)
+            tar_solves, tar_unk = self._target_answer(self._compute_postfix_expression_multi, tar_exp)
             if len(test_unk) != len(tar_unk):
                 return False, False, test_exp, tar_exp
             flag = False
@@ -684,48 +833,14 @@ class PostfixEvaluator(AbstractEvaluator):
         return False, False, test_exp, tar_exp
 
     def _compute_postfix_expression(self, post_fix):
-        st = list()
-        operators = ["+", "-", "^", "*", "/"]
-        for p in post_fix:
-            if p not in operators:
-                pos = re.search("\d+\(", p)
-                if pos:
-                    st.append(eval(p[pos.start():pos.end() - 1] + "+" + p[pos.end() - 1:]))
-                elif p[-1] == "%":
-                    st.append(float(p[:-1]) / 100)
-                else:
-                    st.append(eval(p))
-            elif p == "+" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b + a)
-            elif p == "*" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(a * b)
-            elif p == "/" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if a == 0:
-                    return None
-                st.append(b / a)
-            elif p == "-" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b - a)
-            elif p == "^" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if float(a) != 2.0 and float(a) != 3.0:
-                    return None
-                st.append(b**a)
-            else:
-                return None
-        if len(st) == 1:
-            return st.pop()
-        return None
+        return run_program(compile_postfix(post_fix))
 
     def _compute_postfix_expression_multi(self, post_fix):
+        # linear systems are solved without building sympy expressions.
+        if self.fast_linear_solve:
+            result = solve_linear_equations(post_fix)
+            if result is not None:
+                return result
         st = list()
         operators = ["+", "-", "^", "*", "/", "=", "<BRG>"]
         unk_symbols = {}
@@ -782,11 +897,7 @@ class PostfixEvaluator(AbstractEvaluator):
         if len(st) == 1:
             equations = st.pop()
             unk_list = list(unk_symbols.values())
-            t = Solver(sym.solve, equations, unk_list)
-            t.setDaemon(True)
-            t.start()
-            t.join(10)
-            result = t.get_result()
+            result = self._solve_equations(equations, unk_list)
             return result, unk_symbols
         return None, unk_symbols
 
@@ -795,6 +906,8 @@ class PostfixEvaluator(AbstractEvaluator):
 
 
 class MultiWayTreeEvaluator(AbstractEvaluator):
+    target_computes = ('_compute_expression_by_postfix', '_compute_expression_by_postfix_multi')
+
     def __init__(self, config):
         super().__init__(config)
 
@@ -824,7 +937,7 @@ class MultiWayTreeEvaluator(AbstractEvaluator):
         if test_exp == tar_exp:
             return True, True, test_exp, tar_exp
         try:
-            if abs(self._compute_expression_by_postfix(test_exp) - self._compute_expression_by_postfix(tar_exp)) < 1e-4:
+            if abs(self._compute_expression_by_postfix(test_exp) - self._target_answer(self._compute_expression_by_postfix, tar_exp)) < 1e-4:
                 return True, False, tar_exp, tar_exp
             else:
                 return False, False, tar_exp, tar_exp
@@ -856,7 +969,7 @@ class MultiWayTreeEvaluator(AbstractEvaluator):
             return True, True, test_exp, tar_exp
         try:
             test_solves, test_unk = self._compute_expression_by_postfix_multi(test_exp)
-            tar_solves, tar_unk = self._compute_expression_by_postfix_multi(tar_exp)
+            tar_solves, tar_unk = self._target_answer(self._compute_expression_by_postfix_multi, tar_exp)
             if len(test_unk) != len(tar_unk):
                 return False, False, test_exp, tar_exp
             flag = False
@@ -916,48 +1029,14 @@ class MultiWayTreeEvaluator(AbstractEvaluator):
             return False, False, tar_exp, tar_exp
 
     def _compute_postfix_expression(self, post_fix):
-        st = list()
-        operators = ["+", "-", "^", "*", "/"]
-        for p in post_fix:
-            if p not in operators:
-                pos = re.search("\d+\(", p)
-                if pos:
-                    st.append(eval(p[pos.start():pos.end() - 1] + "+" + p[pos.end() - 1:]))
-                elif p[-1] == "%":
-                    st.append(float(p[:-1]) / 100)
-                else:
-                    st.append(eval(p))
-            elif p == "+" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b + a)
-            elif p == "*" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b * a)
-            elif p == "/" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if a == 0:
-                    return None
-                st.append(b / a)
-            elif p == "-" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                st.append(b - a)
-            elif p == "^" and len(st) > 1:
-                a = st.pop()
-                b = st.pop()
-                if float(a) != 2.0 and float(a) != 3.0:
-                    return None
-                st.append(b**a)
-            else:
-                return None
-        if len(st) == 1:
-            return st.pop()
-        return None
+        return run_program(compile_postfix(post_fix))
 
     def _compute_postfix_expression_multi(self, post_fix):
+        # linear systems are solved without building sympy expressions.
+        if self.fast_linear_solve:
+            result = solve_linear_equations(post_fix)
+            if result is not None:
+                return result
         st = list()
         operators = ["+", "-", "^", "*", "/", "=", "<BRG>"]
         unk_symbols = {}
@@ -1014,20 +1093,12 @@ class MultiWayTreeEvaluator(AbstractEvaluator):
         if len(st) == 1:
             equations = st.pop()
             unk_list = list(unk_symbols.values())
-            t = Solver(sym.solve, equations, unk_list)
-            t.setDaemon(True)
-            t.start()
-            t.join(10)
-            result = t.get_result()
+            result = self._solve_equations(equations, unk_list)
             return result, unk_symbols
         return None, unk_symbols
 
     def _compute_expression_by_postfix(self, expression):
-        try:
-            post_exp = from_infix_to_postfix(expression)
-        except:
-            return None
-        return self._compute_postfix_expression(post_exp)
+        return run_program(compile_infix(expression))
 
     def _compute_expression_by_postfix_multi(self, expression):
         r"""return solves and unknown number list
@@ -1042,6 +1113,9 @@ class MultiWayTreeEvaluator(AbstractEvaluator):
 class MultiEncDecEvaluator(PostfixEvaluator, PrefixEvaluator):
     r"""evaluator for deep-learning model MultiE&D.
     """
+    # targets of the prefix and postfix decoder fill the target table while evaluating.
+    target_computes = None
+
     def __init__(self, config):
         super().__init__(config)
 
@@ -1072,7 +1146,7 @@ class MultiEncDecEvaluator(PostfixEvaluator, PrefixEvaluator):
         if test_exp == tar_exp:
             return True, True, test_exp, tar_exp
         try:
-            if abs(self._compute_prefix_expression(test_exp) - self._compute_prefix_expression(tar_exp)) < 1e-4:
+            if abs(self._compute_prefix_expression(test_exp) - self._target_answer(self._compute_prefix_expression, tar_exp)) < 1e-4:
                 return True, False, test_exp, tar_exp
             else:
                 return False, False, test_exp, tar_exp
@@ -1104,7 +1178,7 @@ class MultiEncDecEvaluator(PostfixEvaluator, PrefixEvaluator):
             return True, True, test_exp, tar_exp
         try:
             test_solves, test_unk = self._compute_prefix_expression_multi(test_exp)
-            tar_solves, tar_unk = self._compute_prefix_expression_multi(tar_exp)
+            tar_solves, tar_unk = self._target_answer(self._compute_prefix_expression_multi, tar_exp)
             if len(test_unk) != len(tar_unk):
                 return False, False, test_exp, tar_exp
             flag = False
@@ -1189,7 +1263,7 @@ class MultiEncDecEvaluator(PostfixEvaluator, PrefixEvaluator):
         if test_exp == tar_exp:
             return True, True, test_exp, tar_exp
         try:
-            if abs(self._compute_postfix_expression(test_exp) - self._compute_postfix_expression(tar_exp)) < 1e-4:
+            if abs(self._compute_postfix_expression(test_exp) - self._target_answer(self._compute_postfix_expression, tar_exp)) < 1e-4:
                 return True, False, test_exp, tar_exp
             else:
                 return False, False, test_exp, tar_exp
@@ -1221,7 +1295,7 @@ class MultiEncDecEvaluator(PostfixEvaluator, PrefixEvaluator):
             return True, True, test_exp, tar_exp
         try:
             test_solves, test_unk = self._compute_postfix_expression_multi(test_exp)
-            tar_solves, tar_unk = self._compute_postfix_expression_multi(tar_exp)
+            tar_solves, tar_unk = self._target_answer(self._compute_postfix_expression_multi, tar_exp)
             if len(test_unk) != len(tar_unk):
                 return False, False, test_exp, tar_exp
             flag = False
@@ -0,0 +1,281 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/08/18 19:19:55
+# @File: expression_program.py
+
+
+import ast
+import operator
+import re
+from array import array
+from functools import lru_cache
+
+import numpy as np
+
+from mwptoolkit.utils.preprocess_tools import from_infix_to_postfix
+
+OP_PAD = -1
+OP_PUSH = 0
+OP_ADD = 1
+OP_SUB = 2
+OP_MUL = 3
+OP_DIV = 4
+OP_POW = 5
+# operators of prefix expressions take the left operand from the top of the stack.
+OP_SWAPPED = 5
+
+_OPCODES = {"+": OP_ADD, "-": OP_SUB, "*": OP_MUL, "/": OP_DIV, "^": OP_POW}
+
+_MIXED_NUMBER = re.compile(r"\d+\(")
+
+_AST_BINARY_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv, ast.Pow: operator.pow}
+_AST_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+# float64 represents every integer below this bound exactly.
+_EXACT_FLOAT_BOUND = 2**53
+
+
+class ExpressionProgram(object):
+    r"""a single-equation expression compiled into a flat opcode array.
+
+    `ops` holds one opcode per step and `consts` the operand pushed by each OP_PUSH step. Binary
+    opcodes pop the right operand first, opcodes above OP_SWAPPED pop the left operand first.
+    """
+    __slots__ = ("ops", "consts", "max_depth", "float_exact", "op_bytes", "const_bytes")
+
+    def __init__(self, ops, consts, max_depth):
+        self.ops = ops
+        self.consts = consts
+        self.max_depth = max_depth
+        self.float_exact = all(isinstance(c, float) or abs(c) < _EXACT_FLOAT_BOUND for c in consts)
+        # int8 opcodes and float64 operands, concatenated as they are by run_programs.
+        self.op_bytes = bytes(ops)
+        self.const_bytes = array("d", [float(c) for c in consts]).tobytes() if self.float_exact else None
+
+    def __len__(self):
+        return len(self.ops)
+
+
+def _eval_number_node(node):
+    if isinstance(node, ast.Expression):
+        return _eval_number_node(node.body)
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _AST_BINARY_OPS:
+        return _AST_BINARY_OPS[type(node.op)](_eval_number_node(node.left), _eval_number_node(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _AST_UNARY_OPS:
+        return _AST_UNARY_OPS[type(node.op)](_eval_number_node(node.operand))
+    raise ValueError("not a number")
+
+
+@lru_cache(maxsize=65536)
+def parse_operand(token):
+    r"""convert an operand token to a number, e.g. '3', '2.5', '(1/2)', '1(1/2)', '50%'.
+
+    Numbers are computed the same way as `eval` would, without executing the token.
+
+    Raises:
+        ValueError: the token is not a number.
+    """
+    try:
+        pos = _MIXED_NUMBER.search(token)
+        if pos:
+            # '1(1/2)' is read as 1+(1/2)
+            source = token[pos.start():pos.end() - 1] + "+" + token[pos.end() - 1:]
+        elif token[-1] == "%":
+            return float(token[:-1]) / 100
+        else:
+            source = token
+        return _eval_number_node(ast.parse(source, mode="eval"))
+    except (SyntaxError, ArithmeticError, TypeError, IndexError, RecursionError, MemoryError) as e:
+        raise ValueError("not a number") from e
+
+
+def _compile(tokens, swapped):
+    ops = []
+    consts = []
+    depth = 0
+    max_depth = 0
+    for token in tokens:
+        opcode = _OPCODES.get(token)
+        if opcode is None:
+            try:
+                consts.append(parse_operand(token))
+            except ValueError:
+                return None
+            ops.append(OP_PUSH)
+            depth += 1
+            max_depth = max(max_depth, depth)
+        else:
+            if depth < 2:
+                return None
+            ops.append(opcode + OP_SWAPPED if swapped else opcode)
+            consts.append(0)
+            depth -= 1
+    if depth != 1:
+        return None
+    return ExpressionProgram(tuple(ops), tuple(consts), max_depth)
+
+
+@lru_cache(maxsize=65536)
+def _compile_postfix(tokens):
+    return _compile(tokens, swapped=False)
+
+
+@lru_cache(maxsize=65536)
+def _compile_prefix(tokens):
+    return _compile(tokens[::-1], swapped=True)
+
+
+@lru_cache(maxsize=65536)
+def _compile_infix(tokens):
+    try:
+        post_fix = from_infix_to_postfix(list(tokens))
+    except:
+        return None
+    return _compile(post_fix, swapped=False)
+
+
+def compile_postfix(post_fix):
+    r"""compile a postfix symbol list, return None if it can not be evaluated.
+    """
+    return _compile_postfix(tuple(post_fix))
+
+
+def compile_prefix(pre_fix):
+    r"""compile a prefix symbol list, return None if it can not be evaluated.
+    """
+    return _compile_prefix(tuple(pre_fix))
+
+
+def compile_infix(expression):
+    r"""compile an infix symbol list, return None if it can not be evaluated.
+    """
+    return _compile_infix(tuple(expression))
+
+
+def run_program(program):
+    r"""evaluate a compiled expression with Python numbers.
+
+    Returns:
+        the value of the expression, None if it is invalid, divides by zero or raises to a power
+        other than 2 or 3.
+    """
+    if program is None:
+        return None
+    st = []
+    push = st.append
+    pop = st.pop
+    consts = program.consts
+    try:
+        for i, op in enumerate(program.ops):
+            if op == OP_PUSH:
+                push(consts[i])
+                continue
+            a = pop()
+            b = pop()
+            if op > OP_SWAPPED:
+                op -= OP_SWAPPED
+                a, b = b, a
+            # b is the left operand and a the right one.
+            if op == OP_ADD:
+                push(b + a)
+            elif op == OP_SUB:
+                push(b - a)
+            elif op == OP_MUL:
+                push(b * a)
+            elif op == OP_DIV:
+                if a == 0:
+                    return None
+                push(b / a)
+            else:
+                if float(a) != 2.0 and float(a) != 3.0:
+                    return None
+                push(b**a)
+    except (ArithmeticError, TypeError):
+        return None
+    return st[0]
+
+
+def run_programs(programs):
+    r"""evaluate a batch of compiled expressions in one vectorized pass.
+
+    All programs advance one opcode per step on a shared [batch_size, max_depth] float64 stack.
+    Programs whose operands or intermediate values are too large to be exact in float64 are
+    evaluated again with :func:`run_program`, so the values match the scalar path.
+
+    The evaluators do not use it: the numpy overhead of every step makes this pass slower than
+    :func:`run_program` on a cached program for the short expressions of math word problems, even
+    over all the equations of the bundled datasets at once (see
+    `mwptoolkit.benchmark.expression_evaluation`). It is kept for callers evaluating large offline
+    batches of long expressions.
+
+    Args:
+        programs (list): list of ExpressionProgram or None.
+
+    Returns:
+        list: value of each program, None where :func:`run_program` gives None.
+    """
+    batch_size = len(programs)
+    rows = [i for i, program in enumerate(programs) if program is not None and program.float_exact]
+    # longest programs first, so the programs still running at a step are a prefix of the rows.
+    rows.sort(key=lambda i: len(programs[i].op_bytes), reverse=True)
+    results = [None] * batch_size
+    if rows:
+        n = len(rows)
+        lengths = np.array([len(programs[i].op_bytes) for i in rows], dtype=np.int64)
+        max_len = int(lengths[0])
+        max_depth = max([programs[i].max_depth for i in rows])
+        total = int(lengths.sum())
+        # scatter the concatenated programs into a padded [n, max_len] layout.
+        flat_rows = np.repeat(np.arange(n), lengths)
+        flat_cols = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        ops = np.full((n, max_len), OP_PAD, dtype=np.int8)
+        consts = np.zeros((n, max_len), dtype=np.float64)
+        ops[flat_rows, flat_cols] = np.frombuffer(b"".join([programs[i].op_bytes for i in rows]), dtype=np.int8)
+        consts[flat_rows, flat_cols] = np.frombuffer(b"".join([programs[i].const_bytes for i in rows]), dtype=np.float64)
+
+        stack = np.zeros((n, max_depth), dtype=np.float64)
+        sp = np.zeros(n, dtype=np.int64)
+        valid = np.ones(n, dtype=bool)
+        max_abs = np.abs(consts).max(axis=1)
+        all_rows = np.arange(n)
+        num_running = n - np.cumsum(np.bincount(lengths, minlength=max_len + 1))
+        with np.errstate(all="ignore"):
+            for t in range(max_len):
+                op = ops[:num_running[t], t]
+                push_rows = all_rows[:num_running[t]][op == OP_PUSH]
+                if len(push_rows):
+                    stack[push_rows, sp[push_rows]] = consts[push_rows, t]
+                    sp[push_rows] += 1
+                bin_rows = all_rows[:num_running[t]][op > OP_PUSH]
+                if len(bin_rows):
+                    bin_op = op[bin_rows].astype(np.int64)
+                    top = stack[bin_rows, sp[bin_rows] - 1]
+                    second = stack[bin_rows, sp[bin_rows] - 2]
+                    swapped = bin_op > OP_SWAPPED
+                    left = np.where(swapped, top, second)
+                    right = np.where(swapped, second, top)
+                    bin_op = np.where(swapped, bin_op - OP_SWAPPED, bin_op)
+                    is_div = bin_op == OP_DIV
+                    is_pow = bin_op == OP_POW
+                    value = np.select([bin_op == OP_ADD, bin_op == OP_SUB, bin_op == OP_MUL, is_div],
+                                      [left + right, left - right, left * right, left / right],
+                                      np.power(left, right))
+                    invalid = (is_div & (right == 0)) | (is_pow & (right != 2.) & (right != 3.))
+                    valid[bin_rows[invalid]] = False
+                    stack[bin_rows, sp[bin_rows] - 2] = value
+                    sp[bin_rows] -= 1
+                    max_abs[bin_rows] = np.maximum(max_abs[bin_rows], np.abs(value))
+        # nan compares false, so it also falls back to the scalar path.
+        exact = max_abs < _EXACT_FLOAT_BOUND
+        values = stack[:, 0].tolist()
+        for row, i in enumerate(rows):
+            if not exact[row]:
+                results[i] = run_program(programs[i])
+            elif valid[row]:
+                results[i] = values[row]
+    for i, program in enumerate(programs):
+        if program is not None and not program.float_exact:
+            results[i] = run_program(program)
+    return results
@@ -0,0 +1,203 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/28 15:02:37
+# @File: linear_solver.py
+
+
+import re
+from fractions import Fraction
+
+from mwptoolkit.utils.lazy_import import LazyModule
+
+sym = LazyModule('sympy')
+
+_MIXED_NUMBER = re.compile(r"\d+\(")
+
+
+class NotLinear(Exception):
+    r"""raised when an equation system is left to sympy, e.g. it is not linear or not well-formed.
+    """
+    pass
+
+
+class LinearForm(object):
+    r"""sum of unknowns times coefficients plus a constant.
+
+    Coefficients follow the number types of sympy: python int and Fraction stand for exact Integer
+    and Rational, float for Float.
+    """
+    __slots__ = ("coefs", "const")
+
+    def __init__(self, coefs, const):
+        self.coefs = coefs
+        self.const = const
+
+    @staticmethod
+    def build(coefs, const):
+        coefs = {x: c for x, c in coefs.items() if c != 0}
+        if coefs:
+            return LinearForm(coefs, const)
+        # sympy collapses an expression whose unknowns cancel to a sympy number.
+        return Fraction(const) if isinstance(const, int) else const
+
+
+def _exact_div(a, b):
+    if isinstance(a, (int, Fraction)) and isinstance(b, (int, Fraction)):
+        return Fraction(a) / b
+    return a / b
+
+
+def _scale(form, factor):
+    return LinearForm.build({x: c * factor for x, c in form.coefs.items()}, form.const * factor)
+
+
+def _add(left, right, sign):
+    if not isinstance(left, LinearForm) and not isinstance(right, LinearForm):
+        return left + right if sign > 0 else left - right
+    if not isinstance(left, LinearForm):
+        left = LinearForm({}, left)
+    if not isinstance(right, LinearForm):
+        right = LinearForm({}, right)
+    coefs = dict(left.coefs)
+    for x, c in right.coefs.items():
+        coefs[x] = coefs[x] + sign * c if x in coefs else sign * c
+    return LinearForm.build(coefs, left.const + sign * right.const)
+
+
+def _is_number(value):
+    return isinstance(value, (int, float, Fraction)) and not isinstance(value, bool)
+
+
+def _operand(p, unknowns):
+    pos = _MIXED_NUMBER.search(p)
+    if pos:
+        value = eval(p[pos.start():pos.end() - 1] + "+" + p[pos.end() - 1:])
+    elif p[-1] == "%":
+        value = float(p[:-1]) / 100
+    elif p.isalpha():
+        if p not in unknowns:
+            unknowns.append(p)
+        return LinearForm({p: 1}, 0)
+    else:
+        value = eval(p)
+    if not _is_number(value):
+        raise NotLinear()
+    return value
+
+
+def _apply(op, left, right):
+    if isinstance(left, list) or isinstance(right, list):
+        # the sympy evaluators concatenate equation lists with + and <BRG>.
+        if op in ["+", "<BRG>"] and isinstance(left, list) and isinstance(right, list):
+            return left + right
+        raise NotLinear()
+    if op in ["+", "<BRG>"]:
+        return _add(left, right, 1)
+    if op == "-":
+        return _add(left, right, -1)
+    if op == "*":
+        if isinstance(left, LinearForm) and isinstance(right, LinearForm):
+            raise NotLinear()
+        if isinstance(left, LinearForm):
+            return _scale(left, right)
+        if isinstance(right, LinearForm):
+            return _scale(right, left)
+        return left * right
+    if op == "/":
+        if isinstance(right, LinearForm) or right == 0:
+            raise NotLinear()
+        if isinstance(left, LinearForm):
+            return LinearForm.build({x: _exact_div(c, right) for x, c in left.coefs.items()}, _exact_div(left.const, right))
+        return left / right
+    if op == "^":
+        if isinstance(left, LinearForm) or isinstance(right, LinearForm) or float(right) not in [2.0, 3.0]:
+            raise NotLinear()
+        return left ** right
+    if op == "=":
+        equation = _add(left, right, -1)
+        # equations between numbers are evaluated by sympy to true or false.
+        if not isinstance(equation, LinearForm):
+            raise NotLinear()
+        return [equation]
+    raise NotLinear()
+
+
+def _to_fraction(value):
+    if isinstance(value, float):
+        # sympy solves Floats as the rationals of their decimal representation.
+        return Fraction(repr(value))
+    return Fraction(value)
+
+
+def _eliminate(rows, n_unknowns):
+    r"""gauss-jordan elimination of the augmented rows, over exact rationals.
+
+    Returns:
+        list(Fraction)|list: the unique solution, [] if the system is inconsistent.
+    """
+    pivot_row = 0
+    for col in range(n_unknowns):
+        pivot = next((r for r in range(pivot_row, len(rows)) if rows[r][col] != 0), None)
+        if pivot is None:
+            # infinite solutions, which sympy gives in terms of the free unknowns.
+            raise NotLinear()
+        rows[pivot_row], rows[pivot] = rows[pivot], rows[pivot_row]
+        head = rows[pivot_row][col]
+        rows[pivot_row] = [value / head for value in rows[pivot_row]]
+        for r in range(len(rows)):
+            if r != pivot_row and rows[r][col] != 0:
+                factor = rows[r][col]
+                rows[r] = [value - factor * pivot_value for value, pivot_value in zip(rows[r], rows[pivot_row])]
+        pivot_row += 1
+    if any(row[-1] != 0 for row in rows[pivot_row:]):
+        return []
+    return [rows[i][-1] for i in range(n_unknowns)]
+
+
+def solve_linear_equations(expression, prefix=False):
+    r"""solve the system of equations of a postfix or prefix expression without sympy, if it is linear.
+
+    The coefficient matrix is collected while the expression is evaluated, then the system is solved
+    over exact rationals. The result has the form the sympy evaluators give: sympy.solve gives a dict
+    from unknown to value if the solution is unique and [] if there is no solution.
+
+    Args:
+        expression (list): list of postfix or prefix tokens, equations joined by '<BRG>'.
+
+        prefix (bool): whether the expression is prefix.
+
+    Returns:
+        tuple(dict|list,dict)|None: the solution and the unknown symbols by name, None if the expression
+        is left to sympy, as it is not linear, has infinite solutions or is not well-formed.
+    """
+    st = list()
+    unknowns = []
+    try:
+        for p in (reversed(expression) if prefix else expression):
+            if p not in ["+", "-", "^", "*", "/", "=", "<BRG>"]:
+                st.append(_operand(p, unknowns))
+                continue
+            if len(st) < 2:
+                return None
+            a = st.pop()
+            b = st.pop()
+            st.append(_apply(p, a, b) if prefix else _apply(p, b, a))
+        if len(st) != 1 or not isinstance(st[0], list):
+            return None
+        has_float = False
+        rows = []
+        for equation in st[0]:
+            entries = [equation.coefs.get(x, 0) for x in unknowns] + [-equation.const]
+            has_float = has_float or any(isinstance(value, float) for value in entries)
+            rows.append([_to_fraction(value) for value in entries])
+        solution = _eliminate(rows, len(unknowns))
+    except Exception:
+        return None
+    unk_symbols = {x: sym.symbols(x) for x in unknowns}
+    if solution == []:
+        return [], unk_symbols
+    if has_float:
+        values = [sym.Float(float(value)) for value in solution]
+    else:
+        values = [sym.Rational(value.numerator, value.denominator) for value in solution]
+    return {unk_symbols[x]: value for x, value in zip(unknowns, values)}, unk_symbols
@@ -0,0 +1,216 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/08/18 19:19:55
+# @File: verification_pool.py
+
+
+import atexit
+import multiprocessing
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+
+
+class SolveTimeout(Exception):
+    r"""raised inside a verification worker when an equation solve runs out of time.
+    """
+    pass
+
+
+def _raise_solve_timeout(signum, frame):
+    raise SolveTimeout()
+
+
+def solve_with_time_limit(func, equations, unk_symbol, timeout):
+    r"""solve equations in the current thread, interrupting the solve after `timeout` seconds.
+
+    The interruption relies on SIGALRM, so it is only armed in the main thread of a process on
+    platforms providing `signal.setitimer`. Otherwise the solve runs unbounded and the owner of
+    the process is expected to enforce the limit (see :class:`VerificationPool`).
+
+    Args:
+        func (function): a function to solve equations.
+
+        equations (list): list of expressions.
+
+        unk_symbol (list): list of unknown symbols.
+
+        timeout (float): time limit in seconds.
+
+    Returns:
+        the result of func, None if it failed or timed out.
+    """
+    can_alarm = hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if can_alarm:
+        old_handler = signal.signal(signal.SIGALRM, _raise_solve_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(equations, unk_symbol)
+    except:
+        return None
+    finally:
+        if can_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, old_handler)
+
+
+def _verification_worker(conn, evaluator):
+    r"""worker loop, receives (index, method, test_exp, tar_exp) and answers (index, result, target table update).
+    """
+    # Ctrl-C is handled by the parent, which terminates the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    evaluator.in_verification_worker = True
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        idx, method, test_exp, tar_exp = task
+        state = evaluator._target_table_state()
+        try:
+            result = getattr(evaluator, method)(test_exp, tar_exp)
+        except:
+            result = (False, False, test_exp, tar_exp)
+        try:
+            conn.send((idx, result, evaluator._target_table_update(state)))
+        except (EOFError, OSError):
+            break
+
+
+class VerificationPool(object):
+    r"""persistent pool of worker processes checking predicted equations against targets.
+
+    Each sample is sent to an idle worker as its own task. A worker stuck on a sample for longer
+    than `task_timeout` seconds is terminated, the sample is marked wrong and a fresh worker takes
+    its place, so a pathological sympy solve can never stall or leak into the rest of the evaluation.
+    Results are returned in input order and every sample is judged on its own, so the verdicts do
+    not depend on the number of workers. The target answers the workers look up or compute are
+    counted and added to the target table of the evaluator of the pool.
+    """
+    def __init__(self, evaluator, num_workers, task_timeout):
+        """
+        Args:
+            evaluator (AbstractEvaluator): evaluator copied into every worker.
+
+            num_workers (int): number of worker processes.
+
+            task_timeout (float): hard time limit in seconds for one sample.
+        """
+        super().__init__()
+        self.evaluator = evaluator
+        self.num_workers = num_workers
+        self.task_timeout = task_timeout
+        self._context = multiprocessing.get_context()
+        self._workers = [None] * num_workers
+        self._closed = False
+        atexit.register(self.close)
+
+    def _start_worker(self, worker_idx):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_verification_worker, args=(child_conn, self.evaluator), daemon=True)
+        process.start()
+        child_conn.close()
+        self._workers[worker_idx] = (process, parent_conn)
+
+    def _kill_worker(self, worker_idx):
+        process, conn = self._workers[worker_idx]
+        process.terminate()
+        process.join(1)
+        if process.is_alive() and hasattr(process, "kill"):
+            process.kill()
+            process.join()
+        conn.close()
+        self._workers[worker_idx] = None
+
+    def map(self, method, test_exps, tar_exps):
+        r"""verify every (test_exp, tar_exp) pair with evaluator method `method`.
+
+        Args:
+            method (str): name of the evaluator method, e.g. 'result' or 'result_multi'.
+
+            test_exps (list): list of test expressions.
+
+            tar_exps (list): list of target expressions.
+
+        Returns:
+            tuple(list,set): one (val_ac, equ_ac, test_exp, tar_exp) tuple per sample, in input order, and
+            the indexes of the samples marked wrong as their worker timed out or died.
+        """
+        if self._closed:
+            raise RuntimeError("verification pool is closed")
+        for worker_idx in range(self.num_workers):
+            if self._workers[worker_idx] is None or not self._workers[worker_idx][0].is_alive():
+                if self._workers[worker_idx] is not None:
+                    self._kill_worker(worker_idx)
+                self._start_worker(worker_idx)
+
+        results = [None] * len(test_exps)
+        unverified = set()
+        pending = deque(range(len(test_exps)))
+        busy = {}
+        try:
+            while pending or busy:
+                for worker_idx in range(self.num_workers):
+                    if not pending:
+                        break
+                    if worker_idx in busy:
+                        continue
+                    idx = pending.popleft()
+                    self._workers[worker_idx][1].send((idx, method, test_exps[idx], tar_exps[idx]))
+                    busy[worker_idx] = (idx, time.monotonic() + self.task_timeout)
+
+                conn2worker = {self._workers[worker_idx][1]: worker_idx for worker_idx in busy}
+                next_deadline = min(deadline for _, deadline in busy.values())
+                ready = wait(list(conn2worker.keys()), timeout=max(0., next_deadline - time.monotonic()))
+                for conn in ready:
+                    worker_idx = conn2worker[conn]
+                    idx, _ = busy.pop(worker_idx)
+                    try:
+                        _, result, target_table_update = conn.recv()
+                        self.evaluator._merge_target_table_update(target_table_update)
+                    except (EOFError, OSError):
+                        # the worker died (e.g. out of memory) while verifying this sample.
+                        result = (False, False, test_exps[idx], tar_exps[idx])
+                        unverified.add(idx)
+                        self._kill_worker(worker_idx)
+                        self._start_worker(worker_idx)
+                    results[idx] = result
+
+                now = time.monotonic()
+                for worker_idx, (idx, deadline) in list(busy.items()):
+                    if deadline <= now:
+                        busy.pop(worker_idx)
+                        results[idx] = (False, False, test_exps[idx], tar_exps[idx])
+                        unverified.add(idx)
+                        self._kill_worker(worker_idx)
+                        self._start_worker(worker_idx)
+        except BaseException:
+            # workers may still hold tasks of this call, don't let them answer the next one.
+            self.close()
+            raise
+        return results, unverified
+
+    def close(self):
+        r"""stop all worker processes.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        for worker_idx, worker in enumerate(self._workers):
+            if worker is None:
+                continue
+            process, conn = worker
+            try:
+                conn.send(None)
+            except (EOFError, OSError):
+                pass
+            process.join(1)
+            if process.is_alive():
+                self._kill_worker(worker_idx)
+            else:
+                conn.close()
+                self._workers[worker_idx] = None
@@ -9,11 +9,6 @@ import sys
 from functools import partial
 from logging import getLogger
 
-import ray
-from ray import tune
-from ray.tune import CLIReporter
-from ray.tune.schedulers import ASHAScheduler, AsyncHyperBandScheduler
-
 from mwptoolkit.config.configuration import Config
 from mwptoolkit.evaluate.evaluator import AbstractEvaluator, InfixEvaluator, PostfixEvaluator, PrefixEvaluator, MultiWayTreeEvaluator
 from mwptoolkit.evaluate.evaluator import MultiEncDecEvaluator
@@ -21,9 +16,14 @@ from mwptoolkit.data.utils import create_dataset, create_dataloader
 from mwptoolkit.utils.utils import get_model, init_seed, get_trainer, read_json_data, write_json_data
 from mwptoolkit.utils.enum_type import SpecialTokens, FixType
 from mwptoolkit.utils.logger import init_logger
+from mwptoolkit.utils.lazy_import import LazyModule
+from mwptoolkit.utils.search_scheduler import SearchScheduler
 
 from mwptoolkit.quick_start import run_toolkit
 
+ray = LazyModule('ray')
+tune = LazyModule('ray.tune')
+
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), ".")))
 
 def train_process(search_parameter,configs):
@@ -64,6 +64,7 @@ def hyper_search_process(model_name, dataset_name, task_type, search_parameter,
     logger.info(configs)
     ray.init(num_gpus=configs['gpu_nums'])
 
+    from ray.tune.schedulers import AsyncHyperBandScheduler
     scheduler = AsyncHyperBandScheduler(
         metric="accuracy",
         mode="max")
@@ -78,19 +79,60 @@ def hyper_search_process(model_name, dataset_name, task_type, search_parameter,
     best_config=result.get_best_config(metric="accuracy", mode="max")
 
     logger.info("best config:{}".format(best_config))
-    
+
+    _save_best_config(configs, best_config)
+
     config_dict.update(best_config)
+    run_toolkit(model_name,dataset_name,task_type,config_dict)
 
+
+def _save_best_config(configs, best_config):
+    logger = getLogger()
     model_config_path = configs["model_config_file"]
     if not os.path.isabs(model_config_path):
         model_config_path = os.path.join(os.getcwd(),model_config_path)
     model_config=read_json_data(model_config_path)
 
     model_config.update(best_config)
-    best_config_path = configs["best_config_path"]
+    best_config_path = configs["best_config_file"]
     if not os.path.isabs(best_config_path):
         best_config_path = os.path.join(os.getcwd(),best_config_path)
+    if not os.path.exists(os.path.dirname(best_config_path)):
+        os.makedirs(os.path.dirname(best_config_path), exist_ok=True)
     write_json_data(model_config,best_config_path)
     logger.info("best config saved at {}".format(best_config_path))
 
+
+def local_hyper_search_process(model_name, dataset_name, task_type, space_dict, config_dict={}):
+    r"""hyper-parameter search on local worker processes, see mwptoolkit.utils.search_scheduler.SearchScheduler.
+
+    Args:
+        space_dict (dict): search space, as returned by mwptoolkit.utils.search_scheduler.parse_search_parameter.
+    """
+    configs = Config(model_name, dataset_name, task_type, config_dict)
+
+    init_seed(configs['random_seed'], True)
+
+    init_logger(configs)
+    logger = getLogger()
+
+    logger.info(configs)
+    scheduler = SearchScheduler(configs, space_dict)
+    results = scheduler.run()
+    for result in sorted(results, key=lambda x: -1 if x["accuracy"] is None else x["accuracy"], reverse=True):
+        logger.info("trial %3d | %-8s | accuracy %s | %s" % (
+            result["trial_id"], result["status"],
+            "-" if result["accuracy"] is None else "%2.3f" % result["accuracy"], result["parameters"]))
+    write_json_data(results, os.path.join(scheduler.search_dir, 'search_result.json'))
+
+    best_result = scheduler.best_result()
+    if best_result is None:
+        logger.error("no trial reported an accuracy, see the logs of the trials.")
+        return
+    best_config = best_result["parameters"]
+    logger.info("best config:{}".format(best_config))
+
+    _save_best_config(configs, best_config)
+
+    config_dict.update(best_config)
     run_toolkit(model_name,dataset_name,task_type,config_dict)
@@ -0,0 +1,463 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/20 10:12:45
+# @File: inference_server.py
+"""Serve a trained model to concurrent clients.
+
+The directory written by :meth:`AbstractTrainer._save_model` (model.pth, config.json and the
+dataset vocabulary) is loaded once. Raw problem texts go through the same number transfer as the
+dataset, requests arriving together are grouped into micro-batches of similar length, and each
+micro-batch is decoded by a single call of ``model.predict``.
+
+usage:
+    python -m mwptoolkit.inference_server --trained_model_dir trained_model/GTS-math23k --mode http --port 8080
+    curl -d '{"text": "..."}' localhost:8080/predict
+    curl localhost:8080/stats
+
+    python -m mwptoolkit.inference_server --trained_model_dir trained_model/GTS-math23k --mode stdin < problems.txt
+"""
+
+import argparse
+import copy
+import inspect
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+
+import numpy as np
+import torch
+
+from mwptoolkit.config.configuration import Config
+from mwptoolkit.data.utils import get_dataset_module, get_dataloader_module
+from mwptoolkit.evaluate.expression_program import compile_infix, compile_postfix, compile_prefix, run_program
+from mwptoolkit.utils.enum_type import DatasetName, FixType, TaskType
+from mwptoolkit.utils.preprocess_tool.number_transfer import number_transfer
+from mwptoolkit.utils.preprocess_tool.sentence_operator import get_deprel_tree_by_parser, get_group_nums_by_parser
+from mwptoolkit.utils.utils import copy_list, get_model
+
+_COMPILERS = {FixType.Prefix: compile_prefix, FixType.Postfix: compile_postfix, FixType.Infix: compile_infix}
+
+
+def raw_problem(dataset_name, task_type, text):
+    r"""wrap a question text into a record of the raw format of `dataset_name`.
+
+    The equation is a placeholder, number transfer needs one and the dataloader drops it.
+    """
+    if dataset_name == DatasetName.math23k:
+        return {"segmented_text": text, "equation": "x=1"}
+    if dataset_name in [DatasetName.asdiv_a]:
+        return {"Body": text, "Question": "", "Formula": "1=1"}
+    if dataset_name in [DatasetName.SVAMP]:
+        return {"Body": text, "Question": "", "Equation": "1"}
+    if dataset_name == DatasetName.mawps_single:
+        return {"sQuestion": text, "lEquations": ["x=1"]}
+    if dataset_name in [DatasetName.mawps, DatasetName.alg514, DatasetName.draw, DatasetName.hmwp]:
+        return {"original_text": text, "equation": "x=1"}
+    if task_type == TaskType.MultiEquation:
+        return {"original_text": text, "equation": "x=1"}
+    return {"question": text, "equation": "1"}
+
+
+class InferenceModel(object):
+    r"""a trained model with its vocabulary and dataloader, ready to predict raw problems.
+    """
+    def __init__(self, trained_model_dir, device=None):
+        """
+        Args:
+            trained_model_dir (str): directory written by AbstractTrainer._save_model.
+
+            device (torch.device|None): device of the model, the saved config decides if None.
+        """
+        super().__init__()
+        self.config = Config.load_from_pretrained(trained_model_dir)
+        if device is not None:
+            self.config['device'] = device
+            self.config['map_location'] = device.type
+
+        self.dataset = get_dataset_module(self.config).load_from_pretrained(trained_model_dir)
+        # only the vocabulary is needed, no batch of the dataset splits is built.
+        self.dataset.trainset = []
+        self.dataset.validset = []
+        self.dataset.testset = []
+        self.dataloader = get_dataloader_module(self.config)(self.config, self.dataset)
+
+        self.model = get_model(self.config["model"])(self.config, self.dataset).to(self.config["device"])
+        state_dict = torch.load(os.path.join(trained_model_dir, 'model.pth'), map_location=self.config["map_location"])
+        self.model.load_state_dict(state_dict["model"], strict=False)
+        self.model.eval()
+
+        if not hasattr(self.model, 'convert_idx2symbol'):
+            raise NotImplementedError("model {} can not be served.".format(self.config["model"]))
+        self._convert_per_sample = 'num_stack' in inspect.signature(self.model.convert_idx2symbol).parameters
+        self._parser = None
+        if self.config["task_type"] == TaskType.SingleEquation:
+            equation_fix = self.config["equation_fix"] if self.config["equation_fix"] else FixType.Infix
+            self._compile = _COMPILERS.get(equation_fix)
+        else:
+            self._compile = None
+
+    def preprocess(self, problem):
+        r"""number transfer of one problem.
+
+        Args:
+            problem (str|dict): question text, or a record in the raw format of the dataset.
+
+        Returns:
+            dict: the preprocessed problem.
+
+        Raises:
+            ValueError: the problem can not be preprocessed.
+        """
+        if isinstance(problem, str):
+            problem = raw_problem(self.config["dataset"], self.config["task_type"], problem)
+        elif isinstance(problem, dict):
+            problem = copy.deepcopy(problem)
+        else:
+            raise ValueError("a problem is a question text or a raw record, got {}.".format(type(problem).__name__))
+        problem.setdefault("id", "temp")
+        try:
+            datas, _, _, _ = number_transfer([problem], self.config["dataset"], self.config["task_type"],
+                                             self.dataset.mask_symbol, 0, self.dataset.linear, ";",
+                                             self.config["vocab_level"] if self.config["vocab_level"] else 'word')
+        except (KeyError, IndexError, TypeError, AttributeError, ValueError) as e:
+            raise ValueError("can not preprocess the problem: {!r}".format(e)) from e
+        if not datas:
+            raise ValueError("can not preprocess the problem.")
+        return datas[0]
+
+    def _graph_preprocess(self, datas):
+        model_name = self.config["model"].lower()
+        if model_name not in ['graph2tree', 'graph2treeibm']:
+            return datas
+        if self._parser is None:
+            self._parser = self.dataset._build_dependency_parser(self.config["device"] == torch.device('cuda'))
+        if model_name == 'graph2tree':
+            _, _, datas = get_group_nums_by_parser([], [], datas, self._parser)
+        else:
+            _, _, datas, _ = get_deprel_tree_by_parser([], [], datas, self._parser)
+        return datas
+
+    def predict_batch(self, datas):
+        r"""predict a batch of preprocessed problems.
+
+        Returns:
+            list: one dict per problem, with the predicted equation, the number list and the answer
+            of single equations, None if it can not be computed.
+        """
+        datas = self._graph_preprocess([copy.deepcopy(data) for data in datas])
+        for idx, data in enumerate(datas):
+            data['id'] = 'temp_{}'.format(idx)
+        batch = self.dataloader.build_batch_for_predict(datas)
+        with torch.no_grad():
+            _, symbol_outputs, _ = self.model.predict(batch)
+        num_list = batch["num list"]
+        if self._convert_per_sample:
+            equations = []
+            for b in range(len(num_list)):
+                output = self.model.convert_idx2symbol(symbol_outputs[b], num_list[b], copy_list(batch["num stack"][b]))
+                equations.append(output[0] if output is not None else [])
+        else:
+            equations = self.model.convert_idx2symbol(symbol_outputs, num_list)
+        results = []
+        for equation, numbers in zip(equations, num_list):
+            equation = [str(symbol) for symbol in equation]
+            ans = run_program(self._compile(equation)) if self._compile is not None and equation else None
+            results.append({"equation": equation, "number list": [str(n) for n in numbers], "ans": ans})
+        return results
+
+
+class LatencyStats(object):
+    r"""latency percentiles and throughput of the served requests.
+    """
+    def __init__(self, window=10000):
+        """
+        Args:
+            window (int): number of most recent requests the percentiles are computed on.
+        """
+        super().__init__()
+        self.start_time = time.perf_counter()
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self._batched = 0
+
+    def add_batch(self, latencies, errors=0):
+        with self._lock:
+            self._latencies.extend(latencies)
+            self.requests += len(latencies)
+            self.errors += errors
+            self.batches += 1
+            self._batched += len(latencies)
+
+    def add_rejected(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            self.requests += 1
+            self.errors += 1
+
+    def summary(self):
+        with self._lock:
+            latencies = np.array(self._latencies, dtype=np.float64)
+            elapsed = time.perf_counter() - self.start_time
+            summary = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "batches": self.batches,
+                "mean_batch_size": self._batched / self.batches if self.batches else 0.,
+                "throughput": self.requests / elapsed if elapsed > 0 else 0.,
+                "p50_ms": float(np.percentile(latencies, 50)) * 1e3 if len(latencies) else None,
+                "p99_ms": float(np.percentile(latencies, 99)) * 1e3 if len(latencies) else None,
+            }
+        return summary
+
+
+class MicroBatcher(object):
+    r"""group concurrent requests into micro-batches under a latency budget.
+
+    Requests are preprocessed in the submitting thread and queued. A single worker thread waits
+    until `max_batch_size` requests are queued or the oldest one has waited `max_wait_ms`, sorts
+    the queued requests by question length and predicts them in chunks of `max_batch_size`, so
+    problems of similar length share a batch and little padding is computed.
+    """
+    def __init__(self, inference_model, max_batch_size=32, max_wait_ms=10.):
+        """
+        Args:
+            inference_model (InferenceModel): the served model.
+
+            max_batch_size (int): largest number of problems in a micro-batch.
+
+            max_wait_ms (float): longest time a request waits for others before its batch is run.
+        """
+        super().__init__()
+        self.inference_model = inference_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1e3
+        self.stats = LatencyStats()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, problem):
+        r"""queue a problem.
+
+        Returns:
+            concurrent.futures.Future: the prediction dict of the problem, or the ValueError raised by
+            its preprocessing.
+        """
+        future = Future()
+        arrival = time.perf_counter()
+        try:
+            data = self.inference_model.preprocess(problem)
+        except ValueError as e:
+            future.set_exception(e)
+            self.stats.add_rejected(time.perf_counter() - arrival)
+            return future
+        self._queue.put((arrival, data, future))
+        return future
+
+    def close(self):
+        r"""run the queued requests and stop the worker.
+        """
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        pending = [first]
+        deadline = first[0] + self.max_wait
+        while len(pending) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            pending.append(item)
+        # requests queued while waiting are taken too, they are batched with their peers in length.
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            pending.append(item)
+        return pending
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            if pending is None:
+                return
+            pending.sort(key=lambda item: len(item[1]["question"]))
+            for start in range(0, len(pending), self.max_batch_size):
+                self._run_batch(pending[start:start + self.max_batch_size])
+
+    def _run_batch(self, batch):
+        try:
+            results = self.inference_model.predict_batch([data for _, data, _ in batch])
+        except Exception as e:
+            getLogger().exception("prediction of a batch failed")
+            for _, _, future in batch:
+                future.set_exception(e)
+            now = time.perf_counter()
+            self.stats.add_batch([now - arrival for arrival, _, _ in batch], errors=len(batch))
+            return
+        now = time.perf_counter()
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+        self.stats.add_batch([now - arrival for arrival, _, _ in batch])
+
+
+def _request_problem(request):
+    # {"text": question} or {"problem": raw record}
+    if isinstance(request, dict):
+        return request.get("text", request.get("problem"))
+    return request
+
+
+def _make_handler(batcher, timeout):
+    class PredictHandler(BaseHTTPRequestHandler):
+        def _send(self, code, body):
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._send(200, batcher.stats.summary())
+            else:
+                self._send(404, {"error": "unknown path {}".format(self.path)})
+
+        def do_POST(self):
+            if self.path != '/predict':
+                self._send(404, {"error": "unknown path {}".format(self.path)})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            except ValueError:
+                self._send(400, {"error": "the body is not json."})
+                return
+            batched = isinstance(request, dict) and "problems" in request
+            problems = request["problems"] if batched else [_request_problem(request)]
+            futures = [batcher.submit(problem) for problem in problems]
+            outputs = []
+            for future in futures:
+                try:
+                    outputs.append(future.result(timeout))
+                except ValueError as e:
+                    outputs.append({"error": str(e)})
+                except Exception as e:
+                    self._send(500, {"error": repr(e)})
+                    return
+            self._send(200, {"results": outputs} if batched else outputs[0])
+
+        def log_message(self, format, *args):
+            getLogger().debug(format, *args)
+
+    return PredictHandler
+
+
+def serve_http(batcher, host='127.0.0.1', port=8080, timeout=60.):
+    r"""serve POST /predict and GET /stats until interrupted.
+
+    A /predict body is {"text": question} or {"problem": raw record}, answered with one prediction,
+    or {"problems": [...]}, answered with {"results": [...]}.
+    """
+    server = ThreadingHTTPServer((host, port), _make_handler(batcher, timeout))
+    getLogger().info("serving on http://{}:{}".format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def serve_stdin(batcher, stdin=sys.stdin, stdout=sys.stdout):
+    r"""read one problem per line and write one json prediction per line, in input order.
+
+    A line is a question text or a json object in the format of a /predict body.
+    """
+    futures = queue.Queue()
+
+    def write():
+        while True:
+            future = futures.get()
+            if future is None:
+                return
+            try:
+                output = future.result()
+            except Exception as e:
+                output = {"error": str(e)}
+            stdout.write(json.dumps(output, ensure_ascii=False) + '\n')
+            stdout.flush()
+
+    writer = threading.Thread(target=write, daemon=True)
+    writer.start()
+    for line in stdin:
+        line = line.strip()
+        if not line:
+            continue
+        problem = line
+        if line.startswith('{'):
+            try:
+                problem = _request_problem(json.loads(line))
+            except ValueError:
+                pass
+        futures.put(batcher.submit(problem))
+    futures.put(None)
+    writer.join()
+
+
+def format_stats(summary):
+    return "{} requests ({} errors) in {} batches | mean batch size {:.2f} | throughput {:.2f} req/s | " \
+           "p50 {} ms | p99 {} ms".format(
+        summary["requests"], summary["errors"], summary["batches"], summary["mean_batch_size"], summary["throughput"],
+        "{:.2f}".format(summary["p50_ms"]) if summary["p50_ms"] is not None else '-',
+        "{:.2f}".format(summary["p99_ms"]) if summary["p99_ms"] is not None else '-')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trained_model_dir', type=str, required=True)
+    parser.add_argument('--mode', type=str, default='http', choices=['http', 'stdin'])
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max_batch_size', type=int, default=32)
+    parser.add_argument('--max_wait_ms', type=float, default=10., help='latency budget of a request waiting for its batch')
+    parser.add_argument('--gpu_id', type=str, default=None)
+    args, _ = parser.parse_known_args()
+
+    device = None
+    if args.gpu_id is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = args.gpu_id
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    batcher = MicroBatcher(InferenceModel(args.trained_model_dir, device), args.max_batch_size, args.max_wait_ms)
+    try:
+        if args.mode == 'http':
+            serve_http(batcher, args.host, args.port)
+        else:
+            serve_stdin(batcher)
+    finally:
+        batcher.close()
+        sys.stderr.write(format_stats(batcher.stats.summary()) + '\n')
@@ -1,12 +1,19 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.loss import abstract_loss,binary_cross_entropy_loss,cross_entropy_loss,masked_cross_entropy_loss,mse_loss,nll_loss,smoothed_cross_entropy_loss
 
-from mwptoolkit.loss.abstract_loss import AbstractLoss
-from mwptoolkit.loss.binary_cross_entropy_loss import BinaryCrossEntropyLoss
-from mwptoolkit.loss.cross_entropy_loss import CrossEntropyLoss
-from mwptoolkit.loss.masked_cross_entropy_loss import MaskedCrossEntropyLoss
-from mwptoolkit.loss.mse_loss import MSELoss
-from mwptoolkit.loss.nll_loss import NLLLoss
-from mwptoolkit.loss.smoothed_cross_entropy_loss import SmoothCrossEntropyLoss
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['abstract_loss', 'binary_cross_entropy_loss', 'cross_entropy_loss', 'masked_cross_entropy_loss', 'mse_loss', 'nll_loss', 'smoothed_cross_entropy_loss'],
+    attributes={
+        'abstract_loss': ['AbstractLoss'],
+        'binary_cross_entropy_loss': ['BinaryCrossEntropyLoss'],
+        'cross_entropy_loss': ['CrossEntropyLoss'],
+        'masked_cross_entropy_loss': ['MaskedCrossEntropyLoss'],
+        'mse_loss': ['MSELoss'],
+        'nll_loss': ['NLLLoss'],
+        'smoothed_cross_entropy_loss': ['SmoothCrossEntropyLoss'],
+    }
+)
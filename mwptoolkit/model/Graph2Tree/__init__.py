@@ -1,7 +1,14 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.model.Graph2Tree import graph2tree,multiencdec
 
-from mwptoolkit.model.Graph2Tree.graph2tree import Graph2Tree
-from mwptoolkit.model.Graph2Tree.multiencdec import MultiEncDec
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['graph2tree', 'multiencdec'],
+    attributes={
+        'graph2tree': ['Graph2Tree'],
+        'multiencdec': ['MultiEncDec'],
+    }
+)
@@ -4,7 +4,6 @@
 # @File: graph2tree.py
 
 import copy
-import itertools
 from typing import Tuple, Dict, Any
 
 import torch
@@ -18,10 +17,13 @@ from mwptoolkit.module.Embedder.bert_embedder import BertEmbedder
 from mwptoolkit.module.Decoder.tree_decoder import TreeDecoder
 from mwptoolkit.module.Layer.tree_layers import NodeGenerater, SubTreeMerger, TreeNode, TreeEmbedding
 from mwptoolkit.module.Layer.tree_layers import Prediction, GenerateNode, Merge
-from mwptoolkit.module.Strategy.beam_search import TreeBeam
+from mwptoolkit.module.Layer.number_gather import gather_number_positions
+from mwptoolkit.module.Strategy.beam_search import TreeBeamSearch
+from mwptoolkit.module.Strategy.teacher_forcing import TreeTeacherForcing
 from mwptoolkit.loss.masked_cross_entropy_loss import MaskedCrossEntropyLoss, masked_cross_entropy
 from mwptoolkit.utils.enum_type import SpecialTokens, NumMask
-from mwptoolkit.utils.utils import str2float, copy_list
+from mwptoolkit.utils.utils import copy_list, copy_num_stack
+from mwptoolkit.utils.preprocess_tool.graph_operator import QUANTITY_GRAPH_CHANNELS, quantity_graph_edges, quantity_graph_index
 
 
 class Graph2Tree(nn.Module):
@@ -91,7 +93,7 @@ class Graph2Tree(nn.Module):
         self.loss = MaskedCrossEntropyLoss()
 
     def forward(self, seq, seq_length, nums_stack, num_size, num_pos, num_list, group_nums, target=None,
-                output_all_layers=False) -> Tuple[torch.Tensor, torch.Tensor, Dict[str, Any]]:
+                output_all_layers=False, graph_index=None, tree_schedule=None) -> Tuple[torch.Tensor, torch.Tensor, Dict[str, Any]]:
         """
         :param torch.Tensor seq: input sequence, shape: [batch_size, seq_length].
         :param torch.Tensor seq_length: the length of sequence, shape: [batch_size].
@@ -102,6 +104,8 @@ class Graph2Tree(nn.Module):
         :param list group_nums: group numbers of input sequence, length:[batch_size].
         :param torch.Tensor | None target: target, shape: [batch_size, target_length], default None.
         :param bool output_all_layers: return output of all layers if output_all_layers is True, default False.
+        :param torch.Tensor | None graph_index: COO index of the quantity graphs, shape: [4, edge_num], default None.
+        :param dict | None tree_schedule: schedule of the target trees built by the dataloader, target is decoded step by step if None.
         :return : token_logits:[batch_size, output_length, output_size], symbol_outputs:[batch_size,output_length], model_all_outputs.
         :rtype: tuple(torch.Tensor, torch.Tensor, dict)
 
@@ -116,7 +120,7 @@ class Graph2Tree(nn.Module):
         num_mask = torch.BoolTensor(num_mask).to(self.device)
 
         batch_size = len(seq_length)
-        graph = self.build_graph(seq_length, num_list, num_pos, group_nums)
+        graph = self.build_graph(seq_length, num_list, num_pos, group_nums, graph_index)
 
         seq_emb = self.embedder(seq)
 
@@ -132,7 +136,7 @@ class Graph2Tree(nn.Module):
         token_logits, symbol_outputs, decoder_layer_outputs = self.decoder_forward(encoder_outputs, problem_output,
                                                                                    all_nums_encoder_outputs, nums_stack,
                                                                                    seq_mask, num_mask, target,
-                                                                                   output_all_layers)
+                                                                                   output_all_layers, tree_schedule)
         model_all_outputs = {}
         if output_all_layers:
             model_all_outputs['inputs_embedding'] = seq_emb
@@ -151,18 +155,20 @@ class Graph2Tree(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation', 'equ len',
         'num stack', 'num size', 'num pos', 'num list', 'group nums'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
         target_length = torch.LongTensor(batch_data["equ len"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
         num_list = batch_data['num list']
         group_nums = batch_data['group nums']
 
         token_logits, _, all_layer_outputs = self.forward(seq, seq_length, nums_stack, num_size, num_pos, num_list,
-                                                          group_nums, target, output_all_layers=True)
+                                                          group_nums, target, output_all_layers=True,
+                                                          graph_index=batch_data.get('graph index'),
+                                                          tree_schedule=batch_data.get('tree schedule'))
         target = all_layer_outputs['target']
 
         loss = masked_cross_entropy(token_logits, target, target_length)
@@ -177,19 +183,27 @@ class Graph2Tree(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation',
         'num stack', 'num pos', 'num list', 'num size', 'group nums'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_pos = batch_data["num pos"]
         num_list = batch_data['num list']
         num_size = batch_data['num size']
         group_nums = batch_data['group nums']
 
         _, symbol_outputs, all_layer_outputs = self.forward(seq, seq_length, nums_stack, num_size, num_pos, num_list,
-                                                            group_nums, output_all_layers=True)
-        all_output = self.convert_idx2symbol(symbol_outputs[0], num_list[0], copy_list(nums_stack[0]))
-        targets = self.convert_idx2symbol(target[0], num_list[0], copy_list(nums_stack[0]))
+                                                            group_nums, output_all_layers=True,
+                                                            graph_index=batch_data.get('graph index'))
+        output_lengths = all_layer_outputs['output_lengths']
+        target_lengths = batch_data['equ len']
+        all_output = []
+        targets = []
+        for b in range(len(num_list)):
+            output = self.convert_idx2symbol(symbol_outputs[b][:output_lengths[b]], num_list[b], copy_list(nums_stack[b]))
+            tar = self.convert_idx2symbol(target[b][:target_lengths[b]], num_list[b], copy_list(nums_stack[b]))
+            all_output.append(output[0] if output is not None else [])
+            targets.append(tar[0] if tar is not None else [])
         return all_output, targets
 
     def predict(self,batch_data:dict,output_all_layers=False):
@@ -200,16 +214,17 @@ class Graph2Tree(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_pos = batch_data["num pos"]
         num_list = batch_data['num list']
         num_size = batch_data['num_size']
         group_nums = batch_data['group nums']
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq, seq_length, nums_stack, num_size, num_pos,
                                                                        num_list, group_nums,
-                                                                       output_all_layers=output_all_layers)
+                                                                       output_all_layers=output_all_layers,
+                                                                       graph_index=batch_data.get('graph index'))
         return token_logits, symbol_outputs, model_all_outputs
 
     def encoder_forward(self, seq_emb, input_length, graph, output_all_layers=False):
@@ -222,7 +237,7 @@ class Graph2Tree(nn.Module):
         return problem_output, encoder_outputs, all_layer_outputs
 
     def decoder_forward(self, encoder_outputs, problem_output, all_nums_encoder_outputs, nums_stack, seq_mask, num_mask,
-                        target=None, output_all_layers=False):
+                        target=None, output_all_layers=False, tree_schedule=None):
         batch_size = encoder_outputs.size(1)
         node_stacks = [[TreeNode(_)] for _ in problem_output.split(1, dim=0)]
         padding_hidden = torch.FloatTensor([0.0 for _ in range(self.hidden_size)]).unsqueeze(0).to(self.device)
@@ -230,7 +245,12 @@ class Graph2Tree(nn.Module):
         left_childs = [None for _ in range(batch_size)]
         token_logits = []
         outputs = []
-        if target is not None:
+        output_lengths = None
+        teacher_forcing = TreeTeacherForcing(self.decoder, self.node_generater, self.merge, self.num_start)
+        if teacher_forcing.fits(tree_schedule, target, all_nums_encoder_outputs):
+            token_logits, outputs, _ = teacher_forcing.decode(encoder_outputs, problem_output, all_nums_encoder_outputs,
+                                                              seq_mask, num_mask, target, tree_schedule)
+        elif target is not None:
             target = target.transpose(0, 1)
             max_target_length = target.size(0)
             for t in range(max_target_length):
@@ -281,117 +301,26 @@ class Graph2Tree(nn.Module):
                     else:
                         left_childs.append(None)
             target = target.transpose(0, 1)
+            token_logits = torch.stack(token_logits, dim=1)  # B x S x N
+            outputs = torch.stack(outputs, dim=1)  # B x S
         else:
-            beams = [TreeBeam(0.0, node_stacks, embeddings_stacks, left_childs, [], [])]
-            max_gen_len = self.max_out_len
-            for t in range(max_gen_len):
-                current_beams = []
-                while len(beams) > 0:
-                    b = beams.pop()
-                    if len(b.node_stack[0]) == 0:
-                        current_beams.append(b)
-                        continue
-                    left_childs = b.left_childs
-
-                    num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.decoder(
-                        b.node_stack,
-                        left_childs,
-                        encoder_outputs,
-                        all_nums_encoder_outputs,
-                        padding_hidden,
-                        seq_mask,
-                        num_mask)
-                    token_logit = torch.cat((op_score, num_score), 1)
-
-                    out_score = nn.functional.log_softmax(token_logit, dim=1)
-
-                    # out_score = p_leaf * out_score
-
-                    topv, topi = out_score.topk(self.beam_size)
-
-                    for tv, ti in zip(topv.split(1, dim=1), topi.split(1, dim=1)):
-                        current_node_stack = copy_list(b.node_stack)
-                        current_left_childs = []
-                        current_embeddings_stacks = copy_list(b.embedding_stack)
-                        current_out = [tl for tl in b.out]
-                        current_token_logit = [tl for tl in b.token_logit]
-
-                        current_token_logit.append(token_logit)
-
-                        out_token = int(ti)
-                        current_out.append(torch.squeeze(ti, dim=1))
-
-                        node = current_node_stack[0].pop()
-
-                        if out_token < self.num_start:
-                            generate_input = torch.LongTensor([out_token])
-                            if self.USE_CUDA:
-                                generate_input = generate_input.cuda()
-                            left_child, right_child, node_label = self.node_generater(current_embeddings,
-                                                                                      generate_input,
-                                                                                      current_context)
-
-                            current_node_stack[0].append(TreeNode(right_child))
-                            current_node_stack[0].append(TreeNode(left_child, left_flag=True))
-
-                            current_embeddings_stacks[0].append(TreeEmbedding(node_label[0].unsqueeze(0), False))
-                        else:
-                            current_num = current_nums_embeddings[0, out_token - self.num_start].unsqueeze(0)
-
-                            while len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                                sub_stree = current_embeddings_stacks[0].pop()
-                                op = current_embeddings_stacks[0].pop()
-                                current_num = self.merge(op.embedding, sub_stree.embedding, current_num)
-                            current_embeddings_stacks[0].append(TreeEmbedding(current_num, True))
-                        if len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                            current_left_childs.append(current_embeddings_stacks[0][-1].embedding)
-                        else:
-                            current_left_childs.append(None)
-                        current_beams.append(
-                            TreeBeam(b.score + float(tv), current_node_stack, current_embeddings_stacks,
-                                     current_left_childs, current_out, current_token_logit))
-                beams = sorted(current_beams, key=lambda x: x.score, reverse=True)
-                beams = beams[:self.beam_size]
-                flag = True
-                for b in beams:
-                    if len(b.node_stack[0]) != 0:
-                        flag = False
-                if flag:
-                    break
-            token_logits = beams[0].token_logit
-            outputs = beams[0].out
-        token_logits = torch.stack(token_logits, dim=1)  # B x S x N
-        outputs = torch.stack(outputs, dim=1)  # B x S
+            beam_search = TreeBeamSearch(self.decoder, self.node_generater, self.merge, self.num_start, self.beam_size,
+                                         self.max_out_len)
+            token_logits, outputs, output_lengths, scores = beam_search.search(encoder_outputs, problem_output,
+                                                                               all_nums_encoder_outputs,
+                                                                               seq_mask, num_mask)
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs['token_logits'] = token_logits
             all_layer_outputs['outputs'] = outputs
             all_layer_outputs['target'] = target
+            all_layer_outputs['output_lengths'] = output_lengths
         return token_logits, outputs, all_layer_outputs
 
     def get_all_number_encoder_outputs(self, encoder_outputs, num_pos, batch_size, num_size, hidden_size):
-        indices = list()
-        sen_len = encoder_outputs.size(0)
-        masked_index = []
-        temp_1 = [1 for _ in range(hidden_size)]
-        temp_0 = [0 for _ in range(hidden_size)]
-        for b in range(batch_size):
-            for i in num_pos[b]:
-                indices.append(i + b * sen_len)
-                masked_index.append(temp_0)
-            indices += [0 for _ in range(len(num_pos[b]), num_size)]
-            masked_index += [temp_1 for _ in range(len(num_pos[b]), num_size)]
-        indices = torch.LongTensor(indices)
-        masked_index = torch.BoolTensor(masked_index)
-        masked_index = masked_index.view(batch_size, num_size, hidden_size)
-        if self.USE_CUDA:
-            indices = indices.cuda()
-            masked_index = masked_index.cuda()
-        all_outputs = encoder_outputs.transpose(0, 1).contiguous()
-        all_embedding = all_outputs.view(-1, encoder_outputs.size(2))  # S x B x H -> (B x S) x H
-        all_num = all_embedding.index_select(0, indices)
-        all_num = all_num.view(batch_size, num_size, hidden_size)
-        return all_num.masked_fill_(masked_index, 0.0)
+        # S x B x H -> B x S x H
+        all_num, _ = gather_number_positions(encoder_outputs.transpose(0, 1), num_pos, num_size)
+        return all_num
 
     def generate_tree_input(self, target, decoder_output, nums_stack_batch, num_start, unk):
         # when the decoder input is copied num but the num has two pos, chose the max
@@ -408,52 +337,21 @@ class Graph2Tree(nn.Module):
                 target_input[i] = 0
         return torch.LongTensor(target), torch.LongTensor(target_input)
 
-    def build_graph(self, seq_length, num_list, num_pos, group_nums):
-        max_len = seq_length.max()
-        batch_size = len(seq_length)
-        batch_graph = []
-        for b_i in range(batch_size):
-            x = torch.zeros((max_len, max_len))
-            for idx in range(seq_length[b_i]):
-                x[idx, idx] = 1
-            quantity_cell_graph = torch.clone(x)
-            graph_greater = torch.clone(x)
-            graph_lower = torch.clone(x)
-            graph_quanbet = torch.clone(x)
-            graph_attbet = torch.clone(x)
-            for idx, n_pos in enumerate(num_pos[b_i]):
-                for pos in group_nums[b_i][idx]:
-                    quantity_cell_graph[n_pos, pos] = 1
-                    quantity_cell_graph[pos, n_pos] = 1
-                    graph_quanbet[n_pos, pos] = 1
-                    graph_quanbet[pos, n_pos] = 1
-                    graph_attbet[n_pos, pos] = 1
-                    graph_attbet[pos, n_pos] = 1
-            for idx_i in range(len(num_pos[b_i])):
-                for idx_j in range(len(num_pos[b_i])):
-                    num_i = str2float(num_list[b_i][idx_i])
-                    num_j = str2float(num_list[b_i][idx_j])
-                    if num_i > num_j:
-                        graph_greater[num_pos[b_i][idx_i]][num_pos[b_i][idx_j]] = 1
-                        graph_lower[num_pos[b_i][idx_j]][num_pos[b_i][idx_i]] = 1
-                    else:
-                        graph_greater[num_pos[b_i][idx_j]][num_pos[b_i][idx_i]] = 1
-                        graph_lower[num_pos[b_i][idx_i]][num_pos[b_i][idx_j]] = 1
-            group_num_ = itertools.chain.from_iterable(group_nums[b_i])
-            combn = itertools.permutations(group_num_, 2)
-            for idx in combn:
-                graph_quanbet[idx] = 1
-                graph_quanbet[idx] = 1
-                graph_attbet[idx] = 1
-                graph_attbet[idx] = 1
-            quantity_cell_graph = quantity_cell_graph.to(self.device)
-            graph_greater = graph_greater.to(self.device)
-            graph_lower = graph_lower.to(self.device)
-            graph_quanbet = graph_quanbet.to(self.device)
-            graph_attbet = graph_attbet.to(self.device)
-            graph = torch.stack([quantity_cell_graph, graph_greater, graph_lower, graph_quanbet, graph_attbet], dim=0)
-            batch_graph.append(graph)
-        batch_graph = torch.stack(batch_graph)
+    def build_graph(self, seq_length, num_list, num_pos, group_nums, graph_index=None):
+        """dense quantity graphs of a batch, shape [batch_size, 5, seq_length, seq_length].
+
+        :param torch.Tensor graph_index: COO index of the edges built in preprocessing, shape [4, edge_num],
+            built from num_list, num_pos and group_nums if None.
+        """
+        if graph_index is None:
+            graphs = [quantity_graph_edges(num_pos[b_i], num_list[b_i], group_nums[b_i]) for b_i in range(len(num_pos))]
+            graph_index = quantity_graph_index(graphs)
+        max_len = int(seq_length.max())
+        seq_length = seq_length.to(self.device)
+        self_loop = (torch.arange(max_len, device=self.device).unsqueeze(0) < seq_length.unsqueeze(1)).float()
+        batch_graph = torch.diag_embed(self_loop).unsqueeze(1).repeat(1, QUANTITY_GRAPH_CHANNELS, 1, 1)
+        graph_index = graph_index.to(self.device)
+        batch_graph[graph_index[0], graph_index[1], graph_index[2], graph_index[3]] = 1.
         return batch_graph
 
     def convert_idx2symbol(self, output, num_list, num_stack):
@@ -184,39 +184,13 @@ class Graph2TreeIBM(nn.Module):
         return outputs
     
     def build_graph(self, group_nums, seq_length):
-        max_length = seq_length.max()
+        max_length = int(seq_length.max())
         batch_size = len(seq_length)
         max_degree=6
-        fw_adj_info_batch=[]
-        bw_adj_info_batch=[]
-        slide=0
-        for b_i in range(batch_size):
-            x=torch.zeros((max_length,max_degree)).long()
-            fw_adj_info = torch.clone(x)
-            bw_adj_info = torch.clone(x)
-            fw_idx=torch.zeros(max_length).long()
-            bw_idx=torch.zeros(max_length).long()
-            for idx in group_nums[b_i]:
-                if fw_idx[idx[0]] < max_degree:
-                    fw_adj_info[idx[0], fw_idx[idx[0]]] = idx[1]+slide
-                    fw_idx[idx[0]]+=1
-                if bw_idx[idx[1]] < max_degree:
-                    bw_adj_info[idx[1], bw_idx[idx[1]]] = idx[0]+slide
-                    bw_idx[idx[1]]+=1
-            for row_idx,col_idx in enumerate(fw_idx):
-                for idx_slide in range(max_degree-col_idx):
-                    fw_adj_info[row_idx,col_idx+idx_slide]=max_length-1+slide
-            for row_idx,col_idx in enumerate(bw_idx):
-                for idx_slide in range(max_degree-col_idx):
-                    bw_adj_info[row_idx,col_idx+idx_slide]=max_length-1+slide
-            #fw_adj_info+=slide
-            #bw_adj_info+=slide
-
-            fw_adj_info_batch.append(fw_adj_info)
-            bw_adj_info_batch.append(bw_adj_info)
-            slide+=max_length
-        fw_adj_info_batch=torch.cat(fw_adj_info_batch,dim=0)
-        bw_adj_info_batch=torch.cat(bw_adj_info_batch,dim=0)
+        edges = [[b_i, edge[0], edge[1]] for b_i in range(batch_size) for edge in group_nums[b_i]]
+        edges = torch.tensor(edges, dtype=torch.long).view(-1, 3)
+        fw_adj_info_batch = self._adjacency_list(edges[:, 0], edges[:, 1], edges[:, 2], batch_size, max_length, max_degree)
+        bw_adj_info_batch = self._adjacency_list(edges[:, 0], edges[:, 2], edges[:, 1], batch_size, max_length, max_degree)
         nodes_batch=torch.arange(0,fw_adj_info_batch.size(0)).view(batch_size,max_length)
         # for b_i in range(batch_size):
         #     x = torch.zeros((max_length, max_length))
@@ -239,6 +213,26 @@ class Graph2TreeIBM(nn.Module):
 
         return fw_adj_info_batch, bw_adj_info_batch,nodes_batch
 
+    def _adjacency_list(self, batch_idx, heads, tails, batch_size, max_length, max_degree):
+        """neighbours of every node of the batch, the first `max_degree` edges of a node in edge order,
+        padded with the last node of its sample. shape [batch_size * max_length, max_degree].
+        """
+        # a negative head indexes from the end of its sample, as a list index does.
+        heads = torch.where(heads < 0, heads + max_length, heads)
+        edge_num = heads.size(0)
+        node = batch_idx * max_length + heads
+        # sort by node, keeping the edge order of each node.
+        order = torch.argsort(node * edge_num + torch.arange(edge_num))
+        node = node[order]
+        _, degree = torch.unique_consecutive(node, return_counts=True)
+        first_edge = torch.cumsum(degree, dim=0) - degree
+        slot = torch.arange(edge_num) - torch.repeat_interleave(first_edge, degree)
+        keep = slot < max_degree
+        slide = torch.arange(batch_size).view(-1, 1, 1) * max_length
+        adj_info = (max_length - 1 + slide).repeat(1, max_length, max_degree)
+        adj_info.view(-1, max_degree)[node[keep], slot[keep]] = (tails + batch_idx * max_length)[order][keep]
+        return adj_info.view(-1, max_degree)
+
     def get_dec_batch(self, dec_tree_batch, batch_size):
         queue_tree = {}
         for i in range(1, batch_size + 1):
@@ -17,11 +17,12 @@ from mwptoolkit.module.Decoder.tree_decoder import TreeDecoder
 from mwptoolkit.module.Layer.layers import TreeAttnDecoderRNN
 from mwptoolkit.module.Layer.tree_layers import NodeGenerater, SubTreeMerger, TreeNode, TreeEmbedding
 from mwptoolkit.module.Layer.tree_layers import Prediction, GenerateNode, Merge
+from mwptoolkit.module.Layer.number_gather import gather_number_positions
 from mwptoolkit.module.Embedder.basic_embedder import BasicEmbedder
 from mwptoolkit.module.Strategy.beam_search import TreeBeam, Beam
 from mwptoolkit.loss.masked_cross_entropy_loss import MaskedCrossEntropyLoss, masked_cross_entropy
 from mwptoolkit.utils.enum_type import SpecialTokens, NumMask
-from mwptoolkit.utils.utils import copy_list
+from mwptoolkit.utils.utils import copy_list, copy_num_stack
 
 
 class MultiEncDec(nn.Module):
@@ -182,14 +183,14 @@ class MultiEncDec(nn.Module):
         'input1 len', 'parse graph', 'num stack', 'output1 len', 'output2 len',
         'num size', 'num pos', 'num order'
         """
-        input1_var = torch.tensor(batch_data['input1']).to(self.device)
-        input2_var = torch.tensor(batch_data['input2']).to(self.device)
-        target1 = torch.tensor(batch_data['output1']).to(self.device)
-        target2 = torch.tensor(batch_data['output2']).to(self.device)
+        input1_var = torch.as_tensor(batch_data['input1']).to(self.device)
+        input2_var = torch.as_tensor(batch_data['input2']).to(self.device)
+        target1 = torch.as_tensor(batch_data['output1']).to(self.device, copy=True)
+        target2 = torch.as_tensor(batch_data['output2']).to(self.device, copy=True)
         input_length = torch.tensor(batch_data['input1 len'])
-        parse_graph = torch.tensor(batch_data['parse graph']).to(self.device)
+        parse_graph = torch.as_tensor(batch_data['parse graph']).to(self.device)
 
-        num_stack_batch = copy.deepcopy(batch_data['num stack'])
+        num_stack_batch = copy_num_stack(batch_data['num stack'])
         target1_length = torch.LongTensor(batch_data['output1 len']).to(self.device)
         target2_length = torch.LongTensor(batch_data['output2 len']).to(self.device)
         num_size_batch = batch_data['num size']
@@ -222,14 +223,14 @@ class MultiEncDec(nn.Module):
         batch_data should include keywords 'input1', 'input2', 'output1', 'output2',
         'input1 len', 'parse graph', 'num stack', 'num pos', 'num order', 'num list'
         """
-        input1_var = torch.tensor(batch_data['input1']).to(self.device)
-        input2_var = torch.tensor(batch_data['input2']).to(self.device)
-        target1 = torch.tensor(batch_data['output1']).to(self.device)
-        target2 = torch.tensor(batch_data['output2']).to(self.device)
+        input1_var = torch.as_tensor(batch_data['input1']).to(self.device)
+        input2_var = torch.as_tensor(batch_data['input2']).to(self.device)
+        target1 = torch.as_tensor(batch_data['output1']).to(self.device, copy=True)
+        target2 = torch.as_tensor(batch_data['output2']).to(self.device, copy=True)
         input_length = torch.tensor(batch_data['input1 len'])
-        parse_graph = torch.tensor(batch_data['parse graph']).to(self.device)
+        parse_graph = torch.as_tensor(batch_data['parse graph']).to(self.device)
 
-        num_stack_batch = copy.deepcopy(batch_data['num stack'])
+        num_stack_batch = copy_num_stack(batch_data['num stack'])
 
         num_size_batch = batch_data['num size']
         num_pos_batch = batch_data['num pos']
@@ -259,12 +260,12 @@ class MultiEncDec(nn.Module):
             return result_type, output2, targets2
 
     def predict(self,batch_data,output_all_layers=False):
-        input1_var = torch.tensor(batch_data['input1']).to(self.device)
-        input2_var = torch.tensor(batch_data['input2']).to(self.device)
+        input1_var = torch.as_tensor(batch_data['input1']).to(self.device)
+        input2_var = torch.as_tensor(batch_data['input2']).to(self.device)
         input_length = torch.tensor(batch_data['input1 len'])
-        parse_graph = torch.tensor(batch_data['parse graph']).to(self.device)
+        parse_graph = torch.as_tensor(batch_data['parse graph']).to(self.device)
 
-        num_stack_batch = copy.deepcopy(batch_data['num stack'])
+        num_stack_batch = copy_num_stack(batch_data['num stack'])
         num_size_batch = batch_data['num size']
         num_pos_batch = batch_data['num pos']
         num_order_batch = batch_data['num order']
@@ -292,28 +293,9 @@ class MultiEncDec(nn.Module):
         return torch.LongTensor(target), torch.LongTensor(target_input)
 
     def get_all_number_encoder_outputs(self, encoder_outputs, num_pos, batch_size, num_size, hidden_size):
-        indices = list()
-        sen_len = encoder_outputs.size(0)
-        masked_index = []
-        temp_1 = [1 for _ in range(hidden_size)]
-        temp_0 = [0 for _ in range(hidden_size)]
-        for b in range(batch_size):
-            for i in num_pos[b]:
-                indices.append(i + b * sen_len)
-                masked_index.append(temp_0)
-            indices += [0 for _ in range(len(num_pos[b]), num_size)]
-            masked_index += [temp_1 for _ in range(len(num_pos[b]), num_size)]
-        indices = torch.LongTensor(indices)
-        masked_index = torch.ByteTensor(masked_index)
-        masked_index = masked_index.view(batch_size, num_size, hidden_size)
-        if self.USE_CUDA:
-            indices = indices.cuda()
-            masked_index = masked_index.cuda()
-        all_outputs = encoder_outputs.transpose(0, 1).contiguous()
-        all_embedding = all_outputs.view(-1, encoder_outputs.size(2))  # S x B x H -> (B x S) x H
-        all_num = all_embedding.index_select(0, indices)
-        all_num = all_num.view(batch_size, num_size, hidden_size)
-        return all_num.masked_fill_(masked_index.bool(), 0.0), masked_index
+        # S x B x H -> B x S x H
+        all_num, pad_mask = gather_number_positions(encoder_outputs.transpose(0, 1), num_pos, num_size)
+        return all_num, pad_mask.unsqueeze(-1).expand(batch_size, num_size, hidden_size)
 
     def generate_decoder_input(self, target, decoder_output, nums_stack_batch, num_start, unk):
         # when the decoder input is copied num but the num has two pos, chose the max
@@ -2,8 +2,14 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-from mwptoolkit.model.PreTrain import bertgen,gpt2,robertagen
+from mwptoolkit.utils.lazy_import import attach
 
-from mwptoolkit.model.PreTrain.bertgen import BERTGen
-from mwptoolkit.model.PreTrain.gpt2 import GPT2
-from mwptoolkit.model.PreTrain.robertagen import RobertaGen
\ No newline at end of file
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['bertgen', 'gpt2', 'robertagen'],
+    attributes={
+        'bertgen': ['BERTGen'],
+        'gpt2': ['GPT2'],
+        'robertagen': ['RobertaGen'],
+    }
+)
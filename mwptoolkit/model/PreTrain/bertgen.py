@@ -114,8 +114,8 @@ class BERTGen(nn.Module):
             float: loss value.
         """
         seq, target = batch_data["question"], batch_data["equation"]
-        seq = torch.LongTensor(seq).to(self.device)
-        target = torch.LongTensor(target).to(self.device)
+        seq = torch.as_tensor(seq).to(self.device)
+        target = torch.as_tensor(target).to(self.device)
 
         token_logits, _, _ = self.forward(seq, target)
         token_logits = token_logits.view(-1, token_logits.size(-1))
@@ -141,8 +141,8 @@ class BERTGen(nn.Module):
         num_list = batch_data['num list']
         target = batch_data['equation']
 
-        seq = torch.LongTensor(seq).to(self.device)
-        target = torch.LongTensor(target).to(self.device)
+        seq = torch.as_tensor(seq).to(self.device)
+        target = torch.as_tensor(target).to(self.device)
         _, outputs, _ = self.forward(seq)
 
         outputs = self.decode_(outputs)
@@ -159,7 +159,7 @@ class BERTGen(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq,output_all_layers=output_all_layers)
         return token_logits, symbol_outputs, model_all_outputs
 
@@ -1,14 +1,21 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.model.Seq2Seq import dns,ept,groupatt,lstm,mathen,rnnencdec,saligned,transformer,rnnvae
 
-from mwptoolkit.model.Seq2Seq.dns import DNS
-from mwptoolkit.model.Seq2Seq.ept import EPT
-from mwptoolkit.model.Seq2Seq.groupatt import GroupATT
-from mwptoolkit.model.Seq2Seq.lstm import LSTM
-from mwptoolkit.model.Seq2Seq.mathen import MathEN
-from mwptoolkit.model.Seq2Seq.rnnencdec import RNNEncDec
-from mwptoolkit.model.Seq2Seq.rnnvae import RNNVAE
-from mwptoolkit.model.Seq2Seq.saligned import Saligned
-from mwptoolkit.model.Seq2Seq.transformer import Transformer
\ No newline at end of file
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['dns', 'ept', 'groupatt', 'lstm', 'mathen', 'rnnencdec', 'saligned', 'transformer', 'rnnvae'],
+    attributes={
+        'dns': ['DNS'],
+        'ept': ['EPT'],
+        'groupatt': ['GroupATT'],
+        'lstm': ['LSTM'],
+        'mathen': ['MathEN'],
+        'rnnencdec': ['RNNEncDec'],
+        'rnnvae': ['RNNVAE'],
+        'saligned': ['Saligned'],
+        'transformer': ['Transformer'],
+    }
+)
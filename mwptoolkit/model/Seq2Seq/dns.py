@@ -14,6 +14,7 @@ from torch.nn import functional as F
 from mwptoolkit.module.Encoder.rnn_encoder import BasicRNNEncoder
 from mwptoolkit.module.Decoder.rnn_decoder import BasicRNNDecoder, AttentionalRNNDecoder
 from mwptoolkit.module.Embedder.basic_embedder import BasicEmbedder
+from mwptoolkit.module.Strategy.grammar_constraint import ExpressionGrammarMask
 from mwptoolkit.loss.nll_loss import NLLLoss
 from mwptoolkit.utils.enum_type import NumMask, SpecialTokens
 
@@ -85,6 +86,7 @@ class DNS(nn.Module):
 
         self.dropout = nn.Dropout(self.dropout_ratio)
         self.generate_linear = nn.Linear(self.hidden_size, self.symbol_size)
+        self.grammar_mask = ExpressionGrammarMask(self.out_idx2symbol, self.num_start)
 
         weight = torch.ones(self.symbol_size).to(self.device)
         pad = self.out_pad_token
@@ -130,9 +132,9 @@ class DNS(nn.Module):
 
         batch_data should include keywords 'question', 'ques len' and 'equation'
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
 
         token_logits, _, _ = self.forward(seq, seq_length, target)
         if self.share_vocab:
@@ -153,10 +155,10 @@ class DNS(nn.Module):
 
         batch_data should include keywords 'question', 'ques len', 'equation' and 'num list'.
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
         num_list = batch_data['num list']
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
 
         _, symbol_outputs, _ = self.forward(seq, seq_length)
         if self.share_vocab:
@@ -172,7 +174,7 @@ class DNS(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq,seq_length,output_all_layers=output_all_layers)
         return token_logits, symbol_outputs, model_all_outputs
@@ -212,7 +214,7 @@ class DNS(nn.Module):
         decoder_outputs = []
         token_logits = []
         outputs = []
-        output = []
+        output = self.grammar_mask.init_state(decoder_inputs.size(0), decoder_inputs.device)
         for idx in range(seq_len):
             if target is not None and with_t < self.teacher_force_ratio:
                 decoder_input = decoder_inputs[:, idx, :].unsqueeze(1)
@@ -261,147 +263,15 @@ class DNS(nn.Module):
         decoded_output = torch.tensor(decoded_output).to(device).view(batch_size, -1)
         return output
 
-    def rule1_filter(self):
-        r"""if r_t−1 in {+, −, ∗, /}, then rt will not in {+, −, ∗, /,), =}.
-        """
-        filters = []
-        filters.append(self.out_symbol2idx['+'])
-        filters.append(self.out_symbol2idx['-'])
-        filters.append(self.out_symbol2idx['*'])
-        filters.append(self.out_symbol2idx['/'])
-        filters.append(self.out_symbol2idx['^'])
-        try:
-            filters.append(self.out_symbol2idx[')'])
-        except:
-            pass
-        try:
-            filters.append(self.out_symbol2idx['='])
-        except:
-            pass
-        filters.append(self.out_symbol2idx['<EOS>'])
-        return torch.tensor(filters).long()
-
-    def rule2_filter(self):
-        r"""if r_t-1 is a number, then r_t will not be a number and not in {(, =)}.
-        """
-        filters = []
-        try:
-            filters.append(self.out_symbol2idx['('])
-        except:
-            pass
-        # try:
-        #     filters.append(self.out_symbol2idx['='])
-        # except:
-        #     pass
-        for idx in range(self.num_start, len(self.out_idx2symbol)):
-            filters.append(idx)
-        return torch.tensor(filters).long()
-
-    def rule3_filter(self):
-        r"""if rt−1 is '=', then rt will not in {+, −, ∗, /, =,)}.
-        """
-        filters = []
-        filters.append(self.out_symbol2idx['+'])
-        filters.append(self.out_symbol2idx['-'])
-        filters.append(self.out_symbol2idx['*'])
-        filters.append(self.out_symbol2idx['/'])
-        filters.append(self.out_symbol2idx['^'])
-        try:
-            filters.append(self.out_symbol2idx['='])
-        except:
-            pass
-        try:
-            filters.append(self.out_symbol2idx[')'])
-        except:
-            pass
-        return torch.tensor(filters).long()
-
-    def rule4_filter(self):
-        r"""if r_t-1 is '(' , then r_t will not in {(,), +, -, *, /, =}).
-        """
-        filters = []
-        # try:
-        #     filters.append(self.out_symbol2idx['('])
-        # except:
-        #     pass
-        try:
-            filters.append(self.out_symbol2idx[')'])
-        except:
-            pass
-        try:
-            filters.append(self.out_symbol2idx['='])
-        except:
-            pass
-        filters.append(self.out_symbol2idx['+'])
-        filters.append(self.out_symbol2idx['-'])
-        filters.append(self.out_symbol2idx['*'])
-        filters.append(self.out_symbol2idx['/'])
-        filters.append(self.out_symbol2idx['^'])
-        filters.append(self.out_symbol2idx['<EOS>'])
-        return torch.tensor(filters).long()
-
-    def rule5_filter(self):
-        r"""if r_t−1 is ')', then r_t will not be a number and not in {(,)};
-        """
-        filters = []
-        try:
-            filters.append(self.out_symbol2idx['('])
-        except:
-            pass
-        # try:
-        #     filters.append(self.out_symbol2idx[')'])
-        # except:
-        #     pass
-        for idx in range(self.num_start, len(self.out_idx2symbol)):
-            filters.append(idx)
-        return torch.tensor(filters).long()
-
-    def filter_op(self):
-        filters = []
-        filters.append(self.out_symbol2idx['+'])
-        filters.append(self.out_symbol2idx['-'])
-        filters.append(self.out_symbol2idx['*'])
-        filters.append(self.out_symbol2idx['/'])
-        filters.append(self.out_symbol2idx['^'])
-        return torch.tensor(filters).long()
-
-    def filter_END(self):
-        filters = []
-        filters.append(self.out_symbol2idx['<EOS>'])
-        return torch.tensor(filters).long()
-
     def rule_filter_(self, symbols, token_logit):
         """
         Args:
-            symbols (torch.Tensor): [batch_size]
+            symbols (torch.Tensor): symbols of the previous step or the start state of the grammar, [batch_size, 1]
             token_logit (torch.Tensor): [batch_size, symbol_size]
         return:
-            symbols of next step (torch.Tensor): [batch_size]
+            symbols of next step (torch.Tensor): [batch_size, 1]
         """
-        device = token_logit.device
-        next_symbols = []
-        current_logit = token_logit.clone().detach()
-        if symbols == []:
-            filters = torch.cat([self.filter_op(), self.filter_END()])
-            for b in range(current_logit.size(0)):
-                current_logit[b][filters] = -float('inf')
-        else:
-            for b, symbol in enumerate(symbols.split(1)):
-                if self.out_idx2symbol[symbol] in ['+', '-', '*', '/', '^']:
-                    filters = self.rule1_filter()
-                    current_logit[b][filters] = -float('inf')
-                elif symbol >= self.num_start:
-                    filters = self.rule2_filter()
-                    current_logit[b][filters] = -float('inf')
-                elif self.out_idx2symbol[symbol] in ['=']:
-                    filters = self.rule3_filter()
-                    current_logit[b][filters] = -float('inf')
-                elif self.out_idx2symbol[symbol] in ['(']:
-                    filters = self.rule4_filter()
-                    current_logit[b][filters] = -float('inf')
-                elif self.out_idx2symbol[symbol] in [')']:
-                    filters = self.rule5_filter()
-                    current_logit[b][filters] = -float('inf')
+        current_logit = self.grammar_mask(token_logit.detach(), symbols)
         next_symbols = current_logit.topk(1, dim=1)[1]
         return next_symbols
 
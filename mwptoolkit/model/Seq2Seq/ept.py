@@ -13,6 +13,7 @@ from mwptoolkit.module.Decoder.ept_decoder import VanillaOpTransformer, Expressi
 from mwptoolkit.module.Embedder.position_embedder import PositionEmbedder
 from mwptoolkit.module.Embedder.basic_embedder import BasicEmbedder
 from mwptoolkit.module.Attention.self_attention import SelfAttentionMask
+from mwptoolkit.module.Layer.number_gather import gather_number_spans
 from mwptoolkit.module.Strategy.beam_search import Beam_Search_Hypothesis
 from mwptoolkit.module.Strategy.sampling import topk_sampling
 from mwptoolkit.module.Strategy.greedy import greedy_search
@@ -237,26 +238,9 @@ class EPT(nn.Module):
         """
         # Compute the maximum number of indicated positions in the text
         max_len = max(mask.max().item(), max_len)
-        batch_size, seq_len, hidden_size = hidden.shape
 
-        # Storage for gathering hidden states
-        gathered = torch.zeros(batch_size, max_len, hidden_size, dtype=hidden.dtype, device=hidden.device)
-        pad_mask = torch.ones(batch_size, max_len, dtype=torch.bool, device=hidden.device)
-
-        # Average hidden states for tokens representing a number
-        for row in range(batch_size):
-            for i in range(max_len):
-                indices = (mask[row] == i).nonzero().view(-1).tolist()
-
-                if len(indices) > 0:
-                    begin = min(indices)
-                    end = max(indices) + 1
-
-                    # Copy masked positions. Take mean of number vectors.
-                    gathered[row, i] = hidden[row, begin:end].mean(dim=0)
-                    pad_mask[row, i] = False
-
-        return gathered, pad_mask
+        # Average hidden states for tokens representing a number, for all rows and numbers at once.
+        return gather_number_spans(hidden, mask, max_len)
 
     def shift_target(self, target: torch.Tensor, fill_value=-1) -> torch.Tensor:
         """
@@ -141,10 +141,10 @@ class MathEN(nn.Module):
 
         batch_data should include keywords 'question', 'ques len', 'equation', 'ques mask'.
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
-        target = torch.tensor(batch_data['equation']).to(self.device)
-        seq_mask = torch.BoolTensor(batch_data["ques mask"]).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
+        seq_mask = torch.as_tensor(batch_data["ques mask"], dtype=torch.bool).to(self.device)
 
         token_logits, _, _ = self.forward(seq, seq_length, seq_mask, target)
         if self.share_vocab:
@@ -163,11 +163,11 @@ class MathEN(nn.Module):
 
         batch_data should include keywords 'question', 'ques len', 'equation', 'num list', 'ques mask'.
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
         num_list = batch_data['num list']
-        seq_mask = torch.BoolTensor(batch_data["ques mask"]).to(self.device)
+        seq_mask = torch.as_tensor(batch_data["ques mask"], dtype=torch.bool).to(self.device)
 
         _, symbol_outputs, _ = self.forward(seq, seq_length, seq_mask)
         if self.share_vocab:
@@ -184,7 +184,7 @@ class MathEN(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq,seq_length,output_all_layers=output_all_layers)
         return token_logits, symbol_outputs, model_all_outputs
@@ -13,6 +13,7 @@ from torch.nn import functional as F
 from mwptoolkit.module.Encoder.rnn_encoder import BasicRNNEncoder
 from mwptoolkit.module.Decoder.rnn_decoder import BasicRNNDecoder, AttentionalRNNDecoder
 from mwptoolkit.module.Embedder.basic_embedder import BasicEmbedder
+from mwptoolkit.module.Strategy.grammar_constraint import ExpressionGrammarMask
 from mwptoolkit.module.Embedder.roberta_embedder import RobertaEmbedder
 from mwptoolkit.loss.nll_loss import NLLLoss
 from mwptoolkit.utils.enum_type import NumMask, SpecialTokens
@@ -84,6 +85,11 @@ class RNNEncDec(nn.Module):
         self.dropout = nn.Dropout(self.dropout_ratio)
         self.generate_linear = nn.Linear(self.hidden_size, self.symbol_size)
 
+        if config["grammar_constrained_decoding"]:
+            self.grammar_mask = ExpressionGrammarMask(self.out_idx2symbol, dataset.num_start)
+        else:
+            self.grammar_mask = None
+
         weight = torch.ones(self.symbol_size).to(config["device"])
         pad = self.out_pad_token
         self.loss = NLLLoss(weight, pad)
@@ -126,9 +132,9 @@ class RNNEncDec(nn.Module):
 
         batch_data should include keywords 'question', 'ques len', 'equation'.
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
 
         token_logits, _, _ = self.forward(seq, seq_length, target)
         if self.share_vocab:
@@ -147,9 +153,9 @@ class RNNEncDec(nn.Module):
 
         batch_data should include keywords 'question', 'ques len', 'equation' and 'num list'.
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
         num_list = batch_data['num list']
 
         _, symbol_outputs, _ = self.forward(seq, seq_length)
@@ -167,7 +173,7 @@ class RNNEncDec(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq,seq_length,output_all_layers=output_all_layers)
         return token_logits, symbol_outputs, model_all_outputs
@@ -285,6 +291,10 @@ class RNNEncDec(nn.Module):
             decoder_outputs = []
             token_logits = []
             outputs = []
+            # valid expression decoding, only at inference.
+            constrained = self.grammar_mask is not None and target is None
+            if constrained:
+                prev_symbols = self.grammar_mask.init_state(decoder_input.size(0), decoder_input.device)
             for idx in range(seq_len):
                 if self.attention:
                     decoder_output, decoder_hidden = self.decoder(decoder_input, decoder_hidden, encoder_outputs)
@@ -292,7 +302,11 @@ class RNNEncDec(nn.Module):
                     decoder_output, decoder_hidden = self.decoder(decoder_input, decoder_hidden)
                 step_output = decoder_output.squeeze(1)
                 token_logit = self.generate_linear(step_output)
-                output = token_logit.topk(1, dim=-1)[1]
+                if constrained:
+                    output = self.grammar_mask(token_logit, prev_symbols).topk(1, dim=-1)[1]
+                    prev_symbols = output
+                else:
+                    output = token_logit.topk(1, dim=-1)[1]
                 decoder_outputs.append(step_output)
                 token_logits.append(token_logit)
                 outputs.append(output)
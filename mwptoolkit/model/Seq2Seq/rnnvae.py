@@ -146,9 +146,9 @@ class RNNVAE(nn.Module):
 
         batch_data should include keywords 'question', 'ques len', 'equation'.
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
 
         token_logits, _, _ = self.forward(seq, seq_length, target)
         if self.share_vocab:
@@ -167,9 +167,9 @@ class RNNVAE(nn.Module):
 
         batch_data should include keywords 'question', 'ques len', 'equation' and 'num list'.
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
         num_list = batch_data['num list']
 
         _, symbol_outputs, _ = self.forward(seq, seq_length)
@@ -187,7 +187,7 @@ class RNNVAE(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         seq_length = torch.tensor(batch_data['ques len']).long()
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq,seq_length,output_all_layers=output_all_layers)
         return token_logits, symbol_outputs, model_all_outputs
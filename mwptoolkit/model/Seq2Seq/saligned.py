@@ -13,7 +13,7 @@ from torch import nn
 from mwptoolkit.module.Embedder.basic_embedder import BasicEmbedder
 from mwptoolkit.module.Encoder.rnn_encoder import SalignedEncoder
 from mwptoolkit.module.Decoder.rnn_decoder import SalignedDecoder
-from mwptoolkit.module.Environment.stack_machine import OPERATIONS, StackMachine
+from mwptoolkit.module.Environment.stack_machine import OPERATIONS, BatchStackMachine
 from mwptoolkit.utils.enum_type import SpecialTokens, NumMask, Operators
 
 
@@ -121,8 +121,9 @@ class Saligned(nn.Module):
                                                                                                             constant_indices,
                                                                                                             output_all_layers)
 
-        stacks = [StackMachine(self.operations, constants[b] + self.fix_constants, number_emb[b], bottom, dry_run=True)
-                  for b in range(batch_size)]
+        # a stack grows by one operand per decoding step at most
+        max_depth = int(max(target_length)) if target is not None else self.max_gen_len
+        stacks = BatchStackMachine(self.operations, number_emb, bottom, max_depth)
 
         if target is not None:
             operands_len = torch.LongTensor(self.N_OPS + np.array(num_len)).to(self._device)
@@ -152,8 +153,8 @@ class Saligned(nn.Module):
         'num pos', 'num list', 'num size'.
         """
 
-        text = torch.tensor(batch_data["question"]).to(self.device)
-        ops = torch.tensor(batch_data["equation"]).to(self.device)
+        text = torch.as_tensor(batch_data["question"]).to(self.device)
+        ops = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
         text_len = torch.tensor(batch_data["ques len"]).long()
         ops_len = torch.tensor(batch_data["equ len"]).long()
         constant_indices = batch_data["num pos"]
@@ -187,12 +188,12 @@ class Saligned(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation', 'equ len',
         'num pos', 'num list', 'num size'.
         """
-        text = torch.tensor(batch_data['question']).to(self.device)
+        text = torch.as_tensor(batch_data['question']).to(self.device)
         text_len = torch.tensor(batch_data['ques len']).long()
         constant_indices = batch_data["num pos"]
         constants = batch_data["num list"]
         num_len = batch_data["num size"]
-        target = torch.tensor(batch_data['equation'])
+        target = torch.as_tensor(batch_data['equation']).clone()
 
         _, outputs, _ = self.forward(text,text_len,constants,constant_indices,num_len)
         predicts = self.convert_idx2symbol(outputs, constants)
@@ -208,7 +209,7 @@ class Saligned(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_len = torch.tensor(batch_data["ques len"]).long()
         num_pos = batch_data["num pos"]
         num_list = batch_data["num list"]
@@ -260,40 +261,23 @@ class Saligned(nn.Module):
                 op_targets.append(op_target)
                 _, pred_op = torch.log(torch.nn.functional.softmax(op_logit, -1)).max(-1)
                 _, pred_arg = torch.log(torch.nn.functional.softmax(arg_logit, -1)).max(-1)
-                for b in range(batch_size):
-                    if pred_op[b] == self.N_OPS:
-                        pred_op[b] += pred_arg[b]
+                pred_op = torch.where(pred_op == self.N_OPS, pred_op + pred_arg, pred_op)
                 outputs.append(pred_op)
 
         else:
-            finished = [False] * batch_size
             for t in range(self.max_gen_len):
                 op_logit, arg_logit, prev_output, prev_state = self.decoder(encoder_outputs, inputs_length, operands,
                                                                              stacks, prev_op, prev_output, prev_state,
                                                                              number_emb, self.N_OPS)
 
-                n_finished = 0
-                for b in range(batch_size):
-                    if len(stacks[b].stack_log_index) and stacks[b].stack_log_index[-1] == self.EQL:
-                        finished[b] = True
-
-                    if finished[b]:
-                        op_logit[b, self.PAD] = math.inf
-                        n_finished += 1
-
-                    # if stacks[b].get_height() < 2:
-                    #     op_logit[b, self.ADD] = -math.inf
-                    #     op_logit[b, self.SUB] = -math.inf
-                    #     op_logit[b, self.MUL] = -math.inf
-                    #     op_logit[b, self.DIV] = -math.inf
-                    #     op_logit[b, self.POWER] = -math.inf
+                # problems which applied <EOS> only pad
+                finished = stacks.finished
+                op_logit[:, self.PAD] = op_logit[:, self.PAD].masked_fill(finished, math.inf)
+                n_finished = int(finished.sum())
 
                 op_loss, prev_op = torch.log(torch.nn.functional.softmax(op_logit, -1)).max(-1)
                 arg_loss, prev_arg = torch.log(torch.nn.functional.softmax(arg_logit, -1)).max(-1)
-
-                for b in range(batch_size):
-                    if prev_op[b] == self.N_OPS:
-                        prev_op[b] += prev_arg[b]
+                prev_op = torch.where(prev_op == self.N_OPS, prev_op + prev_arg, prev_op)
 
                 if n_finished == batch_size:
                     break
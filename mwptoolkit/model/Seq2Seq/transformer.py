@@ -17,6 +17,7 @@ from mwptoolkit.module.Attention.self_attention import SelfAttentionMask
 from mwptoolkit.module.Strategy.beam_search import Beam_Search_Hypothesis
 from mwptoolkit.module.Strategy.sampling import topk_sampling
 from mwptoolkit.module.Strategy.greedy import greedy_search
+from mwptoolkit.module.Strategy.grammar_constraint import ExpressionGrammarMask
 from mwptoolkit.loss.nll_loss import NLLLoss
 from mwptoolkit.utils.enum_type import NumMask, SpecialTokens
 from mwptoolkit.module.Decoder.rnn_decoder import BasicRNNDecoder, AttentionalRNNDecoder
@@ -82,6 +83,11 @@ class Transformer(nn.Module):
         self.generate_linear = nn.Linear(128, self.symbol_size)
         self.out = nn.Linear(config["embedding_size"], self.symbol_size)
 
+        if config["grammar_constrained_decoding"]:
+            self.grammar_mask = ExpressionGrammarMask(self.out_idx2symbol, dataset.num_start)
+        else:
+            self.grammar_mask = None
+
         weight = torch.ones(self.symbol_size).to(config["device"])
         pad = self.out_pad_token
         self.loss = NLLLoss(weight, pad)
@@ -128,8 +134,8 @@ class Transformer(nn.Module):
 
         batch_data should include keywords 'question', 'equation'.
         """
-        src = torch.tensor(batch_data['question']).to(self.device)
-        target = torch.tensor(batch_data['equation']).to(self.device)
+        src = torch.as_tensor(batch_data['question']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
         token_logits, _, _ = self.forward(src, target)
         if self.share_vocab:
             target = self.convert_in_idx_2_out_idx(target)
@@ -147,8 +153,8 @@ class Transformer(nn.Module):
 
         batch_data should include keywords 'question', 'equation' and 'num list'.
         """
-        src = batch_data['question']
-        target = batch_data['equation']
+        src = torch.as_tensor(batch_data['question']).to(self.device)
+        target = torch.as_tensor(batch_data['equation']).to(self.device)
         num_list = batch_data['num list']
 
         _, symbol_outputs, _ = self.forward(src)
@@ -166,7 +172,7 @@ class Transformer(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data['question']).to(self.device)
+        seq = torch.as_tensor(batch_data['question']).to(self.device)
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq,output_all_layers=output_all_layers)
         return token_logits, symbol_outputs, model_all_outputs
 
@@ -200,26 +206,38 @@ class Transformer(nn.Module):
         else:
             token_logits = []
             outputs = []
+            all_decoder_outputs = []
             seq_len = target.size(1) if target is not None else self.max_output_len
             input_seq = torch.LongTensor([self.out_sos_token] * batch_size).view(batch_size, -1).to(device)
-            pre_tokens = [input_seq]
+            # incremental decoding, only the newest token is fed at each step,
+            # keys and values of the previous tokens are kept in the cache.
+            cache = self.decoder.init_cache()
+            # valid expression decoding, only at inference.
+            constrained = self.grammar_mask is not None and target is None
+            if constrained:
+                prev_symbols = self.grammar_mask.init_state(batch_size, device)
             for idx in range(seq_len):
-                self_attn_mask = self.self_attentioner(input_seq.size(-1)).bool()
-                decoder_input = self.out_embedder(input_seq) + self.pos_embedder(input_seq).to(device)
-                decoder_outputs = self.decoder(decoder_input, self_attn_mask=self_attn_mask,
+                decoder_input = self.out_embedder(input_seq) + self.pos_embedder(input_seq, offset=idx).to(device)
+                decoder_outputs = self.decoder(decoder_input,
                                                external_states=encoder_outputs,
-                                               external_padding_mask=seq_mask)
+                                               external_padding_mask=seq_mask,
+                                               cache=cache)
+                all_decoder_outputs.append(decoder_outputs)
 
                 token_logit = self.out(decoder_outputs[:, -1, :].unsqueeze(1))
                 token_logits.append(token_logit)
                 # output=greedy_search(token_logit)
-                output = torch.topk(token_logit.squeeze(), 1, dim=-1)[1]
+                if constrained:
+                    output = self.grammar_mask(token_logit.view(batch_size, -1), prev_symbols).topk(1, dim=-1)[1]
+                    prev_symbols = output
+                else:
+                    output = torch.topk(token_logit.squeeze(), 1, dim=-1)[1]
                 outputs.append(output)
                 if self.share_vocab:
-                    pre_tokens.append(self.convert_out_idx_2_in_idx(output))
+                    input_seq = self.convert_out_idx_2_in_idx(output.view(batch_size, -1))
                 else:
-                    pre_tokens.append(output)
-                input_seq = torch.cat(pre_tokens, dim=1)
+                    input_seq = output.view(batch_size, -1)
+            decoder_outputs = torch.cat(all_decoder_outputs, dim=1)
             token_logits = torch.cat(token_logits, dim=1)
             outputs = torch.stack(outputs,dim=1)
         all_layer_outputs = {}
@@ -1,11 +1,18 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.model.Seq2Tree import gts,sausolver,treelstm,trnn,tsn,berttd
 
-from mwptoolkit.model.Seq2Tree.gts import GTS
-from mwptoolkit.model.Seq2Tree.sausolver import SAUSolver
-from mwptoolkit.model.Seq2Tree.treelstm import TreeLSTM
-from mwptoolkit.model.Seq2Tree.trnn import TRNN
-from mwptoolkit.model.Seq2Tree.tsn import TSN
-from mwptoolkit.model.Seq2Tree.berttd import BertTD
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['gts', 'sausolver', 'treelstm', 'trnn', 'tsn', 'berttd'],
+    attributes={
+        'gts': ['GTS'],
+        'sausolver': ['SAUSolver'],
+        'treelstm': ['TreeLSTM'],
+        'trnn': ['TRNN'],
+        'tsn': ['TSN'],
+        'berttd': ['BertTD'],
+    }
+)
@@ -3,9 +3,10 @@ from typing import Dict, Any, Tuple
 
 from mwptoolkit.module.Encoder.transformer_encoder import BertEncoder
 from mwptoolkit.module.Layer.tree_layers import *
-from mwptoolkit.module.Strategy.beam_search import TreeBeam
+from mwptoolkit.module.Layer.number_gather import gather_number_positions
+from mwptoolkit.module.Strategy.beam_search import TreeBeamSearch
 from mwptoolkit.loss.masked_cross_entropy_loss import MaskedCrossEntropyLoss, masked_cross_entropy
-from mwptoolkit.utils.utils import copy_list
+from mwptoolkit.utils.utils import copy_list, copy_num_stack
 from mwptoolkit.utils.enum_type import NumMask, SpecialTokens
 
 
@@ -130,11 +131,11 @@ class BertTD(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation', 'equ len',
         'num stack', 'num size', 'num pos'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
         target_length = torch.tensor(batch_data["equ len"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
 
@@ -154,18 +155,26 @@ class BertTD(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation',
         'num stack', 'num pos', 'num list'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_pos = batch_data["num pos"]
         num_list = batch_data['num list']
         num_size = batch_data['num size']
 
-        _, outputs, _ = self.forward(seq, seq_length, nums_stack, num_size, num_pos)
-
-        all_output = self.convert_idx2symbol(outputs[0], num_list[0], copy_list(nums_stack[0]))
-        targets = self.convert_idx2symbol(target[0], num_list[0], copy_list(nums_stack[0]))
+        _, outputs, all_layer_outputs = self.forward(seq, seq_length, nums_stack, num_size, num_pos,
+                                                     output_all_layers=True)
+
+        output_lengths = all_layer_outputs['output_lengths']
+        target_lengths = batch_data['equ len']
+        all_output = []
+        targets = []
+        for b in range(len(num_list)):
+            output = self.convert_idx2symbol(outputs[b][:output_lengths[b]], num_list[b], copy_list(nums_stack[b]))
+            tar = self.convert_idx2symbol(target[b][:target_lengths[b]], num_list[b], copy_list(nums_stack[b]))
+            all_output.append(output[0] if output is not None else [])
+            targets.append(tar[0] if tar is not None else [])
         return all_output, targets
 
     def predict(self, batch_data: dict, output_all_layers=False):
@@ -176,9 +185,9 @@ class BertTD(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq, seq_length, nums_stack, num_size, num_pos,
@@ -203,6 +212,7 @@ class BertTD(nn.Module):
         left_childs = [None for _ in range(batch_size)]
         token_logits = []
         outputs = []
+        output_lengths = None
         if target is not None:
             target = target.transpose(0, 1)
             max_target_length = target.size(0)
@@ -254,117 +264,26 @@ class BertTD(nn.Module):
                     else:
                         left_childs.append(None)
             target = target.transpose(0, 1)
+            token_logits = torch.stack(token_logits, dim=1)  # B x S x N
+            outputs = torch.stack(outputs, dim=1)  # B x S
         else:
-            beams = [TreeBeam(0.0, node_stacks, embeddings_stacks, left_childs, [], [])]
-            max_gen_len = self.max_out_len
-            for t in range(max_gen_len):
-                current_beams = []
-                while len(beams) > 0:
-                    b = beams.pop()
-                    if len(b.node_stack[0]) == 0:
-                        current_beams.append(b)
-                        continue
-                    left_childs = b.left_childs
-
-                    num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.decoder(
-                        b.node_stack,
-                        left_childs,
-                        encoder_outputs,
-                        all_nums_encoder_outputs,
-                        padding_hidden,
-                        seq_mask,
-                        num_mask)
-                    token_logit = torch.cat((op_score, num_score), 1)
-
-                    out_score = nn.functional.log_softmax(token_logit, dim=1)
-
-                    # out_score = p_leaf * out_score
-
-                    topv, topi = out_score.topk(self.beam_size)
-
-                    for tv, ti in zip(topv.split(1, dim=1), topi.split(1, dim=1)):
-                        current_node_stack = copy_list(b.node_stack)
-                        current_left_childs = []
-                        current_embeddings_stacks = copy_list(b.embedding_stack)
-                        current_out = [tl for tl in b.out]
-                        current_token_logit = [tl for tl in b.token_logit]
-
-                        current_token_logit.append(token_logit)
-
-                        out_token = int(ti)
-                        current_out.append(torch.squeeze(ti, dim=1))
-
-                        node = current_node_stack[0].pop()
-
-                        if out_token < self.num_start:
-                            generate_input = torch.LongTensor([out_token])
-                            if self.USE_CUDA:
-                                generate_input = generate_input.cuda()
-                            left_child, right_child, node_label = self.node_generater(current_embeddings,
-                                                                                      generate_input,
-                                                                                      current_context)
-
-                            current_node_stack[0].append(TreeNode(right_child))
-                            current_node_stack[0].append(TreeNode(left_child, left_flag=True))
-
-                            current_embeddings_stacks[0].append(TreeEmbedding(node_label[0].unsqueeze(0), False))
-                        else:
-                            current_num = current_nums_embeddings[0, out_token - self.num_start].unsqueeze(0)
-
-                            while len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                                sub_stree = current_embeddings_stacks[0].pop()
-                                op = current_embeddings_stacks[0].pop()
-                                current_num = self.merge(op.embedding, sub_stree.embedding, current_num)
-                            current_embeddings_stacks[0].append(TreeEmbedding(current_num, True))
-                        if len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                            current_left_childs.append(current_embeddings_stacks[0][-1].embedding)
-                        else:
-                            current_left_childs.append(None)
-                        current_beams.append(
-                            TreeBeam(b.score + float(tv), current_node_stack, current_embeddings_stacks,
-                                     current_left_childs, current_out, current_token_logit))
-                beams = sorted(current_beams, key=lambda x: x.score, reverse=True)
-                beams = beams[:self.beam_size]
-                flag = True
-                for b in beams:
-                    if len(b.node_stack[0]) != 0:
-                        flag = False
-                if flag:
-                    break
-            token_logits = beams[0].token_logit
-            outputs = beams[0].out
-        token_logits = torch.stack(token_logits, dim=1)  # B x S x N
-        outputs = torch.stack(outputs, dim=1)  # B x S
+            beam_search = TreeBeamSearch(self.decoder, self.node_generater, self.merge, self.num_start, self.beam_size,
+                                         self.max_out_len)
+            token_logits, outputs, output_lengths, scores = beam_search.search(encoder_outputs, problem_output,
+                                                                               all_nums_encoder_outputs,
+                                                                               seq_mask, num_mask)
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs['token_logits'] = token_logits
             all_layer_outputs['outputs'] = outputs
             all_layer_outputs['target'] = target
+            all_layer_outputs['output_lengths'] = output_lengths
         return token_logits, outputs, all_layer_outputs
 
     def get_all_number_encoder_outputs(self, encoder_outputs, num_pos, batch_size, num_size, hidden_size):
-        indices = list()
-        sen_len = encoder_outputs.size(0)
-        masked_index = []
-        temp_1 = [1 for _ in range(hidden_size)]
-        temp_0 = [0 for _ in range(hidden_size)]
-        for b in range(batch_size):
-            for i in num_pos[b]:
-                indices.append(i + b * sen_len)
-                masked_index.append(temp_0)
-            indices += [0 for _ in range(len(num_pos[b]), num_size)]
-            masked_index += [temp_1 for _ in range(len(num_pos[b]), num_size)]
-        indices = torch.LongTensor(indices)
-        masked_index = torch.BoolTensor(masked_index)
-        masked_index = masked_index.view(batch_size, num_size, hidden_size)
-        if self.USE_CUDA:
-            indices = indices.cuda()
-            masked_index = masked_index.cuda()
-        all_outputs = encoder_outputs.transpose(0, 1).contiguous()
-        all_embedding = all_outputs.view(-1, encoder_outputs.size(2))  # S x B x H -> (B x S) x H
-        all_num = all_embedding.index_select(0, indices)
-        all_num = all_num.view(batch_size, num_size, hidden_size)
-        return all_num.masked_fill_(masked_index, 0.0)
+        # S x B x H -> B x S x H
+        all_num, _ = gather_number_positions(encoder_outputs.transpose(0, 1), num_pos, num_size)
+        return all_num
 
     def generate_tree_input(self, target, decoder_output, nums_stack_batch, num_start, unk):
         # when the decoder input is copied num but the num has two pos, chose the max
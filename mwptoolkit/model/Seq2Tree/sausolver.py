@@ -15,10 +15,12 @@ from mwptoolkit.module.Embedder.basic_embedder import BasicEmbedder
 from mwptoolkit.module.Decoder.tree_decoder import SARTreeDecoder
 from mwptoolkit.module.Layer.tree_layers import NodeGenerater, SubTreeMerger, TreeNode, TreeEmbedding
 from mwptoolkit.module.Layer.tree_layers import Prediction, GenerateNode, Merge, SemanticAlignmentModule
-from mwptoolkit.module.Strategy.beam_search import TreeBeam
+from mwptoolkit.module.Layer.number_gather import gather_number_positions
+from mwptoolkit.module.Strategy.beam_search import TreeBeamSearch
+from mwptoolkit.module.Strategy.teacher_forcing import TreeTeacherForcing
 from mwptoolkit.loss.masked_cross_entropy_loss import MaskedCrossEntropyLoss, masked_cross_entropy
 from mwptoolkit.loss.mse_loss import MSELoss
-from mwptoolkit.utils.utils import copy_list
+from mwptoolkit.utils.utils import copy_list, copy_num_stack
 from mwptoolkit.utils.enum_type import NumMask, SpecialTokens
 
 
@@ -141,11 +143,11 @@ class SAUSolver(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation', 'equ len',
         'num stack', 'num size', 'num pos'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
         target_length = torch.LongTensor(batch_data["equ len"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
         generate_nums = self.generate_nums
@@ -153,7 +155,8 @@ class SAUSolver(nn.Module):
         # sequence mask for attention
         unk = self.unk_token
 
-        loss = self.train_tree(seq, seq_length, target, target_length, nums_stack, num_size, generate_nums, num_pos, unk, num_start)
+        loss = self.train_tree(seq, seq_length, target, target_length, nums_stack, num_size, generate_nums, num_pos, unk, num_start,
+                               tree_schedule=batch_data.get("tree schedule"))
         return loss
 
     def model_test(self, batch_data:dict) -> tuple:
@@ -164,10 +167,10 @@ class SAUSolver(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation',
         'num stack', 'num pos', 'num list'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_pos = batch_data["num pos"]
         num_list = batch_data['num list']
         generate_nums = self.generate_nums
@@ -188,16 +191,16 @@ class SAUSolver(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq,seq_length,nums_stack,num_size,num_pos,output_all_layers=output_all_layers)
         return token_logits, symbol_outputs, model_all_outputs
 
     def train_tree(self,input_batch, input_length, target_batch, target_length, nums_stack_batch, num_size_batch, generate_nums, num_pos, unk, num_start, 
-                                                   english=False,var_nums=[], batch_first=False):
+                                                   english=False,var_nums=[], batch_first=False, tree_schedule=None):
         # sequence mask for attention
         seq_mask = []
         max_len = max(input_length)
@@ -253,58 +256,67 @@ class SAUSolver(nn.Module):
         embeddings_stacks = [[] for _ in range(batch_size)]  # B x 1  当前的tree state/ subtree embedding / output
         left_childs = [None for _ in range(batch_size)]  # B x 1
 
-        for t in range(max_target_length):
-            num_score, op, current_embeddings, current_context, current_nums_embeddings = self.decoder(
-                node_stacks, left_childs, encoder_outputs, all_nums_encoder_outputs, padding_hidden, seq_mask, num_mask)
-
-            # all_leafs.append(p_leaf)
-            outputs = torch.cat((op, num_score), 1)
-            all_node_outputs.append(outputs)
-
-            target_t, generate_input = self.generate_tree_input(target[t].tolist(), outputs, nums_stack_batch, num_start,
-                                                           unk)
-            target[t] = target_t
-            if self.USE_CUDA:
-                generate_input = generate_input.cuda()
-            left_child, right_child, node_label = self.node_generater(current_embeddings, generate_input, current_context)
-            left_childs = []
-            for idx, l, r, node_stack, i, o in zip(range(batch_size), left_child.split(1), right_child.split(1),
-                                                   node_stacks, target[t].tolist(), embeddings_stacks):
-                if len(node_stack) != 0:
-                    node = node_stack.pop()
-                else:
-                    left_childs.append(None)
-                    continue
-
-                # 未知数当数字处理，SEP当操作符处理
-                if i < num_start:  # 非数字
-                    node_stack.append(TreeNode(r))
-                    node_stack.append(TreeNode(l, left_flag=True))
-                    o.append(TreeEmbedding(node_label[idx].unsqueeze(0), terminal=False))
-                    # print(o[-1].embedding.size())
-                    # print(encoder_outputs[idx].size())
-                else:  # 数字
-                    current_num = current_nums_embeddings[idx, i - num_start].unsqueeze(0)
-                    while len(o) > 0 and o[-1].terminal:
-                        sub_stree = o.pop()
-                        op = o.pop()
-                        current_num = self.merge(op.embedding, sub_stree.embedding, current_num)  # Subtree embedding
-                        if batch_first:
-                            encoder_mapping, decoder_mapping = self.sa(current_num, encoder_outputs[idx])
-                        else:
-                            temp_encoder_outputs = encoder_outputs.transpose(0, 1)
-                            encoder_mapping, decoder_mapping = self.sa(current_num,temp_encoder_outputs[idx])
-                        all_sa_outputs.append((encoder_mapping, decoder_mapping))
-                    o.append(TreeEmbedding(current_num, terminal=True))
-
-                if len(o) > 0 and o[-1].terminal:
-                    left_childs.append(o[-1].embedding)
-
-                else:
-                    left_childs.append(None)
-
-        # all_leafs = torch.stack(all_leafs, dim=1)  # B x S x 2
-        all_node_outputs = torch.stack(all_node_outputs, dim=1)  # B x S x N
+        teacher_forcing = TreeTeacherForcing(self.decoder, self.node_generater, self.merge, num_start)
+        if not batch_first and teacher_forcing.fits(tree_schedule, target_batch, all_nums_encoder_outputs):
+            # every merged sub tree is aligned with the question, as in the loop below
+            all_node_outputs, _, merged = teacher_forcing.decode(encoder_outputs, problem_output,
+                                                                 all_nums_encoder_outputs, seq_mask, num_mask,
+                                                                 target_batch, tree_schedule)
+            for sub_tree, problem_index in merged:
+                all_sa_outputs.append(self.sa.batch_forward(sub_tree, encoder_outputs.index_select(1, problem_index)))
+        else:
+            for t in range(max_target_length):
+                num_score, op, current_embeddings, current_context, current_nums_embeddings = self.decoder(
+                    node_stacks, left_childs, encoder_outputs, all_nums_encoder_outputs, padding_hidden, seq_mask, num_mask)
+
+                # all_leafs.append(p_leaf)
+                outputs = torch.cat((op, num_score), 1)
+                all_node_outputs.append(outputs)
+
+                target_t, generate_input = self.generate_tree_input(target[t].tolist(), outputs, nums_stack_batch, num_start,
+                                                               unk)
+                target[t] = target_t
+                if self.USE_CUDA:
+                    generate_input = generate_input.cuda()
+                left_child, right_child, node_label = self.node_generater(current_embeddings, generate_input, current_context)
+                left_childs = []
+                for idx, l, r, node_stack, i, o in zip(range(batch_size), left_child.split(1), right_child.split(1),
+                                                       node_stacks, target[t].tolist(), embeddings_stacks):
+                    if len(node_stack) != 0:
+                        node = node_stack.pop()
+                    else:
+                        left_childs.append(None)
+                        continue
+
+                    # 未知数当数字处理，SEP当操作符处理
+                    if i < num_start:  # 非数字
+                        node_stack.append(TreeNode(r))
+                        node_stack.append(TreeNode(l, left_flag=True))
+                        o.append(TreeEmbedding(node_label[idx].unsqueeze(0), terminal=False))
+                        # print(o[-1].embedding.size())
+                        # print(encoder_outputs[idx].size())
+                    else:  # 数字
+                        current_num = current_nums_embeddings[idx, i - num_start].unsqueeze(0)
+                        while len(o) > 0 and o[-1].terminal:
+                            sub_stree = o.pop()
+                            op = o.pop()
+                            current_num = self.merge(op.embedding, sub_stree.embedding, current_num)  # Subtree embedding
+                            if batch_first:
+                                encoder_mapping, decoder_mapping = self.sa(current_num, encoder_outputs[idx])
+                            else:
+                                temp_encoder_outputs = encoder_outputs.transpose(0, 1)
+                                encoder_mapping, decoder_mapping = self.sa(current_num,temp_encoder_outputs[idx])
+                            all_sa_outputs.append((encoder_mapping, decoder_mapping))
+                        o.append(TreeEmbedding(current_num, terminal=True))
+
+                    if len(o) > 0 and o[-1].terminal:
+                        left_childs.append(o[-1].embedding)
+
+                    else:
+                        left_childs.append(None)
+
+            # all_leafs = torch.stack(all_leafs, dim=1)  # B x S x 2
+            all_node_outputs = torch.stack(all_node_outputs, dim=1)  # B x S x N
 
         target = target.transpose(0, 1).contiguous()  # B x S
 
@@ -321,14 +333,7 @@ class SAUSolver(nn.Module):
             pass
             # target_length = torch.LongTensor(target_length)
 
-        semantic_alignment_loss = nn.MSELoss()
-        total_semanti_alognment_loss = 0
-        sa_len = len(all_sa_outputs)
-        for sa_pair in all_sa_outputs:
-            total_semanti_alognment_loss += semantic_alignment_loss(sa_pair[0], sa_pair[1])
-        # print(total_semanti_alognment_loss)
-        total_semanti_alognment_loss = total_semanti_alognment_loss / sa_len
-        # print(total_semanti_alognment_loss)
+        total_semanti_alognment_loss = self.semantic_alignment_loss(all_sa_outputs)
 
         # op_target = target < num_start
         # loss_0 = masked_cross_entropy_without_logit(all_leafs, op_target.long(), target_length)
@@ -343,6 +348,20 @@ class SAUSolver(nn.Module):
         # Update parameters with optimizers
         return loss.item()  # , loss_0.item(), loss_1.item()
 
+    def semantic_alignment_loss(self, all_sa_outputs):
+        """mean squared error of the semantic alignment pairs, averaged over the aligned sub trees.
+
+        :param list all_sa_outputs: (encoder mapping, decoder mapping) pairs, shape [1, sub_tree_num, hidden_size].
+        :return: semantic alignment loss.
+        """
+        semantic_alignment_loss = nn.MSELoss()
+        total_semanti_alognment_loss = 0
+        # a pair holds the alignments of one or, when merged together, more sub trees
+        sa_len = sum(sa_pair[0].size(1) for sa_pair in all_sa_outputs)
+        for sa_pair in all_sa_outputs:
+            total_semanti_alognment_loss += semantic_alignment_loss(sa_pair[0], sa_pair[1]) * sa_pair[0].size(1)
+        return total_semanti_alognment_loss / sa_len
+
     def evaluate_tree(self, input_batch, input_length, generate_nums, num_pos, num_start, beam_size=5, max_length=30):
 
         seq_mask = torch.BoolTensor(1, input_length).fill_(0)
@@ -351,14 +370,11 @@ class SAUSolver(nn.Module):
 
         num_mask = torch.BoolTensor(1, len(num_pos[0]) + len(generate_nums)).fill_(0)
 
-        padding_hidden = torch.FloatTensor([0.0 for _ in range(self.hidden_size)]).unsqueeze(0)
-
         batch_size = 1
 
         if self.USE_CUDA:
             input_var = input_var.cuda()
             seq_mask = seq_mask.cuda()
-            padding_hidden = padding_hidden.cuda()
             num_mask = num_mask.cuda()
         # Run words through encoder
 
@@ -367,88 +383,14 @@ class SAUSolver(nn.Module):
         problem_output = pade_outputs[-1, :, :self.hidden_size] + pade_outputs[0, :, self.hidden_size:]
         encoder_outputs = pade_outputs[:, :, :self.hidden_size] + pade_outputs[:, :, self.hidden_size:]
 
-        # Prepare input and output variables
-        node_stacks = [[TreeNode(_)] for _ in problem_output.split(1, dim=0)]
-
         num_size = len(num_pos[0])
         all_nums_encoder_outputs = self.get_all_number_encoder_outputs(encoder_outputs, num_pos, batch_size, num_size,
                                                                        self.hidden_size)
-        # B x P x N
-        embeddings_stacks = [[] for _ in range(batch_size)]
-        left_childs = [None for _ in range(batch_size)]
-
-        beams = [TreeBeam(0.0, node_stacks, embeddings_stacks, left_childs, [])]
-
-        for t in range(max_length):
-            current_beams = []
-            while len(beams) > 0:
-                b = beams.pop()
-                if len(b.node_stack[0]) == 0:
-                    current_beams.append(b)
-                    continue
-                # left_childs = torch.stack(b.left_childs)
-                left_childs = b.left_childs
-
-                num_score, op, current_embeddings, current_context, current_nums_embeddings = self.decoder(b.node_stack,
-                                                                                                           left_childs,
-                                                                                                           encoder_outputs,
-                                                                                                           all_nums_encoder_outputs,
-                                                                                                           padding_hidden,
-                                                                                                           seq_mask,
-                                                                                                           num_mask)
+        beam_search = TreeBeamSearch(self.decoder, self.node_generater, self.merge, num_start, beam_size, max_length)
+        _, outputs, output_lengths, _ = beam_search.search(encoder_outputs, problem_output, all_nums_encoder_outputs,
+                                                           seq_mask, num_mask)
 
-                out_score = nn.functional.log_softmax(torch.cat((op, num_score), dim=1), dim=1)
-
-                # out_score = p_leaf * out_score
-
-                topv, topi = out_score.topk(beam_size)
-
-                for tv, ti in zip(topv.split(1, dim=1), topi.split(1, dim=1)):
-                    current_node_stack = copy_list(b.node_stack)
-                    current_left_childs = []
-                    current_embeddings_stacks = copy_list(b.embedding_stack)
-                    current_out = copy.deepcopy(b.out)
-
-                    out_token = int(ti)
-                    current_out.append(out_token)
-
-                    node = current_node_stack[0].pop()
-
-                    if out_token < num_start:
-                        generate_input = torch.LongTensor([out_token])
-                        if self.USE_CUDA:
-                            generate_input = generate_input.cuda()
-                        left_child, right_child, node_label = self.node_generater(current_embeddings, generate_input,
-                                                                                  current_context)
-
-                        current_node_stack[0].append(TreeNode(right_child))
-                        current_node_stack[0].append(TreeNode(left_child, left_flag=True))
-
-                        current_embeddings_stacks[0].append(TreeEmbedding(node_label[0].unsqueeze(0), False))
-                    else:
-                        current_num = current_nums_embeddings[0, out_token - num_start].unsqueeze(0)
-
-                        while len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                            sub_stree = current_embeddings_stacks[0].pop()
-                            op = current_embeddings_stacks[0].pop()
-                            current_num = self.merge(op.embedding, sub_stree.embedding, current_num)
-                        current_embeddings_stacks[0].append(TreeEmbedding(current_num, True))
-                    if len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                        current_left_childs.append(current_embeddings_stacks[0][-1].embedding)
-                    else:
-                        current_left_childs.append(None)
-                    current_beams.append(TreeBeam(b.score + float(tv), current_node_stack, current_embeddings_stacks,
-                                                  current_left_childs, current_out))
-            beams = sorted(current_beams, key=lambda x: x.score, reverse=True)
-            beams = beams[:beam_size]
-            flag = True
-            for b in beams:
-                if len(b.node_stack[0]) != 0:
-                    flag = False
-            if flag:
-                break
-
-        return beams[0].out
+        return outputs[0, :output_lengths[0]].tolist()
 
     def encoder_forward(self, seq_emb, seq_length, output_all_layers=False):
         if not self.batch_first:
@@ -531,88 +473,14 @@ class SAUSolver(nn.Module):
                         left_childs.append(None)
             if not self.batch_first:
                 target = target.transpose(0, 1).contiguous()
+            token_logits = torch.stack(token_logits, dim=1)  # B x S x N
+            outputs = torch.stack(outputs, dim=1)  # B x S
         else:
-            beams = [TreeBeam(0.0, node_stacks, embeddings_stacks, left_childs, [], [])]
-            max_gen_len = self.max_out_len
-            for t in range(max_gen_len):
-                current_beams = []
-                while len(beams) > 0:
-                    b = beams.pop()
-                    if len(b.node_stack[0]) == 0:
-                        current_beams.append(b)
-                        continue
-                    left_childs = b.left_childs
-
-                    num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.decoder(
-                        b.node_stack,
-                        left_childs,
-                        encoder_outputs,
-                        all_nums_encoder_outputs,
-                        padding_hidden,
-                        seq_mask,
-                        num_mask)
-                    token_logit = torch.cat((op_score, num_score), 1)
-
-                    out_score = nn.functional.log_softmax(token_logit, dim=1)
-
-                    # out_score = p_leaf * out_score
-
-                    topv, topi = out_score.topk(self.beam_size)
-
-                    for tv, ti in zip(topv.split(1, dim=1), topi.split(1, dim=1)):
-                        current_node_stack = copy_list(b.node_stack)
-                        current_left_childs = []
-                        current_embeddings_stacks = copy_list(b.embedding_stack)
-                        current_out = [tl for tl in b.out]
-                        current_token_logit = [tl for tl in b.token_logit]
-
-                        current_token_logit.append(token_logit)
-
-
-                        out_token = int(ti)
-                        current_out.append(torch.squeeze(ti,dim=1))
-
-                        node = current_node_stack[0].pop()
-
-                        if out_token < self.num_start:
-                            generate_input = torch.LongTensor([out_token])
-                            if self.USE_CUDA:
-                                generate_input = generate_input.cuda()
-                            left_child, right_child, node_label = self.node_generater(current_embeddings,
-                                                                                      generate_input,
-                                                                                      current_context)
-
-                            current_node_stack[0].append(TreeNode(right_child))
-                            current_node_stack[0].append(TreeNode(left_child, left_flag=True))
-
-                            current_embeddings_stacks[0].append(TreeEmbedding(node_label[0].unsqueeze(0), False))
-                        else:
-                            current_num = current_nums_embeddings[0, out_token - self.num_start].unsqueeze(0)
-
-                            while len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                                sub_stree = current_embeddings_stacks[0].pop()
-                                op = current_embeddings_stacks[0].pop()
-                                current_num = self.merge(op.embedding, sub_stree.embedding, current_num)
-                            current_embeddings_stacks[0].append(TreeEmbedding(current_num, True))
-                        if len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                            current_left_childs.append(current_embeddings_stacks[0][-1].embedding)
-                        else:
-                            current_left_childs.append(None)
-                        current_beams.append(
-                            TreeBeam(b.score + float(tv), current_node_stack, current_embeddings_stacks,
-                                     current_left_childs, current_out,current_token_logit))
-                beams = sorted(current_beams, key=lambda x: x.score, reverse=True)
-                beams = beams[:self.beam_size]
-                flag = True
-                for b in beams:
-                    if len(b.node_stack[0]) != 0:
-                        flag = False
-                if flag:
-                    break
-            token_logits = beams[0].token_logit
-            outputs = beams[0].out
-        token_logits = torch.stack(token_logits, dim=1)  # B x S x N
-        outputs = torch.stack(outputs, dim=1)  # B x S
+            beam_search = TreeBeamSearch(self.decoder, self.node_generater, self.merge, self.num_start, self.beam_size,
+                                         self.max_out_len)
+            token_logits, outputs, output_lengths, scores = beam_search.search(encoder_outputs, problem_output,
+                                                                               all_nums_encoder_outputs,
+                                                                               seq_mask, num_mask)
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs['token_logits'] = token_logits
@@ -622,28 +490,9 @@ class SAUSolver(nn.Module):
         return token_logits,outputs,all_layer_outputs
 
     def get_all_number_encoder_outputs(self, encoder_outputs, num_pos, batch_size, num_size, hidden_size):
-        indices = list()
-        sen_len = encoder_outputs.size(0)
-        masked_index = []
-        temp_1 = [1 for _ in range(hidden_size)]
-        temp_0 = [0 for _ in range(hidden_size)]
-        for b in range(batch_size):
-            for i in num_pos[b]:
-                indices.append(i + b * sen_len)
-                masked_index.append(temp_0)
-            indices += [0 for _ in range(len(num_pos[b]), num_size)]
-            masked_index += [temp_1 for _ in range(len(num_pos[b]), num_size)]
-        indices = torch.LongTensor(indices)
-        masked_index = torch.BoolTensor(masked_index)
-        masked_index = masked_index.view(batch_size, num_size, hidden_size)
-        if self.USE_CUDA:
-            indices = indices.cuda()
-            masked_index = masked_index.cuda()
-        all_outputs = encoder_outputs.transpose(0, 1).contiguous()
-        all_embedding = all_outputs.view(-1, encoder_outputs.size(2))  # S x B x H -> (B x S) x H
-        all_num = all_embedding.index_select(0, indices)
-        all_num = all_num.view(batch_size, num_size, hidden_size)
-        return all_num.masked_fill_(masked_index, 0.0)
+        # S x B x H -> B x S x H
+        all_num, _ = gather_number_positions(encoder_outputs.transpose(0, 1), num_pos, num_size)
+        return all_num
 
     def generate_tree_input(self, target, decoder_output, nums_stack_batch, num_start, unk):
         # when the decoder input is copied num but the num has two pos, chose the max
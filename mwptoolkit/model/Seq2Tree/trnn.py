@@ -24,6 +24,7 @@ from mwptoolkit.module.Embedder.bert_embedder import BertEmbedder
 from mwptoolkit.model.Seq2Seq.rnnencdec import RNNEncDec
 from mwptoolkit.utils.data_structure import Node, BinaryTree
 from mwptoolkit.utils.enum_type import NumMask, SpecialTokens
+from mwptoolkit.utils.preprocess_tool.tree_operator import postfix_tree
 
 
 class TRNN(nn.Module):
@@ -187,14 +188,14 @@ class TRNN(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation', 'ques mask',
         'num pos', 'num list', 'template'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
+        target = torch.as_tensor(batch_data["equation"]).to(self.device)
 
-        seq_mask = torch.BoolTensor(batch_data["ques mask"]).to(self.device)
+        seq_mask = torch.as_tensor(batch_data["ques mask"], dtype=torch.bool).to(self.device)
         num_pos = batch_data['num pos']
         num_list = batch_data["num list"]
-        template_target = self.convert_temp_idx2symbol(torch.tensor(batch_data['template']))
+        template_target = self.convert_temp_idx2symbol(torch.as_tensor(batch_data['template']))
 
         _, output_template, _ = self.seq2seq_forward(seq, seq_length)
         template = self.convert_temp_idx2symbol(output_template)
@@ -220,9 +221,9 @@ class TRNN(nn.Module):
         :param bool output_all_layers: return all layer outputs of model.
         :return: token_logits, symbol_outputs, all_layer_outputs
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        ques_mask = torch.BoolTensor(batch_data["ques mask"]).to(self.device)
+        ques_mask = torch.as_tensor(batch_data["ques mask"], dtype=torch.bool).to(self.device)
         num_pos = batch_data['num pos']
         token_logits, symbol_outputs, model_all_outputs = self.forward(seq, seq_length, ques_mask, num_pos,
                                                                        output_all_layers=output_all_layers)
@@ -234,10 +235,10 @@ class TRNN(nn.Module):
         :param batch_data: one batch data.
         :return: loss value of seq2seq module.
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["template"]).to(self.device)
-        # ques_mask = torch.BoolTensor(batch_data["ques mask"]).to(self.device)
+        target = torch.as_tensor(batch_data["template"]).to(self.device)
+        # ques_mask = torch.as_tensor(batch_data["ques mask"], dtype=torch.bool).to(self.device)
 
         token_logits, _, _ = self.seq2seq_forward(seq, seq_length, target)
 
@@ -255,9 +256,9 @@ class TRNN(nn.Module):
         :param batch_data: one batch data.
         :return: loss value of answer module.
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        seq_mask = torch.BoolTensor(batch_data["ques mask"]).to(self.device)
+        seq_mask = torch.as_tensor(batch_data["ques mask"], dtype=torch.bool).to(self.device)
 
         num_pos = batch_data["num pos"]
         equ_source = copy.deepcopy(batch_data["equ_source"])
@@ -267,7 +268,8 @@ class TRNN(nn.Module):
         template = equ_source
 
         token_logits, _, ans_module_layers = self.ans_module_forward(seq, seq_length, seq_mask, template, num_pos,
-                                                                     equation_target=template, output_all_layers=True)
+                                                                     equation_target=template, output_all_layers=True,
+                                                                     template_trees=batch_data.get("template tree"))
         target = ans_module_layers["ans_module_target"]
 
         self.ans_module_loss.reset()
@@ -363,7 +365,7 @@ class TRNN(nn.Module):
         return token_logits, symbol_outputs, seq2seq_all_outputs
 
     def ans_module_forward(self, seq, seq_length, seq_mask, template, num_pos, equation_target=None,
-                           output_all_layers=False):
+                           output_all_layers=False, template_trees=None):
         if self.embedding == 'roberta':
             seq_emb = self.answer_in_embedder(seq, seq_mask)
         else:
@@ -381,42 +383,31 @@ class TRNN(nn.Module):
         outputs = []
         equations = []
         input_template = equation_target if equation_target else template
-        if equation_target is not None:
-            for b_i in range(batch_size):
-                try:
-                    tree_i = self.template2tree(input_template[b_i])
-                except IndexError:
-                    outputs.append([])
-                    continue
-                look_up = self.generate_list + NumMask.number[:len(num_pos[b_i])]
-                num_encoding = seq_emb[b_i, num_pos[b_i]] + encoder_output[b_i, num_pos[b_i]]
-                num_embedding = torch.cat([generate_emb, num_encoding], dim=0)
-                assert len(look_up) == len(num_embedding)
-                prob, target = self.answer_rnn(tree_i.root, num_embedding, look_up, self.out_idx2symbol)
-                batch_prob.append(prob)
-                batch_target.append(target)
-                if not isinstance(prob,list):
-                    output = torch.topk(prob, 1)[1]
-                    outputs.append(output)
-                else:
-                    outputs.append([])
-        else:
-            for b_i in range(batch_size):
-                try:
-                    tree_i = self.template2tree(input_template[b_i])
-                except IndexError:
-                    outputs.append([])
-                    continue
-                look_up = self.generate_list + NumMask.number[:len(num_pos[b_i])]
-                num_encoding = seq_emb[b_i, num_pos[b_i]] + encoder_output[b_i, num_pos[b_i]]
-                num_embedding = torch.cat([generate_emb, num_encoding], dim=0)
-                assert len(look_up) == len(num_embedding)
-                prob, output, node_pred = self.answer_rnn.test(tree_i.root, num_embedding, look_up, self.out_idx2symbol)
-                batch_prob.append(prob)
-                tree_i.root = node_pred
-                outputs.append(output)
-                equation = self.tree2equation(tree_i)
-                equations.append(equation)
+        if template_trees is None:
+            template_trees = [postfix_tree(tuple(symbols)) for symbols in input_template]
+        trees = []
+        num_embeddings = []
+        look_ups = []
+        for b_i in range(batch_size):
+            if template_trees[b_i] is None:
+                continue
+            look_up = self.generate_list + NumMask.number[:len(num_pos[b_i])]
+            num_encoding = seq_emb[b_i, num_pos[b_i]] + encoder_output[b_i, num_pos[b_i]]
+            num_embedding = torch.cat([generate_emb, num_encoding], dim=0)
+            assert len(look_up) == len(num_embedding)
+            trees.append(template_trees[b_i])
+            num_embeddings.append(num_embedding)
+            look_ups.append(look_up)
+        # template trees of the batch are composed together, level by level
+        tree_outputs = []
+        if trees and equation_target is not None:
+            batch_prob, batch_target = self.answer_rnn.batch_forward(trees, num_embeddings, look_ups)
+            tree_outputs = [torch.topk(prob, 1)[1] if not isinstance(prob, list) else [] for prob in batch_prob]
+        elif trees:
+            batch_prob, tree_outputs, equations = self.answer_rnn.batch_test(trees, num_embeddings, look_ups)
+        tree_outputs = iter(tree_outputs)
+        for tree_i in template_trees:
+            outputs.append(next(tree_outputs) if tree_i is not None else [])
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs['ans_module_token_logits'] = batch_prob
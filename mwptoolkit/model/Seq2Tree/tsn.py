@@ -15,10 +15,12 @@ from mwptoolkit.module.Encoder.rnn_encoder import BasicRNNEncoder
 from mwptoolkit.module.Decoder.tree_decoder import TreeDecoder
 from mwptoolkit.module.Layer.tree_layers import NodeGenerater, SubTreeMerger, TreeNode, TreeEmbedding
 from mwptoolkit.module.Layer.tree_layers import Prediction, GenerateNode, Merge
-from mwptoolkit.module.Strategy.beam_search import TreeBeam
+from mwptoolkit.module.Layer.number_gather import gather_number_positions
+from mwptoolkit.module.Strategy.beam_search import TreeBeamSearch
+from mwptoolkit.module.Strategy.teacher_forcing import TreeTeacherForcing
 from mwptoolkit.loss.masked_cross_entropy_loss import MaskedCrossEntropyLoss, masked_cross_entropy
 from mwptoolkit.utils.enum_type import SpecialTokens, NumMask
-from mwptoolkit.utils.utils import str2float, copy_list, clones
+from mwptoolkit.utils.utils import str2float, copy_list, clones, copy_num_stack
 
 
 class TSN(nn.Module):
@@ -68,6 +70,10 @@ class TSN(nn.Module):
             self.out_pad_token = self.out_symbol2idx[SpecialTokens.PAD_TOKEN]
         except:
             self.out_pad_token = None
+        try:
+            self.in_pad_token = dataset.in_word2idx[SpecialTokens.PAD_TOKEN]
+        except:
+            self.in_pad_token = None
 
         self.t_embedder = BasicEmbedder(self.vocab_size, self.embedding_size, self.dropout_ratio)
         self.t_encoder = BasicRNNEncoder(self.embedding_size, self.hidden_size, self.num_layers, self.rnn_cell_type, self.dropout_ratio, batch_first=False)
@@ -112,7 +118,8 @@ class TSN(nn.Module):
 
         return (t_token_logits,s_token_logits[0],s_token_logits[1]),(t_symbol_outputs,s_symbol_outputs[0],s_symbol_outputs[1]),model_all_outputs
 
-    def teacher_net_forward(self, seq, seq_length, nums_stack, num_size, num_pos, target=None,output_all_layers=False)\
+    def teacher_net_forward(self, seq, seq_length, nums_stack, num_size, num_pos, target=None,output_all_layers=False,
+                            tree_schedule=None)\
             -> Tuple[torch.Tensor, torch.Tensor, Dict[str, Any]]:
         """
 
@@ -123,6 +130,7 @@ class TSN(nn.Module):
         :param list num_pos: number positions of input sequence, length:[batch_size].
         :param torch.Tensor | None target: target, shape: [batch_size, target_length], default None.
         :param bool output_all_layers: return output of all layers if output_all_layers is True, default False.
+        :param dict | None tree_schedule: schedule of the target trees built by the dataloader, target is decoded step by step if None.
         :return : token_logits:[batch_size, output_length, output_size], symbol_outputs:[batch_size,output_length], model_all_outputs.
         :rtype: tuple(torch.Tensor, torch.Tensor, dict)
         """
@@ -150,7 +158,7 @@ class TSN(nn.Module):
         token_logits, symbol_outputs, decoder_layer_outputs = self.teacher_net_decoder_forward(encoder_outputs, problem_output,
                                                                                    all_nums_encoder_outputs, nums_stack,
                                                                                    seq_mask, num_mask, target,
-                                                                                   output_all_layers)
+                                                                                   output_all_layers, tree_schedule)
         teacher_net_all_outputs = {}
         if output_all_layers:
             teacher_net_all_outputs['teacher_inputs_embedding'] = seq_emb
@@ -160,7 +168,8 @@ class TSN(nn.Module):
 
         return token_logits, symbol_outputs, teacher_net_all_outputs
 
-    def student_net_forward(self, seq, seq_length, nums_stack, num_size, num_pos, target=None,output_all_layers=False)\
+    def student_net_forward(self, seq, seq_length, nums_stack, num_size, num_pos, target=None,output_all_layers=False,
+                            tree_schedule=None)\
             -> Tuple[Tuple[torch.Tensor, torch.Tensor], Tuple[torch.Tensor, torch.Tensor], Dict[str, Any]]:
         """
 
@@ -171,6 +180,7 @@ class TSN(nn.Module):
         :param list num_pos: number positions of input sequence, length:[batch_size].
         :param torch.Tensor | None target: target, shape: [batch_size, target_length], default None.
         :param bool output_all_layers: return output of all layers if output_all_layers is True, default False.
+        :param dict | None tree_schedule: schedule of the target trees built by the dataloader, target is decoded step by step if None.
         :return : token_logits:(token_logits_1,token_logits_2), symbol_outputs:(symbol_outputs_1,symbol_outputs_2), model_all_outputs.
         :rtype: tuple(tuple(torch.Tensor), tuple(torch.Tensor), dict)
         """
@@ -202,7 +212,8 @@ class TSN(nn.Module):
                                                                                                nums_stack,
                                                                                                seq_mask, num_mask,
                                                                                                target,
-                                                                                               output_all_layers)
+                                                                                               output_all_layers,
+                                                                                               tree_schedule)
         student_net_all_outputs = {}
         if output_all_layers:
             student_net_all_outputs['student_inputs_embedding'] = seq_emb
@@ -221,17 +232,18 @@ class TSN(nn.Module):
         batch_data should include keywords 'question', 'ques len', 'equation', 'equ len',
         'num stack', 'num size', 'num pos'
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
         target_length = torch.LongTensor(batch_data["equ len"]).to(self.device)
 
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
 
         token_logits, _, t_net_layer_outputs = self.teacher_net_forward(seq, seq_length, nums_stack, num_size, num_pos,
-                                                                        target, output_all_layers=True)
+                                                                        target, output_all_layers=True,
+                                                                        tree_schedule=batch_data.get("tree schedule"))
         target = t_net_layer_outputs['teacher_target']
 
         loss = masked_cross_entropy(token_logits, target, target_length)
@@ -248,11 +260,11 @@ class TSN(nn.Module):
         'num stack', 'num size', 'num pos', 'id'
         """
 
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
         target_length = torch.LongTensor(batch_data["equ len"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
 
@@ -261,7 +273,8 @@ class TSN(nn.Module):
         soft_target = self.get_soft_target(batch_id)
         soft_target = torch.cat(soft_target, dim=0).to(self.device)
 
-        token_logits,_,s_net_layer_outputs = self.student_net_forward(seq,seq_length,nums_stack,num_size,num_pos,target,output_all_layers=True)
+        token_logits,_,s_net_layer_outputs = self.student_net_forward(seq,seq_length,nums_stack,num_size,num_pos,target,output_all_layers=True,
+                                                                      tree_schedule=batch_data.get("tree schedule"))
 
         (token_logits_1, token_logits_2) = token_logits
         target1 = s_net_layer_outputs['student_1_target']
@@ -287,10 +300,10 @@ class TSN(nn.Module):
         'num stack', 'num pos', 'num list'
         """
 
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_pos = batch_data["num pos"]
         num_list = batch_data['num list']
         num_size = batch_data['num size']
@@ -312,10 +325,10 @@ class TSN(nn.Module):
         'num stack', 'num pos', 'num list'
         """
 
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_pos = batch_data["num pos"]
         num_list = batch_data['num list']
         num_size = batch_data['num size']
@@ -357,7 +370,7 @@ class TSN(nn.Module):
         return problem_output, encoder_outputs, all_layer_outputs
 
     def teacher_net_decoder_forward(self, encoder_outputs, problem_output, all_nums_encoder_outputs, nums_stack,
-                                    seq_mask, num_mask, target=None, output_all_layers=False):
+                                    seq_mask, num_mask, target=None, output_all_layers=False, tree_schedule=None):
         batch_size = problem_output.size(0)
         node_stacks = [[TreeNode(_)] for _ in problem_output.split(1, dim=0)]
         padding_hidden = torch.FloatTensor([0.0 for _ in range(self.hidden_size)]).unsqueeze(0).to(self.device)
@@ -365,7 +378,12 @@ class TSN(nn.Module):
         left_childs = [None for _ in range(batch_size)]
         token_logits = []
         outputs = []
-        if target is not None:
+        teacher_forcing = TreeTeacherForcing(self.t_decoder, self.t_node_generater, self.t_merge, self.num_start)
+        if teacher_forcing.fits(tree_schedule, target, all_nums_encoder_outputs):
+            token_logits, outputs, _ = teacher_forcing.decode(encoder_outputs, problem_output, all_nums_encoder_outputs,
+                                                              seq_mask, num_mask, target, tree_schedule)
+        elif target is not None:
+            target = target.transpose(0, 1)
             max_target_length = target.size(0)
             for t in range(max_target_length):
                 num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.t_decoder(
@@ -414,87 +432,15 @@ class TSN(nn.Module):
                         left_childs.append(o[-1].embedding)
                     else:
                         left_childs.append(None)
+            target = target.transpose(0, 1)
+            token_logits = torch.stack(token_logits, dim=1)  # B x S x N
+            outputs = torch.stack(outputs, dim=1)  # B x S
         else:
-            beams = [TreeBeam(0.0, node_stacks, embeddings_stacks, left_childs, [], [])]
-            max_gen_len = self.max_out_len
-            for t in range(max_gen_len):
-                current_beams = []
-                while len(beams) > 0:
-                    b = beams.pop()
-                    if len(b.node_stack[0]) == 0:
-                        current_beams.append(b)
-                        continue
-                    left_childs = b.left_childs
-
-                    num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.t_decoder(
-                        b.node_stack,
-                        left_childs,
-                        encoder_outputs,
-                        all_nums_encoder_outputs,
-                        padding_hidden,
-                        seq_mask,
-                        num_mask)
-                    token_logit = torch.cat((op_score, num_score), 1)
-
-                    out_score = nn.functional.log_softmax(token_logit, dim=1)
-
-                    # out_score = p_leaf * out_score
-
-                    topv, topi = out_score.topk(self.beam_size)
-
-                    for tv, ti in zip(topv.split(1, dim=1), topi.split(1, dim=1)):
-                        current_node_stack = copy_list(b.node_stack)
-                        current_left_childs = []
-                        current_embeddings_stacks = copy_list(b.embedding_stack)
-                        current_out = [tl for tl in b.out]
-                        current_token_logit = [tl for tl in b.token_logit]
-
-                        current_token_logit.append(token_logit)
-
-                        out_token = int(ti)
-                        current_out.append(torch.squeeze(ti, dim=1))
-
-                        node = current_node_stack[0].pop()
-
-                        if out_token < self.num_start:
-                            generate_input = torch.LongTensor([out_token])
-                            if self.USE_CUDA:
-                                generate_input = generate_input.cuda()
-                            left_child, right_child, node_label = self.t_node_generater(current_embeddings,
-                                                                                        generate_input,
-                                                                                        current_context)
-
-                            current_node_stack[0].append(TreeNode(right_child))
-                            current_node_stack[0].append(TreeNode(left_child, left_flag=True))
-
-                            current_embeddings_stacks[0].append(TreeEmbedding(node_label[0].unsqueeze(0), False))
-                        else:
-                            current_num = current_nums_embeddings[0, out_token - self.num_start].unsqueeze(0)
-
-                            while len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                                sub_stree = current_embeddings_stacks[0].pop()
-                                op = current_embeddings_stacks[0].pop()
-                                current_num = self.t_merge(op.embedding, sub_stree.embedding, current_num)
-                            current_embeddings_stacks[0].append(TreeEmbedding(current_num, True))
-                        if len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                            current_left_childs.append(current_embeddings_stacks[0][-1].embedding)
-                        else:
-                            current_left_childs.append(None)
-                        current_beams.append(
-                            TreeBeam(b.score + float(tv), current_node_stack, current_embeddings_stacks,
-                                     current_left_childs, current_out, current_token_logit))
-                beams = sorted(current_beams, key=lambda x: x.score, reverse=True)
-                beams = beams[:self.beam_size]
-                flag = True
-                for b in beams:
-                    if len(b.node_stack[0]) != 0:
-                        flag = False
-                if flag:
-                    break
-            token_logits = beams[0].token_logit
-            outputs = beams[0].out
-        token_logits = torch.stack(token_logits, dim=1)  # B x S x N
-        outputs = torch.stack(outputs, dim=1)  # B x S
+            beam_search = TreeBeamSearch(self.t_decoder, self.t_node_generater, self.t_merge, self.num_start, self.beam_size,
+                                         self.max_out_len)
+            token_logits, outputs, output_lengths, scores = beam_search.search(encoder_outputs, problem_output,
+                                                                               all_nums_encoder_outputs,
+                                                                               seq_mask, num_mask)
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs['teacher_token_logits'] = token_logits
@@ -515,21 +461,23 @@ class TSN(nn.Module):
         return problem_output, encoder_outputs, all_layer_outputs
 
     def student_net_decoder_forward(self, encoder_outputs, problem_output, all_nums_encoder_outputs, nums_stack,
-                                    seq_mask, num_mask, target=None, output_all_layers=False):
+                                    seq_mask, num_mask, target=None, output_all_layers=False, tree_schedule=None):
         s_1_token_logits, s_1_outputs, s_1_all_layer_outputs = self.student_net_1_decoder_forward(encoder_outputs,
                                                                                                   problem_output,
                                                                                                   all_nums_encoder_outputs,
                                                                                                   nums_stack,
                                                                                                   seq_mask, num_mask,
                                                                                                   target=target,
-                                                                                                  output_all_layers=output_all_layers)
+                                                                                                  output_all_layers=output_all_layers,
+                                                                                                  tree_schedule=tree_schedule)
         s_2_token_logits, s_2_outputs, s_2_all_layer_outputs = self.student_net_2_decoder_forward(encoder_outputs,
                                                                                                   problem_output,
                                                                                                   all_nums_encoder_outputs,
                                                                                                   nums_stack,
                                                                                                   seq_mask, num_mask,
                                                                                                   target=target,
-                                                                                                  output_all_layers=output_all_layers)
+                                                                                                  output_all_layers=output_all_layers,
+                                                                                                  tree_schedule=tree_schedule)
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs.update(s_1_all_layer_outputs)
@@ -538,7 +486,7 @@ class TSN(nn.Module):
         return (s_1_token_logits, s_2_token_logits), (s_1_outputs, s_2_outputs), all_layer_outputs
 
     def student_net_1_decoder_forward(self, encoder_outputs, problem_output, all_nums_encoder_outputs, nums_stack,
-                                      seq_mask, num_mask, target=None, output_all_layers=False):
+                                      seq_mask, num_mask, target=None, output_all_layers=False, tree_schedule=None):
         batch_size = problem_output.size(0)
         node_stacks = [[TreeNode(_)] for _ in problem_output.split(1, dim=0)]
         padding_hidden = torch.FloatTensor([0.0 for _ in range(self.hidden_size)]).unsqueeze(0).to(self.device)
@@ -547,7 +495,12 @@ class TSN(nn.Module):
         token_logits = []
         outputs = []
         score = None
-        if target is not None:
+        teacher_forcing = TreeTeacherForcing(self.s_decoder_1, self.s_node_generater_1, self.s_merge_1, self.num_start)
+        if teacher_forcing.fits(tree_schedule, target, all_nums_encoder_outputs):
+            token_logits, outputs, _ = teacher_forcing.decode(encoder_outputs, problem_output, all_nums_encoder_outputs,
+                                                              seq_mask, num_mask, target, tree_schedule)
+        elif target is not None:
+            target = target.transpose(0, 1)
             max_target_length = target.size(0)
             for t in range(max_target_length):
                 num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.s_decoder_1(
@@ -596,88 +549,16 @@ class TSN(nn.Module):
                         left_childs.append(o[-1].embedding)
                     else:
                         left_childs.append(None)
+            target = target.transpose(0, 1)
+            token_logits = torch.stack(token_logits, dim=1)  # B x S x N
+            outputs = torch.stack(outputs, dim=1)  # B x S
         else:
-            beams = [TreeBeam(0.0, node_stacks, embeddings_stacks, left_childs, [], [])]
-            max_gen_len = self.max_out_len
-            for t in range(max_gen_len):
-                current_beams = []
-                while len(beams) > 0:
-                    b = beams.pop()
-                    if len(b.node_stack[0]) == 0:
-                        current_beams.append(b)
-                        continue
-                    left_childs = b.left_childs
-
-                    num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.s_decoder_1(
-                        b.node_stack,
-                        left_childs,
-                        encoder_outputs,
-                        all_nums_encoder_outputs,
-                        padding_hidden,
-                        seq_mask,
-                        num_mask)
-                    token_logit = torch.cat((op_score, num_score), 1)
-
-                    out_score = nn.functional.log_softmax(token_logit, dim=1)
-
-                    # out_score = p_leaf * out_score
-
-                    topv, topi = out_score.topk(self.beam_size)
-
-                    for tv, ti in zip(topv.split(1, dim=1), topi.split(1, dim=1)):
-                        current_node_stack = copy_list(b.node_stack)
-                        current_left_childs = []
-                        current_embeddings_stacks = copy_list(b.embedding_stack)
-                        current_out = [tl for tl in b.out]
-                        current_token_logit = [tl for tl in b.token_logit]
-
-                        current_token_logit.append(token_logit)
-
-                        out_token = int(ti)
-                        current_out.append(torch.squeeze(ti, dim=1))
-
-                        node = current_node_stack[0].pop()
-
-                        if out_token < self.num_start:
-                            generate_input = torch.LongTensor([out_token])
-                            if self.USE_CUDA:
-                                generate_input = generate_input.cuda()
-                            left_child, right_child, node_label = self.s_node_generater_1(current_embeddings,
-                                                                                          generate_input,
-                                                                                          current_context)
-
-                            current_node_stack[0].append(TreeNode(right_child))
-                            current_node_stack[0].append(TreeNode(left_child, left_flag=True))
-
-                            current_embeddings_stacks[0].append(TreeEmbedding(node_label[0].unsqueeze(0), False))
-                        else:
-                            current_num = current_nums_embeddings[0, out_token - self.num_start].unsqueeze(0)
-
-                            while len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                                sub_stree = current_embeddings_stacks[0].pop()
-                                op = current_embeddings_stacks[0].pop()
-                                current_num = self.s_merge_1(op.embedding, sub_stree.embedding, current_num)
-                            current_embeddings_stacks[0].append(TreeEmbedding(current_num, True))
-                        if len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                            current_left_childs.append(current_embeddings_stacks[0][-1].embedding)
-                        else:
-                            current_left_childs.append(None)
-                        current_beams.append(
-                            TreeBeam(b.score + float(tv), current_node_stack, current_embeddings_stacks,
-                                     current_left_childs, current_out, current_token_logit))
-                beams = sorted(current_beams, key=lambda x: x.score, reverse=True)
-                beams = beams[:self.beam_size]
-                flag = True
-                for b in beams:
-                    if len(b.node_stack[0]) != 0:
-                        flag = False
-                if flag:
-                    break
-            token_logits = beams[0].token_logit
-            outputs = beams[0].out
-            score = beams[0].score
-        token_logits = torch.stack(token_logits, dim=1)  # B x S x N
-        outputs = torch.stack(outputs, dim=1)  # B x S
+            beam_search = TreeBeamSearch(self.s_decoder_1, self.s_node_generater_1, self.s_merge_1, self.num_start, self.beam_size,
+                                         self.max_out_len)
+            token_logits, outputs, output_lengths, scores = beam_search.search(encoder_outputs, problem_output,
+                                                                               all_nums_encoder_outputs,
+                                                                               seq_mask, num_mask)
+            score = scores[0]
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs['student_1_token_logits'] = token_logits
@@ -687,7 +568,7 @@ class TSN(nn.Module):
         return token_logits, outputs, all_layer_outputs
 
     def student_net_2_decoder_forward(self, encoder_outputs, problem_output, all_nums_encoder_outputs, nums_stack,
-                                      seq_mask, num_mask, target=None, output_all_layers=False):
+                                      seq_mask, num_mask, target=None, output_all_layers=False, tree_schedule=None):
         batch_size = encoder_outputs.size(1)
         seq_size = encoder_outputs.size(0)
         encoder_outputs_mask = self.encoder_mask[:batch_size, :seq_size, :].transpose(1, 0).float()
@@ -700,7 +581,12 @@ class TSN(nn.Module):
         token_logits = []
         outputs = []
         score = None
-        if target is not None:
+        teacher_forcing = TreeTeacherForcing(self.s_decoder_1, self.s_node_generater_1, self.s_merge_1, self.num_start)
+        if teacher_forcing.fits(tree_schedule, target, all_nums_encoder_outputs):
+            token_logits, outputs, _ = teacher_forcing.decode(encoder_outputs, problem_output, all_nums_encoder_outputs,
+                                                              seq_mask, num_mask, target, tree_schedule)
+        elif target is not None:
+            target = target.transpose(0, 1)
             max_target_length = target.size(0)
             for t in range(max_target_length):
                 num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.s_decoder_1(
@@ -749,88 +635,16 @@ class TSN(nn.Module):
                         left_childs.append(o[-1].embedding)
                     else:
                         left_childs.append(None)
+            target = target.transpose(0, 1)
+            token_logits = torch.stack(token_logits, dim=1)  # B x S x N
+            outputs = torch.stack(outputs, dim=1)  # B x S
         else:
-            beams = [TreeBeam(0.0, node_stacks, embeddings_stacks, left_childs, [], [])]
-            max_gen_len = self.max_out_len
-            for t in range(max_gen_len):
-                current_beams = []
-                while len(beams) > 0:
-                    b = beams.pop()
-                    if len(b.node_stack[0]) == 0:
-                        current_beams.append(b)
-                        continue
-                    left_childs = b.left_childs
-
-                    num_score, op_score, current_embeddings, current_context, current_nums_embeddings = self.s_decoder_1(
-                        b.node_stack,
-                        left_childs,
-                        encoder_outputs,
-                        all_nums_encoder_outputs,
-                        padding_hidden,
-                        seq_mask,
-                        num_mask)
-                    token_logit = torch.cat((op_score, num_score), 1)
-
-                    out_score = nn.functional.log_softmax(token_logit, dim=1)
-
-                    # out_score = p_leaf * out_score
-
-                    topv, topi = out_score.topk(self.beam_size)
-
-                    for tv, ti in zip(topv.split(1, dim=1), topi.split(1, dim=1)):
-                        current_node_stack = copy_list(b.node_stack)
-                        current_left_childs = []
-                        current_embeddings_stacks = copy_list(b.embedding_stack)
-                        current_out = [tl for tl in b.out]
-                        current_token_logit = [tl for tl in b.token_logit]
-
-                        current_token_logit.append(token_logit)
-
-                        out_token = int(ti)
-                        current_out.append(torch.squeeze(ti, dim=1))
-
-                        node = current_node_stack[0].pop()
-
-                        if out_token < self.num_start:
-                            generate_input = torch.LongTensor([out_token])
-                            if self.USE_CUDA:
-                                generate_input = generate_input.cuda()
-                            left_child, right_child, node_label = self.s_node_generater_1(current_embeddings,
-                                                                                          generate_input,
-                                                                                          current_context)
-
-                            current_node_stack[0].append(TreeNode(right_child))
-                            current_node_stack[0].append(TreeNode(left_child, left_flag=True))
-
-                            current_embeddings_stacks[0].append(TreeEmbedding(node_label[0].unsqueeze(0), False))
-                        else:
-                            current_num = current_nums_embeddings[0, out_token - self.num_start].unsqueeze(0)
-
-                            while len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                                sub_stree = current_embeddings_stacks[0].pop()
-                                op = current_embeddings_stacks[0].pop()
-                                current_num = self.s_merge_1(op.embedding, sub_stree.embedding, current_num)
-                            current_embeddings_stacks[0].append(TreeEmbedding(current_num, True))
-                        if len(current_embeddings_stacks[0]) > 0 and current_embeddings_stacks[0][-1].terminal:
-                            current_left_childs.append(current_embeddings_stacks[0][-1].embedding)
-                        else:
-                            current_left_childs.append(None)
-                        current_beams.append(
-                            TreeBeam(b.score + float(tv), current_node_stack, current_embeddings_stacks,
-                                     current_left_childs, current_out, current_token_logit))
-                beams = sorted(current_beams, key=lambda x: x.score, reverse=True)
-                beams = beams[:self.beam_size]
-                flag = True
-                for b in beams:
-                    if len(b.node_stack[0]) != 0:
-                        flag = False
-                if flag:
-                    break
-            token_logits = beams[0].token_logit
-            outputs = beams[0].out
-            score = beams[0].score
-        token_logits = torch.stack(token_logits, dim=1)  # B x S x N
-        outputs = torch.stack(outputs, dim=1)  # B x S
+            beam_search = TreeBeamSearch(self.s_decoder_1, self.s_node_generater_1, self.s_merge_1, self.num_start, self.beam_size,
+                                         self.max_out_len)
+            token_logits, outputs, output_lengths, scores = beam_search.search(encoder_outputs, problem_output,
+                                                                               all_nums_encoder_outputs,
+                                                                               seq_mask, num_mask)
+            score = scores[0]
         all_layer_outputs = {}
         if output_all_layers:
             all_layer_outputs['student_2_token_logits'] = token_logits
@@ -900,12 +714,12 @@ class TSN(nn.Module):
             batch_data (dict): one batch data.
         
         """
-        seq = torch.tensor(batch_data["question"]).to(self.device)
+        seq = torch.as_tensor(batch_data["question"]).to(self.device)
         seq_length = torch.tensor(batch_data["ques len"]).long()
-        target = torch.tensor(batch_data["equation"]).to(self.device)
+        target = torch.as_tensor(batch_data["equation"]).to(self.device, copy=True)
         target_length = torch.tensor(batch_data["equ len"]).to(self.device)
 
-        nums_stack = copy.deepcopy(batch_data["num stack"])
+        nums_stack = copy_num_stack(batch_data["num stack"])
         num_size = batch_data["num size"]
         num_pos = batch_data["num pos"]
 
@@ -923,28 +737,9 @@ class TSN(nn.Module):
         return soft_tsrget
 
     def get_all_number_encoder_outputs(self, encoder_outputs, num_pos, batch_size, num_size, hidden_size):
-        indices = list()
-        sen_len = encoder_outputs.size(0)
-        masked_index = []
-        temp_1 = [1 for _ in range(hidden_size)]
-        temp_0 = [0 for _ in range(hidden_size)]
-        for b in range(batch_size):
-            for i in num_pos[b]:
-                indices.append(i + b * sen_len)
-                masked_index.append(temp_0)
-            indices += [0 for _ in range(len(num_pos[b]), num_size)]
-            masked_index += [temp_1 for _ in range(len(num_pos[b]), num_size)]
-        indices = torch.LongTensor(indices)
-        masked_index = torch.BoolTensor(masked_index)
-        masked_index = masked_index.view(batch_size, num_size, hidden_size)
-        if self.USE_CUDA:
-            indices = indices.cuda()
-            masked_index = masked_index.cuda()
-        all_outputs = encoder_outputs.transpose(0, 1).contiguous()
-        all_embedding = all_outputs.view(-1, encoder_outputs.size(2))  # S x B x H -> (B x S) x H
-        all_num = all_embedding.index_select(0, indices)
-        all_num = all_num.view(batch_size, num_size, hidden_size)
-        return all_num.masked_fill_(masked_index, 0.0)
+        # S x B x H -> B x S x H
+        all_num, _ = gather_number_positions(encoder_outputs.transpose(0, 1), num_pos, num_size)
+        return all_num
 
     def generate_tree_input(self, target, decoder_output, nums_stack_batch, num_start, unk):
         # when the decoder input is copied num but the num has two pos, chose the max
@@ -2,4 +2,9 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-from mwptoolkit.model import Graph2Tree,Seq2Tree,Seq2Seq,PreTrain
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['Graph2Tree', 'Seq2Tree', 'Seq2Seq', 'PreTrain']
+)
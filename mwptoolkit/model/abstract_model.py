@@ -11,15 +11,6 @@ from torch import nn
 
 from mwptoolkit.config.configuration import Config
 
-from mwptoolkit.data.dataset.abstract_dataset import AbstractDataset
-# from mwptoolkit.data.dataset.dataset_ept import DatasetEPT
-# from mwptoolkit.data.dataset.dataset_hms import DatasetHMS
-from mwptoolkit.data.dataset.template_dataset import TemplateDataset
-from mwptoolkit.data.dataset.pretrain_dataset import PretrainDataset
-from mwptoolkit.data.dataset.dataset_multiencdec import DatasetMultiEncDec
-from mwptoolkit.data.dataset.multi_equation_dataset import MultiEquationDataset
-from mwptoolkit.data.dataset.single_equation_dataset import SingleEquationDataset
-
 
 class AbstractModel(nn.Module):
     def __init__(self):
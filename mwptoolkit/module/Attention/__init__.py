@@ -1,4 +1,10 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.module.Attention import group_attention,multi_head_attention,self_attention,seq_attention,tree_attention
\ No newline at end of file
+
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['group_attention', 'multi_head_attention', 'self_attention', 'seq_attention', 'tree_attention']
+)
@@ -37,7 +37,7 @@ class MultiHeadAttention(nn.Module):
 
         self.weight_dropout = nn.Dropout(dropout_ratio)
 
-    def forward(self, query, key, value, key_padding_mask=None, attn_mask=None):
+    def forward(self, query, key, value, key_padding_mask=None, attn_mask=None, layer_cache=None, static_kv=False):
         r"""
         Multi-head attention
 
@@ -47,6 +47,10 @@ class MultiHeadAttention(nn.Module):
             value (torch.Tensor): shape [batch_size, src_len, embedding_size].
             key_padding_mask (torch.Tensor): shape [batch_size, src_len].
             attn_mask (torch.BoolTensor): shape [batch_size, tgt_len, src_len].
+            layer_cache (dict|None): projected keys and values of previous calls, updated in place, default: None.
+            static_kv (bool): if True, key and value are the same at every call (e.g. encoder states), they are
+                projected at the first call and read from layer_cache afterwards, otherwise the projected key and value
+                are appended to the cached ones. default: False.
 
         Return:
             tuple(torch.Tensor, torch.Tensor):
@@ -55,16 +59,23 @@ class MultiHeadAttention(nn.Module):
         """
         device=query.device
         batch_size, tgt_len, embedding_size = query.size()
-        src_len = key.size(1)
         assert key.size() == value.size()
 
         q = self.linear_query(query) * self.scaling
-        k = self.linear_key(key)
-        v = self.linear_value(value)
-
         q = q.view(batch_size, tgt_len, self.num_heads, self.head_size).permute(0, 2, 1, 3)
-        k = k.view(batch_size, src_len, self.num_heads, self.head_size).permute(0, 2, 3, 1)
-        v = v.view(batch_size, src_len, self.num_heads, self.head_size).permute(0, 2, 1, 3)
+
+        if layer_cache is not None and static_kv and 'key' in layer_cache:
+            k = layer_cache['key']
+            v = layer_cache['value']
+        else:
+            k, v = self._project_key_value(key, value)
+            if layer_cache is not None:
+                if not static_kv and 'key' in layer_cache:
+                    k = torch.cat((layer_cache['key'], k), dim=-1)
+                    v = torch.cat((layer_cache['value'], v), dim=-2)
+                layer_cache['key'] = k
+                layer_cache['value'] = v
+        src_len = k.size(-1)
 
         attn_weights = torch.matmul(q, k)
         assert list(attn_weights.size()) == [batch_size, self.num_heads, tgt_len, src_len]
@@ -94,6 +105,15 @@ class MultiHeadAttention(nn.Module):
 
         return attn_repre, attn_weights
 
+    def _project_key_value(self, key, value):
+        batch_size, src_len, _ = key.size()
+        k = self.linear_key(key)
+        v = self.linear_value(value)
+
+        k = k.view(batch_size, src_len, self.num_heads, self.head_size).permute(0, 2, 3, 1)
+        v = v.view(batch_size, src_len, self.num_heads, self.head_size).permute(0, 2, 1, 3)
+        return k, v
+
 class EPTMultiHeadAttentionWeights(nn.Module):
     """
     Class for computing multi-head attention weights (follows the paper, 'Attention is all you need')
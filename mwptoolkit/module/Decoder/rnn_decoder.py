@@ -9,7 +9,7 @@ from torch import nn
 
 from mwptoolkit.module.Attention.seq_attention import SeqAttention,Attention,MaskedRelevantScore
 from mwptoolkit.module.Layer.layers import Transformer
-from mwptoolkit.module.Environment.stack_machine import OPERATIONS
+from mwptoolkit.module.Environment.stack_machine import OPERATIONS, BatchStackMachine
 
 class BasicRNNDecoder(nn.Module):
     r"""
@@ -234,7 +234,7 @@ class SalignedDecoder(nn.Module):
             context (torch.Tensor): Encoded context, with size [batch_size, text_len, dim_hidden].
             text_len (torch.Tensor): Text length for each problem in the batch.
             operands (list of torch.Tensor): List of operands embeddings for each problem in the batch. Each element in the list is of size [n_operands, dim_hidden].
-            stacks (list of StackMachine): List of stack machines used for each problem.
+            stacks (list of StackMachine | BatchStackMachine): List of stack machines used for each problem, or stack machines of the batch.
             prev_op (torch.LongTensor): Previous operation, with size [batch, 1].
             prev_arg (torch.LongTensor): Previous argument indices, with size [batch, 1]. Can be None for the first step.
             prev_output (torch.Tensor): Previous decoder RNN outputs, with size [batch, dim_hidden]. Can be None for the first step.
@@ -249,74 +249,83 @@ class SalignedDecoder(nn.Module):
         """
         batch_size = context.size(0)
 
-        # collect stack states
-        stack_states = \
-            torch.stack([stack.get_top2().view(-1,) for stack in stacks],
-                        dim=0).to(self._device)
-        #print('stack_states', stack_states)
-
-        # skip the first step (all NOOP)
-        if prev_output is not None:
-            # result calculated batch-wise
-            batch_result = {
-                self.ADD: self.transformer_add(stack_states),
-                self.SUB: self.transformer_sub(stack_states),
-                self.MUL: self.transformer_mul(stack_states),
-                self.DIV: self.transformer_div(stack_states),
-                self.POWER: self.transformer_power(stack_states)
-            }
-
-        prev_returns = []
-        # apply previous op on stacks
-        for b in range(batch_size):
-            #print('prev_op[b].item()', prev_op[b].item())
-            #print(prev_op[b].item(), OPERATIONS.NOOP, OPERATIONS.GEN_VAR, OPERATIONS.EQL); exit()
-            # no op
-            if prev_op[b].item() == self.NOOP:
-                ret = self.noop_padding_return
-
-            elif prev_op[b].item() == self.PAD:
-                ret = self.noop_padding_return
-            # generate variable
-            elif prev_op[b].item() == self.GEN_VAR:
-                variable = batch_result[self.GEN_VAR][b]
-                operands[b].append(variable)
-                stacks[b].add_variable(variable)
-                ret = variable
-                #print('add_variable', stacks[b]._operands)
-
-            # OPERATIONS.ADD, SUB, MUL, DIV
-            elif prev_op[b].item() in [self.ADD, self.SUB,
-                                       self.MUL, self.DIV, self.POWER]:
-                #print('>>> OPERATIONS.ADD, SUB, MUL, DIV', len(stacks[b]._stack))
-                transformed = batch_result[prev_op[b].item()][b]
-                #print('transformed', transformed)
-                ret = stacks[b].apply_embed_only(
-                    prev_op[b].item(),
-                    transformed)
-
-            # elif prev_op[b].item() in [self.RAW_EQL, self.BRG]:
-            #     ret = stacks[b].apply_embed_only(prev_op[b].item(), None)
-
-            elif prev_op[b].item() == self.EQL:
-                ret = stacks[b].apply_eql(prev_op[b].item())
-
-            # push operand
-            else:
-                #if b == 0: print('>>> push operand', len(stacks[b]._stack))
-                stacks[b].push(prev_op[b].item() - N_OPS)
-                #ret = operands[b][prev_op[b].item() - N_OPS]
-                ret = number_emb[b][prev_op[b].item() - N_OPS]
-            prev_returns.append(ret)
-            #exit()
-
-        # collect stack states (after applied op)
-        stack_states = \
-            torch.stack([stack.get_top2().view(-1,) for stack in stacks],
-                        dim=0).to(self._device)
-
-        # collect previous returns
-        prev_returns = torch.stack(prev_returns)
+        if isinstance(stacks, BatchStackMachine):
+            # stacks of the batch are applied together
+            stack_states = stacks.get_top2()
+            transformed = None
+            if prev_output is not None:
+                transformed = self.batch_transform(stack_states, prev_op.to(stack_states.device))
+            prev_returns = stacks.apply(prev_op, transformed)
+            stack_states = stacks.get_top2()
+        else:
+            # collect stack states
+            stack_states = \
+                torch.stack([stack.get_top2().view(-1,) for stack in stacks],
+                            dim=0).to(self._device)
+            #print('stack_states', stack_states)
+
+            # skip the first step (all NOOP)
+            if prev_output is not None:
+                # result calculated batch-wise
+                batch_result = {
+                    self.ADD: self.transformer_add(stack_states),
+                    self.SUB: self.transformer_sub(stack_states),
+                    self.MUL: self.transformer_mul(stack_states),
+                    self.DIV: self.transformer_div(stack_states),
+                    self.POWER: self.transformer_power(stack_states)
+                }
+
+            prev_returns = []
+            # apply previous op on stacks
+            for b in range(batch_size):
+                #print('prev_op[b].item()', prev_op[b].item())
+                #print(prev_op[b].item(), OPERATIONS.NOOP, OPERATIONS.GEN_VAR, OPERATIONS.EQL); exit()
+                # no op
+                if prev_op[b].item() == self.NOOP:
+                    ret = self.noop_padding_return
+
+                elif prev_op[b].item() == self.PAD:
+                    ret = self.noop_padding_return
+                # generate variable
+                elif prev_op[b].item() == self.GEN_VAR:
+                    variable = batch_result[self.GEN_VAR][b]
+                    operands[b].append(variable)
+                    stacks[b].add_variable(variable)
+                    ret = variable
+                    #print('add_variable', stacks[b]._operands)
+
+                # OPERATIONS.ADD, SUB, MUL, DIV
+                elif prev_op[b].item() in [self.ADD, self.SUB,
+                                           self.MUL, self.DIV, self.POWER]:
+                    #print('>>> OPERATIONS.ADD, SUB, MUL, DIV', len(stacks[b]._stack))
+                    transformed = batch_result[prev_op[b].item()][b]
+                    #print('transformed', transformed)
+                    ret = stacks[b].apply_embed_only(
+                        prev_op[b].item(),
+                        transformed)
+
+                # elif prev_op[b].item() in [self.RAW_EQL, self.BRG]:
+                #     ret = stacks[b].apply_embed_only(prev_op[b].item(), None)
+
+                elif prev_op[b].item() == self.EQL:
+                    ret = stacks[b].apply_eql(prev_op[b].item())
+
+                # push operand
+                else:
+                    #if b == 0: print('>>> push operand', len(stacks[b]._stack))
+                    stacks[b].push(prev_op[b].item() - N_OPS)
+                    #ret = operands[b][prev_op[b].item() - N_OPS]
+                    ret = number_emb[b][prev_op[b].item() - N_OPS]
+                prev_returns.append(ret)
+                #exit()
+
+            # collect stack states (after applied op)
+            stack_states = \
+                torch.stack([stack.get_top2().view(-1,) for stack in stacks],
+                            dim=0).to(self._device)
+
+            # collect previous returns
+            prev_returns = torch.stack(prev_returns)
         prev_returns = self.dropout(prev_returns)
 
         # decode
@@ -355,6 +364,26 @@ class SalignedDecoder(nn.Module):
 
         return op_logits, arg_logits, outputs, hidden_state
 
+    def batch_transform(self, stack_states, prev_op):
+        """ Transform the top 2 embeddings of each stack with the operator applied on it.
+
+        Args:
+            stack_states (torch.Tensor): Top 2 embeddings of each stack, with size [batch, 2 * dim_embedding].
+            prev_op (torch.LongTensor): Previous operation, with size [batch].
+
+        Return:
+            torch.Tensor: Resulted embedding, with size [batch, dim_embedding], zeros for problems not applying an operator.
+        """
+        transformed = None
+        for op, transformer in [(self.ADD, self.transformer_add), (self.SUB, self.transformer_sub),
+                                (self.MUL, self.transformer_mul), (self.DIV, self.transformer_div),
+                                (self.POWER, self.transformer_power)]:
+            result = transformer(stack_states)
+            if transformed is None:
+                transformed = torch.zeros_like(result)
+            transformed = torch.where((prev_op == op).unsqueeze(1), result, transformed)
+        return transformed
+
     def pad_and_cat(self, tensors, padding):
         """ Pad lists to have same number of elements, and concatenate
         those elements to a 3d tensor.
@@ -31,9 +31,17 @@ class TransformerDecoder(nn.Module):
                 TransformerLayer(embedding_size, ffn_size, num_heads, attn_dropout_ratio, attn_weight_dropout_ratio,
                                  ffn_dropout_ratio, with_external))
 
+    def init_cache(self):
+        r"""Build empty key/value caches of all layers for incremental decoding.
+
+        Returns:
+            list: one cache per layer, pass it to :meth:`forward` as ``cache`` at every step.
+        """
+        return [layer.init_cache() for layer in self.transformer_layers]
+
     def forward(self, x, kv=None,
                 self_padding_mask=None, self_attn_mask=None,
-                external_states=None, external_padding_mask=None):
+                external_states=None, external_padding_mask=None, cache=None):
         r""" Implement the decoding process step by step.
 
         Args:
@@ -43,10 +51,14 @@ class TransformerDecoder(nn.Module):
             self_attn_mask (torch.Tensor): diagonal attention mask matrix of target sequence, shape: [batch_size, sequence_length, sequence_length], default: None.
             external_states (torch.Tensor): output features of encoder, shape: [batch_size, sequence_length, feature_size], default: None.
             external_padding_mask (torch.Tensor): padding mask of source sequence, shape: [batch_size, sequence_length], default: None.
+            cache (list|None): key/value caches built by :meth:`init_cache`, default: None. If given, x only holds the
+                new positions, which attend to all positions fed before, so self_attn_mask is not needed.
 
         Returns:
             torch.Tensor: output features, shape: [batch_size, sequence_length, ffn_size].
         """
         for idx, layer in enumerate(self.transformer_layers):
-            x, _, _ = layer(x, kv, self_padding_mask, self_attn_mask, external_states, external_padding_mask)
-        return x
\ No newline at end of file
+            layer_cache = cache[idx] if cache is not None else None
+            x, _, _ = layer(x, kv, self_padding_mask, self_attn_mask, external_states, external_padding_mask,
+                            layer_cache)
+        return x
@@ -1,4 +1,10 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.module.Embedder import basic_embedder,bert_embedder,position_embedder,roberta_embedder
\ No newline at end of file
+
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['basic_embedder', 'bert_embedder', 'position_embedder', 'roberta_embedder']
+)
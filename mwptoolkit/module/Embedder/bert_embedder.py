@@ -6,12 +6,15 @@
 
 import torch
 from torch import nn
-from transformers import BertModel
+
+from mwptoolkit.utils.lazy_import import LazyModule
+
+transformers = LazyModule('transformers')
 
 class BertEmbedder(nn.Module):
     def __init__(self,input_size,pretrained_model_path):
         super(BertEmbedder,self).__init__()
-        self.bert=BertModel.from_pretrained(pretrained_model_path)
+        self.bert=transformers.BertModel.from_pretrained(pretrained_model_path)
         
     def forward(self,input_seq):
         output=self.bert(input_seq)[0]
@@ -6,13 +6,16 @@
 
 import torch
 from torch import nn
-from transformers import RobertaModel
+
+from mwptoolkit.utils.lazy_import import LazyModule
+
+transformers = LazyModule('transformers')
 
 class RobertaEmbedder(nn.Module):
     def __init__(self,input_size,pretrained_model_path):
         super(RobertaEmbedder,self).__init__()
         #roberta=RobertaModel.from_pretrained(pretrain_model_path)
-        self.roberta=RobertaModel.from_pretrained(pretrained_model_path)
+        self.roberta=transformers.RobertaModel.from_pretrained(pretrained_model_path)
         #self.roberta.resize_token_embeddings(input_size)
     
     def forward(self,input_seq,attn_mask):
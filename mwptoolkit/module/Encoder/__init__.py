@@ -1,4 +1,10 @@
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
-from mwptoolkit.module.Encoder import graph_based_encoder,rnn_encoder,transformer_encoder
\ No newline at end of file
+
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['graph_based_encoder', 'rnn_encoder', 'transformer_encoder']
+)
@@ -6,10 +6,12 @@
 
 import torch
 from torch import nn
-from transformers import BertModel
 
 from mwptoolkit.module.Layer.transformer_layer import TransformerLayer,GAEncoderLayer,LayerNorm
 from mwptoolkit.utils.utils import clones
+from mwptoolkit.utils.lazy_import import LazyModule
+
+transformers = LazyModule('transformers')
 
 class TransformerEncoder(nn.Module):
     r"""
@@ -79,7 +81,7 @@ class BertEncoder(nn.Module):
     def __init__(self,hidden_size,dropout_ratio,pretrained_model_path):
         super(BertEncoder, self).__init__()
         self.embedding_size = 768
-        self.bert = BertModel.from_pretrained(pretrained_model_path)
+        self.bert = transformers.BertModel.from_pretrained(pretrained_model_path)
         self.hidden_size = hidden_size
         self.dropout = dropout_ratio
 
@@ -4,9 +4,12 @@
 # @File: stack_machine.py
 
 
-import sympy
 import torch
 
+from mwptoolkit.utils.lazy_import import LazyModule
+
+sympy = LazyModule('sympy')
+
 class OPERATIONS:
     def __init__(self, out_symbol2idx):
         self.NOOP = -1
@@ -195,3 +198,108 @@ class StackMachine:
 
     def get_stack(self):
         return [self._bottom_embed] + [s[1] for s in self._stack]
+
+
+class BatchStackMachine:
+    r"""Stack machines of a batch in dry run mode, where only embeddings are kept.
+
+    Stacks of all problems are held in one padded tensor of shape [batch_size, max_depth, dim_embedding] with a
+    height vector, so that push, apply and get_top2 are index operations on the whole batch instead of a python
+    loop over problems. Values are not calculated, use `StackMachine` to solve equations with sympy.
+    """
+    def __init__(self, operations, embeddings, bottom_embedding, max_depth):
+        """
+        Args:
+            operations (mwptoolkit.module.Environment.stack_machine.OPERATIONS): operation symbols.
+            embeddings (list): Embedding of the operands of each problem, a list of tensors of shape (dim_embedding,).
+            bottom_embedding (torch.Tensor): Tensor of shape (dim_embedding,). The embedding to return when stack is empty.
+            max_depth (int): Max height of the stacks, no more than the number of steps.
+        """
+        self.operations = operations
+        self._bottom_embed = bottom_embedding
+        device = bottom_embedding.device
+        batch_size = len(embeddings)
+        self._n_operands = torch.LongTensor([len(embedding) for embedding in embeddings]).to(device)
+        max_operands = max(len(embedding) for embedding in embeddings)
+        self._operands = torch.stack(
+            [torch.stack(list(embedding) + [bottom_embedding] * (max_operands - len(embedding)), dim=0)
+             for embedding in embeddings], dim=0)
+
+        self._binary_ops = torch.LongTensor(
+            [operations.ADD, operations.SUB, operations.MUL, operations.DIV, operations.POWER]).to(device)
+        self._batch_index = torch.arange(batch_size, device=device)
+        self._depth_index = torch.arange(max(max_depth, 1), device=device)
+        self._stack = bottom_embedding.new_zeros((batch_size, max(max_depth, 1), bottom_embedding.size(0)))
+        self.height = torch.zeros(batch_size, dtype=torch.long, device=device)
+
+        # whether `<EOS>` has been applied, the problem is finished
+        self.finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
+
+        # operations logged by each stack machine, NOOP where nothing is logged
+        self._log = []
+
+    def get_top2(self):
+        """ Get the top 2 embeddings of the stacks.
+
+        Return:
+            torch.Tensor: Return tensor of shape (batch_size, 2 * embed_dim).
+        """
+        top1 = self._stack[self._batch_index, (self.height - 1).clamp(min=0)]
+        top2 = self._stack[self._batch_index, (self.height - 2).clamp(min=0)]
+        top1 = torch.where((self.height >= 1).unsqueeze(1), top1, self._bottom_embed)
+        top2 = torch.where((self.height >= 2).unsqueeze(1), top2, self._bottom_embed)
+        return torch.cat([top1, top2], dim=1)
+
+    def apply(self, operation, embed_res):
+        """ Apply an operation on each stack, the same as `StackMachine.push`, `StackMachine.apply_embed_only` and
+        `StackMachine.apply_eql`.
+
+        An operand is pushed for operations not in OPERATIONS, an operator is applied if the stack has 2 elements at least.
+
+        Args:
+            operation (torch.LongTensor): operation of each problem, with size (batch_size,). NOOP and PAD leave the stack as it is.
+            embed_res (torch.Tensor|None): Resulted embedding of the operator of each problem, with size (batch_size, dim_embedding).
+
+        Returns:
+            torch.Tensor: embedding returned by the operation on each stack, with size (batch_size, dim_embedding).
+        """
+        operations = self.operations
+        operation = operation.to(self.height.device)
+        no_op = (operation == operations.NOOP) | (operation == operations.PAD)
+        binary = (operation.unsqueeze(1) == self._binary_ops).any(1)
+        eql = operation == operations.EQL
+        push = ~(no_op | binary | eql)
+        applied = binary & (self.height >= 2)
+
+        # operands are indexed from N_OPS, constants before it wrap around to the end as with python lists.
+        operand_index = torch.remainder(operation - operations.N_OPS, self._n_operands)
+        pushed = self._operands[self._batch_index, operand_index]
+        if embed_res is None:
+            embed_res = pushed
+        written = torch.where(applied.unsqueeze(1), embed_res, pushed)
+        position = torch.where(applied, self.height - 2, self.height)
+        write = ((self._depth_index == position.unsqueeze(1)) & (applied | push).unsqueeze(1)).unsqueeze(2)
+        self._stack = torch.where(write, written.unsqueeze(1), self._stack)
+        self.height = self.height + push.long() - applied.long()
+        self.finished = self.finished | eql
+        self._log.append(torch.where(push | applied | eql, operation, torch.full_like(operation, operations.NOOP)))
+
+        ret = torch.where(push.unsqueeze(1), pushed, self._bottom_embed.expand_as(pushed))
+        return torch.where(applied.unsqueeze(1), embed_res, ret)
+
+    def get_height(self):
+        """ Get the height of the stacks.
+
+        Return:
+            torch.LongTensor: height of each stack, with size (batch_size,).
+        """
+        return self.height
+
+    @property
+    def stack_log_index(self):
+        """operations logged by each stack machine, the same as `StackMachine.stack_log_index`.
+        """
+        if not self._log:
+            return [[] for _ in range(self.height.size(0))]
+        log = torch.stack(self._log, dim=1).tolist()
+        return [[op for op in ops if op != self.operations.NOOP] for ops in log]
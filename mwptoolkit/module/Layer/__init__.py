@@ -2,4 +2,9 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-from mwptoolkit.module.Layer import graph_layers,layers,transformer_layer,tree_layers
\ No newline at end of file
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['graph_layers', 'layers', 'number_gather', 'transformer_layer', 'tree_layers']
+)
@@ -0,0 +1,65 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/22 16:40:18
+# @File: number_gather.py
+
+
+import torch
+
+
+def gather_number_positions(hidden, num_pos, num_size):
+    r"""gather the hidden states of the number positions of every sample with one indexing op.
+
+    Args:
+        hidden (torch.Tensor): hidden states, shape [batch_size, seq_length, hidden_size].
+
+        num_pos (list): positions of the numbers of each sample, -1 for a number not in the sequence.
+
+        num_size (int): number of gathered slots per sample, at least the largest length of `num_pos`.
+
+    Returns:
+        tuple(torch.Tensor, torch.Tensor):
+            gathered hidden states, shape [batch_size, num_size, hidden_size], zero at padded slots.
+            pad mask, shape [batch_size, num_size], True at padded slots.
+    """
+    batch_size = hidden.size(0)
+    indices = [[max(i, 0) for i in pos] + [0] * (num_size - len(pos)) for pos in num_pos]
+    valid = [[i != -1 for i in pos] + [False] * (num_size - len(pos)) for pos in num_pos]
+    indices = torch.tensor(indices, dtype=torch.long, device=hidden.device).view(batch_size, num_size)
+    pad_mask = ~torch.tensor(valid, dtype=torch.bool, device=hidden.device).view(batch_size, num_size)
+    batch_index = torch.arange(batch_size, device=hidden.device).unsqueeze(1)
+    gathered = hidden[batch_index, indices]
+    return gathered.masked_fill(pad_mask.unsqueeze(-1), 0.0), pad_mask
+
+
+def gather_number_spans(hidden, mask, num_size):
+    r"""mean of the hidden states spanned by each number, as a batched segment mean.
+
+    The span of number i in a sample runs from the first to the last position where `mask` is i,
+    the positions in between are averaged whatever their mask value is.
+
+    Args:
+        hidden (torch.Tensor): hidden states, shape [batch_size, seq_length, hidden_size].
+
+        mask (torch.Tensor): number index of every position, negative for other tokens, shape [batch_size, seq_length].
+
+        num_size (int): number of gathered slots per sample.
+
+    Returns:
+        tuple(torch.Tensor, torch.Tensor):
+            gathered hidden states, shape [batch_size, num_size, hidden_size], zero at padded slots.
+            pad mask, shape [batch_size, num_size], True where the number does not occur.
+    """
+    seq_len = hidden.size(1)
+    positions = torch.arange(seq_len, device=hidden.device)
+    slots = torch.arange(num_size, device=hidden.device)
+    # [B, N, S], True where position s holds number n.
+    occurs = mask.unsqueeze(1) == slots.view(1, -1, 1)
+    expanded = positions.view(1, 1, -1).expand_as(occurs)
+    begin = expanded.masked_fill(~occurs, seq_len).min(dim=-1)[0]
+    end = expanded.masked_fill(~occurs, -1).max(dim=-1)[0]
+    pad_mask = end < 0
+    span = (positions >= begin.unsqueeze(-1)) & (positions <= end.unsqueeze(-1))
+    count = span.sum(dim=-1, keepdim=True).clamp(min=1)
+    gathered = torch.bmm(span.to(hidden.dtype), hidden) / count.to(hidden.dtype)
+    return gathered, pad_mask
@@ -9,13 +9,13 @@ import math
 from torch import nn
 from torch.nn import functional as F
 
-from transformers.activations import gelu_new as gelu_bert
-
-
 from mwptoolkit.module.Attention.multi_head_attention import MultiHeadAttention
 from mwptoolkit.module.Attention.multi_head_attention import EPTMultiHeadAttention
 from mwptoolkit.module.Attention.group_attention import GroupAttention
 from mwptoolkit.utils.utils import clones
+from mwptoolkit.utils.lazy_import import LazyModule
+
+activations = LazyModule('transformers.activations')
 
 
 class TransformerLayer(nn.Module):
@@ -29,6 +29,7 @@ class TransformerLayer(nn.Module):
         self_attn_mask (torch.bool): the attention mask for the multi head attention sublayer.
         external_states (torch.Tensor): the external context for decoder, e.g., hidden states from encoder.
         external_padding_mask (torch.bool): the padding mask for the external states.
+        layer_cache (dict): the cached keys and values of this layer for incremental decoding, see :meth:`init_cache`.
 
     Returns:
         feedforward_output (torch.Tensor): the output of the point-wise feed-forward sublayer, is the output of the transformer layer
@@ -62,18 +63,28 @@ class TransformerLayer(nn.Module):
     def gelu(self, x):
         return x * 0.5 * (1.0 + torch.erf(x / math.sqrt(2.0)))
 
-    def forward(self, x, kv=None, self_padding_mask=None, self_attn_mask=None, external_states=None, external_padding_mask=None):
+    def init_cache(self):
+        r"""Build an empty cache for incremental decoding.
+
+        With the cache, x only holds the new positions at each call, the keys and values of the previous positions
+        and the projected external states are read from the cache instead of being recomputed.
+        """
+        return {'self': {}, 'external': {}}
+
+    def forward(self, x, kv=None, self_padding_mask=None, self_attn_mask=None, external_states=None, external_padding_mask=None, layer_cache=None):
         residual = x
+        self_cache = layer_cache['self'] if layer_cache is not None else None
         if kv is None:
-            x, self_attn_weights = self.multi_head_attention(query=x, key=x, value=x, key_padding_mask=self_padding_mask, attn_mask=self_attn_mask)
+            x, self_attn_weights = self.multi_head_attention(query=x, key=x, value=x, key_padding_mask=self_padding_mask, attn_mask=self_attn_mask, layer_cache=self_cache)
         else:
-            x, self_attn_weights = self.multi_head_attention(query=x, key=kv, value=kv, key_padding_mask=self_padding_mask, attn_mask=self_attn_mask)
+            x, self_attn_weights = self.multi_head_attention(query=x, key=kv, value=kv, key_padding_mask=self_padding_mask, attn_mask=self_attn_mask, layer_cache=self_cache)
         x = self.attn_dropout(x)
         x = self.attn_layer_norm(residual + x)
 
         if self.with_external:
             residual = x
-            x, external_attn_weights = self.external_multi_head_attention(query=x, key=external_states, value=external_states, key_padding_mask=external_padding_mask)
+            external_cache = layer_cache['external'] if layer_cache is not None else None
+            x, external_attn_weights = self.external_multi_head_attention(query=x, key=external_states, value=external_states, key_padding_mask=external_padding_mask, layer_cache=external_cache, static_kv=True)
             x = self.attn_dropout(x)
             x = self.external_layer_norm(residual + x)
         else:
@@ -216,7 +227,7 @@ class EPTTransformerLayer(nn.Module):
             target = self.norm_mem(target)
 
         # Pass linear transformations
-        output = self.lin_collapse(self.dropout_expand(gelu_bert(self.lin_expand(target))))
+        output = self.lin_collapse(self.dropout_expand(activations.gelu_new(self.lin_expand(target))))
         target = target + self.dropout_out(output)
         target = self.norm_out(target)
 
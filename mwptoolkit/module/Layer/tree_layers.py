@@ -299,6 +299,112 @@ class RecursiveNN(nn.Module):
             self.labelList.append(self.classes.index(node.node_value))
         return currentNode
 
+    def batch_forward(self, trees, num_embeddings, look_ups):
+        """
+        Same as forward, but the trees of a batch are given as postorder arrays and composed together, level by level.
+
+        Args:
+            trees (list): postorder arrays of the trees, built by `~mwptoolkit.utils.preprocess_tool.tree_operator.postfix_tree`.
+            num_embeddings (list): number embeddings of each tree, shape [number_size, emb_size].
+            look_ups (list): number symbols of each tree.
+
+        Returns:
+            tuple(list, list):
+                node probabilities of the operators of each tree in postorder, shape [operator_number, op_size], an empty list for a tree without operators.
+                labels of the operators of each tree.
+        """
+        probs = self._level_traverse(trees, num_embeddings, look_ups)
+        device = num_embeddings[0].device
+        labels = []
+        for tree, prob in zip(trees, probs):
+            if isinstance(prob, list):
+                labels.append([])
+                continue
+            label = [self.classes.index(symbol) for symbol, left in zip(tree['symbols'], tree['left']) if left >= 0]
+            labels.append(torch.tensor(label).to(device))
+        return probs, labels
+
+    def batch_test(self, trees, num_embeddings, look_ups):
+        """
+        Same as test, but the trees of a batch are given as postorder arrays and composed together, level by level.
+
+        Args:
+            trees (list): postorder arrays of the trees, built by `~mwptoolkit.utils.preprocess_tool.tree_operator.postfix_tree`.
+            num_embeddings (list): number embeddings of each tree, shape [number_size, emb_size].
+            look_ups (list): number symbols of each tree.
+
+        Returns:
+            tuple(list, list, list):
+                node probabilities of the operators of each tree in postorder, shape [operator_number, op_size], an empty list for a tree without operators.
+                predicted labels of the operators of each tree.
+                postfix equation of each tree with the predicted operators.
+        """
+        probs = self._level_traverse(trees, num_embeddings, look_ups)
+        labels = []
+        equations = []
+        for tree, prob in zip(trees, probs):
+            if isinstance(prob, list):
+                labels.append([])
+                equations.append(list(tree['symbols']))
+                continue
+            label = torch.topk(prob, 1, 1)[1].view(-1)
+            ops = iter([self.classes[op_idx] for op_idx in label.tolist()])
+            labels.append(label)
+            equations.append([next(ops) if left >= 0 else symbol for symbol, left in zip(tree['symbols'], tree['left'])])
+        return probs, labels, equations
+
+    def _level_traverse(self, trees, num_embeddings, look_ups):
+        # nodes of all trees share one embedding table, indexed by the offset of their tree plus their postorder index.
+        numbers = torch.cat(num_embeddings, dim=0)
+        leaf_rows = []
+        leaf_numbers = []
+        levels = {}
+        tree_ops = []
+        node_offset = 0
+        number_offset = 0
+        for tree, num_embedding, look_up in zip(trees, num_embeddings, look_ups):
+            ops = []
+            for t, (symbol, left, right, level) in enumerate(zip(tree['symbols'], tree['left'], tree['right'], tree['level'])):
+                if left < 0:
+                    leaf_rows.append(node_offset + t)
+                    leaf_numbers.append(number_offset + (look_up.index(symbol) if symbol in look_up else 0))
+                else:
+                    rows, lefts, rights = levels.setdefault(level, ([], [], []))
+                    ops.append((level, len(rows)))
+                    rows.append(node_offset + t)
+                    lefts.append(node_offset + left)
+                    rights.append(node_offset + right)
+            tree_ops.append(ops)
+            node_offset += len(tree['symbols'])
+            number_offset += num_embedding.size(0)
+
+        device = numbers.device
+        nodes = numbers.new_zeros((node_offset, self.emb_size))
+        nodes = nodes.index_copy(0, torch.tensor(leaf_rows, device=device),
+                                 numbers.index_select(0, torch.tensor(leaf_numbers, device=device)))
+        level_probs = []
+        level_offsets = {}
+        prob_offset = 0
+        for level in sorted(levels):
+            rows, lefts, rights = [torch.tensor(index, device=device) for index in levels[level]]
+            combined_v = torch.cat((nodes.index_select(0, lefts), nodes.index_select(0, rights)), 1)
+            node_embedding, op_prob = self.RecurCell(combined_v)
+            nodes = nodes.index_copy(0, rows, node_embedding)
+            level_probs.append(op_prob)
+            level_offsets[level] = prob_offset
+            prob_offset += rows.size(0)
+        if not level_probs:
+            return [[] for _ in trees]
+        level_probs = torch.cat(level_probs, dim=0)
+        probs = []
+        for ops in tree_ops:
+            if not ops:
+                probs.append([])
+                continue
+            prob_index = torch.tensor([level_offsets[level] + row for level, row in ops], device=device)
+            probs.append(level_probs.index_select(0, prob_index))
+        return probs
+
     def RecurCell(self, combine_emb):
         node_embedding = torch.tanh(self.W(combine_emb))
         #op=self.softmax(self.generate_linear(node_embedding),dim=1)
@@ -504,6 +610,45 @@ class Prediction(nn.Module):
 
         current_node = torch.stack(current_node_temp)
 
+        return self._predict(current_node, encoder_outputs, num_pades, seq_mask, mask_nums)
+
+    def batch_forward(self, current_embeddings, left_childs, left_mask, encoder_outputs, num_pades, seq_mask, mask_nums):
+        """
+        Same as forward, but the current nodes and left childs are given as tensors instead of python stacks,
+        so that nodes of many problems (or beams) are scored together.
+
+        Args:
+            current_embeddings (torch.Tensor): representation of current nodes, shape [batch_size, hidden_size].
+            left_childs (torch.Tensor): representation of left childs, shape [batch_size, hidden_size], rows where left_mask is False are ignored.
+            left_mask (torch.BoolTensor): whether the current node has a left child, shape [batch_size].
+            encoder_outputs (torch.Tensor): output from encoder, shape [sequence_length, batch_size, hidden_size].
+            num_pades (torch.Tensor): number representation, shape [batch_size, number_size, hidden_size].
+            seq_mask (torch.BoolTensor): sequence mask, shape [batch_size, sequence_length].
+            mask_nums (torch.BoolTensor): number mask, shape [batch_size, number_size].
+
+        Returns:
+            tuple(torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor): same as forward.
+        """
+        c = self.dropout(current_embeddings)
+        current_node = torch.zeros_like(c)
+        without_left = (~left_mask).nonzero(as_tuple=True)[0]
+        with_left = left_mask.nonzero(as_tuple=True)[0]
+        if without_left.numel() > 0:
+            c_l = c.index_select(0, without_left)
+            g = torch.tanh(self.concat_l(c_l))
+            t = torch.sigmoid(self.concat_lg(c_l))
+            current_node = current_node.index_copy(0, without_left, g * t)
+        if with_left.numel() > 0:
+            ld = self.dropout(left_childs.index_select(0, with_left))
+            c_r = c.index_select(0, with_left)
+            g = torch.tanh(self.concat_r(torch.cat((ld, c_r), 1)))
+            t = torch.sigmoid(self.concat_rg(torch.cat((ld, c_r), 1)))
+            current_node = current_node.index_copy(0, with_left, g * t)
+        current_node = current_node.unsqueeze(1)
+
+        return self._predict(current_node, encoder_outputs, num_pades, seq_mask, mask_nums)
+
+    def _predict(self, current_node, encoder_outputs, num_pades, seq_mask, mask_nums):
         current_embeddings = self.dropout(current_node)
 
         current_attn = self.attn(current_embeddings.transpose(0, 1), encoder_outputs, seq_mask)
@@ -680,6 +825,30 @@ class SemanticAlignmentModule(nn.Module):
 
         return encoder_linear2, decoder_linear2
 
+    def batch_forward(self, decoder_hidden, encoder_outputs):
+        """
+        Same as forward, but many sub trees are aligned together, each one with the encoder outputs of its problem.
+
+        Args:
+            decoder_hidden (torch.Tensor): representation of sub trees, shape [batch_size, hidden_size].
+            encoder_outputs (torch.Tensor): output from encoder of the problem of each sub tree, shape [sequence_length, batch_size, hidden_size].
+
+        Returns:
+            tuple(torch.Tensor, torch.Tensor): encoder mapping and decoder mapping, shape [1, batch_size, hidden_size].
+        """
+        decoder_hidden = decoder_hidden.unsqueeze(0)
+        attn_weights = self.attn(decoder_hidden, encoder_outputs, None)
+        align_context = attn_weights.bmm(encoder_outputs.transpose(0, 1))  # B x 1 x H
+        align_context = align_context.transpose(0, 1)
+
+        encoder_linear1 = torch.tanh(self.encoder_linear1(align_context))
+        encoder_linear2 = self.encoder_linear2(encoder_linear1)
+
+        decoder_linear1 = torch.tanh(self.decoder_linear1(decoder_hidden))
+        decoder_linear2 = self.decoder_linear2(decoder_linear1)
+
+        return encoder_linear2, decoder_linear2
+
 
 # class ExtensionNet(nn.Module):
 #     def __init__(self,hidden_size,node_size,dropout_ratio):
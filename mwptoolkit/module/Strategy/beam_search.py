@@ -150,3 +150,185 @@ class Beam_Search_Hypothesis(object):
             returns += [encoder_output, encoder_mask]
             
         return returns
+
+
+class _Stack:
+    """immutable linked stack, hypotheses expanded from the same beam share everything below their own top."""
+    __slots__ = ('item', 'below')
+
+    def __init__(self, item, below=None):
+        self.item = item
+        self.below = below
+
+
+class _TreeHypothesis:
+    __slots__ = ('score', 'node_stack', 'embedding_stack', 'left_child', 'out', 'token_logit')
+
+    def __init__(self, score, node_stack, embedding_stack, left_child, out, token_logit):
+        self.score = score
+        self.node_stack = node_stack
+        self.embedding_stack = embedding_stack
+        self.left_child = left_child
+        self.out = out
+        self.token_logit = token_logit
+
+
+class TreeBeamSearch(object):
+    r"""Batched beam search for goal-driven tree decoders (GTS, Graph2Tree, TSN, MWPBert, SAUSolver, BertTD).
+
+    All live hypotheses of all problems in a batch are stacked into one tensor, so every step costs one call of
+    the prediction module, one call of the node generater and one call of the merge module per merge depth,
+    instead of one call per hypothesis. Node stacks and tree embedding stacks are kept as shared linked stacks,
+    so expanding a beam never copies them.
+
+    Hypotheses are expanded, sorted and pruned in the same order as the original per-beam loop, so the top-1 output
+    is the same.
+
+    example of instantiation:
+
+        >>> beam_search = TreeBeamSearch(model.decoder, model.node_generater, model.merge, num_start, beam_size, max_length)
+        >>> token_logits, outputs, output_lengths, scores = beam_search.search(encoder_outputs, problem_output,
+        ...                                                                     all_nums_encoder_outputs, seq_mask, num_mask)
+    """
+
+    def __init__(self, decoder, node_generater, merge, num_start, beam_size, max_length):
+        """
+        Args:
+            decoder (~mwptoolkit.module.Layer.tree_layers.Prediction): prediction module.
+            node_generater (~mwptoolkit.module.Layer.tree_layers.GenerateNode): node generation module.
+            merge (~mwptoolkit.module.Layer.tree_layers.Merge): sub tree merge module.
+            num_start (int): index of the first number symbol, symbols before it are operators.
+            beam_size (int): beam size.
+            max_length (int): max output length.
+        """
+        self.decoder = decoder
+        self.node_generater = node_generater
+        self.merge = merge
+        self.num_start = num_start
+        self.beam_size = beam_size
+        self.max_length = max_length
+
+    def search(self, encoder_outputs, problem_output, all_nums_encoder_outputs, seq_mask, num_mask):
+        """
+        Args:
+            encoder_outputs (torch.Tensor): output from encoder, shape [sequence_length, batch_size, hidden_size].
+            problem_output (torch.Tensor): goal vector of the root, shape [batch_size, hidden_size].
+            all_nums_encoder_outputs (torch.Tensor): number representation, shape [batch_size, number_size, hidden_size].
+            seq_mask (torch.BoolTensor): sequence mask, shape [batch_size, sequence_length].
+            num_mask (torch.BoolTensor): number mask, shape [batch_size, number_size].
+
+        Returns:
+            tuple(torch.Tensor, torch.LongTensor, list, list):
+                token_logits, logits of the best hypothesis, zero padded, shape [batch_size, output_length, symbol_size].
+                outputs, symbols of the best hypothesis, zero padded, shape [batch_size, output_length].
+                output_lengths, lengths of the best hypotheses, length [batch_size].
+                scores, log probabilities of the best hypotheses, length [batch_size].
+        """
+        batch_size = problem_output.size(0)
+        device = problem_output.device
+        padding_hidden = problem_output.new_zeros(problem_output.size(1))
+
+        beams = [[_TreeHypothesis(0.0, _Stack(problem_output[b]), None, None, [], [])] for b in range(batch_size)]
+        finished = [False for _ in range(batch_size)]
+        for t in range(self.max_length):
+            live = []
+            for b in range(batch_size):
+                if finished[b]:
+                    continue
+                for hyp in beams[b]:
+                    if hyp.node_stack is not None:
+                        live.append((b, hyp))
+            problem_index = torch.LongTensor([b for b, _ in live]).to(device)
+            node_embeddings = torch.stack([hyp.node_stack.item for _, hyp in live])
+            left_childs = torch.stack([hyp.left_child if hyp.left_child is not None else padding_hidden
+                                       for _, hyp in live])
+            left_mask = torch.BoolTensor([hyp.left_child is not None for _, hyp in live]).to(device)
+
+            num_score, op_score, current_embeddings, current_context, current_nums_embeddings = \
+                self.decoder.batch_forward(node_embeddings, left_childs, left_mask,
+                                           encoder_outputs.index_select(1, problem_index),
+                                           all_nums_encoder_outputs.index_select(0, problem_index),
+                                           seq_mask.index_select(0, problem_index),
+                                           num_mask.index_select(0, problem_index))
+            token_logit = torch.cat((op_score, num_score), 1)
+            out_score = F.log_softmax(token_logit, dim=1)
+            topv, topi = out_score.topk(self.beam_size)
+            topv = topv.tolist()
+            topi = topi.tolist()
+
+            candidates = [[None] * self.beam_size for _ in live]
+            op_candidates = []
+            num_candidates = []
+            for i in range(len(live)):
+                for k in range(self.beam_size):
+                    if topi[i][k] < self.num_start:
+                        op_candidates.append((i, k))
+                    else:
+                        num_candidates.append((i, k))
+
+            # expand every operator candidate with one call of node generater
+            if len(op_candidates) > 0:
+                rows = torch.LongTensor([i for i, _ in op_candidates]).to(device)
+                labels = torch.LongTensor([topi[i][k] for i, k in op_candidates]).to(device)
+                left_child, right_child, node_label = self.node_generater(current_embeddings.index_select(0, rows),
+                                                                          labels,
+                                                                          current_context.index_select(0, rows))
+                for n, (i, k) in enumerate(op_candidates):
+                    hyp = live[i][1]
+                    node_stack = _Stack(left_child[n], _Stack(right_child[n], hyp.node_stack.below))
+                    embedding_stack = _Stack((node_label[n], False), hyp.embedding_stack)
+                    candidates[i][k] = _TreeHypothesis(hyp.score + topv[i][k], node_stack, embedding_stack, None,
+                                                       hyp.out + [topi[i][k]], hyp.token_logit + [token_logit[i]])
+
+            # merge finished sub trees of every number candidate, one call of merge per depth
+            if len(num_candidates) > 0:
+                rows = torch.LongTensor([i for i, _ in num_candidates]).to(device)
+                cols = torch.LongTensor([topi[i][k] - self.num_start for i, k in num_candidates]).to(device)
+                current_nums = list(current_nums_embeddings[rows, cols].unbind(0))
+                embedding_stacks = [live[i][1].embedding_stack for i, _ in num_candidates]
+                while True:
+                    merging = [n for n, stack in enumerate(embedding_stacks) if stack is not None and stack.item[1]]
+                    if len(merging) == 0:
+                        break
+                    op_embedding = torch.stack([embedding_stacks[n].below.item[0] for n in merging])
+                    sub_tree = torch.stack([embedding_stacks[n].item[0] for n in merging])
+                    current_num = torch.stack([current_nums[n] for n in merging])
+                    merged = self.merge(op_embedding, sub_tree, current_num)
+                    for m, n in enumerate(merging):
+                        current_nums[n] = merged[m]
+                        embedding_stacks[n] = embedding_stacks[n].below.below
+                for n, (i, k) in enumerate(num_candidates):
+                    hyp = live[i][1]
+                    embedding_stack = _Stack((current_nums[n], True), embedding_stacks[n])
+                    candidates[i][k] = _TreeHypothesis(hyp.score + topv[i][k], hyp.node_stack.below, embedding_stack,
+                                                       current_nums[n], hyp.out + [topi[i][k]],
+                                                       hyp.token_logit + [token_logit[i]])
+
+            # same order as popping beams one by one, so that ties are broken as before
+            children = {id(hyp): candidates[i] for i, (_, hyp) in enumerate(live)}
+            for b in range(batch_size):
+                if finished[b]:
+                    continue
+                current_beams = []
+                for hyp in reversed(beams[b]):
+                    if hyp.node_stack is None:
+                        current_beams.append(hyp)
+                    else:
+                        current_beams.extend(children[id(hyp)])
+                beams[b] = sorted(current_beams, key=lambda x: x.score, reverse=True)[:self.beam_size]
+                finished[b] = all(hyp.node_stack is None for hyp in beams[b])
+            if all(finished):
+                break
+
+        best = [beams[b][0] for b in range(batch_size)]
+        output_lengths = [len(hyp.out) for hyp in best]
+        max_output_length = max(output_lengths)
+        symbol_size = self.decoder.op_nums + self.decoder.input_size + all_nums_encoder_outputs.size(1)
+        token_logits = problem_output.new_zeros((batch_size, max_output_length, symbol_size))
+        outputs = torch.zeros((batch_size, max_output_length), dtype=torch.long, device=device)
+        for b, hyp in enumerate(best):
+            if output_lengths[b] > 0:
+                token_logits[b, :output_lengths[b]] = torch.stack(hyp.token_logit)
+                outputs[b, :output_lengths[b]] = torch.LongTensor(hyp.out).to(device)
+        scores = [hyp.score for hyp in best]
+        return token_logits, outputs, output_lengths, scores
@@ -0,0 +1,88 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/08/29 22:12:27
+# @File: grammar_constraint.py
+
+
+import torch
+from torch import nn
+
+from mwptoolkit.utils.enum_type import SpecialTokens
+
+_OPERATORS = ['+', '-', '*', '/', '^']
+
+
+class ExpressionGrammarMask(nn.Module):
+    r"""grammar of infix equations compiled into a symbol x symbol transition mask.
+
+    Row i of `transitions` marks the symbols which can not follow symbol i, the last row marks
+    the symbols which can not start an equation. The rules are the ones of DNS (Wang et al. 2017):
+
+        - an equation does not start with an operator or <EOS>.
+        - after an operator, r_t is not in {+, -, *, /, ^, ), =, <EOS>}.
+        - after a number, r_t is not a number and not '('.
+        - after '=', r_t is not in {+, -, *, /, ^, =, )}.
+        - after '(', r_t is not in {+, -, *, /, ^, ), =, <EOS>}.
+        - after ')', r_t is not a number and not '('.
+
+    The mask is built once, decoding masks the logits of the whole batch with one row lookup per step.
+    """
+    def __init__(self, out_idx2symbol, num_start):
+        """
+        Args:
+            out_idx2symbol (list): output symbols.
+
+            num_start (int): index of the first number symbol, every symbol after it is a number.
+        """
+        super().__init__()
+        symbol_size = len(out_idx2symbol)
+        symbol2idx = {symbol: idx for idx, symbol in enumerate(out_idx2symbol)}
+
+        def indices(symbols):
+            return [symbol2idx[s] for s in symbols if s in symbol2idx]
+
+        numbers = list(range(num_start, symbol_size))
+        after_operator = indices(_OPERATORS + [')', '=', SpecialTokens.EOS_TOKEN])
+        after_number = indices(['(']) + numbers
+        after_equal = indices(_OPERATORS + ['=', ')'])
+        after_left_bracket = indices([')', '='] + _OPERATORS + [SpecialTokens.EOS_TOKEN])
+        after_right_bracket = indices(['(']) + numbers
+
+        transitions = torch.zeros(symbol_size + 1, symbol_size, dtype=torch.bool)
+        for idx, symbol in enumerate(out_idx2symbol):
+            if symbol in _OPERATORS:
+                transitions[idx, after_operator] = True
+            elif idx >= num_start:
+                transitions[idx, after_number] = True
+            elif symbol == '=':
+                transitions[idx, after_equal] = True
+            elif symbol == '(':
+                transitions[idx, after_left_bracket] = True
+            elif symbol == ')':
+                transitions[idx, after_right_bracket] = True
+        transitions[symbol_size, indices(_OPERATORS + [SpecialTokens.EOS_TOKEN])] = True
+        # not saved with the model, it is derived from the vocabulary.
+        self.register_buffer('transitions', transitions, persistent=False)
+        self.start_state = symbol_size
+
+    def init_state(self, batch_size, device):
+        r"""previous symbols of the first decoding step.
+
+        Returns:
+            torch.Tensor: shape [batch_size], the start state.
+        """
+        return torch.full((batch_size,), self.start_state, dtype=torch.long, device=device)
+
+    def forward(self, token_logit, prev_symbols):
+        r"""mask the logits of the symbols which can not follow `prev_symbols`.
+
+        Args:
+            token_logit (torch.Tensor): shape [batch_size, symbol_size].
+
+            prev_symbols (torch.Tensor): symbols of the previous step, or the start state, shape [batch_size] or [batch_size, 1].
+
+        Returns:
+            torch.Tensor: masked logits, shape [batch_size, symbol_size].
+        """
+        mask = self.transitions.index_select(0, prev_symbols.reshape(-1))
+        return token_logit.masked_fill(mask, -float('inf'))
@@ -0,0 +1,145 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/27 20:41:53
+# @File: teacher_forcing.py
+
+
+import torch
+
+from mwptoolkit.utils.utils import map_tensors
+
+
+class TreeTeacherForcing(object):
+    r"""Teacher forced training of goal-driven tree decoders (GTS, Graph2Tree, TSN, MWPBert, SAUSolver) in waves.
+
+    The target trees of a batch are decoded along a schedule built by the dataloader with
+    `~mwptoolkit.utils.preprocess_tool.tree_operator.prefix_tree_schedule`. Every wave costs one call of the
+    prediction module and one call of the node generater for all nodes of the batch in it, and sub trees are
+    merged with one call of the merge module per height, where the sequential loop costs one step per target
+    token and one call of merge per merged sub tree. Goal vectors and sub tree embeddings are gathered from and
+    scattered to tensors indexed by the flat position of the nodes in the padded targets.
+
+    Token logits and resolved targets are the same as the ones of the sequential loop, if dropout is disabled.
+
+    example of instantiation:
+
+        >>> teacher_forcing = TreeTeacherForcing(model.decoder, model.node_generater, model.merge, num_start)
+        >>> token_logits, outputs, merged = teacher_forcing.decode(encoder_outputs, problem_output,
+        ...                                                        all_nums_encoder_outputs, seq_mask, num_mask,
+        ...                                                        target, tree_schedule)
+    """
+
+    def __init__(self, decoder, node_generater, merge, num_start):
+        """
+        Args:
+            decoder (~mwptoolkit.module.Layer.tree_layers.Prediction): prediction module.
+            node_generater (~mwptoolkit.module.Layer.tree_layers.GenerateNode): node generation module.
+            merge (~mwptoolkit.module.Layer.tree_layers.Merge): sub tree merge module.
+            num_start (int): index of the first number symbol, symbols before it are operators.
+        """
+        self.decoder = decoder
+        self.node_generater = node_generater
+        self.merge = merge
+        self.num_start = num_start
+
+    def fits(self, tree_schedule, target, all_nums_encoder_outputs):
+        r"""whether `target` can be decoded along `tree_schedule`, else the sequential loop is used.
+        """
+        if target is None or tree_schedule is None or tree_schedule['length'] != target.size(1):
+            return False
+        number_size = self.decoder.input_size + all_nums_encoder_outputs.size(1)
+        return tree_schedule['max_number'] < number_size
+
+    def decode(self, encoder_outputs, problem_output, all_nums_encoder_outputs, seq_mask, num_mask, target,
+               tree_schedule):
+        """
+        Args:
+            encoder_outputs (torch.Tensor): output from encoder, shape [sequence_length, batch_size, hidden_size].
+            problem_output (torch.Tensor): goal vector of the root, shape [batch_size, hidden_size].
+            all_nums_encoder_outputs (torch.Tensor): number representation, shape [batch_size, number_size, hidden_size].
+            seq_mask (torch.BoolTensor): sequence mask, shape [batch_size, sequence_length].
+            num_mask (torch.BoolTensor): number mask, shape [batch_size, number_size].
+            target (torch.LongTensor): target, UNK symbols are replaced by the numbers they are resolved to, shape [batch_size, target_length].
+            tree_schedule (dict): schedule of the targets.
+
+        Returns:
+            tuple(torch.Tensor, torch.LongTensor, list):
+                token_logits, shape [batch_size, target_length, symbol_size].
+                outputs, shape [batch_size, target_length, 1].
+                merged, embeddings of the merged sub trees and the problems they belong to, one pair per merge call.
+        """
+        device = problem_output.device
+        batch_size, hidden_size = problem_output.size()
+        if tree_schedule['labels'].device != device:
+            # the dataloader places schedules with the batches, others are moved once here.
+            tree_schedule = map_tensors(tree_schedule, lambda tensor: tensor.to(device))
+        max_length = tree_schedule['length']
+
+        # number embeddings, as concatenated by the prediction module.
+        number_embeddings = torch.cat(
+            (self.decoder.embedding_weight.expand(batch_size, -1, -1), all_nums_encoder_outputs), dim=1)
+        number_size = number_embeddings.size(1)
+        number_embeddings = number_embeddings.reshape(batch_size * number_size, hidden_size)
+
+        labels = tree_schedule['labels']
+        op_embeddings = self.node_generater.embeddings(labels)
+        goals = problem_output.new_zeros((batch_size * max_length, hidden_size))
+        goals = goals.index_copy(0, torch.arange(batch_size, device=device) * max_length, problem_output)
+        sub_trees = problem_output.new_zeros((batch_size * max_length, hidden_size))
+        if tree_schedule['leaves'].numel() > 0:
+            leaf_index = tree_schedule['leaf_batch'] * number_size + tree_schedule['leaf_number']
+            sub_trees = sub_trees.index_copy(0, tree_schedule['leaves'],
+                                             number_embeddings.index_select(0, leaf_index))
+
+        merged = []
+        sub_trees = self._merge(sub_trees, op_embeddings, tree_schedule['merges'][0], max_length, merged)
+        token_logits = []
+        for wave_i, wave in enumerate(tree_schedule['waves']):
+            positions = wave['positions']
+            problem_index = wave['batch']
+            num_score, op_score, current_embeddings, current_context, _ = self.decoder.batch_forward(
+                goals.index_select(0, positions),
+                sub_trees.index_select(0, wave['left']),
+                wave['left_mask'],
+                encoder_outputs.index_select(1, problem_index),
+                all_nums_encoder_outputs.index_select(0, problem_index),
+                seq_mask.index_select(0, problem_index),
+                num_mask.index_select(0, problem_index))
+            token_logit = torch.cat((op_score, num_score), 1)
+            token_logits.append(token_logit)
+
+            if wave['unk_rows'].numel() > 0:
+                sub_trees = self._resolve_unk(sub_trees, number_embeddings, number_size, token_logit, target, wave,
+                                              max_length)
+            if wave['op_rows'].numel() > 0:
+                op_rows = wave['op_rows']
+                left_child, right_child, _ = self.node_generater(current_embeddings.index_select(0, op_rows),
+                                                                 labels.index_select(0, wave['op_positions']),
+                                                                 current_context.index_select(0, op_rows))
+                goals = goals.index_copy(0, wave['left_children'], left_child)
+                goals = goals.index_copy(0, wave['right_children'], right_child)
+            sub_trees = self._merge(sub_trees, op_embeddings, tree_schedule['merges'][wave_i + 1], max_length,
+                                    merged)
+
+        token_logits = torch.cat(token_logits, dim=0).index_select(0, tree_schedule['logit_index'])
+        token_logits = token_logits.view(batch_size, max_length, -1)
+        outputs = torch.topk(token_logits, 1, dim=-1)[1]
+        return token_logits, outputs, merged
+
+    def _resolve_unk(self, sub_trees, number_embeddings, number_size, token_logit, target, wave, max_length):
+        # an UNK is resolved to the number of its number stack entry scored highest, the first one on ties.
+        candidates = wave['unk_candidates']
+        scores = token_logit.detach().index_select(0, wave['unk_rows']).gather(1, self.num_start + candidates)
+        numbers = candidates.gather(1, scores.argmax(dim=1, keepdim=True)).squeeze(1)
+        target[wave['unk_batch'], wave['unk_positions'] % max_length] = self.num_start + numbers
+        return sub_trees.index_copy(0, wave['unk_positions'],
+                                    number_embeddings.index_select(0, wave['unk_batch'] * number_size + numbers))
+
+    def _merge(self, sub_trees, op_embeddings, groups, max_length, merged):
+        for op_positions, left_positions, right_positions in groups:
+            sub_tree = self.merge(op_embeddings.index_select(0, op_positions),
+                                  sub_trees.index_select(0, left_positions),
+                                  sub_trees.index_select(0, right_positions))
+            sub_trees = sub_trees.index_copy(0, op_positions, sub_tree)
+            merged.append((sub_tree, op_positions // max_length))
+        return sub_trees
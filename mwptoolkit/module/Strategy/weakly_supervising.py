@@ -774,3 +774,192 @@ def find_fix(pred, gt, all_prob, sym_list, num_start, n_step):
 
     return fix
 
+
+class _OutputSymbols:
+    # stands in for the dataloader passed to the strategies as `Lang`, only the output symbols are read from it.
+    def __init__(self, out_idx2symbol):
+        self.dataset = self
+        self.out_idx2symbol = out_idx2symbol
+
+
+def _to_worker(value):
+    if isinstance(value, torch.Tensor):
+        return value.detach().cpu()
+    return value
+
+
+def _search_sample(task):
+    """run the strategy of one sample with fresh accumulators.
+
+    the numpy random state is seeded per sample and restored afterwards, so the result of a sample does
+    not depend on the process it runs in nor on the samples searched before it.
+    """
+    supervising_mode, idx, seed, sample, batch_args, buffer_new, buffer_new_exp = task
+    exp, num, generate_exp, all_list, probs = sample
+    target_length, num_ans, num_start, n_step, input_length, out_symbols = batch_args
+    batch_size = len(target_length)
+    fix_found = [False] * batch_size
+    buffer_batch_new = [[] for _ in range(batch_size)]
+    buffer_batch_new_exp = [[] for _ in range(batch_size)]
+    buffer_batch_new[idx] = list(buffer_new)
+    buffer_batch_new_exp[idx] = list(buffer_new_exp)
+    fix_input_length, fix_target_list, fix_index, fix_target_length = [], [], [], []
+
+    random_state = np.random.get_state()
+    np.random.seed(seed)
+    start_time = time.time()
+    try:
+        # find_fix converts the symbols of the lists in place.
+        get_weakly_supervised(supervising_mode)(
+            idx, exp, num, list(generate_exp), target_length, num_ans, list(all_list), probs, num_start, n_step,
+            fix_input_length, fix_target_list, fix_index, fix_target_length, fix_found, buffer_batch_new,
+            buffer_batch_new_exp, input_length, out_symbols)
+    finally:
+        np.random.set_state(random_state)
+    search_time = time.time() - start_time
+    return (fix_input_length, fix_target_list, fix_index, fix_target_length, fix_found[idx],
+            buffer_batch_new[idx], buffer_batch_new_exp[idx], search_time)
+
+
+class PendingFixSearch:
+    """fix search of a batch submitted to FixSearch, read its results with FixSearch.collect.
+    """
+    def __init__(self, indices, batch_size, results):
+        self.indices = indices
+        self.batch_size = batch_size
+        self.results = results
+
+
+class FixSearch:
+    """fix search of weakly supervised training (fix, mafix, reinforce, mapo strategies) for whole batches.
+
+    Samples of a batch are searched in a pool of worker processes, so the search of a batch overlaps with whatever
+    the caller runs between `submit` and `collect`, e.g. the forward pass of the next batch. Results are merged in
+    sample order, and each sample is searched with its own seed, so they are the same with any number of workers,
+    also with num_workers=0, where samples are searched in this process by `collect`.
+
+    search_time is the time spent searching and wait_time the time `collect` blocked for the results, the search
+    time of the samples when num_workers=0. both are summed until `pop_stats`.
+    """
+    def __init__(self, supervising_mode, out_idx2symbol, n_step, num_workers=0, seed=0):
+        """
+        Args:
+            supervising_mode (str): [fix | mafix | reinforce | mapo], name of the strategy.
+
+            out_idx2symbol (list): output symbols, used to read fixes as expressions.
+
+            n_step (int): max steps of the search of a sample.
+
+            num_workers (int): number of worker processes, search in this process if 0.
+
+            seed (int): seed of the search, combined with the seed of each batch.
+        """
+        self.supervising_mode = supervising_mode
+        self.out_symbols = _OutputSymbols(out_idx2symbol)
+        self.n_step = n_step
+        self.num_workers = num_workers
+        self.seed = seed
+        self._pool = None
+        self._batch_nums = 0
+        self.search_time = 0.
+        self.wait_time = 0.
+        self.sample_nums = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            import multiprocessing
+            # spawn, since forking a process with initialized torch threads or cuda may deadlock.
+            self._pool = multiprocessing.get_context('spawn').Pool(self.num_workers)
+        return self._pool
+
+    def submit(self, samples, target_length, num_ans, input_length, num_start, buffer_batch, buffer_batch_exp,
+               batch_seed=None):
+        """start the search of a batch.
+
+        Args:
+            samples (list): (idx, exp, num, generate_exp, all_list, probs) of each sample to search, idx is its
+                position in the batch, all_list the output symbols with the numbers of the sample, as read by find_fix.
+
+            target_length (list): lengths of the generated expressions of the batch.
+
+            num_ans (list): answers of the batch.
+
+            input_length (list): question lengths of the batch.
+
+            num_start (int): index of the first number symbol.
+
+            buffer_batch (list): fixes found in earlier epochs for each sample of the batch.
+
+            buffer_batch_exp (list): expressions of those fixes.
+
+            batch_seed (int|None): seed of the batch, the number of batches submitted before if None.
+
+        Returns:
+            PendingFixSearch: the search, pass it to collect.
+        """
+        if batch_seed is None:
+            batch_seed = self._batch_nums
+        self._batch_nums += 1
+        batch_args = (list(target_length), list(num_ans), num_start, self.n_step, list(input_length), self.out_symbols)
+        tasks = []
+        for idx, exp, num, generate_exp, all_list, probs in samples:
+            seed = (self.seed * 1000003 + batch_seed * 1009 + idx) % (2 ** 32)
+            sample = (_to_worker(exp), num, generate_exp, all_list, _to_worker(probs))
+            tasks.append((self.supervising_mode, idx, seed, sample, batch_args, buffer_batch[idx], buffer_batch_exp[idx]))
+        if self.num_workers > 0 and tasks:
+            results = self._get_pool().map_async(_search_sample, tasks, chunksize=max(1, len(tasks) // (4 * self.num_workers)))
+        else:
+            results = tasks
+        return PendingFixSearch([task[1] for task in tasks], len(buffer_batch), results)
+
+    def collect(self, pending, buffer_batch, buffer_batch_exp):
+        """wait for the search of a batch and merge its results in sample order.
+
+        Args:
+            pending (PendingFixSearch): returned by submit.
+
+            buffer_batch (list): fixes of each sample of the batch, updated in place.
+
+            buffer_batch_exp (list): expressions of the fixes, updated in place.
+
+        Returns:
+            tuple(list,list,list,list,list,list,list): fix_input_length, fix_target_list, fix_index, fix_target_length,
+            fix_found, buffer_batch, buffer_batch_exp, as returned by the strategies.
+        """
+        start_time = time.time()
+        if isinstance(pending.results, list):
+            results = [_search_sample(task) for task in pending.results]
+        else:
+            results = pending.results.get()
+        self.wait_time += time.time() - start_time
+        fix_input_length, fix_target_list, fix_index, fix_target_length = [], [], [], []
+        fix_found = [False] * pending.batch_size
+        for idx, result in zip(pending.indices, results):
+            fix_input_length += result[0]
+            fix_target_list += result[1]
+            fix_index += result[2]
+            fix_target_length += result[3]
+            fix_found[idx] = result[4]
+            buffer_batch[idx] = result[5]
+            buffer_batch_exp[idx] = result[6]
+            self.search_time += result[7]
+        self.sample_nums += len(results)
+        return fix_input_length, fix_target_list, fix_index, fix_target_length, fix_found, buffer_batch, buffer_batch_exp
+
+    def pop_stats(self):
+        """return and reset the summed timing of the search.
+
+        Returns:
+            dict: sample_nums, search_time and wait_time in seconds.
+        """
+        stats = {'sample_nums': self.sample_nums, 'search_time': self.search_time, 'wait_time': self.wait_time}
+        self.search_time = 0.
+        self.wait_time = 0.
+        self.sample_nums = 0
+        return stats
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
@@ -17,6 +17,7 @@ from mwptoolkit.data.utils import create_dataset, create_dataloader,get_dataset_
 from mwptoolkit.utils.utils import get_model, init_seed, get_trainer
 from mwptoolkit.utils.enum_type import SpecialTokens, FixType
 from mwptoolkit.utils.logger import init_logger
+from mwptoolkit.utils.fold_scheduler import FoldScheduler
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), ".")))
 
@@ -53,6 +54,7 @@ def train_cross_validation(config):
         
         if config['model'].lower() in ['multiencdec']:
             evaluator = MultiEncDecEvaluator(config)
+        evaluator.build_target_table(dataset)
 
 
         trainer = get_trainer(config)(config, model, dataloader, evaluator)
@@ -63,6 +65,7 @@ def train_cross_validation(config):
         else:
             trainer.fit()
             best_folds_accuracy.append({"fold_t": fold_t, "best_equ_accuracy": trainer.best_test_equ_accuracy, "best_value_accuracy": trainer.best_test_value_accuracy})
+        evaluator.close()
         config["resume"]=False
     best_folds_accuracy = sorted(best_folds_accuracy, key=lambda x: x["best_value_accuracy"], reverse=True)
     logger.info("{} fold cross validation finished.".format(config["k_fold"]))
@@ -97,6 +100,7 @@ def train_with_train_valid_test_split(temp_config):
     model = get_model(config["model"])(config, dataset).to(config["device"])
 
     evaluator = get_evaluator_module(config)(config)
+    evaluator.build_target_table(dataset)
 
     trainer = get_trainer(config)(config, model, dataloader, evaluator)
     logger.info(model)
@@ -117,6 +121,7 @@ def test_with_train_valid_test_split(temp_config):
     model = get_model(config["model"])(config, dataset).to(config["device"])
 
     evaluator = get_evaluator_module(config)(config)
+    evaluator.build_target_table(dataset)
 
     trainer = get_trainer(config)(config, model, dataloader, evaluator)
     trainer.test()
@@ -156,16 +161,23 @@ def train_with_cross_validation(temp_config):
         model = get_model(config["model"])(config, dataset).to(config["device"])
 
         evaluator = get_evaluator_module(config)(config)
+        evaluator.build_target_table(dataset)
 
         trainer = get_trainer(config)(config, model, dataloader, evaluator)
 
         trainer.fit()
         best_folds_accuracy.append({"fold_t": fold_t, "best_equ_accuracy": trainer.best_test_equ_accuracy,
                                     "best_value_accuracy": trainer.best_test_value_accuracy})
+        evaluator.close()
         temp_config["resume"] = False
         temp_config['training_resume'] = False
+    log_folds_accuracy(config["k_fold"], best_folds_accuracy)
+
+
+def log_folds_accuracy(k_fold, best_folds_accuracy):
+    logger = getLogger()
     best_folds_accuracy = sorted(best_folds_accuracy, key=lambda x: x["best_value_accuracy"], reverse=True)
-    logger.info("{} fold cross validation finished.".format(config["k_fold"]))
+    logger.info("{} fold cross validation finished.".format(k_fold))
     best_equ_accuracy = []
     best_value_accuracy = []
     for accuracy in best_folds_accuracy:
@@ -173,9 +185,27 @@ def train_with_cross_validation(temp_config):
         best_value_accuracy.append(accuracy["best_value_accuracy"])
         logger.info("fold %2d : test equ accuracy [%2.3f] | test value accuracy [%2.3f]" \
                     % (accuracy["fold_t"], accuracy["best_equ_accuracy"], accuracy["best_value_accuracy"]))
-    logger.info("folds avr : test equ accuracy [%2.3f] | test value accuracy [%2.3f]" \
-                % (sum(best_equ_accuracy) / len(best_equ_accuracy),
-                   sum(best_value_accuracy) / len(best_value_accuracy)))
+    if best_folds_accuracy:
+        logger.info("folds avr : test equ accuracy [%2.3f] | test value accuracy [%2.3f]" \
+                    % (sum(best_equ_accuracy) / len(best_equ_accuracy),
+                       sum(best_value_accuracy) / len(best_value_accuracy)))
+
+
+def train_with_parallel_cross_validation(config):
+    r"""k-fold cross validation with `fold_workers` folds trained at the same time.
+
+    Run it again with resume set and the same checkpoint_dir to train the folds which failed or
+    were interrupted, finished folds are not trained again.
+    """
+    logger = getLogger()
+    logger.info(config)
+
+    scheduler = FoldScheduler(config)
+    best_folds_accuracy = scheduler.run()
+    log_folds_accuracy(config["k_fold"], best_folds_accuracy)
+    if scheduler.failed_folds:
+        raise RuntimeError("folds {} failed, run again with resume to train them.".format(
+            ', '.join(str(fold_t) for fold_t in sorted(scheduler.failed_folds))))
 
 
 def test_with_cross_validation(temp_config):
@@ -192,9 +222,11 @@ def test_with_cross_validation(temp_config):
         model = get_model(config["model"])(config, dataset).to(config["device"])
 
         evaluator = get_evaluator_module(config)(config)
+        evaluator.build_target_table(dataset)
 
         trainer = get_trainer(config)(config, model, dataloader, evaluator)
         trainer.test()
+        evaluator.close()
 
 
 def run_toolkit(model_name, dataset_name, task_type, config_dict={}):
@@ -209,7 +241,9 @@ def run_toolkit(model_name, dataset_name, task_type, config_dict={}):
         else:
             test_with_train_valid_test_split(config)
     else:
-        if config["k_fold"] is not None:
+        if config["k_fold"] is not None and config["fold_workers"] and config["fold_workers"] > 1:
+            train_with_parallel_cross_validation(config)
+        elif config["k_fold"] is not None:
             train_with_cross_validation(config)
         else:
             train_with_train_valid_test_split(config)
@@ -2,4 +2,9 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-from mwptoolkit.trainer import abstract_trainer,supervised_trainer,template_trainer
\ No newline at end of file
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['abstract_trainer', 'supervised_trainer', 'template_trainer']
+)
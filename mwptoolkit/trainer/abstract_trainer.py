@@ -2,13 +2,19 @@
 # @Author: Yihuai Lan
 # @Time: 2021/08/29 22:13:14
 # @File: abstract_trainer.py
+import contextlib
 import os
 from logging import getLogger
 
 import torch
 
+from mwptoolkit.utils.enum_type import DatasetType
+from mwptoolkit.utils.lazy_import import LazyModule
+from mwptoolkit.utils.profiler import TrainerProfiler
 from mwptoolkit.utils.utils import write_json_data
 
+tune = LazyModule('ray.tune')
+
 
 class AbstractTrainer(object):
     """abstract trainer
@@ -46,6 +52,14 @@ class AbstractTrainer(object):
 
         best_folds_accuracy (list|None): when running k-fold cross validation, this keeps the accuracy of folds that already run. 
 
+        mixed_precision (bool): run forward and backward of training batches under bfloat16 autocast, where the device supports it.
+
+        gradient_accumulation_steps (int|None): number of batches whose gradients are averaged before an optimizer step.
+
+        profile (bool): time data fetch, forward, backward, optimizer step, decoding, evaluation and file writing, see TrainerProfiler.
+
+        profile_dir (str|None): folder the per epoch profile and Chrome trace files are written to.
+
         """
         super().__init__()
         self.config = config
@@ -64,6 +78,16 @@ class AbstractTrainer(object):
         self.epoch_i = 0
         self.output_result = []
 
+        self.gradient_accumulation_steps = config["gradient_accumulation_steps"] if config["gradient_accumulation_steps"] else 1
+        self._autocast_device = self._autocast_device_type() if config["mixed_precision"] else None
+        self._accumulation = {}
+        self._epoch_tokens = 0
+        self._epoch_padded_tokens = 0
+        self._epoch_samples = 0
+        self.profiler = TrainerProfiler(config, self.logger)
+        # called with the accuracy of every evaluation of param_search, reported to ray tune if None.
+        self.search_reporter = None
+
         if self.config['k_fold']:
             if self.config['fold_t'] is None:
                 self.logger.warning("config should include a parameter 'fold_t', which is the value of current fold.")
@@ -73,6 +97,124 @@ class AbstractTrainer(object):
         if config["resume"] or config["training_resume"]:
             self._load_checkpoint()
 
+        self.profiler.instrument(self)
+
+    def _autocast_device_type(self):
+        device = self.config["device"]
+        device_type = device.type if isinstance(device, torch.device) else str(device).split(':')[0]
+        if not hasattr(torch, 'autocast'):
+            self.logger.warning("mixed precision requires torch>=1.10, training in float32.")
+            return None
+        if device_type == 'cuda' and not torch.cuda.is_bf16_supported():
+            self.logger.warning("the gpu does not support bfloat16, training in float32.")
+            return None
+        return device_type
+
+    def _autocast(self):
+        r"""context of training batches, bfloat16 autocast if mixed precision is on.
+
+        bfloat16 keeps the exponent range of float32, so no loss scaling is needed, which matters as
+        models compute backward inside calculate_loss.
+        """
+        if self._autocast_device is None:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self._autocast_device, dtype=torch.bfloat16)
+
+    def _count_batch(self, batch):
+        # padded tokens count every sequence as long as the longest one of its batch.
+        if "ques len" in batch and len(batch["ques len"]) > 0:
+            self._epoch_samples += len(batch["ques len"])
+            self._epoch_tokens += int(sum(batch["ques len"]))
+            self._epoch_padded_tokens += len(batch["ques len"]) * int(max(batch["ques len"]))
+        if "equ len" in batch and len(batch["equ len"]) > 0:
+            self._epoch_tokens += int(sum(batch["equ len"]))
+            self._epoch_padded_tokens += len(batch["equ len"]) * int(max(batch["equ len"]))
+
+    def _train_step(self, batch, train_batch, optimizer_step, parameters=None):
+        r"""train one batch with the mixed precision and gradient accumulation of the config.
+
+        Gradients are zeroed on the first batch of an accumulation window, and `optimizer_step` is
+        called on their average once `gradient_accumulation_steps` batches are accumulated. Models
+        call backward inside calculate_loss, so the accumulated gradients are divided instead of
+        the losses.
+
+        Args:
+            batch (dict): one batch of trainset.
+
+            train_batch (function): computes the loss and the gradients of a batch, e.g. self._train_batch.
+
+            optimizer_step (function): applies the gradients, e.g. self._optimizer_step.
+
+            parameters (list|None): parameters updated by `optimizer_step`, all parameters of the model if None.
+                Trainers with several training stages per batch pass the parameters of each stage.
+
+        Returns:
+            float: loss of the batch.
+        """
+        key = train_batch.__name__
+        if key not in self._accumulation:
+            self._accumulation[key] = [0, None if parameters is None else list(parameters), optimizer_step]
+        state = self._accumulation[key]
+        # the optimizers may be rebuilt, e.g. when a checkpoint is loaded.
+        state[2] = optimizer_step
+        if state[0] == 0:
+            if state[1] is None:
+                self.model.zero_grad()
+            else:
+                for p in state[1]:
+                    p.grad = None
+        self._count_batch(batch)
+        with self._autocast(), self.profiler.phase('forward'), self.profiler.backward():
+            batch_loss = train_batch(batch)
+        state[0] += 1
+        if state[0] >= self.gradient_accumulation_steps:
+            self._apply_accumulated(state)
+        return batch_loss
+
+    def _apply_accumulated(self, state):
+        count, parameters, optimizer_step = state
+        with self.profiler.phase('optimizer_step'):
+            if count > 1:
+                for p in (self.model.parameters() if parameters is None else parameters):
+                    if p.grad is not None:
+                        p.grad.div_(count)
+            optimizer_step()
+        state[0] = 0
+
+    @staticmethod
+    def _optimizer_parameters(optimizer):
+        return [p for group in optimizer.param_groups for p in group['params']]
+
+    def _flush_accumulation(self):
+        r"""apply the gradients of the last batches of an epoch, fewer than gradient_accumulation_steps.
+        """
+        for state in self._accumulation.values():
+            if state[0] > 0:
+                self._apply_accumulated(state)
+
+    def _log_train_throughput(self, seconds):
+        r"""log the training throughput of the epoch and reset the counters.
+        """
+        if seconds > 0:
+            padding_efficiency = self._epoch_tokens / self._epoch_padded_tokens if self._epoch_padded_tokens else 1.
+            self.logger.info("epoch [%3d] train throughput %.1f tokens/s | %.1f samples/s | padding efficiency %.3f%s" \
+                             % (self.epoch_i, self._epoch_tokens / seconds, self._epoch_samples / seconds,
+                                padding_efficiency, " | bfloat16 autocast" if self._autocast_device is not None else ""))
+        self._epoch_tokens = 0
+        self._epoch_padded_tokens = 0
+        self._epoch_samples = 0
+
+    def _log_verdict_cache(self):
+        r"""log the hit rates of the verdict cache and the target table of the evaluation and reset the counters.
+        """
+        info = self.evaluator.cache_info()
+        verdict_total = info["verdict_hits"] + info["verdict_misses"]
+        target_total = info["target_hits"] + info["target_misses"]
+        self.logger.info("evaluation verdict cache hit rate %.3f (%d/%d) | target table hit rate %.3f (%d/%d)" \
+                         % (info["verdict_hits"] / verdict_total if verdict_total else 0., info["verdict_hits"], verdict_total,
+                            info["target_hits"] / target_total if target_total else 0., info["target_hits"], target_total))
+        self.evaluator.reset_cache_info()
+
     def _save_checkpoint(self):
         raise NotImplementedError
 
@@ -146,3 +288,18 @@ class AbstractTrainer(object):
 
     def param_search(self):
         raise NotImplementedError
+
+    def _search_eval_set(self):
+        r"""the dataset evaluated in param_search, validset when it is split as in fit, testset else.
+        """
+        if self.config["k_fold"] or self.config["validset_divide"] is not True:
+            return DatasetType.Test
+        return DatasetType.Valid
+
+    def _report_search(self, accuracy):
+        r"""report the accuracy of an evaluation in param_search to the search engine.
+        """
+        if self.search_reporter is not None:
+            self.search_reporter(accuracy)
+        else:
+            tune.report(accuracy=accuracy)
@@ -8,13 +8,14 @@ import math
 from itertools import groupby
 
 import torch
-import transformers
-from ray import tune
 
 from mwptoolkit.trainer.abstract_trainer import AbstractTrainer
 from mwptoolkit.trainer.template_trainer import TemplateTrainer
 from mwptoolkit.utils.enum_type import TaskType, DatasetType, SpecialTokens
 from mwptoolkit.utils.utils import time_since, write_json_data
+from mwptoolkit.utils.lazy_import import LazyModule
+
+transformers = LazyModule('transformers')
 
 
 class SupervisedTrainer(AbstractTrainer):
@@ -76,6 +77,9 @@ class SupervisedTrainer(AbstractTrainer):
     def _build_optimizer(self):
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=self.config["learning_rate"])
 
+    def _optimizer_step(self):
+        self.optimizer.step()
+
     def _save_checkpoint(self):
         check_pnt = {
             "model": self.model.state_dict(),
@@ -118,6 +122,7 @@ class SupervisedTrainer(AbstractTrainer):
         self.optimizer.load_state_dict(check_pnt["optimizer"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -147,13 +152,14 @@ class SupervisedTrainer(AbstractTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
             result = {
@@ -173,10 +179,10 @@ class SupervisedTrainer(AbstractTrainer):
         self.model.train()
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
-            batch_loss = self._train_batch(batch)
+            batch_loss = self._train_step(batch, self._train_batch, self._optimizer_step)
             loss_total += batch_loss
-            self.optimizer.step()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
@@ -262,6 +268,7 @@ class SupervisedTrainer(AbstractTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, eval_total, test_time_cost
 
     def test(self):
@@ -283,6 +290,7 @@ class SupervisedTrainer(AbstractTrainer):
         self.best_test_equ_accuracy = equation_ac / eval_total
         self.best_test_value_accuracy = value_ac / eval_total
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s" \
                          % (eval_total, equation_ac / eval_total, value_ac / eval_total, test_time_cost))
         self._save_output()
@@ -301,9 +309,9 @@ class SupervisedTrainer(AbstractTrainer):
             self.model.train()
             loss_total, train_time_cost = self._train_epoch()
             if epo % self.test_step == 0 or epo > epoch_nums - 5:
-                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(DatasetType.Test)
+                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(self._search_eval_set())
 
-                tune.report(accuracy=test_val_ac)
+                self._report_search(test_val_ac)
 
 
 class GTSTrainer(AbstractTrainer):
@@ -452,6 +460,7 @@ class GTSTrainer(AbstractTrainer):
         self.merge_scheduler.load_state_dict(check_pnt["merge_scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -484,13 +493,14 @@ class GTSTrainer(AbstractTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
             result = {
@@ -511,10 +521,10 @@ class GTSTrainer(AbstractTrainer):
         self.model.train()
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
-            batch_loss = self._train_batch(batch)
+            batch_loss = self._train_step(batch, self._train_batch, self._optimizer_step)
             loss_total += batch_loss
-            self._optimizer_step()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
@@ -599,6 +609,7 @@ class GTSTrainer(AbstractTrainer):
             pass
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, eval_total, test_time_cost
 
     def test(self):
@@ -620,6 +631,7 @@ class GTSTrainer(AbstractTrainer):
         self.best_test_equ_accuracy = equation_ac / eval_total
         self.best_test_value_accuracy = value_ac / eval_total
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s" \
                          % (eval_total, equation_ac / eval_total, value_ac / eval_total, test_time_cost))
         self._save_output()
@@ -639,9 +651,9 @@ class GTSTrainer(AbstractTrainer):
             loss_total, train_time_cost = self._train_epoch()
             self._scheduler_step()
             if epo % self.test_step == 0 or epo > epoch_nums - 5:
-                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(DatasetType.Test)
+                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(self._search_eval_set())
 
-                tune.report(accuracy=test_val_ac)
+                self._report_search(test_val_ac)
 
 
 class MultiEncDecTrainer(GTSTrainer):
@@ -756,6 +768,7 @@ class MultiEncDecTrainer(GTSTrainer):
         self.merge_scheduler.load_state_dict(check_pnt["merge_scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -830,17 +843,18 @@ class MultiEncDecTrainer(GTSTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation and out_type == 'tree':
+            batch_result = self.evaluator.result_batch(test_out, target, method="prefix_result")
+        elif self.config["task_type"] == TaskType.SingleEquation and out_type == 'attn':
+            batch_result = self.evaluator.result_batch(test_out, target, method="postfix_result")
+        elif self.config["task_type"] == TaskType.MultiEquation and out_type == 'tree':
+            batch_result = self.evaluator.result_batch(test_out, target, method="prefix_result_multi")
+        elif self.config["task_type"] == TaskType.MultiEquation and out_type == 'attn':
+            batch_result = self.evaluator.result_batch(test_out, target, method="postfix_result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation and out_type == 'tree':
-                val_ac, equ_ac, _, _ = self.evaluator.prefix_result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.SingleEquation and out_type == 'attn':
-                val_ac, equ_ac, _, _ = self.evaluator.postfix_result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation and out_type == 'tree':
-                val_ac, equ_ac, _, _ = self.evaluator.prefix_result_multi(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation and out_type == 'attn':
-                val_ac, equ_ac, _, _ = self.evaluator.postfix_result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
             result = {
@@ -1046,6 +1060,7 @@ class TreeLSTMTrainer(AbstractTrainer):
         self.node_generater_scheduler.load_state_dict(check_pnt["generate_scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -1074,13 +1089,14 @@ class TreeLSTMTrainer(AbstractTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
             result = {
@@ -1100,10 +1116,10 @@ class TreeLSTMTrainer(AbstractTrainer):
         self.model.train()
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
-            batch_loss = self._train_batch(batch)
+            batch_loss = self._train_step(batch, self._train_batch, self._optimizer_step)
             loss_total += batch_loss
-            self._optimizer_step()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
@@ -1187,6 +1203,7 @@ class TreeLSTMTrainer(AbstractTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, eval_total, test_time_cost
 
     def test(self):
@@ -1208,6 +1225,7 @@ class TreeLSTMTrainer(AbstractTrainer):
         self.best_test_equ_accuracy = equation_ac / eval_total
         self.best_test_value_accuracy = value_ac / eval_total
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s" \
                          % (eval_total, equation_ac / eval_total, value_ac / eval_total, test_time_cost))
         self._save_output()
@@ -1225,9 +1243,9 @@ class TreeLSTMTrainer(AbstractTrainer):
             loss_total, train_time_cost = self._train_epoch()
             self._scheduler_step()
             if epo % self.test_step == 0 or epo > epoch_nums - 5:
-                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(DatasetType.Test)
+                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(self._search_eval_set())
 
-                tune.report(accuracy=test_val_ac)
+                self._report_search(test_val_ac)
 
 
 class SAUSolverTrainer(GTSTrainer):
@@ -1293,14 +1311,15 @@ class SAUSolverTrainer(GTSTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
             # batch['ans'][idx] = [12,8]
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
             result = {
@@ -1408,6 +1427,7 @@ class SAUSolverTrainer(GTSTrainer):
         self.sa_scheduler.load_state_dict(check_pnt["sa_scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -1550,18 +1570,18 @@ class TRNNTrainer(SupervisedTrainer):
             self.batch_idx = batch_idx + 1
             # first stage
             self._seq2seq_train()
-            self.model.zero_grad()
-            batch_seq2seq_loss = self._train_seq2seq_batch(batch)
-            self.optimizer.step()
+            batch_seq2seq_loss = self._train_step(batch, self._train_seq2seq_batch, self.optimizer.step,
+                                                  self._optimizer_parameters(self.optimizer))
             # second stage
             self._ans_train()
-            self.model.zero_grad()
-            batch_ans_module_loss = self._train_ans_batch(batch)
+            batch_ans_module_loss = self._train_step(batch, self._train_ans_batch, self.answer_module_optimizer.step,
+                                                     self._optimizer_parameters(self.answer_module_optimizer))
             loss_total_seq2seq += batch_seq2seq_loss
             loss_total_ans_module += batch_ans_module_loss
             # self.seq2seq_optimizer.step()
             # self.answer_module_optimizer.step()
-            self.answer_module_optimizer.step()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total_seq2seq, loss_total_ans_module, epoch_time_cost
 
@@ -1572,13 +1592,14 @@ class TRNNTrainer(SupervisedTrainer):
         equ_acc = []
         temp_acc = []
         equs_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
 
             equ_acc.append(equ_ac)
             val_acc.append(val_ac)
@@ -1694,6 +1715,7 @@ class TRNNTrainer(SupervisedTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, \
                template_ac / eval_total, equations_ac / eval_total, \
                eval_total, test_time_cost
@@ -1717,6 +1739,7 @@ class TRNNTrainer(SupervisedTrainer):
         self.best_test_equ_accuracy = equation_ac / eval_total
         self.best_test_value_accuracy = value_ac / eval_total
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         # self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s"\
         #                         %(eval_total,equation_ac/eval_total,value_ac/eval_total,test_time_cost))
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s" \
@@ -1738,9 +1761,9 @@ class TRNNTrainer(SupervisedTrainer):
             seq2seq_loss_total, _, train_time_cost = self._train_epoch()
 
             if epo % self.test_step == 0 or epo > epoch_nums - 5:
-                test_equ_ac, test_val_ac, _, acc, test_total, test_time_cost = self.evaluate(DatasetType.Test)
+                test_equ_ac, test_val_ac, _, acc, test_total, test_time_cost = self.evaluate(self._search_eval_set())
 
-                tune.report(accuracy=test_val_ac)
+                self._report_search(test_val_ac)
 
 
 class SalignedTrainer(SupervisedTrainer):
@@ -1853,6 +1876,7 @@ class SalignedTrainer(SupervisedTrainer):
         self.scheduler.load_state_dict(check_pnt["scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -1928,13 +1952,14 @@ class SalignedTrainer(SupervisedTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
             result = {
@@ -1958,10 +1983,10 @@ class SalignedTrainer(SupervisedTrainer):
             # print('batch_idx', batch_idx)
             # batch["raw_equation"] = batch["equation"].clone()
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
-            batch_loss = self._train_batch(batch)
+            batch_loss = self._train_step(batch, self._train_batch, self._optimizer_step)
             loss_total += batch_loss
-            self._optimizer_step()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
@@ -2049,6 +2074,7 @@ class SalignedTrainer(SupervisedTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, eval_total, test_time_cost
 
     def test(self):
@@ -2070,6 +2096,7 @@ class SalignedTrainer(SupervisedTrainer):
         self.best_test_equ_accuracy = equation_ac / eval_total
         self.best_test_value_accuracy = value_ac / eval_total
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s" \
                          % (eval_total, equation_ac / eval_total, value_ac / eval_total, test_time_cost))
         self._save_output()
@@ -2105,6 +2132,7 @@ class HMSTrainer(GTSTrainer):
         self.scheduler.load_state_dict(check_pnt["scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -2366,6 +2394,7 @@ class TSNTrainer(AbstractTrainer):
         # other parameter
         self.t_start_epoch = check_pnt["t_start_epoch"]
         self.s_start_epoch = check_pnt['s_start_epoch']
+        self.dataloader.resume_train_order(self.t_start_epoch + self.s_start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -2450,13 +2479,14 @@ class TSNTrainer(AbstractTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
         return val_acc, equ_acc
@@ -2470,15 +2500,17 @@ class TSNTrainer(AbstractTrainer):
         s1_equ_acc = []
         s2_val_acc = []
         s2_equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            method = "result"
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            method = "result_multi"
+        else:
+            raise NotImplementedError
+        batch_result1 = self.evaluator.result_batch(test_out1, target, method=method)
+        batch_result2 = self.evaluator.result_batch(test_out2, target, method=method)
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac1, equ_ac1, _, _ = self.evaluator.result(test_out1[idx], target[idx])
-                val_ac2, equ_ac2, _, _ = self.evaluator.result(test_out2[idx], target[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac1, equ_ac1, _, _ = self.evaluator.result_multi(test_out1[idx], target[idx])
-                val_ac2, equ_ac2, _, _ = self.evaluator.result_multi(test_out2[idx], target[idx])
-            else:
-                raise NotImplementedError
+            val_ac1, equ_ac1, _, _ = batch_result1[idx]
+            val_ac2, equ_ac2, _, _ = batch_result2[idx]
             if score1 > score2:
                 val_acc.append(val_ac1)
                 equ_acc.append(equ_ac1)
@@ -2499,18 +2531,17 @@ class TSNTrainer(AbstractTrainer):
         loss_total = 0.
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
             if module_name == 'teacher_net':
                 self._teacher_net_train()
-                batch_loss = self._train_teacher_net_batch(batch)
-                self._teacher_optimizer_step()
+                batch_loss = self._train_step(batch, self._train_teacher_net_batch, self._teacher_optimizer_step)
             elif module_name == 'student_net':
                 self._student_net_train()
-                batch_loss = self._train_student_net_batch(batch)
-                self._student_optimizer_step()
+                batch_loss = self._train_step(batch, self._train_student_net_batch, self._student_optimizer_step)
             else:
                 NotImplementedError("TSN has no {} module".format(module_name))
             loss_total += batch_loss
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
@@ -2663,6 +2694,7 @@ class TSNTrainer(AbstractTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, eval_total, test_time_cost
 
     def evaluate_student(self, eval_set):
@@ -2698,6 +2730,7 @@ class TSNTrainer(AbstractTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, s1_equation_ac / eval_total, s1_value_ac / eval_total, \
                s2_equation_ac / eval_total, s2_value_ac / eval_total, eval_total, test_time_cost
 
@@ -2720,6 +2753,7 @@ class TSNTrainer(AbstractTrainer):
         self.best_test_equ_accuracy = equation_ac / eval_total
         self.best_test_value_accuracy = value_ac / eval_total
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s" \
                          % (eval_total, equation_ac / eval_total, value_ac / eval_total, test_time_cost))
         self._save_output()
@@ -2834,12 +2868,26 @@ class EPTTrainer(AbstractTrainer):
         # load parameter of scheduler
         self.scheduler.load_state_dict(check_pnt["scheduler"])
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
         self.best_test_equ_accuracy = check_pnt["best_test_equ_accuracy"]
         self.best_folds_accuracy = check_pnt["best_folds_accuracy"]
 
+    def _optimizer_step(self):
+        if self.config['gradient_clip'] > 0:
+            # If clipping threshold is set, then clip the gradient
+            torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.config['gradient_clip'])
+
+        # if self._config.gradient_normalize:
+        #    # If normalizing gradient is set, then normalize the gradient
+        #    self._normalize_gradients(*self.model.parameters())
+
+        # Apply optimizer & scheduler
+        self.optimizer.step()
+        self.scheduler.step()
+
     def _train_batch(self, batch):
         batch_loss = self.model.calculate_loss(batch)
         return batch_loss
@@ -2851,13 +2899,14 @@ class EPTTrainer(AbstractTrainer):
         batch_size = len(test_out)
         val_acc = []
         equ_acc = []
+        if self.config["task_type"] == TaskType.SingleEquation:
+            batch_result = self.evaluator.result_batch(test_out, target_out)
+        elif self.config["task_type"] == TaskType.MultiEquation:
+            batch_result = self.evaluator.result_batch(test_out, target_out, method="result_multi")
+        else:
+            raise NotImplementedError
         for idx in range(batch_size):
-            if self.config["task_type"] == TaskType.SingleEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result(test_out[idx], target_out[idx])
-            elif self.config["task_type"] == TaskType.MultiEquation:
-                val_ac, equ_ac, _, _ = self.evaluator.result_multi(test_out[idx], target_out[idx])
-            else:
-                raise NotImplementedError
+            val_ac, equ_ac, _, _ = batch_result[idx]
             val_acc.append(val_ac)
             equ_acc.append(equ_ac)
             result = {
@@ -2874,40 +2923,13 @@ class EPTTrainer(AbstractTrainer):
     def _train_epoch(self):
         epoch_start_time = time.time()
         loss_total = 0.
-        self.all_grad_applied = True
         self.model.train()
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
-            batch_loss = self._train_batch(batch)
+            batch_loss = self._train_step(batch, self._train_batch, self._optimizer_step)
             loss_total += batch_loss
-            self.all_grad_applied = False
-            if self.batch_idx % self.config["gradient_accumulation_steps"] == 0:
-                if self.config['gradient_clip'] > 0:
-                    # If clipping threshold is set, then clip the gradient
-                    torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.config['gradient_clip'])
-
-                # if self._config.gradient_normalize:
-                #    # If normalizing gradient is set, then normalize the gradient
-                #    self._normalize_gradients(*self.model.parameters())
-
-                # Apply optimizer & scheduler
-                self.optimizer.step()
-                self.scheduler.step()
-                self.all_grad_applied = True
-        else:
-            if not self.all_grad_applied:
-                if self.config['gradient_clip'] > 0:
-                    # If clipping threshold is set, then clip the gradient
-                    torch.nn.utils.clip_grad_norm_(self.model.parameters(), self.config['gradient_clip'])
-
-                # if self._config.gradient_normalize:
-                #    # If normalizing gradient is set, then normalize the gradient
-                #    self._normalize_gradients(*self.model.parameters())
-
-                # Apply optimizer & scheduler
-                self.optimizer.step()
-                self.scheduler.step()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
@@ -2991,6 +3013,7 @@ class EPTTrainer(AbstractTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, eval_total, test_time_cost
 
     def test(self):
@@ -3012,6 +3035,7 @@ class EPTTrainer(AbstractTrainer):
         self.best_test_equ_accuracy = equation_ac / eval_total
         self.best_test_value_accuracy = value_ac / eval_total
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s" \
                          % (eval_total, equation_ac / eval_total, value_ac / eval_total, test_time_cost))
         self._save_output()
@@ -3092,9 +3116,9 @@ class EPTTrainer(AbstractTrainer):
             self.model.train()
             loss_total, train_time_cost = self._train_epoch()
             if epo % self.test_step == 0 or epo > epoch_nums - 5:
-                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(DatasetType.Test)
+                test_equ_ac, test_val_ac, test_total, test_time_cost = self.evaluate(self._search_eval_set())
 
-                tune.report(accuracy=test_val_ac)
+                self._report_search(test_val_ac)
 
 
 class PretrainSeq2SeqTrainer(SupervisedTrainer):
@@ -3257,6 +3281,7 @@ class MWPBertTrainer(GTSTrainer):
         self.merge_scheduler.load_state_dict(check_pnt["merge_scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -3285,13 +3310,17 @@ class BertTDTrainer(SupervisedTrainer):
 
     def _build_optimizer(self):
         t_total = (len(self.dataloader.dataset.trainset) // self.config['train_batch_size'] + 1) * self.config[
-            'epoch_nums']
+            'epoch_nums'] // self.gradient_accumulation_steps
         self.optimizer = transformers.AdamW([{'params': self.model.parameters(), 'weight_decay': 0.0}],
                                             lr=self.config['learning_rate'])
         self.scheduler = transformers.get_linear_schedule_with_warmup(self.optimizer,
                                                                       num_warmup_steps=self.config['warmup_steps'],
                                                                       num_training_steps=t_total)
 
+    def _optimizer_step(self):
+        self.optimizer.step()
+        self.scheduler.step()
+
     def _save_checkpoint(self):
         check_pnt = {
             "model": self.model.state_dict(),
@@ -3336,6 +3365,7 @@ class BertTDTrainer(SupervisedTrainer):
         self.scheduler.load_state_dict(check_pnt["scheduler"])
         # other parameter
         self.start_epoch = check_pnt["start_epoch"]
+        self.dataloader.resume_train_order(self.start_epoch)
         self.best_valid_value_accuracy = check_pnt["best_valid_value_accuracy"]
         self.best_valid_equ_accuracy = check_pnt["best_valid_equ_accuracy"]
         self.best_test_value_accuracy = check_pnt["best_test_value_accuracy"]
@@ -3348,10 +3378,9 @@ class BertTDTrainer(SupervisedTrainer):
         self.model.train()
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
-            batch_loss = self._train_batch(batch)
+            batch_loss = self._train_step(batch, self._train_batch, self._optimizer_step)
             loss_total += batch_loss
-            self.optimizer.step()
-            self.scheduler.step()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
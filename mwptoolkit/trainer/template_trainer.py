@@ -50,18 +50,22 @@ class TemplateTrainer(AbstractTrainer):
     def _eval_batch(self, batch):
         raise NotImplementedError
 
+    def _train_and_backward_batch(self, batch):
+        batch_loss = self._train_batch(batch)
+        self.loss.backward()
+        self.loss.reset()
+        return batch_loss
+
     def _train_epoch(self):
         epoch_start_time = time.time()
         loss_total = 0.
         self.model.train()
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.zero_grad()
-            batch_loss = self._train_batch(batch)
+            batch_loss = self._train_step(batch, self._train_and_backward_batch, self.optimizer.step)
             loss_total += batch_loss
-            self.loss.backward()
-            self.optimizer.step()
-            self.loss.reset()
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
@@ -117,6 +121,7 @@ class TemplateTrainer(AbstractTrainer):
             eval_total += len(batch_val_ac)
 
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         return equation_ac / eval_total, value_ac / eval_total, eval_total, test_time_cost
 
     def test(self):
@@ -133,5 +138,6 @@ class TemplateTrainer(AbstractTrainer):
             equation_ac += batch_equ_ac.count(True)
             eval_total += len(batch_val_ac)
         test_time_cost = time_since(time.time() - test_start_time)
+        self._log_verdict_cache()
         self.logger.info("test total [%d] | test equ acc [%2.3f] | test value acc [%2.3f] | test time %s"\
                                 %(eval_total,equation_ac/eval_total,value_ac/eval_total,test_time_cost))
@@ -7,55 +7,98 @@ from mwptoolkit.trainer.abstract_trainer import AbstractTrainer
 from mwptoolkit.trainer.supervised_trainer import GTSTrainer, SupervisedTrainer
 from mwptoolkit.utils.enum_type import TaskType, DatasetType, SpecialTokens
 from mwptoolkit.utils.utils import time_since
+from mwptoolkit.module.Strategy.weakly_supervising import FixSearch
 
 
-class GTSWeakTrainer(GTSTrainer):
-    def __init__(self, config, model, dataloader, evaluator):
-        super().__init__(config, model, dataloader, evaluator)
-        self.supervising_mode = config["supervising_mode"]
-        self._build_optimizer()
- 
+class _WeaklySupervisedTraining:
+    """training loop of the weakly supervised trainers.
+
+    the model decodes a batch, the fix search of the batch is submitted to FixSearch, and the model is trained on the
+    fixes of the previous batch meanwhile, so the search overlaps the forward pass of the next batch. fixes found for a
+    sample are kept in the buffers by the position of the sample in the trainset batches.
+    """
+    def _build_fix_search(self):
+        if not hasattr(self.model, 'weakly_decode'):
+            raise NotImplementedError("{} does not support weakly supervised training".format(self.config["model"]))
+        # fix_search_workers processes search fixes while the model trains, in this process if 0.
+        self.fix_search = FixSearch(self.supervising_mode, self.dataloader.dataset.out_idx2symbol,
+                                    self.config["fix_n_step"], self.config["fix_search_workers"] or 0,
+                                    self.config["random_seed"] or 0)
 
     def _build_buffer_batch(self):
+        # the buffers are read by the position of a sample in the trainset batches, which must not be reshuffled.
+        self.dataloader.fixed_train_order = True
         self._buffer_batches = [[] for i in range(self.dataloader.trainset_nums)]
         self._buffer_batches_exp = [[] for i in range(self.dataloader.trainset_nums)]
-   
+
+    def _submit_fix_search(self, batch, pos):
+        samples, target_length = self.model.weakly_decode(batch)
+        batch_size = len(batch["ques len"])
+        buffer_batch = self._buffer_batches[pos: pos + batch_size]
+        buffer_batch_exp = self._buffer_batches_exp[pos: pos + batch_size]
+        # seeded by the position of the batch in the run, so a resumed run searches the same way.
+        batch_seed = (self.epoch_i - 1) * self.dataloader.trainset_batch_nums + self.batch_idx
+        pending = self.fix_search.submit(samples, target_length, [str(ans) for ans in batch["ans"]],
+                                         batch["ques len"], self.model.num_start, buffer_batch, buffer_batch_exp,
+                                         batch_seed)
+        return batch, pos, pending, buffer_batch, buffer_batch_exp
+
+    def _train_fixes(self, batch, pos, pending, buffer_batch, buffer_batch_exp):
+        with self.profiler.phase('fix_search'):
+            fix_input_length, fix_target_list, fix_index, fix_target_length, _, buffer_batch, buffer_batch_exp = \
+                self.fix_search.collect(pending, buffer_batch, buffer_batch_exp)
+        self._buffer_batches[pos: pos + len(buffer_batch)] = buffer_batch
+        self._buffer_batches_exp[pos: pos + len(buffer_batch_exp)] = buffer_batch_exp
+        if len(fix_index) == 0:
+            return 0.
+        fix_batch = {
+            "batch": batch,
+            "fix index": fix_index,
+            "fix target": fix_target_list,
+            "ques len": fix_input_length,
+            "equ len": fix_target_length
+        }
+        return self._train_step(fix_batch, self._train_batch, self._optimizer_step)
+
+    def _train_batch(self, fix_batch):
+        return self.model.weakly_train(fix_batch["batch"], fix_batch["fix index"], fix_batch["fix target"])
+
+    def _log_fix_search(self, seconds):
+        stats = self.fix_search.pop_stats()
+        if stats["sample_nums"] and seconds > 0:
+            self.logger.info("epoch [%3d] fix search %d samples | search time %.2fs | waited %.2fs (%.1f%% of epoch)" \
+                             % (self.epoch_i, stats["sample_nums"], stats["search_time"], stats["wait_time"],
+                                100 * stats["wait_time"] / seconds))
+
     def _train_epoch(self):
-        epoch_start_time = time.time() #
-        loss_total = 0.  #
-      
-        self.mask_flag = False #
-        self._pos = 0 #
-        self.epo_iteration = 0
+        epoch_start_time = time.time()
+        loss_total = 0.
+        self.model.train()
+        previous = None
+        pos = 0
         for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
             self.batch_idx = batch_idx + 1
-            self.model.train()
-            self.model.zero_grad()
-            if self.epoch_i == 1 and self.batch_idx <= 2: #
-                self.mask_flag = True
-            buffer_batches_train = self._buffer_batches[self._pos: self._pos + len(batch["ques len"])]
-            buffer_batches_train_exp = self._buffer_batches_exp[self._pos: self._pos + len(batch["ques len"])]
-            iterations, buffer_batch_new, buffer_batch_exp, batch_loss = self._train_batch(batch, buffer_batches_train, buffer_batches_train_exp)
-            loss_total += batch_loss
-            self.epo_iteration += iterations
-            self._buffer_batches[self._pos: self._pos + len(batch["ques len"])] = buffer_batch_new
-            self._buffer_batches_exp[self._pos: self._pos + len(batch["ques len"])] = buffer_batch_exp
-            self._pos += len(batch["ques len"])
+            current = self._submit_fix_search(batch, pos)
+            pos += len(batch["ques len"])
+            if previous is not None:
+                loss_total += self._train_fixes(*previous)
+            previous = current
+        if previous is not None:
+            loss_total += self._train_fixes(*previous)
+        self._flush_accumulation()
+        self._log_train_throughput(time.time() - epoch_start_time)
+        self._log_fix_search(time.time() - epoch_start_time)
         epoch_time_cost = time_since(time.time() - epoch_start_time)
         return loss_total, epoch_time_cost
 
-    def _train_batch(self, batch, buffer_batches_train, buffer_batches_train_exp):
-        optimizer = {
-            "embedder_optimizer": self.embedder_optimizer,
-            "encoder_optimizer": self.encoder_optimizer,
-            "decoder_optimizer": self.decoder_optimizer,
-            "node_generater_optimizer": self.node_generater_optimizer,
-            "merge_optimizer": self.merge_optimizer
-        }
-        num_iteration, buffer_batch_new, buffer_batch_exp, batch_loss = self.model.weakly_train(batch, buffer_batches_train, buffer_batches_train_exp, self.dataloader, self.epoch_i - 1, 
-        self.mask_flag, self.supervising_mode, optimizer)
-        return num_iteration, buffer_batch_new, buffer_batch_exp, batch_loss
-    
+
+class GTSWeakTrainer(_WeaklySupervisedTraining, GTSTrainer):
+    def __init__(self, config, model, dataloader, evaluator):
+        super().__init__(config, model, dataloader, evaluator)
+        self.supervising_mode = config["supervising_mode"]
+        self._build_optimizer()
+        self._build_fix_search()
+
     def fit(self):
         train_batch_size = self.config["train_batch_size"]
         epoch_nums = self.config["epoch_nums"]
@@ -109,49 +152,16 @@ class GTSWeakTrainer(GTSTrainer):
                             best test result : equation accuracy [%2.3f] | value accuracy [%2.3f]''' \
                         % (self.best_valid_equ_accuracy, self.best_valid_value_accuracy, \
                             self.best_test_equ_accuracy, self.best_test_value_accuracy))
+        self.fix_search.close()
 
 
-class WeaklySupervisedTrainer(SupervisedTrainer):
+class WeaklySupervisedTrainer(_WeaklySupervisedTraining, SupervisedTrainer):
     def __init__(self, config, model, dataloader, evaluator):
         super().__init__(config, model, dataloader, evaluator)
         self.supervising_mode = config["supervising_mode"]
         self._build_optimizer()
- 
-
-    def _build_buffer_batch(self):
-        self._buffer_batches = [[] for i in range(self.dataloader.trainset_nums)]
-        self._buffer_batches_exp = [[] for i in range(self.dataloader.trainset_nums)]
-   
-    def _train_epoch(self):
-        epoch_start_time = time.time() #
-        loss_total = 0.  #
-      
-        self.mask_flag = False #
-        self._pos = 0 #
-        self.epo_iteration = 0
-        for batch_idx, batch in enumerate(self.dataloader.load_data(DatasetType.Train)):
-            self.batch_idx = batch_idx + 1
-            self.model.train()
-            self.model.zero_grad()
-            if self.epoch_i == 1 and self.batch_idx <= 2: #
-                self.mask_flag = True
-            buffer_batches_train = self._buffer_batches[self._pos: self._pos + len(batch["ques len"])]
-            buffer_batches_train_exp = self._buffer_batches_exp[self._pos: self._pos + len(batch["ques len"])]
-            iterations, buffer_batch_new, buffer_batch_exp, batch_loss = self._train_batch(batch, buffer_batches_train, buffer_batches_train_exp)
-            loss_total += batch_loss
-            self.epo_iteration += iterations
-            self._buffer_batches[self._pos: self._pos + len(batch["ques len"])] = buffer_batch_new
-            self._buffer_batches_exp[self._pos: self._pos + len(batch["ques len"])] = buffer_batch_exp
-            self._pos += len(batch["ques len"])
-        epoch_time_cost = time_since(time.time() - epoch_start_time)
-        return loss_total, epoch_time_cost
+        self._build_fix_search()
 
-    def _train_batch(self, batch, buffer_batches_train, buffer_batches_train_exp):
-        optimizer = self.optimizer
-        num_iteration, buffer_batch_new, buffer_batch_exp, batch_loss = self.model.weakly_train(batch, buffer_batches_train, buffer_batches_train_exp, self.dataloader, self.epoch_i - 1, 
-        self.mask_flag, self.supervising_mode, optimizer)
-        return num_iteration, buffer_batch_new, buffer_batch_exp, batch_loss
-    
     def fit(self):
         train_batch_size = self.config["train_batch_size"]
         epoch_nums = self.config["epoch_nums"]
@@ -204,3 +214,4 @@ class WeaklySupervisedTrainer(SupervisedTrainer):
                             best test result : equation accuracy [%2.3f] | value accuracy [%2.3f]''' \
                         % (self.best_valid_equ_accuracy, self.best_valid_value_accuracy, \
                             self.best_test_equ_accuracy, self.best_test_value_accuracy))
+        self.fix_search.close()
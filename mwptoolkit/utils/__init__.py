@@ -2,4 +2,9 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-from mwptoolkit.utils import data_structure,enum_type,logger,utils,preprocess_tool
\ No newline at end of file
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['data_structure', 'enum_type', 'fold_scheduler', 'logger', 'profiler', 'search_scheduler', 'utils', 'preprocess_tool']
+)
@@ -6,9 +6,12 @@
 
 from itertools import groupby
 from math import log10
-from sympy import Eq
 import re
 
+from mwptoolkit.utils.lazy_import import LazyModule
+
+sym = LazyModule('sympy')
+
 OPERATORS = ["+", "-", "*", "/", "^"]
 SPECIAL_TOKENS = ["<PAD>", "<UNK>", "<SOS>", "<EOS>", "<BRG>", "<OPT>"]
 OUTPUT_SPECIAL_TOKENS = ["<PAD>", "<UNK>"]
@@ -176,7 +179,7 @@ class EPT:
         '/': {'arity': 2, 'commutable': False, 'top_level': False, 'convert': (lambda *x: x[0] / x[1])},
         '^': {'arity': 2, 'commutable': False, 'top_level': False, 'convert': (lambda *x: x[0] ** x[1])},
         '=': {'arity': 2, 'commutable': True, 'top_level': True,
-              'convert': (lambda *x: Eq(x[0], x[1], evaluate=False))}
+              'convert': (lambda *x: sym.Eq(x[0], x[1], evaluate=False))}
     }
 
     # Arity and top-level classes
@@ -0,0 +1,181 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/24 14:08:51
+# @File: fold_scheduler.py
+
+
+import os
+import multiprocessing
+from multiprocessing.connection import wait
+from logging import getLogger
+
+import torch
+
+from mwptoolkit.utils.utils import read_json_data, write_json_data, read_pickle_data, write_pickle_data
+
+# written to the checkpoint folder of a fold once it is trained, marks the fold as finished.
+FOLD_RESULT_FILE = 'fold_accuracy.json'
+# the dataset with raw folds shared by the workers of a run, also used to resume it.
+FOLD_DATASET_FILE = 'cross_validation_dataset.pkl'
+
+
+def _abs_dir(path):
+    return path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+
+
+def _fold_log_file(config, fold_t):
+    log_file = config['log_file'] if config['log_file'] else config['log_path']
+    root, ext = os.path.splitext(log_file)
+    return '{}-fold{}{}'.format(root, fold_t, ext)
+
+
+def _run_fold(config, dataset_file, fold_t, num_threads, gpu_id, resume):
+    r"""train the fold `fold_t` in a worker process.
+    """
+    if gpu_id is not None:
+        # before cuda is initialized in this process.
+        os.environ["CUDA_VISIBLE_DEVICES"] = gpu_id
+    torch.set_num_threads(num_threads)
+
+    from mwptoolkit.data.utils import get_dataloader_module
+    from mwptoolkit.evaluate.evaluator import get_evaluator_module
+    from mwptoolkit.utils.utils import get_model, get_trainer, init_seed
+    from mwptoolkit.utils.logger import init_logger
+
+    config['log_file'] = _fold_log_file(config, fold_t)
+    init_logger(config)
+    init_seed(config['random_seed'], True)
+    logger = getLogger()
+
+    fold_dir = os.path.join(_abs_dir(config['checkpoint_dir']), 'fold{}'.format(fold_t))
+    resume = resume and os.path.exists(os.path.join(fold_dir, 'trainer_checkpoint.pth'))
+    config['fold_t'] = fold_t
+    config['best_folds_accuracy'] = []
+    config['resume'] = resume
+    config['training_resume'] = resume
+
+    dataset = read_pickle_data(dataset_file)
+    dataset.fold_load(fold_t)
+
+    dataloader = get_dataloader_module(config)(config, dataset)
+    model = get_model(config["model"])(config, dataset).to(config["device"])
+    evaluator = get_evaluator_module(config)(config)
+    evaluator.build_target_table(dataset)
+    trainer = get_trainer(config)(config, model, dataloader, evaluator)
+    logger.info("fold {}{}".format(fold_t, ", resumed from {}".format(fold_dir) if resume else ""))
+    trainer.fit()
+    evaluator.close()
+
+    if not os.path.exists(fold_dir):
+        os.makedirs(fold_dir, exist_ok=True)
+    write_json_data({"fold_t": fold_t, "best_equ_accuracy": trainer.best_test_equ_accuracy,
+                     "best_value_accuracy": trainer.best_test_value_accuracy},
+                    os.path.join(fold_dir, FOLD_RESULT_FILE))
+
+
+class FoldScheduler(object):
+    r"""train the folds of k-fold cross validation concurrently, one worker process per fold.
+
+    The raw data is read and split into folds once, pickled to the checkpoint folder and read by
+    every worker, which only preprocesses and trains its own fold. When resuming, the folds of the
+    previous run are kept, a fold whose result file exists is not trained again and a fold with a
+    trainer checkpoint is resumed from it.
+
+    expected that config includes these parameters below:
+
+    k_fold (int): the number of folds.
+
+    fold_workers (int): number of folds trained at the same time.
+
+    fold_num_threads (int|None): torch threads of a fold worker, cpu count divided by fold_workers if None.
+
+    gpu_id (str): with several gpus, e.g. "0,1", a fold is started on the gpu running the fewest folds.
+    """
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.k_fold = config["k_fold"]
+        self.num_workers = max(1, min(config["fold_workers"] if config["fold_workers"] else 1, self.k_fold))
+        if config["fold_num_threads"]:
+            self.num_threads = config["fold_num_threads"]
+        else:
+            self.num_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        gpu_ids = [gpu_id.strip() for gpu_id in str(config["gpu_id"]).split(',') if gpu_id.strip()]
+        self.gpu_ids = gpu_ids if config["use_gpu"] and len(gpu_ids) > 1 else []
+        self.checkpoint_dir = _abs_dir(config["checkpoint_dir"])
+        self.dataset_file = os.path.join(self.checkpoint_dir, FOLD_DATASET_FILE)
+        self.resume = bool(config["resume"] or config["training_resume"])
+        self.failed_folds = []
+        self.logger = getLogger()
+
+    def _prepare(self):
+        from mwptoolkit.data.utils import get_dataset_module
+
+        for key in ['checkpoint_dir', 'trained_model_dir', 'output_dir']:
+            if self.config[key]:
+                os.makedirs(_abs_dir(self.config[key]), exist_ok=True)
+        if self.resume and os.path.exists(self.dataset_file):
+            self.logger.info("read the folds of cross validation from {} ...".format(self.dataset_file))
+            return
+        dataset = get_dataset_module(self.config)(self.config)
+        write_pickle_data(dataset, self.dataset_file)
+        self.config.save_config(self.checkpoint_dir)
+
+    def _least_used_gpu(self, running):
+        folds_on_gpu = {gpu_id: 0 for gpu_id in self.gpu_ids}
+        for _, _, gpu_id in running.values():
+            folds_on_gpu[gpu_id] += 1
+        return min(self.gpu_ids, key=lambda gpu_id: folds_on_gpu[gpu_id])
+
+    def fold_result(self, fold_t):
+        r"""accuracy of a finished fold, None if the fold is not finished.
+        """
+        result_file = os.path.join(self.checkpoint_dir, 'fold{}'.format(fold_t), FOLD_RESULT_FILE)
+        if os.path.exists(result_file) and os.path.getmtime(result_file) >= os.path.getmtime(self.dataset_file):
+            return read_json_data(result_file)
+        return None
+
+    def run(self):
+        r"""train every unfinished fold.
+
+        Returns:
+            list: best accuracy of every finished fold, as in `best_folds_accuracy`. Folds whose
+            worker failed are left out and listed in `failed_folds`.
+        """
+        self._prepare()
+        best_folds_accuracy = []
+        pending = []
+        for fold_t in range(self.k_fold):
+            result = self.fold_result(fold_t)
+            if result is None:
+                pending.append(fold_t)
+            else:
+                self.logger.info("fold {} is already finished.".format(fold_t))
+                best_folds_accuracy.append(result)
+        self.logger.info("train {} folds with {} workers, {} threads each.".format(
+            len(pending), self.num_workers, self.num_threads))
+
+        # spawn, since forking a process with initialized torch threads or cuda may deadlock.
+        context = multiprocessing.get_context('spawn')
+        running = {}
+        self.failed_folds = []
+        while pending or running:
+            while pending and len(running) < self.num_workers:
+                fold_t = pending.pop(0)
+                gpu_id = self._least_used_gpu(running) if self.gpu_ids else None
+                process = context.Process(target=_run_fold,
+                                          args=(self.config, self.dataset_file, fold_t, self.num_threads, gpu_id, self.resume))
+                process.start()
+                running[process.sentinel] = (fold_t, process, gpu_id)
+            for sentinel in wait(list(running.keys())):
+                fold_t, process, _ = running.pop(sentinel)
+                process.join()
+                result = self.fold_result(fold_t)
+                if process.exitcode != 0 or result is None:
+                    self.logger.error("fold {} failed with exit code {}, see {}.".format(
+                        fold_t, process.exitcode, _fold_log_file(self.config, fold_t)))
+                    self.failed_folds.append(fold_t)
+                else:
+                    self.logger.info("fold {} finished.".format(fold_t))
+                    best_folds_accuracy.append(result)
+        return best_folds_accuracy
@@ -0,0 +1,82 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/08/29 21:49:49
+# @File: lazy_import.py
+"""Lazy loading of subpackages and heavy dependencies.
+
+A package ``__init__`` lists what it exports and `attach` returns the module level
+``__getattr__``/``__dir__`` (PEP 562) importing each name on first access, e.g.::
+
+    __getattr__, __dir__, __all__ = attach(__name__, submodules=['dns', 'gts'],
+                                           attributes={'dns': ['DNS'], 'gts': ['GTS']})
+
+Importing the package then costs nothing until one of its modules is really used.
+"""
+
+import importlib
+import sys
+
+
+def attach(package_name, submodules=(), attributes=None):
+    r"""build lazy ``__getattr__``, ``__dir__`` and ``__all__`` of a package.
+
+    Args:
+        package_name (str): ``__name__`` of the package.
+
+        submodules (list): names of submodules and subpackages exported by the package.
+
+        attributes (dict): map of submodule name to the list of attributes re-exported from it.
+
+    Returns:
+        tuple(function, function, list): __getattr__, __dir__ and __all__ of the package.
+    """
+    submodules = set(submodules)
+    attr2module = {}
+    for module_name, attrs in (attributes or {}).items():
+        for attr in attrs:
+            attr2module[attr] = module_name
+    __all__ = sorted(submodules | set(attr2module.keys()))
+
+    def __getattr__(name):
+        if name in submodules:
+            return importlib.import_module('{}.{}'.format(package_name, name))
+        if name in attr2module:
+            module = importlib.import_module('{}.{}'.format(package_name, attr2module[name]))
+            value = getattr(module, name)
+            # later lookups no longer go through __getattr__.
+            setattr(sys.modules[package_name], name, value)
+            return value
+        raise AttributeError("module {!r} has no attribute {!r}".format(package_name, name))
+
+    def __dir__():
+        return list(__all__)
+
+    return __getattr__, __dir__, __all__
+
+
+class LazyModule(object):
+    r"""stand-in for a module, imported on first attribute access.
+
+    Used for heavy optional dependencies, e.g. ``sym = LazyModule('sympy')`` keeps module level
+    code such as ``sym.solve`` working without importing sympy until a solve is needed.
+    """
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        if self._module is None:
+            self.__dict__['_module'] = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, item):
+        return getattr(self._load(), item)
+
+    def __setattr__(self, key, value):
+        setattr(self._load(), key, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return "<lazy module {!r}>".format(self._name)
@@ -2,4 +2,9 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
-from mwptoolkit.utils.preprocess_tool import dataset_operator,equation_operator,number_operator,number_transfer,sentence_operator
\ No newline at end of file
+from mwptoolkit.utils.lazy_import import attach
+
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    submodules=['dataset_operator', 'equation_operator', 'graph_operator', 'number_operator', 'number_transfer', 'sentence_operator', 'tree_operator']
+)
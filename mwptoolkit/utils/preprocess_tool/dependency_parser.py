@@ -0,0 +1,171 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/08/29 21:49:49
+# @File: dependency_parser.py
+
+
+import json
+import multiprocessing
+import os
+
+import torch
+
+from mwptoolkit.utils.lazy_import import LazyModule
+
+stanza = LazyModule('stanza')
+
+_PIPELINES = {}
+
+
+def load_pipeline(language, use_gpu=False):
+    r"""load the stanza dependency parsing pipeline of `language`, once per process.
+    """
+    key = (language, use_gpu)
+    if key not in _PIPELINES:
+        _PIPELINES[key] = stanza.Pipeline(language, processors='depparse,tokenize,pos,lemma', tokenize_pretokenized=True,
+                                          logging_level='error', use_gpu=use_gpu)
+    return _PIPELINES[key]
+
+
+def sentence_tokens(text):
+    r"""split a pretokenized question into the tokens of its first sentence, as stanza does.
+    """
+    for line in text.split('\n'):
+        tokens = line.split()
+        if tokens:
+            return tokens
+    return []
+
+
+def _parse_batch(nlp, batch):
+    # one document holding a sentence per question, so stanza batches them together.
+    doc = nlp([list(tokens) for tokens in batch])
+    return doc.to_dict()
+
+
+def _init_parse_worker(language, num_threads):
+    torch.set_num_threads(num_threads)
+    load_pipeline(language, False)
+
+
+def _parse_in_worker(task):
+    language, batch = task
+    return batch, _parse_batch(load_pipeline(language, False), batch)
+
+
+class DependencyParseCache(object):
+    r"""per-question cache of dependency parses, keyed by language and token sequence.
+
+    Entries are appended to a json-lines file, one parsed question per line, so adding questions
+    never rewrites what is already stored.
+    """
+    def __init__(self, path, rebuild=False):
+        """
+        Args:
+            path (str|None): cache file, None to keep the cache in memory only.
+
+            rebuild (bool): if True, drop the entries stored in the cache file.
+        """
+        super().__init__()
+        self.path = path
+        self._entries = {}
+        if path is None:
+            return
+        if rebuild and os.path.exists(path):
+            os.remove(path)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line cut by an interrupted run.
+                        continue
+                    self._entries[(entry['language'], tuple(entry['tokens']))] = entry['deprel']
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, language, tokens):
+        return self._entries.get((language, tuple(tokens)))
+
+    def update(self, language, batch, token_lists):
+        r"""store the parses `token_lists` of the token sequences `batch`.
+        """
+        lines = []
+        for tokens, token_list in zip(batch, token_lists):
+            self._entries[(language, tuple(tokens))] = token_list
+            lines.append(json.dumps({'language': language, 'tokens': list(tokens), 'deprel': token_list}, ensure_ascii=False))
+        if self.path is None or not lines:
+            return
+        if not os.path.exists(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+
+
+class DependencyParser(object):
+    r"""dependency parsing service used by graph preprocessing.
+
+    Questions already in the cache are not parsed again. The others are parsed in batches by a
+    single stanza pipeline, or, on CPU with `num_workers` > 1, by a pool of processes each loading
+    the pipeline once. Every parsed batch is written to the cache as soon as it is done.
+    """
+    def __init__(self, language, use_gpu=False, cache_path=None, num_workers=1, batch_size=64, rebuild=False):
+        """
+        Args:
+            language (str): language of the stanza pipeline, e.g. 'en' or 'zh'.
+
+            use_gpu (bool): run the pipeline on gpu, which disables the process pool.
+
+            cache_path (str|None): json-lines cache file, None to disable the on-disk cache.
+
+            num_workers (int): number of parsing processes on CPU.
+
+            batch_size (int): number of questions in a parsed document.
+
+            rebuild (bool): if True, parse every question again and rewrite the cache file.
+        """
+        super().__init__()
+        self.language = language
+        self.use_gpu = use_gpu
+        self.num_workers = num_workers if num_workers else 1
+        self.batch_size = batch_size
+        self.cache = DependencyParseCache(cache_path, rebuild)
+
+    def parse(self, texts):
+        r"""parse pretokenized questions.
+
+        Args:
+            texts (list): list of pretokenized question strings, e.g. data["ques source 1"].
+
+        Returns:
+            list: the stanza token dicts of the first sentence of each question.
+        """
+        token_seqs = [tuple(sentence_tokens(text)) for text in texts]
+        pending = []
+        seen = set()
+        for tokens in token_seqs:
+            if tokens and tokens not in seen and self.cache.get(self.language, tokens) is None:
+                seen.add(tokens)
+                pending.append(tokens)
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        for batch, token_lists in self._parse_batches(batches):
+            self.cache.update(self.language, batch, token_lists)
+        return [self.cache.get(self.language, tokens) if tokens else [] for tokens in token_seqs]
+
+    def _parse_batches(self, batches):
+        if not batches:
+            return
+        num_workers = min(self.num_workers, len(batches))
+        if self.use_gpu or num_workers <= 1:
+            nlp = load_pipeline(self.language, self.use_gpu)
+            for batch in batches:
+                yield batch, _parse_batch(nlp, batch)
+            return
+        num_threads = max(1, (os.cpu_count() or 1) // num_workers)
+        # spawn, since forking a process with initialized torch threads may deadlock.
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(num_workers, initializer=_init_parse_worker, initargs=(self.language, num_threads)) as pool:
+            for batch, token_lists in pool.imap_unordered(_parse_in_worker, [(self.language, batch) for batch in batches]):
+                yield batch, token_lists
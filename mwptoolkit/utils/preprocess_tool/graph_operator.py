@@ -0,0 +1,77 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/25 10:21:36
+# @File: graph_operator.py
+
+
+import itertools
+
+import torch
+
+from mwptoolkit.utils.utils import str2float
+
+# quantity cell graph, quantity comparison graphs (greater, lower), quantity between and attribute between graphs.
+QUANTITY_GRAPH_CHANNELS = 5
+
+
+def quantity_graph_edges(num_pos, num_list, group_nums):
+    r"""edges of the quantity graphs of a problem, as used by Graph2Tree (Zhang et al. 2020).
+
+    The graphs only depend on the problem, so they are built once in preprocessing. Self loops of
+    the question tokens are left out, they depend on the padded length and are added per batch.
+
+    Args:
+        num_pos (list): positions of the numbers in the question.
+
+        num_list (list): the numbers.
+
+        group_nums (list): positions of the quantity cell of each number.
+
+    Returns:
+        list: COO indices [channels, rows, cols] of the edges.
+    """
+    edges = set()
+    for idx, n_pos in enumerate(num_pos):
+        group_num = group_nums[idx] if idx < len(group_nums) else []
+        for pos in group_num:
+            for channel in [0, 3, 4]:
+                edges.add((channel, n_pos, pos))
+                edges.add((channel, pos, n_pos))
+    values = [str2float(num) for num in num_list[:len(num_pos)]]
+    for (pos_i, num_i), (pos_j, num_j) in itertools.product(zip(num_pos, values), repeat=2):
+        if num_i > num_j:
+            edges.add((1, pos_i, pos_j))
+            edges.add((2, pos_j, pos_i))
+        else:
+            edges.add((1, pos_j, pos_i))
+            edges.add((2, pos_i, pos_j))
+    for pos_i, pos_j in itertools.permutations(itertools.chain.from_iterable(group_nums), 2):
+        edges.add((3, pos_i, pos_j))
+        edges.add((4, pos_i, pos_j))
+    edges = sorted(edges)
+    return [[edge[0] for edge in edges], [edge[1] for edge in edges], [edge[2] for edge in edges]]
+
+
+def quantity_graph_index(graphs, shift=0):
+    r"""COO index of the quantity graphs of a batch.
+
+    Args:
+        graphs (list): edges of each problem, as returned by `quantity_graph_edges`.
+
+        shift (int): offset added to every position, 1 when a <SOS> token is put at the head of questions.
+
+    Returns:
+        torch.Tensor: index of the edges in a [batch_size, channels, seq_length, seq_length] graph, shape [4, edge_num].
+    """
+    samples = []
+    channels = []
+    rows = []
+    cols = []
+    for b_i, (graph_channels, graph_rows, graph_cols) in enumerate(graphs):
+        samples += [b_i] * len(graph_channels)
+        channels += graph_channels
+        rows += graph_rows
+        cols += graph_cols
+    index = torch.tensor([samples, channels, rows, cols], dtype=torch.long).view(4, -1)
+    index[2:] += shift
+    return index
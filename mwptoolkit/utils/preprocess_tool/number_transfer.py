@@ -4,13 +4,13 @@ import random
 from copy import deepcopy
 from collections import OrderedDict
 
-import nltk
-import stanza
-
 from mwptoolkit.utils.utils import read_json_data, str2float, lists2dict
 from mwptoolkit.utils.enum_type import DatasetName, MaskSymbol, NumMask, SpecialTokens, EPT, TaskType
 from mwptoolkit.utils.data_structure import DependencyTree
 from mwptoolkit.utils.preprocess_tool.number_operator import english_word_2_num
+from mwptoolkit.utils.lazy_import import LazyModule
+
+nltk = LazyModule('nltk')
 
 
 def number_transfer(datas, dataset_name, task_type, mask_type, min_generate_keep,linear_dataset, equ_split_symbol=';',vocab_level='word', word_lower=False):
@@ -27,6 +27,26 @@ def number_transfer(datas, dataset_name, task_type, mask_type, min_generate_keep
         tuple(list,list,int,list):
         processed datas, generate number list, copy number, unk symbol list.
     """
+    statistics = {}
+    processed_datas = list(iter_number_transfer(datas, dataset_name, task_type, mask_type, linear_dataset, statistics,
+                                                equ_split_symbol, vocab_level, word_lower))
+    generate_number = keep_generate_number(statistics, min_generate_keep)
+    return processed_datas, generate_number, statistics['copy_nums'], statistics['unk_symbol']
+
+
+def iter_number_transfer(datas, dataset_name, task_type, mask_type, linear_dataset, statistics, equ_split_symbol=';',vocab_level='word', word_lower=False):
+    """number transfer as a generator stage, problems are transferred one at a time when the stage is read.
+
+    Args:
+        datas (Iterable[dict]): dataset.
+        dataset_name (str): dataset name.
+        task_type (str): [single_equation | multi_equation], task type.
+        statistics (dict): filled with generate numbers, copy number and unk symbols of the problems read so far.
+        equ_split_symbol (str): equation split symbol of multiple-equation dataset.
+
+    Returns:
+        Generator[dict]: processed datas.
+    """
     if dataset_name == DatasetName.math23k:
         transfer = number_transfer_math23k
     elif dataset_name == DatasetName.asdiv_a:
@@ -50,11 +70,13 @@ def number_transfer(datas, dataset_name, task_type, mask_type, min_generate_keep
             transfer = num_transfer_multi
         else:
             raise NotImplementedError
-    generate_nums = []
-    generate_nums_dict = {}
-    copy_nums = 0
-    processed_datas = []
-    unk_symbol = []
+    statistics.setdefault('generate_nums', [])
+    statistics.setdefault('generate_nums_dict', {})
+    statistics.setdefault('copy_nums', 0)
+    statistics.setdefault('unk_symbol', [])
+    generate_nums = statistics['generate_nums']
+    generate_nums_dict = statistics['generate_nums_dict']
+    unk_symbol = statistics['unk_symbol']
     for data in datas:
         if task_type == TaskType.SingleEquation:
             new_data = transfer(data, mask_type, linear_dataset, vocab_level,word_lower)
@@ -79,8 +101,8 @@ def number_transfer(datas, dataset_name, task_type, mask_type, min_generate_keep
             if s in generate_nums and s not in num_list:
                 generate_nums_dict[s] = generate_nums_dict[s] + 1
 
-        if copy_num > copy_nums:
-            copy_nums = copy_num
+        if copy_num > statistics['copy_nums']:
+            statistics['copy_nums'] = copy_num
 
         # get unknown number
         if task_type == TaskType.SingleEquation:
@@ -103,13 +125,17 @@ def number_transfer(datas, dataset_name, task_type, mask_type, min_generate_keep
         else:
             raise NotImplementedError
 
-        processed_datas.append(new_data)
-    # keep generate number
+        yield new_data
+
+
+def keep_generate_number(statistics, min_generate_keep):
+    """generate numbers of `iter_number_transfer` statistics which count at least min_generate_keep.
+    """
     generate_number = []
-    for g in generate_nums:
-        if generate_nums_dict[g] >= min_generate_keep:
+    for g in statistics.get('generate_nums', []):
+        if statistics['generate_nums_dict'][g] >= min_generate_keep:
             generate_number.append(g)
-    return processed_datas, generate_number, copy_nums, unk_symbol
+    return generate_number
 
 
 def seg_and_tag_single(st, nums_fraction, nums):  # seg the equation and tag the num
@@ -1,11 +1,14 @@
 import re
 
-import nltk
-import stanza
-
 from mwptoolkit.utils.data_structure import DependencyTree
 from mwptoolkit.utils.utils import write_json_data,read_json_data
 from mwptoolkit.utils.enum_type import EPT
+from mwptoolkit.utils.preprocess_tool.dependency_parser import DependencyParser
+from mwptoolkit.utils.preprocess_tool.graph_operator import quantity_graph_edges
+from mwptoolkit.utils.lazy_import import LazyModule
+
+nltk = LazyModule('nltk')
+stanza = LazyModule('stanza')
 
 def deprel_tree_to_file(train_datas, valid_datas, test_datas, path, language, use_gpu):
     """save deprel tree infomation to file
@@ -398,94 +401,120 @@ def get_deprel_tree_(train_datas, valid_datas, test_datas, path):
     return train_datas, valid_datas, test_datas, deprel_tokens
 
 
+def _group_nums_from_deprel(data, token_list):
+    group_nums = []
+    num_pos = data["number position"]
+    sent_len = len(data["question"])
+    for n_pos in num_pos:
+        pos_stack = []
+        group_num = []
+        pos_stack.append([n_pos, token_list[n_pos]["deprel"]])
+        head_pos = token_list[n_pos]['head']
+        for idx, x in enumerate(token_list):
+            if x['head'] == head_pos and n_pos != idx:
+                deprel = x["deprel"]
+                pos_stack.append([idx, deprel])
+        while pos_stack:
+            pos_dep = pos_stack.pop(0)
+            pos = pos_dep[0]
+            dep = pos_dep[1]
+            upos = token_list[pos]['upos']
+            head_pos = token_list[pos]['head'] - 1
+            if upos not in ['NOUN', 'NUM', 'ADJ', 'VERB', 'DET', 'SYM']:
+                continue
+            elif upos == 'NOUN' and dep not in ['compound', 'nsubj:pass', 'nsubj', 'compound']:
+                continue
+            elif upos == 'VERB' and dep not in ['conj', 'root']:
+                continue
+            elif upos == 'ADJ' and dep not in ['amod']:
+                continue
+            elif upos == 'DET' and dep not in ['advmod']:
+                continue
+            elif upos == 'SYM' and dep not in ['obl']:
+                continue
+            else:
+                group_num.append(pos)
+            if head_pos >= 0:
+                head_dep = token_list[head_pos]['deprel']
+                if [head_pos, head_dep] in pos_stack:
+                    pass
+                else:
+                    pos_stack.append([head_pos, head_dep])
+        if group_num == []:
+            group_num.append(n_pos)
+        if len(group_num) == 1:
+            if n_pos - 1 >= 0:
+                group_num.append(n_pos - 1)
+            if n_pos + 1 <= sent_len:
+                group_num.append(n_pos + 1)
+        group_nums.append(group_num)
+    return group_nums
+
+
+def _deprel_tree_from_deprel(data, token_list):
+    group_nums = []
+    deprel_token = []
+    length = len(data["question"])
+    for idx, x in enumerate(token_list):
+        token = x['deprel']
+        if token in deprel_token:
+            deprel_idx = deprel_token.index(token) + length
+        else:
+            deprel_token.append(token)
+            deprel_idx = deprel_token.index(token) + length
+        group_nums.append([x['head'] - 1, deprel_idx])
+        group_nums.append([deprel_idx, idx])
+    data["group nums"] = group_nums
+    data["question"] = data["question"] + deprel_token
+    return deprel_token
+
+
+def get_group_nums_by_parser(train_datas, valid_datas, test_datas, parser):
+    """get group nums infomation, parsing the questions with a :class:`DependencyParser`, and the
+    quantity graphs built from them.
+    """
+    datas = train_datas + valid_datas + test_datas
+    token_lists = parser.parse([data["ques source 1"] for data in datas])
+    for data, token_list in zip(datas, token_lists):
+        data["group nums"] = _group_nums_from_deprel(data, token_list)
+        data["quantity graph"] = quantity_graph_edges(data["number position"], data["number list"], data["group nums"])
+    return train_datas, valid_datas, test_datas
+
+
+def get_deprel_tree_by_parser(train_datas, valid_datas, test_datas, parser):
+    """get deprel tree infomation, parsing the questions with a :class:`DependencyParser`.
+    """
+    datas = train_datas + valid_datas + test_datas
+    token_lists = parser.parse([data["ques source 1"] for data in datas])
+    deprel_tokens = []
+    for idx, (data, token_list) in enumerate(zip(datas, token_lists)):
+        deprel_token = _deprel_tree_from_deprel(data, token_list)
+        # deprel tokens are collected from trainset only.
+        if idx < len(train_datas):
+            for token in deprel_token:
+                if token not in deprel_tokens:
+                    deprel_tokens.append(token)
+    return train_datas, valid_datas, test_datas, deprel_tokens
+
+
 def get_group_nums(datas, language, use_gpu):
-    nlp = stanza.Pipeline(language, processors='depparse,tokenize,pos,lemma', tokenize_pretokenized=True, logging_level='error', use_gpu=use_gpu)
+    parser = DependencyParser(language, use_gpu)
+    token_lists = parser.parse([data["ques source 1"] for data in datas])
     new_datas = []
-    for idx, data in enumerate(datas):
-        group_nums = []
-        num_pos = data["number position"]
-        sent_len = len(data["question"])
-        doc = nlp(data["ques source 1"])
-        token_list = doc.to_dict()[0]
-        for n_pos in num_pos:
-            pos_stack = []
-            group_num = []
-            pos_stack.append([n_pos, token_list[n_pos]["deprel"]])
-            head_pos = token_list[n_pos]['head']
-            for idx, x in enumerate(token_list):
-                if x['head'] == head_pos and n_pos != idx:
-                    deprel = x["deprel"]
-                    pos_stack.append([idx, deprel])
-            while pos_stack:
-                pos_dep = pos_stack.pop(0)
-                pos = pos_dep[0]
-                dep = pos_dep[1]
-                upos = token_list[pos]['upos']
-                head_pos = token_list[pos]['head'] - 1
-                if upos not in ['NOUN', 'NUM', 'ADJ', 'VERB', 'DET', 'SYM']:
-                    continue
-                elif upos == 'NOUN' and dep not in ['compound', 'nsubj:pass', 'nsubj', 'compound']:
-                    continue
-                elif upos == 'VERB' and dep not in ['conj', 'root']:
-                    continue
-                elif upos == 'ADJ' and dep not in ['amod']:
-                    continue
-                elif upos == 'DET' and dep not in ['advmod']:
-                    continue
-                elif upos == 'SYM' and dep not in ['obl']:
-                    continue
-                else:
-                    group_num.append(pos)
-                if head_pos >= 0:
-                    head_dep = token_list[head_pos]['deprel']
-                    if [head_pos, head_dep] in pos_stack:
-                        pass
-                    else:
-                        pos_stack.append([head_pos, head_dep])
-            if group_num == []:
-                group_num.append(n_pos)
-            if len(group_num) == 1:
-                if n_pos - 1 >= 0:
-                    group_num.append(n_pos - 1)
-                if n_pos + 1 <= sent_len:
-                    group_num.append(n_pos + 1)
-            group_nums.append(group_num)
-        #datas[idx]["group nums"]=group_nums
-        data["group nums"] = group_nums
+    for data, token_list in zip(datas, token_lists):
+        data["group nums"] = _group_nums_from_deprel(data, token_list)
+        data["quantity graph"] = quantity_graph_edges(data["number position"], data["number list"], data["group nums"])
         new_datas.append(data)
-        # group_words=[]
-        # for group_num in group_nums:
-        #     group_word=[]
-        #     for idx in group_num:
-        #         group_word.append(token_list[idx]["text"])
-        #     group_words.append(group_word)
-        # path="/group_nums.json"
-        # json_data={"sentence":data["ques source 1"],"num pos":num_pos,"words":group_words}
-        # write_json_data(json_data,path)
     return new_datas
 
 
 def get_deprel_tree(datas, language):
-    nlp = stanza.Pipeline(language, processors='depparse,tokenize,pos,lemma', tokenize_pretokenized=True, logging_level='error')
+    parser = DependencyParser(language)
+    token_lists = parser.parse([data["ques source 1"] for data in datas])
     new_datas = []
     deprel_tokens = []
-    for idx, data in enumerate(datas):
-        group_nums = []
-        deprel_token = []
-        doc = nlp(data["ques source 1"])
-        token_list = doc.to_dict()[0]
-        length = len(data["question"])
-        for idx, x in enumerate(token_list):
-            token = x['deprel']
-            if token in deprel_token:
-                deprel_idx = deprel_token.index(token) + length
-            else:
-                deprel_token.append(token)
-                deprel_idx = deprel_token.index(token) + length
-            group_nums.append([x['head'] - 1, deprel_idx])
-            group_nums.append([deprel_idx, idx])
-        data["group nums"] = group_nums
-        data["question"] = data["question"] + deprel_token
+    for data, token_list in zip(datas, token_lists):
+        deprel_token = _deprel_tree_from_deprel(data, token_list)
         new_datas.append(data)
         for token in deprel_token:
             if token not in deprel_tokens:
@@ -0,0 +1,254 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/27 20:14:08
+# @File: tree_operator.py
+
+
+from functools import lru_cache
+
+import torch
+
+from mwptoolkit.utils.enum_type import SpecialTokens
+
+_BINARY_SYMBOLS = ['+', '-', '*', '/', '^', '=', SpecialTokens.BRG_TOKEN, SpecialTokens.OPT_TOKEN]
+
+
+def prefix_tree_schedule(equations, max_length, num_stacks, num_start, unk_token):
+    r"""schedule of teacher forced decoding of binary prefix trees, as done by GTS-style tree decoders.
+
+    The decoders visit the nodes of a target tree one by one. A node is predicted from the goal vector its
+    parent generated and, if it is a right child, from the embedding of the subtree of its left sibling, so
+    nodes are predicted in waves instead: a node is in the wave after its parent and after the wave its left
+    sibling subtree is finished in. Subtrees only depend on the target, except for UNK leaves, which are
+    resolved to the number scored highest when they are predicted, so a subtree is merged before the first
+    wave if it has no UNK leaf, or after the wave of its last UNK leaf. Merges of a wave are grouped by
+    height.
+
+    Positions after the end of a target are predicted as by the sequential decoders: the first one from a
+    zero goal and the whole tree as left child, the others from a zero goal only, which all share one row.
+
+    Nodes are indexed by their flat position `b * max_length + t` in the padded target.
+
+    Args:
+        equations (list): prefix token ids of each target, without padding.
+
+        max_length (int): length of the padded targets.
+
+        num_stacks (list): positions of the numbers of each UNK of each target, the last one is used first.
+
+        num_start (int): index of the first number symbol, symbols before it are binary operators.
+
+        unk_token (int): index of UNK symbol.
+
+    Returns:
+        dict|None: index tensors of the waves and merges, None if a target is not a complete binary prefix tree or
+        has more UNK than number stack entries.
+    """
+    trees = []
+    for equation, num_stack in zip(equations, num_stacks):
+        if len(equation) == 0 or len(equation) > max_length:
+            return None
+        tree = _prefix_tree(equation, num_stack, num_start, unk_token)
+        if tree is None:
+            return None
+        trees.append(tree)
+
+    wave_nums = 1 + max(max(tree['wave'] + [tree['pad_wave'] if len(tree['tokens']) < max_length else 0])
+                        for tree in trees)
+    waves = [{'positions': [], 'batch': [], 'left': [], 'left_mask': [], 'op_rows': [], 'op_positions': [],
+              'left_children': [], 'right_children': [], 'unk_rows': [], 'unk_positions': [], 'unk_batch': [],
+              'unk_candidates': []} for _ in range(wave_nums)]
+    merge_groups = [{} for _ in range(wave_nums + 1)]
+    rows = {}
+    leaves = []
+    leaf_batch = []
+    leaf_number = []
+    labels = [0] * (len(trees) * max_length)
+    max_number = -1
+    for b, tree in enumerate(trees):
+        offset = b * max_length
+        for t, token in enumerate(tree['tokens']):
+            wave = waves[tree['wave'][t]]
+            rows[offset + t] = (tree['wave'][t], len(wave['positions']))
+            wave['positions'].append(offset + t)
+            wave['batch'].append(b)
+            left_sibling = tree['left_sibling'][t]
+            wave['left'].append(offset + left_sibling if left_sibling >= 0 else 0)
+            wave['left_mask'].append(left_sibling >= 0)
+            if token < num_start:
+                labels[offset + t] = token
+                wave['op_rows'].append(len(wave['positions']) - 1)
+                wave['op_positions'].append(offset + t)
+                wave['left_children'].append(offset + tree['left_child'][t])
+                wave['right_children'].append(offset + tree['right_child'][t])
+                group = merge_groups[tree['ready'][t] + 1].setdefault(tree['height'][t], ([], [], []))
+                group[0].append(offset + t)
+                group[1].append(offset + tree['left_child'][t])
+                group[2].append(offset + tree['right_child'][t])
+            elif token == unk_token:
+                candidates = tree['candidates'][t]
+                wave['unk_rows'].append(len(wave['positions']) - 1)
+                wave['unk_positions'].append(offset + t)
+                wave['unk_batch'].append(b)
+                wave['unk_candidates'].append(candidates)
+                max_number = max([max_number] + candidates)
+            else:
+                leaves.append(offset + t)
+                leaf_batch.append(b)
+                leaf_number.append(token - num_start)
+                max_number = max(max_number, token - num_start)
+        length = len(tree['tokens'])
+        if length < max_length:
+            # the first position after the target sees the whole tree as its left child.
+            wave = waves[tree['pad_wave']]
+            rows[offset + length] = (tree['pad_wave'], len(wave['positions']))
+            wave['positions'].append(offset + length)
+            wave['batch'].append(b)
+            wave['left'].append(offset)
+            wave['left_mask'].append(True)
+        if length + 1 < max_length:
+            wave = waves[0]
+            shared_row = (0, len(wave['positions']))
+            wave['positions'].append(offset + length + 1)
+            wave['batch'].append(b)
+            wave['left'].append(0)
+            wave['left_mask'].append(False)
+            for t in range(length + 1, max_length):
+                rows[offset + t] = shared_row
+
+    # rows of the token logits of every wave are concatenated in wave order.
+    wave_offsets = [0]
+    for wave in waves:
+        wave_offsets.append(wave_offsets[-1] + len(wave['positions']))
+    logit_index = [0] * (len(trees) * max_length)
+    for position, (wave_i, row) in rows.items():
+        logit_index[position] = wave_offsets[wave_i] + row
+
+    for wave in waves:
+        for key in ['positions', 'batch', 'left', 'op_rows', 'op_positions', 'left_children', 'right_children',
+                    'unk_rows', 'unk_positions', 'unk_batch']:
+            wave[key] = torch.tensor(wave[key], dtype=torch.long)
+        wave['left_mask'] = torch.tensor(wave['left_mask'], dtype=torch.bool)
+        # padded with the first candidate, which is picked on ties anyway.
+        width = max([len(candidates) for candidates in wave['unk_candidates']] + [1])
+        wave['unk_candidates'] = torch.tensor([candidates + candidates[:1] * (width - len(candidates))
+                                               for candidates in wave['unk_candidates']],
+                                              dtype=torch.long).view(-1, width)
+    merges = []
+    for groups in merge_groups:
+        merges.append([tuple(torch.tensor(index, dtype=torch.long) for index in groups[height])
+                       for height in sorted(groups)])
+    return {
+        'length': max_length,
+        'waves': waves,
+        'merges': merges,
+        'leaves': torch.tensor(leaves, dtype=torch.long),
+        'leaf_batch': torch.tensor(leaf_batch, dtype=torch.long),
+        'leaf_number': torch.tensor(leaf_number, dtype=torch.long),
+        'max_number': max_number,
+        'labels': torch.tensor(labels, dtype=torch.long),
+        'logit_index': torch.tensor(logit_index, dtype=torch.long)
+    }
+
+
+def _prefix_tree(equation, num_stack, num_start, unk_token):
+    # parent links, prediction waves, ready waves and heights of a prefix tree, None if it is not complete.
+    length = len(equation)
+    left_child = [-1] * length
+    right_child = [-1] * length
+    left_sibling = [-1] * length
+    wave = [0] * length
+    unk_wave = [-1] * length
+    candidates = {}
+    stack = []
+    for t, token in enumerate(equation):
+        if t > 0:
+            if not stack:
+                return None
+            parent = stack[-1]
+            if left_child[parent] < 0:
+                left_child[parent] = t
+                wave[t] = wave[parent] + 1
+            else:
+                stack.pop()
+                right_child[parent] = t
+                left_sibling[t] = left_child[parent]
+                # the left sibling subtree is finished after its last UNK leaf is predicted.
+                ready = max(unk_wave[left_child[parent]:t])
+                wave[t] = max(wave[parent], ready) + 1
+        if token < num_start:
+            stack.append(t)
+        elif token == unk_token:
+            if len(candidates) >= len(num_stack):
+                return None
+            candidates[t] = list(num_stack[-1 - len(candidates)])
+            if not candidates[t]:
+                return None
+            unk_wave[t] = wave[t]
+    if stack:
+        return None
+    ready = list(unk_wave)
+    height = [0] * length
+    for t in reversed(range(length)):
+        if equation[t] < num_start:
+            ready[t] = max(ready[left_child[t]], ready[right_child[t]])
+            height[t] = 1 + max(height[left_child[t]], height[right_child[t]])
+    return {
+        'tokens': equation,
+        'left_child': left_child,
+        'right_child': right_child,
+        'left_sibling': left_sibling,
+        'wave': wave,
+        'ready': ready,
+        'height': height,
+        'candidates': candidates,
+        'pad_wave': ready[0] + 1
+    }
+
+
+@lru_cache(maxsize=65536)
+def postfix_tree(template):
+    r"""postorder arrays of the binary tree of a postfix template, the same tree as built by
+    `~mwptoolkit.utils.data_structure.BinaryTree.equ2tree_`.
+
+    Nodes are numbered in postorder, which is the order of the template symbols, so an operator comes after
+    its children. The level of a node is the height of its subtree, 0 for leaves, every node of a level only
+    depends on nodes of lower levels.
+
+    Args:
+        template (tuple): postfix symbols, read until EOS or PAD symbol.
+
+    Returns:
+        dict|None: symbols, left and right child (-1 for leaves) and level of every node, None if the template is
+        not a complete tree.
+    """
+    symbols = []
+    left = []
+    right = []
+    level = []
+    stack = []
+    for symbol in template:
+        if symbol in [SpecialTokens.EOS_TOKEN, SpecialTokens.PAD_TOKEN]:
+            break
+        if symbol in _BINARY_SYMBOLS:
+            if len(stack) < 2:
+                return None
+            right_child = stack.pop()
+            left_child = stack.pop()
+            left.append(left_child)
+            right.append(right_child)
+            level.append(1 + max(level[left_child], level[right_child]))
+        else:
+            left.append(-1)
+            right.append(-1)
+            level.append(0)
+        stack.append(len(symbols))
+        symbols.append(symbol)
+    if len(stack) != 1:
+        return None
+    return {
+        'symbols': tuple(symbols),
+        'left': tuple(left),
+        'right': tuple(right),
+        'level': tuple(level)
+    }
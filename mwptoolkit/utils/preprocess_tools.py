@@ -6,13 +6,15 @@ from collections import OrderedDict
 from pathlib import Path
 from typing import Tuple, List, Union
 
-import nltk
-import stanza
 from word2number import w2n
 
 from mwptoolkit.utils.utils import read_json_data, str2float, lists2dict
 from mwptoolkit.utils.enum_type import MaskSymbol, NumMask, SpecialTokens, EPT
 from mwptoolkit.utils.data_structure import DependencyTree
+from mwptoolkit.utils.lazy_import import LazyModule
+
+nltk = LazyModule('nltk')
+stanza = LazyModule('stanza')
 
 
 def split_number(text_list):
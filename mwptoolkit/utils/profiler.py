@@ -0,0 +1,263 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/27 16:05:31
+# @File: profiler.py
+
+
+import contextlib
+import functools
+import json
+import os
+import time
+
+import torch
+
+# shared by every disabled phase, so a disabled profiler costs one attribute lookup per phase.
+_NULL_PHASE = contextlib.nullcontext()
+
+
+class _Phase(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit()
+        return False
+
+
+class TrainerProfiler(object):
+    r"""time the phases of training and evaluation batches, per epoch.
+
+    A phase is timed as a whole (total) and without the phases nested in it (self), e.g. the
+    self time of forward leaves out backward. At the end of an epoch the phases are logged by self
+    time, and if `profile_dir` is set, written to `epoch-<n>.json` and, as Chrome trace events,
+    to `epoch-<n>.trace.json`, which can be opened in chrome://tracing or Perfetto.
+
+    Phases timed by the trainers:
+
+    data_fetch: building or reading a batch and moving it to the device.
+
+    forward: loss of a training batch, calculate_loss of the models also runs backward.
+
+    backward: backward, nested in forward.
+
+    optimizer_step: updating the parameters.
+
+    decode: model_test of an evaluation batch, teacher_test and student_test for TSN, tree models do their tree
+    bookkeeping here.
+
+    fix_search: waiting for the fixes of a batch in weakly supervised training, the decoding of the batch is timed as
+    forward.
+
+    evaluate: checking outputs with the evaluator, e.g. sympy solving of multi equation problems.
+
+    save_checkpoint, save_model, save_output: writing files.
+
+    expected that config includes these parameters below:
+
+    profile (bool): time the phases, nothing is timed if False.
+
+    profile_dir (str|None): folder of per epoch json and trace files, only logged if None.
+    """
+    def __init__(self, config, logger):
+        super().__init__()
+        self.enabled = bool(config["profile"])
+        self.profile_dir = config["profile_dir"]
+        if self.enabled and self.profile_dir:
+            if config["k_fold"] and config["fold_t"] is not None:
+                self.profile_dir = os.path.join(self.profile_dir, 'fold{}'.format(config["fold_t"]))
+            os.makedirs(self.profile_dir, exist_ok=True)
+        self.logger = logger
+        self.epoch_fn = None
+        self.epoch = None
+        self._patched = []
+        self._runs = 0
+        self._reset()
+
+    def _reset(self):
+        self.totals = {}
+        self.selfs = {}
+        self.counts = {}
+        self.events = []
+        self._stack = []
+        self._start = time.perf_counter()
+
+    def phase(self, name):
+        r"""context timing the phase `name`.
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def _enter(self, name):
+        if self.epoch_fn is not None and not self._stack:
+            epoch = self.epoch_fn()
+            if epoch != self.epoch:
+                self.flush()
+                self.epoch = epoch
+        # [name, start, time of nested phases]
+        self._stack.append([name, time.perf_counter(), 0.])
+
+    def _exit(self):
+        name, start, nested = self._stack.pop()
+        end = time.perf_counter()
+        seconds = end - start
+        self.totals[name] = self.totals.get(name, 0.) + seconds
+        self.selfs[name] = self.selfs.get(name, 0.) + seconds - nested
+        self.counts[name] = self.counts.get(name, 0) + 1
+        if self._stack:
+            self._stack[-1][2] += seconds
+        if self.profile_dir:
+            self.events.append({'name': name, 'cat': 'trainer', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                                'ts': start * 1e6, 'dur': seconds * 1e6})
+
+    def wrap(self, name, func):
+        r"""`func` timed as the phase `name`.
+        """
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return timed
+
+    def iterate(self, name, iterable):
+        r"""items of `iterable`, getting each one timed as the phase `name`.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.phase(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def wrap_iterator(self, name, func):
+        r"""`func` returning an iterable whose items are timed as the phase `name`.
+        """
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            return self.iterate(name, func(*args, **kwargs))
+        return timed
+
+    def _patch(self, obj, attr, wrapper):
+        # models and trainers only have some of the timed methods, e.g. TSN decodes with teacher_test.
+        if not hasattr(obj, attr):
+            return
+        # the attribute set on the instance, None for a method of its class.
+        self._patched.append((obj, attr, obj.__dict__.get(attr)))
+        setattr(obj, attr, wrapper(getattr(obj, attr)))
+
+    def instrument(self, trainer):
+        r"""time the phases of a trainer which happen in its dataloader, model, evaluator and file writing.
+
+        The batches of training and the optimizer step are timed by the trainer itself. A run, i.e. fit, test or
+        param_search, closes the profiler when it ends, and instruments the trainer again if it is run once more.
+        """
+        if not self.enabled:
+            return
+        self._instrument_phases(trainer)
+        for name in ['fit', 'test', 'param_search']:
+            if hasattr(trainer, name):
+                setattr(trainer, name, self._close_after(trainer, getattr(trainer, name)))
+
+    def _instrument_phases(self, trainer):
+        self.epoch_fn = lambda: trainer.epoch_i
+        self._patch(trainer.dataloader, 'load_data', lambda func: self.wrap_iterator('data_fetch', func))
+        self._patch(trainer.dataloader, 'load_next_batch', lambda func: self.wrap('data_fetch', func))
+        for name in ['model_test', 'teacher_test', 'student_test']:
+            self._patch(trainer.model, name, lambda func: self.wrap('decode', func))
+        # teacher forward building the soft targets of TSN, and decoding of the weakly supervised models.
+        for name in ['init_soft_target', 'weakly_decode']:
+            self._patch(trainer.model, name, lambda func: self.wrap('forward', func))
+        self._patch(trainer.evaluator, 'result_batch', lambda func: self.wrap('evaluate', func))
+        for name in ['save_checkpoint', 'save_model', 'save_output']:
+            self._patch(trainer, '_' + name, lambda func, name=name: self.wrap(name, func))
+
+    def _close_after(self, trainer, func):
+        @functools.wraps(func)
+        def run(*args, **kwargs):
+            if self._runs == 0 and not self._patched:
+                self._instrument_phases(trainer)
+            self._runs += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self._runs -= 1
+                if self._runs == 0:
+                    self.close()
+                else:
+                    self.flush()
+        return run
+
+    def backward(self):
+        r"""context timing the calls of backward in it, models call it inside calculate_loss.
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return self._timed_backward()
+
+    @contextlib.contextmanager
+    def _timed_backward(self):
+        backward = torch.autograd.backward
+
+        @functools.wraps(backward)
+        def timed(*args, **kwargs):
+            with self.phase('backward'):
+                return backward(*args, **kwargs)
+        torch.autograd.backward = timed
+        try:
+            yield
+        finally:
+            torch.autograd.backward = backward
+
+    def summary(self):
+        r"""the phases timed since the last flush.
+
+        Returns:
+            dict: wall time of the epoch, and for each phase its count, total and self seconds.
+        """
+        return {
+            'epoch': self.epoch,
+            'seconds': time.perf_counter() - self._start,
+            'phases': {name: {'count': self.counts[name], 'total_seconds': self.totals[name],
+                              'self_seconds': self.selfs[name]} for name in self.totals}
+        }
+
+    def flush(self):
+        r"""log the phases of the epoch, write its files and start the next one.
+        """
+        if not self.enabled or not self.totals:
+            self._reset()
+            return
+        summary = self.summary()
+        wall = summary['seconds']
+        phases = sorted(summary['phases'].items(), key=lambda item: item[1]['self_seconds'], reverse=True)
+        self.logger.info("epoch [%3s] profile %.2fs: %s" % (
+            self.epoch, wall, ' | '.join("%s %.2fs %.1f%% x%d" % (
+                name, phase['self_seconds'], 100 * phase['self_seconds'] / wall if wall > 0 else 0., phase['count'])
+                for name, phase in phases)))
+        if self.profile_dir:
+            prefix = os.path.join(self.profile_dir, 'epoch-{}'.format(self.epoch))
+            with open(prefix + '.json', 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=4)
+            with open(prefix + '.trace.json', 'w', encoding='utf-8') as f:
+                json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+        self._reset()
+
+    def close(self):
+        r"""flush the last epoch and remove the timing wrappers.
+        """
+        self.flush()
+        for obj, attr, original in reversed(self._patched):
+            if original is None:
+                delattr(obj, attr)
+            else:
+                setattr(obj, attr, original)
+        self._patched = []
+        self.epoch_fn = None
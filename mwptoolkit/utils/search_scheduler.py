@@ -0,0 +1,330 @@
+# -*- encoding: utf-8 -*-
+# @Author: Yihuai Lan
+# @Time: 2021/09/28 09:47:26
+# @File: search_scheduler.py
+
+
+import ast
+import copy
+import hashlib
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+from multiprocessing.connection import wait
+from logging import getLogger
+
+import numpy as np
+import torch
+
+from mwptoolkit.utils.utils import write_pickle_data, read_pickle_data
+
+
+class TrialStopped(Exception):
+    r"""raised in a trial stopped early by the scheduler, ends its param_search.
+    """
+    pass
+
+
+def parse_search_parameter(parameters):
+    r"""parse search parameters in the format of search_space/*.json, e.g. "hidden_size=[128,256]".
+
+    A list is searched as a grid, a tuple (0,1) is sampled uniformly, another tuple of two values
+    is sampled log-uniformly and any other value is fixed.
+
+    Args:
+        parameters (list): strings "name=space".
+
+    Returns:
+        dict: name to (kind, space), kind is 'grid', 'uniform', 'loguniform' or 'fixed'.
+    """
+    space_dict = {}
+    for parameter in parameters:
+        name, space = parameter.split('=', 1)
+        space = ast.literal_eval(space.strip())
+        if isinstance(space, list):
+            space_dict[name.strip()] = ('grid', space)
+        elif isinstance(space, tuple) and len(space) == 2:
+            if space[0] == 0 and space[1] == 1:
+                space_dict[name.strip()] = ('uniform', space)
+            else:
+                space_dict[name.strip()] = ('loguniform', space)
+        else:
+            space_dict[name.strip()] = ('fixed', space)
+    return space_dict
+
+
+def generate_trials(space_dict, samples=1, algorithm='grid', seed=2021):
+    r"""parameters of every trial.
+
+    With 'grid', every combination of the grid parameters is run `samples` times, as num_samples of
+    ray tune. With 'random', `samples` trials pick every grid parameter at random. Uniform and
+    log-uniform parameters are sampled for each trial.
+    """
+    rng = random.Random(seed)
+    grid_names = [name for name, (kind, _) in space_dict.items() if kind == 'grid']
+    if algorithm == 'grid':
+        grids = [dict(zip(grid_names, values)) for values in
+                 itertools.product(*[space_dict[name][1] for name in grid_names])]
+        grids = grids * samples
+    elif algorithm == 'random':
+        grids = [{name: rng.choice(space_dict[name][1]) for name in grid_names} for _ in range(samples)]
+    else:
+        raise NotImplementedError("search algorithm {} is not supported, use grid or random.".format(algorithm))
+    trials = []
+    for grid in grids:
+        parameters = {}
+        for name, (kind, space) in space_dict.items():
+            if kind == 'grid':
+                parameters[name] = grid[name]
+            elif kind == 'uniform':
+                parameters[name] = rng.uniform(space[0], space[1])
+            elif kind == 'loguniform':
+                parameters[name] = math.exp(rng.uniform(math.log(space[0]), math.log(space[1])))
+            else:
+                parameters[name] = space
+        trials.append(parameters)
+    return trials
+
+
+class AsyncSuccessiveHalving(object):
+    r"""asynchronous successive halving (ASHA, Li et al. 2020) on the accuracy reported by trials.
+
+    A trial reaching a rung, its grace_period * reduction_factor^k th report, is stopped when its
+    accuracy is below the (1 - 1/reduction_factor) quantile of the accuracies recorded at that rung
+    so far, as the AsyncHyperBandScheduler of ray tune.
+    """
+    def __init__(self, grace_period=1, reduction_factor=3):
+        super().__init__()
+        self.grace_period = max(1, grace_period)
+        self.reduction_factor = max(2, reduction_factor)
+        self.rungs = {}
+
+    def on_result(self, iteration, accuracy):
+        r"""whether a trial continues after its `iteration` th report.
+        """
+        rung = self.grace_period
+        while rung < iteration:
+            rung *= self.reduction_factor
+        if rung != iteration:
+            return True
+        recorded = self.rungs.setdefault(rung, [])
+        cutoff = np.percentile(recorded, (1 - 1 / self.reduction_factor) * 100) if recorded else None
+        recorded.append(accuracy)
+        return cutoff is None or bool(accuracy >= cutoff)
+
+
+class FIFOScheduler(object):
+    r"""run every trial to the end.
+    """
+    def on_result(self, iteration, accuracy):
+        return True
+
+
+def _abs_dir(path):
+    return path if os.path.isabs(path) else os.path.join(os.getcwd(), path)
+
+
+def _trial_log_file(config, trial_id):
+    log_file = config['log_file'] if config['log_file'] else config['log_path']
+    root, ext = os.path.splitext(log_file)
+    return '{}-trial{}{}'.format(root, trial_id, ext)
+
+
+def _run_trial(config, dataset_file, trial_id, conn, num_threads, gpu_id):
+    r"""run the param_search of a trial in a worker process, reporting through `conn`.
+    """
+    if gpu_id is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = gpu_id
+    torch.set_num_threads(num_threads)
+
+    from mwptoolkit.data.utils import get_dataloader_module
+    from mwptoolkit.evaluate.evaluator import get_evaluator_module
+    from mwptoolkit.utils.utils import get_model, get_trainer, init_seed
+    from mwptoolkit.utils.logger import init_logger
+
+    config['log_file'] = _trial_log_file(config, trial_id)
+    init_logger(config)
+    init_seed(config['random_seed'], True)
+
+    def report(accuracy):
+        conn.send(('report', accuracy))
+        if not conn.recv():
+            raise TrialStopped
+
+    dataset = read_pickle_data(dataset_file)
+    dataloader = get_dataloader_module(config)(config, dataset)
+    model = get_model(config["model"])(config, dataset).to(config["device"])
+    evaluator = get_evaluator_module(config)(config)
+    evaluator.build_target_table(dataset)
+    trainer = get_trainer(config)(config, model, dataloader, evaluator)
+    trainer.search_reporter = report
+    try:
+        trainer.param_search()
+    except TrialStopped:
+        getLogger().info("trial {} stopped early.".format(trial_id))
+    evaluator.close()
+    conn.send(('done', None))
+    conn.close()
+
+
+class SearchScheduler(object):
+    r"""hyper-parameter search on a local process pool, without ray.
+
+    Trials run the param_search of their trainer in worker processes, which report the accuracy
+    of each evaluation back. With ASHA, a trial whose accuracy falls behind at a rung is stopped.
+
+    The dataset is preprocessed once for trials whose parameters of preprocessing, those which the
+    dataset cache is keyed on, are the same. It is pickled to the checkpoint folder and read by
+    the workers, which only build their dataloader, model and evaluator.
+
+    expected that config includes these parameters below:
+
+    samples (int): number of runs of each grid combination, or number of trials of random search.
+
+    search_algorithm (str): grid or random.
+
+    search_scheduler (str): asha to stop trials early, fifo to run every trial to the end.
+
+    asha_grace_period (int): number of reports before a trial can be stopped.
+
+    asha_reduction_factor (int): only the best 1/asha_reduction_factor of the trials reaching a rung continue.
+
+    search_workers (int): number of trials run at the same time.
+
+    search_num_threads (int|None): torch threads of a worker, cpu count divided by search_workers if None.
+    """
+    def __init__(self, config, space_dict):
+        """
+        Args:
+            config (mwptoolkit.config.configuration.Config): config shared by the trials.
+
+            space_dict (dict): search space, as returned by `parse_search_parameter`.
+        """
+        super().__init__()
+        self.config = config
+        self.space_dict = space_dict
+        self.num_workers = max(1, config["search_workers"] if config["search_workers"] else 1)
+        if config["search_num_threads"]:
+            self.num_threads = config["search_num_threads"]
+        else:
+            self.num_threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+        gpu_ids = [gpu_id.strip() for gpu_id in str(config["gpu_id"]).split(',') if gpu_id.strip()]
+        self.gpu_ids = gpu_ids if config["use_gpu"] and len(gpu_ids) > 1 else []
+        self.search_dir = os.path.join(_abs_dir(config["checkpoint_dir"]), 'search')
+        if str(config["search_scheduler"]).lower() == 'asha':
+            self.scheduler = AsyncSuccessiveHalving(config["asha_grace_period"] or 1,
+                                                    config["asha_reduction_factor"] or 3)
+        else:
+            self.scheduler = FIFOScheduler()
+        self.trials = generate_trials(space_dict, config["samples"] if config["samples"] else 1,
+                                      config["search_algorithm"] or 'grid', config["random_seed"])
+        self.results = []
+        # preprocessing parameters to the dataset file preprocessed in this run.
+        self._dataset_files = {}
+        self.logger = getLogger()
+
+    def _trial_config(self, parameters):
+        config = copy.deepcopy(self.config)
+        for key, value in parameters.items():
+            config[key] = value
+        return config
+
+    def _dataset_file(self, config):
+        r"""the preprocessed dataset of a trial, preprocessed when no earlier trial shares it.
+        """
+        from mwptoolkit.data.dataset.abstract_dataset import CACHE_PARAMETER_NAMES
+        from mwptoolkit.data.utils import get_dataset_module
+
+        key = json.dumps({name: config[name] for name in CACHE_PARAMETER_NAMES}, sort_keys=True, default=str)
+        dataset_file = os.path.join(self.search_dir, 'dataset-{}.pkl'.format(
+            hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]))
+        if key not in self._dataset_files:
+            self.logger.info("preprocess dataset for trials with {}".format(key))
+            dataset = get_dataset_module(config)(config)
+            dataset.dataset_load()
+            write_pickle_data(dataset, dataset_file)
+            self._dataset_files[key] = dataset_file
+        return self._dataset_files[key]
+
+    def _least_used_gpu(self, running):
+        trials_on_gpu = {gpu_id: 0 for gpu_id in self.gpu_ids}
+        for trial in running.values():
+            trials_on_gpu[trial['gpu_id']] += 1
+        return min(self.gpu_ids, key=lambda gpu_id: trials_on_gpu[gpu_id])
+
+    def _start(self, context, trial_id, parameters, running):
+        config = self._trial_config(parameters)
+        dataset_file = self._dataset_file(config)
+        gpu_id = self._least_used_gpu(running) if self.gpu_ids else None
+        parent_conn, child_conn = context.Pipe()
+        process = context.Process(target=_run_trial,
+                                  args=(config, dataset_file, trial_id, child_conn, self.num_threads, gpu_id))
+        process.start()
+        child_conn.close()
+        self.logger.info("trial {} started: {}".format(trial_id, parameters))
+        running[parent_conn] = {'trial_id': trial_id, 'parameters': parameters, 'process': process,
+                                'gpu_id': gpu_id, 'accuracies': [], 'done': False, 'stopped': False}
+
+    def _receive(self, conn, trial):
+        try:
+            message, accuracy = conn.recv()
+        except EOFError:
+            return False
+        if message == 'report':
+            trial['accuracies'].append(accuracy)
+            keep = self.scheduler.on_result(len(trial['accuracies']), accuracy)
+            trial['stopped'] = not keep
+            conn.send(keep)
+            self.logger.info("trial {} report {} accuracy {:.4f}{}".format(
+                trial['trial_id'], len(trial['accuracies']), accuracy, "" if keep else ", stopped"))
+            return True
+        trial['done'] = True
+        return False
+
+    def run(self):
+        r"""run every trial.
+
+        Returns:
+            list: one dict per trial with its parameters, reported accuracies, last accuracy and status.
+        """
+        os.makedirs(self.search_dir, exist_ok=True)
+        self.logger.info("search {} trials with {} workers, {} threads each.".format(
+            len(self.trials), self.num_workers, self.num_threads))
+        # spawn, since forking a process with initialized torch threads or cuda may deadlock.
+        context = multiprocessing.get_context('spawn')
+        pending = list(enumerate(self.trials))
+        running = {}
+        self.results = []
+        while pending or running:
+            while pending and len(running) < self.num_workers:
+                trial_id, parameters = pending.pop(0)
+                self._start(context, trial_id, parameters, running)
+            for conn in wait(list(running.keys())):
+                trial = running[conn]
+                if self._receive(conn, trial):
+                    continue
+                trial['process'].join()
+                running.pop(conn)
+                conn.close()
+                if trial['done'] and trial['process'].exitcode == 0:
+                    status = 'stopped' if trial['stopped'] else 'finished'
+                else:
+                    status = 'failed'
+                    self.logger.error("trial {} failed with exit code {}, see {}.".format(
+                        trial['trial_id'], trial['process'].exitcode, _trial_log_file(self.config, trial['trial_id'])))
+                self.results.append({'trial_id': trial['trial_id'], 'parameters': trial['parameters'],
+                                     'accuracies': trial['accuracies'], 'status': status,
+                                     'accuracy': trial['accuracies'][-1] if trial['accuracies'] else None})
+        self.results.sort(key=lambda result: result['trial_id'])
+        return self.results
+
+    def best_result(self):
+        r"""the trial with the best last accuracy, as get_best_config of ray tune, None if no trial reported.
+        """
+        reported = [result for result in self.results if result['accuracy'] is not None]
+        if not reported:
+            return None
+        return max(reported, key=lambda result: result['accuracy'])
@@ -4,10 +4,14 @@
 # @File: utils.py
 
 
+import hashlib
 import json
 import math
+import os
+import pickle
 import copy
 import importlib
+import importlib.util
 import random
 import re
 import numpy as np
@@ -34,6 +38,49 @@ def read_json_data(filename):
     return json.load(f)
 
 
+def iter_json_data(filename):
+    """
+    yield the items of a json list file, or the lines of a json-lines (.jsonl) file one at a time
+    """
+    if filename.endswith('.jsonl'):
+        with open(filename, 'r', encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        for data in read_json_data(filename):
+            yield data
+
+
+def write_pickle_data(data, filename):
+    """
+    write data to a binary pickle file, the file is replaced atomically
+    """
+    temp_filename = '{}.{}.tmp'.format(filename, os.getpid())
+    with open(temp_filename, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_filename, filename)
+
+
+def read_pickle_data(filename):
+    """
+    load data from a binary pickle file
+    """
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def file_digest(filename, block_size=1 << 20):
+    """
+    return the sha256 hex digest of a file's content
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
 def read_ape200k_source(filename):
     """specially used to read data of ape200k source file
     """
@@ -71,6 +118,28 @@ def copy_list(l):
     return r
 
 
+def copy_num_stack(num_stack_batch):
+    """copy num stacks of a batch for decoders which pop from them.
+
+    only the stacks are copied, the position lists in them are never modified, so they are shared.
+    """
+    return [list(num_stack) for num_stack in num_stack_batch]
+
+
+def map_tensors(value, func):
+    """apply func to the tensors of value, also to the ones nested in dicts, lists and tuples, e.g. a tree schedule.
+
+    containers are rebuilt, other values are returned as they are.
+    """
+    if isinstance(value, torch.Tensor):
+        return func(value)
+    if isinstance(value, dict):
+        return {key: map_tensors(item, func) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(map_tensors(item, func) for item in value)
+    return value
+
+
 def time_since(s):
     """compute time
 
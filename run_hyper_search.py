@@ -2,14 +2,30 @@ import argparse
 import sys
 import os
 
-from ray import tune
-
-from mwptoolkit.hyper_search import hyper_search_process
+from mwptoolkit.hyper_search import hyper_search_process, local_hyper_search_process
+from mwptoolkit.utils.search_scheduler import parse_search_parameter
 from mwptoolkit.utils.utils import read_json_data
 
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.getcwd(), ".")))
 
+
+def to_tune_space(space_dict):
+    from ray import tune
+
+    parameter_dict = {}
+    for name, (kind, space) in space_dict.items():
+        if kind == 'grid':
+            parameter_dict[name] = tune.grid_search(space)
+        elif kind == 'uniform':
+            parameter_dict[name] = tune.uniform(space[0], space[1])
+        elif kind == 'loguniform':
+            parameter_dict[name] = tune.loguniform(space[0], space[1])
+        else:
+            parameter_dict[name] = space
+    return parameter_dict
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--model', '-m', type=str, default='GTS', help='name of models')
@@ -17,36 +33,18 @@ if __name__ == '__main__':
     parser.add_argument('--task_type', '-t', type=str, default='single_equation', help='name of tasks')
     parser.add_argument('--search_parameter', '-s', type=str, action='append', default=[])
     parser.add_argument('--search_file','-f',type=str,default=None)
+    parser.add_argument('--engine', '-e', type=str, default='local', choices=['local', 'ray'],
+                        help='local runs the trials on a local process pool, ray runs them with ray tune')
 
     args, _ = parser.parse_known_args()
     config_dict = {}
-    parameter_dict = {}
+    search_parameter = []
     if args.search_file != None:
-        search_parameter=read_json_data(args.search_file)
-        for parameter in search_parameter:
-            value = parameter.split('=')
-            space = eval(value[1])
-            if isinstance(space,list):
-                parameter_dict[value[0]] = tune.grid_search(space)
-            elif isinstance(space,tuple) and len(space)==2:
-                if space[0]==0 and space[1]==1:
-                    parameter_dict[value[0]] = tune.uniform(space[0],space[1])
-                else:
-                    parameter_dict[value[0]] = tune.loguniform(space[0],space[1])
-            else:
-                parameter_dict[value[0]] = space
-    search_parameter = args.search_parameter
-    for parameter in search_parameter:
-        value = parameter.split('=')
-        space = eval(value[1])
-        if isinstance(space,list):
-            parameter_dict[value[0]] = tune.grid_search(space)
-        elif isinstance(space,tuple) and len(space)==2:
-            if space[0]==0 and space==1:
-                parameter_dict[value[0]] = tune.uniform(space[0],space[1])
-            else:
-                parameter_dict[value[0]] = tune.loguniform(space[0],space[1])
-        else:
-            parameter_dict[value[0]] = space
+        search_parameter += read_json_data(args.search_file)
+    search_parameter += args.search_parameter
+    space_dict = parse_search_parameter(search_parameter)
 
-    hyper_search_process(args.model, args.dataset, args.task_type, parameter_dict, config_dict)
+    if args.engine == 'ray':
+        hyper_search_process(args.model, args.dataset, args.task_type, to_tune_space(space_dict), config_dict)
+    else:
+        local_hyper_search_process(args.model, args.dataset, args.task_type, space_dict, config_dict)